@@ -41,4 +41,83 @@ if admin_ids_str:
 # Настройки ИИ
 DEFAULT_MODEL = "gpt-4o-mini"
 MAX_RESULTS = 10  # Максимальное количество документов для контекста
-MAX_TOKENS = 2000  # Максимальное количество токенов в ответе 
\ No newline at end of file
+MAX_TOKENS = 2000  # Максимальное количество токенов в ответе 
+
+# Настройки пулов исполнителей для блокирующих операций
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", "4"))  # ML-фильтр, эмбеддинги, поиск в ChromaDB
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "16"))  # HTTP-запросы, скрапинг, SQLite
+CPU_POOL_MAX_QUEUE = int(os.getenv("CPU_POOL_MAX_QUEUE", "64"))  # Максимум задач в очереди CPU-пула
+IO_POOL_MAX_QUEUE = int(os.getenv("IO_POOL_MAX_QUEUE", "128"))  # Максимум задач в очереди I/O-пула
+
+# Настройки асинхронного клиента OpenAI
+OPENAI_REQUEST_DEADLINE = float(os.getenv("OPENAI_REQUEST_DEADLINE", "90"))  # Общий дедлайн запроса с учетом повторов, сек
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))  # Повторы при 429/5xx и сетевых ошибках
+OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "1.0"))  # Базовая задержка экспоненциального backoff, сек
+OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "20"))  # Максимальная задержка между повторами, сек
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))  # Размер пула HTTP-соединений
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "120"))  # Время жизни простаивающего соединения, сек
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))  # Лимит токенов в минуту для нашего ключа
+OPENAI_TOKENS_PER_REQUEST = int(os.getenv("OPENAI_TOKENS_PER_REQUEST", "6000"))  # Промпт с контекстом + MAX_TOKENS
+OPENAI_AVG_REQUEST_SECONDS = float(os.getenv("OPENAI_AVG_REQUEST_SECONDS", "15"))  # Средняя длительность генерации
+# Одновременных запросов столько, чтобы за минуту не выйти за OPENAI_TPM_LIMIT
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "0")) or max(
+    1, int(OPENAI_TPM_LIMIT * OPENAI_AVG_REQUEST_SECONDS / 60 / OPENAI_TOKENS_PER_REQUEST)
+)
+
+# Потоковая выдача ответа в Telegram
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))  # Не реже, чем раз в N секунд
+STREAM_EDIT_CHARS = int(os.getenv("STREAM_EDIT_CHARS", "300"))  # Или после N новых символов
+
+# Семантический кеш ответов
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))  # Максимум ответов в кеше (LRU)
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))  # Время жизни ответа, сек
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))  # Порог косинусного сходства вопросов
+KB_VERSION_PATH = os.getenv("KB_VERSION_PATH", "db/kb_version")  # Версия документов базы знаний: сбрасывает кеш ответов при загрузке из других процессов
+
+# Загрузка документов в базу знаний
+KB_BATCH_SIZE = int(os.getenv("KB_BATCH_SIZE", "128"))  # Документов в одном пакете эмбеддингов и записи
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))  # Процессов извлечения текста при загрузке (0 - по числу ядер)
+DOCUMENT_MANIFEST_PATH = os.getenv("DOCUMENT_MANIFEST_PATH", "db/document_manifest.db")  # Блоки базы знаний по исходным файлам (SQLite)
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"  # Кешировать текст и блоки документов по хешу файла
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", "db/extraction_cache.db")
+EXTRACTION_CACHE_MAX_MB = float(os.getenv("EXTRACTION_CACHE_MAX_MB", "1024"))  # Максимальный размер сжатого текста и блоков
+KB_EMBEDDING_CACHE_SIZE = int(os.getenv("KB_EMBEDDING_CACHE_SIZE", "1024"))  # Эмбеддингов запросов в LRU-кеше
+KB_COUNT_REFRESH_SECONDS = float(os.getenv("KB_COUNT_REFRESH_SECONDS", "60"))  # Как часто перечитывать количество документов
+
+# Гибридный поиск (BM25 + векторный) с объединением результатов по RRF
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+BM25_INDEX_PATH = os.getenv(  # Лексический индекс рядом с CHROMA_DB_PATH (SQLite)
+    "BM25_INDEX_PATH", os.path.join(os.path.dirname(os.path.normpath(CHROMA_DB_PATH)), "bm25_index.db")
+)
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # Кандидатов от каждого вида поиска
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))  # Константа reciprocal rank fusion
+HYBRID_LEXICAL_MIN_TERMS = int(os.getenv("HYBRID_LEXICAL_MIN_TERMS", "3"))  # Термов запроса для полного доверия к лексическому совпадению
+
+# Динамический поиск на pravo.by: параллельные запросы с ограничением частоты
+DYNAMIC_SEARCH_HOST_CONCURRENCY = int(os.getenv("DYNAMIC_SEARCH_HOST_CONCURRENCY", "4"))  # Одновременных запросов к одному хосту
+DYNAMIC_SEARCH_RATE = float(os.getenv("DYNAMIC_SEARCH_RATE", "2"))  # Средняя частота запросов к одному хосту, в секунду
+DYNAMIC_SEARCH_BURST = float(os.getenv("DYNAMIC_SEARCH_BURST", "4"))  # Запросов, которые можно отправить без ожидания
+DYNAMIC_SEARCH_TIMEOUT = float(os.getenv("DYNAMIC_SEARCH_TIMEOUT", "10"))  # Таймаут загрузки одной страницы, сек
+
+# Фоновое пополнение базы знаний: сначала ответ по базе, затем поиск на pravo.by
+DYNAMIC_SEARCH_BACKGROUND = os.getenv("DYNAMIC_SEARCH_BACKGROUND", "true").lower() == "true"  # Не ждать pravo.by при слабых результатах
+ENRICHMENT_WORKERS = int(os.getenv("ENRICHMENT_WORKERS", "2"))  # Одновременных фоновых поисков
+ENRICHMENT_QUEUE_SIZE = int(os.getenv("ENRICHMENT_QUEUE_SIZE", "32"))  # Максимум вопросов в очереди
+ENRICHMENT_EDIT_ANSWER = os.getenv("ENRICHMENT_EDIT_ANSWER", "false").lower() == "true"  # Обновить ответ после пополнения базы (повторный запрос к LLM)
+
+# Постоянный кеш HTTP-ответов скраперов (с перепроверкой по ETag/Last-Modified)
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() == "true"
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", "db/http_cache.db")
+HTTP_CACHE_MAX_MB = float(os.getenv("HTTP_CACHE_MAX_MB", "256"))  # Максимальный размер сжатых страниц
+HTTP_CACHE_TTL = float(os.getenv("HTTP_CACHE_TTL", "3600"))  # Сколько секунд страница считается свежей без перепроверки
+
+# Обход сайтов скраперами
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "4"))  # Одновременно загружаемых страниц
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "5"))  # Глубина ссылок от стартовой страницы
+CRAWL_BLOOM_CAPACITY = int(os.getenv("CRAWL_BLOOM_CAPACITY", "0"))  # >0 - учитывать посещенные URL фильтром Блума
+HTML_PARSER = os.getenv("HTML_PARSER", "auto")  # auto, selectolax, lxml или bs4
+
+# Хранилище информации о страницах и истории парсинга (заменяет pages_info.json и scraping_info.json)
+PAGE_STORE_PATH = os.getenv("PAGE_STORE_PATH", "db/page_store.db")
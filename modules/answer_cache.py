@@ -0,0 +1,268 @@
+"""
+Модуль семантического кеша ответов.
+
+Хранит ответы LLM вместе с эмбеддингом вопроса и идентификаторами документов,
+на основе которых ответ был сгенерирован. Похожий по смыслу вопрос получает
+готовый ответ без поиска в ChromaDB и запроса к OpenAI. Записи вытесняются по
+LRU и TTL и удаляются, когда изменяются документы, от которых они зависят.
+Изменения базы знаний в других процессах (скрипты загрузки, админ-панель)
+обнаруживаются по общей версии документов и сбрасывают весь кеш.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+
+import config
+from modules.metrics import ANSWER_CACHE_HITS, ANSWER_CACHE_MISSES, ANSWER_CACHE_EVICTIONS, ANSWER_CACHE_SIZE
+from modules.single_flight import normalize_question
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    """Запись кеша ответов."""
+    question: str
+    embedding: np.ndarray
+    doc_ids: Set[str]
+    answer: str
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """Кеш ответов с поиском по косинусному сходству вопросов."""
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 86400,
+                 similarity_threshold: float = 0.92,
+                 embed_fn: Optional[Callable[[str], Sequence[float]]] = None,
+                 version_fn: Optional[Callable[[], Optional[str]]] = None):
+        """
+        Инициализирует кеш.
+
+        Args:
+            max_entries: Максимальное количество ответов в кеше
+            ttl_seconds: Время жизни ответа в секундах
+            similarity_threshold: Минимальное косинусное сходство вопросов для попадания
+            embed_fn: Функция вычисления эмбеддинга вопроса
+                      (по умолчанию - эмбеддинги базы знаний)
+            version_fn: Функция, возвращающая общую для всех процессов версию документов
+                        (None - учитывать только изменения в текущем процессе)
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._embed_fn = embed_fn
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._doc_index: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        # Версия растет при каждой инвалидации; ответ, сгенерированный по
+        # документам до инвалидации, в кеш не попадает
+        self._version = 0
+        self._version_fn = version_fn
+        self._external_version = version_fn() if version_fn else None
+        self._hits = 0
+        self._misses = 0
+
+    def _embed(self, question: str) -> np.ndarray:
+        """Вычисляет нормализованный эмбеддинг вопроса."""
+        if self._embed_fn is None:
+            from modules.knowledge_base import get_knowledge_base
+            self._embed_fn = get_knowledge_base().embed_query
+        vector = np.asarray(self._embed_fn(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, key: str, reason: str):
+        """Удаляет запись из кеша. Вызывается под блокировкой."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for doc_id in entry.doc_ids:
+            keys = self._doc_index.get(doc_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._doc_index[doc_id]
+        if ANSWER_CACHE_EVICTIONS: ANSWER_CACHE_EVICTIONS.labels(reason=reason).inc()
+
+    def _remove_expired(self):
+        """Удаляет записи с истекшим TTL. Вызывается под блокировкой."""
+        now = time.time()
+        expired = [key for key, entry in self._entries.items() if now - entry.created_at > self.ttl_seconds]
+        for key in expired:
+            self._remove(key, "ttl")
+
+    def _update_size(self):
+        """Обновляет метрику размера кеша. Вызывается под блокировкой."""
+        if ANSWER_CACHE_SIZE: ANSWER_CACHE_SIZE.set(len(self._entries))
+
+    def _sync_external_version(self):
+        """Сбрасывает кеш, если документы базы знаний изменил другой процесс."""
+        if self._version_fn is None or self._version_fn() == self._external_version:
+            return
+        logger.info("💾 КЕШ ОТВЕТОВ: База знаний изменена другим процессом")
+        self.invalidate_documents(None)
+
+    def get_version(self) -> int:
+        """
+        Возвращает текущую версию кеша.
+
+        Версию нужно получить до генерации ответа и передать в store().
+
+        Returns:
+            Номер версии
+        """
+        self._sync_external_version()
+        with self._lock:
+            return self._version
+
+    def lookup(self, question: str) -> Optional[str]:
+        """
+        Ищет ответ на семантически близкий вопрос.
+
+        Args:
+            question: Вопрос пользователя
+
+        Returns:
+            Ответ из кеша или None
+        """
+        embedding = self._embed(question)
+        self._sync_external_version()
+
+        with self._lock:
+            self._remove_expired()
+            best_key, best_similarity = None, -1.0
+            if self._entries:
+                keys = list(self._entries.keys())
+                matrix = np.vstack([self._entries[key].embedding for key in keys])
+                similarities = matrix @ embedding
+                best_index = int(np.argmax(similarities))
+                best_key, best_similarity = keys[best_index], float(similarities[best_index])
+
+            if best_key is not None and best_similarity >= self.similarity_threshold:
+                self._entries.move_to_end(best_key)
+                self._hits += 1
+                self._update_size()
+                if ANSWER_CACHE_HITS: ANSWER_CACHE_HITS.inc()
+                logger.info(f"💾 КЕШ ОТВЕТОВ: Попадание (сходство {best_similarity:.3f}) для вопроса: '{question[:50]}...'")
+                return self._entries[best_key].answer
+
+            self._misses += 1
+            self._update_size()
+            if ANSWER_CACHE_MISSES: ANSWER_CACHE_MISSES.inc()
+            return None
+
+    def store(self, question: str, doc_ids: Iterable[str], answer: str,
+              version: Optional[int] = None) -> bool:
+        """
+        Сохраняет ответ в кеш.
+
+        Args:
+            question: Вопрос пользователя
+            doc_ids: Идентификаторы документов, использованных для ответа
+            answer: Текст ответа
+            version: Версия кеша на момент получения документов
+
+        Returns:
+            True если ответ сохранен
+        """
+        doc_ids = {doc_id for doc_id in doc_ids if doc_id}
+        if not answer or not doc_ids:
+            return False
+
+        embedding = self._embed(question)
+        key = normalize_question(question)
+        self._sync_external_version()
+
+        with self._lock:
+            if version is not None and version != self._version:
+                logger.debug("Ответ не сохранен в кеш: документы изменились во время генерации")
+                return False
+
+            self._remove(key, "replaced")
+            self._entries[key] = CachedAnswer(
+                question=question,
+                embedding=embedding,
+                doc_ids=doc_ids,
+                answer=answer,
+                created_at=time.time()
+            )
+            for doc_id in doc_ids:
+                self._doc_index.setdefault(doc_id, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key, "lru")
+            self._update_size()
+        return True
+
+    def invalidate_documents(self, doc_ids: Optional[List[str]]):
+        """
+        Удаляет ответы, зависящие от измененных документов.
+
+        Args:
+            doc_ids: Идентификаторы измененных документов или None для полной очистки
+        """
+        with self._lock:
+            self._version += 1
+            if self._version_fn is not None:
+                # Версия документов уже обновлена тем, кто их изменил
+                self._external_version = self._version_fn()
+            if doc_ids is None:
+                keys = list(self._entries.keys())
+            else:
+                keys = set()
+                for doc_id in doc_ids:
+                    keys.update(self._doc_index.get(doc_id, ()))
+            for key in keys:
+                self._remove(key, "invalidated")
+            self._update_size()
+        if keys:
+            logger.info(f"💾 КЕШ ОТВЕТОВ: Удалено {len(keys)} ответов из-за изменения документов")
+
+    def clear(self):
+        """Очищает кеш."""
+        self.invalidate_documents(None)
+
+    def get_stats(self) -> Dict[str, float]:
+        """Возвращает статистику кеша."""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / total if total else 0.0
+            }
+
+
+# Глобальный экземпляр кеша
+_answer_cache = None
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """
+    Возвращает глобальный кеш ответов, подписанный на изменения базы знаний
+    в текущем и других процессах.
+
+    Returns:
+        Кеш ответов или None, если кеш отключен
+    """
+    global _answer_cache
+    if not config.ANSWER_CACHE_ENABLED:
+        return None
+    if _answer_cache is None:
+        from modules.knowledge_base import add_change_listener, get_documents_version
+        _answer_cache = SemanticAnswerCache(
+            max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds=config.ANSWER_CACHE_TTL,
+            similarity_threshold=config.ANSWER_CACHE_SIMILARITY,
+            version_fn=get_documents_version
+        )
+        add_change_listener(_answer_cache.invalidate_documents)
+    return _answer_cache
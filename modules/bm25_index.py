@@ -0,0 +1,241 @@
+"""
+Модуль лексического индекса BM25 для гибридного поиска.
+
+Векторный поиск плохо различает точные ссылки на нормы («статья 1014 ГК»,
+«Декрет №8»), поэтому результаты ChromaDB дополняются поиском по
+инвертированному индексу BM25 над текстами блоков базы знаний.
+Индекс хранится в SQLite и обновляется построчно при загрузке документов.
+"""
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Длина префикса, к которой усекаются слова (простая замена стемминга для русского языка)
+STEM_LENGTH = 5
+
+STOP_WORDS = {
+    'и', 'в', 'во', 'не', 'на', 'по', 'с', 'со', 'к', 'ко', 'о', 'об', 'от', 'до', 'за', 'из',
+    'у', 'для', 'как', 'что', 'это', 'а', 'но', 'или', 'ли', 'же', 'бы', 'то', 'я', 'мы',
+    'вы', 'он', 'она', 'они', 'мне', 'меня', 'при', 'если', 'можно', 'чем', 'какой', 'какие',
+    'нужно', 'его', 'ее', 'их', 'так', 'также', 'быть', 'был', 'была', 'есть'
+}
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Максимум параметров в одном запросе SQLite
+_BATCH = 500
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Разбивает текст на термы индекса.
+
+    Числа сохраняются целиком (номера статей и документов), слова
+    приводятся к нижнему регистру и усекаются до STEM_LENGTH символов.
+
+    Args:
+        text: Исходный текст
+
+    Returns:
+        Список термов
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower().replace('ё', 'е')):
+        if token in STOP_WORDS or not token.strip('_'):
+            continue
+        if not token.isdigit():
+            token = token[:STEM_LENGTH]
+        terms.append(token)
+    return terms
+
+
+class BM25Index:
+    """Инвертированный индекс BM25, хранящийся в SQLite."""
+
+    def __init__(self, index_file: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        """
+        Инициализирует индекс.
+
+        Индекс изменяется построчно в транзакциях SQLite, поэтому добавление
+        блоков не перезаписывает весь индекс, а изменения скриптов загрузки
+        и бота сразу видны друг другу и не теряются при одновременной записи.
+
+        Args:
+            index_file: Путь к файлу SQLite индекса (None - только в памяти)
+            k1: Параметр насыщения частоты терма
+            b: Параметр нормализации по длине документа
+        """
+        self.index_file = index_file
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        if index_file:
+            directory = os.path.dirname(index_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        # Индекс одновременно изменяют бот и скрипты загрузки: ждем освобождения записи
+        self._conn = sqlite3.connect(index_file or ":memory:", timeout=30, check_same_thread=False)
+        self._init_database()
+
+    def _init_database(self):
+        """Создает таблицы индекса."""
+        with self._lock, self._conn:
+            if self.index_file:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS docs (
+                    doc_id TEXT PRIMARY KEY,
+                    length INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (term, doc_id)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_doc_id ON postings(doc_id)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def _remove(self, doc_ids: List[str]):
+        """Удаляет документы из индекса. Вызывается в транзакции под блокировкой."""
+        for start in range(0, len(doc_ids), _BATCH):
+            batch = doc_ids[start:start + _BATCH]
+            placeholders = ','.join('?' * len(batch))
+            self._conn.execute(f"DELETE FROM postings WHERE doc_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM docs WHERE doc_id IN ({placeholders})", batch)
+
+    def add_documents(self, documents: Iterable[Tuple[str, str]]):
+        """
+        Добавляет документы в индекс (существующие документы заменяются).
+
+        Args:
+            documents: Пары (ID документа, текст)
+        """
+        term_counts = {doc_id: Counter(tokenize(text)) for doc_id, text in documents}
+        if not term_counts:
+            return
+        with self._lock, self._conn:
+            self._remove(list(term_counts))
+            self._conn.executemany(
+                "INSERT INTO docs (doc_id, length) VALUES (?, ?)",
+                ((doc_id, sum(counts.values())) for doc_id, counts in term_counts.items())
+            )
+            self._conn.executemany(
+                "INSERT INTO postings (term, doc_id, count) VALUES (?, ?, ?)",
+                ((term, doc_id, count) for doc_id, counts in term_counts.items() for term, count in counts.items())
+            )
+
+    def remove_documents(self, doc_ids: Iterable[str]):
+        """
+        Удаляет документы из индекса.
+
+        Args:
+            doc_ids: ID документов
+        """
+        doc_ids = list(set(doc_ids))
+        if not doc_ids:
+            return
+        with self._lock, self._conn:
+            self._remove(doc_ids)
+
+    def clear(self):
+        """Очищает индекс."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM docs")
+
+    def _doc_freqs(self, terms: List[str]) -> Dict[str, int]:
+        """Возвращает количество документов с каждым термом. Вызывается под блокировкой."""
+        placeholders = ','.join('?' * len(terms))
+        return dict(self._conn.execute(
+            f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term", terms
+        ).fetchall())
+
+    @staticmethod
+    def _idf(doc_freq: int, total: int) -> float:
+        """Возвращает обратную документную частоту терма."""
+        return math.log(1 + (total - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def search(self, query_text: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """
+        Ищет документы по запросу.
+
+        Args:
+            query_text: Текст запроса
+            n_results: Максимальное количество результатов
+
+        Returns:
+            Список пар (ID документа, оценка BM25) по убыванию оценки
+        """
+        terms = list(set(tokenize(query_text)))
+        if not terms:
+            return []
+        placeholders = ','.join('?' * len(terms))
+        with self._lock:
+            total, total_length = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+            if not total:
+                return []
+            # Вхождения всех термов запроса одним запросом; частоты термов считаются по ним же
+            rows = self._conn.execute(
+                "SELECT postings.term, postings.count, docs.length, docs.doc_id FROM postings "
+                f"JOIN docs ON docs.doc_id = postings.doc_id WHERE postings.term IN ({placeholders})", terms
+            ).fetchall()
+        avg_length = total_length / total or 1.0
+        doc_freqs = Counter(term for term, _, _, _ in rows)
+        scores: Dict[str, float] = {}
+        for term, count, length, doc_id in rows:
+            norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + self._idf(doc_freqs[term], total) * count * (self.k1 + 1) / (count + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+
+    def coverage(self, query_text: str, doc_ids: List[str]) -> Dict[str, Tuple[float, List[str]]]:
+        """
+        Оценивает, какая доля запроса буквально содержится в каждом из документов.
+
+        Термы взвешиваются по IDF, поэтому совпадение редкого номера статьи
+        важнее совпадения частого слова. Частоты термов считаются один раз
+        на запрос, вхождения термов во все документы читаются одним запросом.
+
+        Args:
+            query_text: Текст запроса
+            doc_ids: ID документов
+
+        Returns:
+            Словарь ID документа -> (доля покрытия от 0 до 1, найденные в документе термы запроса)
+        """
+        terms = list(set(tokenize(query_text)))
+        doc_ids = list(dict.fromkeys(doc_ids))
+        if not terms or not doc_ids:
+            return {doc_id: (0.0, []) for doc_id in doc_ids}
+        term_placeholders = ','.join('?' * len(terms))
+        doc_terms: Dict[str, List[str]] = {doc_id: [] for doc_id in doc_ids}
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+            doc_freqs = self._doc_freqs(terms)
+            for start in range(0, len(doc_ids), _BATCH):
+                batch = doc_ids[start:start + _BATCH]
+                rows = self._conn.execute(
+                    f"SELECT doc_id, term FROM postings WHERE term IN ({term_placeholders}) "
+                    f"AND doc_id IN ({','.join('?' * len(batch))})", terms + batch
+                )
+                for doc_id, term in rows:
+                    doc_terms[doc_id].append(term)
+        weights = {term: self._idf(doc_freqs.get(term, 0), total) for term in terms}
+        total_weight = sum(weights.values())
+        return {
+            doc_id: ((sum(weights[term] for term in matched) / total_weight if total_weight else 0.0), matched)
+            for doc_id, matched in doc_terms.items()
+        }
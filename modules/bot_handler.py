@@ -1,21 +1,28 @@
 """
 Модуль для обработки сообщений Telegram бота.
 """
+import asyncio
 import logging
 from aiogram import Bot, Dispatcher, F
 from aiogram.types import Message, BotCommand
 from aiogram.filters import Command
-from aiogram.exceptions import TelegramAPIError
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramRetryAfter
 import config
-from .knowledge_base import search_relevant_docs, get_knowledge_base, should_use_dynamic_search
-from .llm_service import get_answer
+from .knowledge_base import (
+    search_relevant_docs, get_knowledge_base, should_use_dynamic_search, find_by_citation, relevance_distance
+)
+from .llm_service import get_answer_async, get_llm_service
 from .web_scraper import create_scraper_from_config
 from .scraping_tracker import get_scraping_tracker
 from .incremental_scraper import create_incremental_scraper
-from .dynamic_search import create_dynamic_searcher
+from .dynamic_search import create_dynamic_searcher, DynamicSearcher
 from .text_processing import TextProcessor
 from .ml_question_filter import is_legal_question_ml as is_legal_question, get_ml_rejection_message as get_rejection_message
 from .ml_analytics_integration import create_question_context, finalize_question_context, get_analytics_summary
+from .executors import ExecutorQueueFull, run_cpu, run_io, shutdown_executors
+from .answer_cache import get_answer_cache
+from .single_flight import SingleFlight, normalize_question
+from .enrichment_queue import EnrichmentQueue, EnrichmentJob
 
 # Импортируем метрики Prometheus из modules.metrics
 from modules.metrics import REQUESTS, ERRORS, RESPONSE_TIME, ACTIVE_USERS
@@ -23,6 +30,35 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Telegram ограничивает сообщение 4096 символами; запас оставлен под маркер генерации
+TELEGRAM_MESSAGE_LIMIT = 4000
+
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> list:
+    """
+    Разбивает текст на части, которые помещаются в одно сообщение Telegram.
+    
+    Текст по возможности разрезается по переводу строки или пробелу.
+    
+    Args:
+        text: Текст сообщения
+        limit: Максимальная длина части
+        
+    Returns:
+        Список частей текста
+    """
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit)
+        if cut < limit // 2:
+            cut = text.rfind(' ', 0, limit)
+        if cut < limit // 2:
+            cut = limit
+        parts.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    parts.append(text)
+    return parts
+
 class LegalBot:
     """Класс для управления юридическим ботом."""
     
@@ -34,6 +70,18 @@ class LegalBot:
         logger.info("Бот инициализирован")
         self._unique_users_today = set()
         self._current_day = datetime.now().date()
+        # Одинаковые вопросы, заданные одновременно, обрабатываются один раз на каждом этапе
+        self._search_flight = SingleFlight("search")
+        self._dynamic_search_flight = SingleFlight("dynamic_search")
+        self._llm_flight = SingleFlight("llm")
+        # Общая HTTP-сессия динамического поиска (создается при первом поиске)
+        self._search_session = None
+        # Фоновый динамический поиск для вопросов со слабым совпадением в базе знаний
+        self._enrichment_queue = EnrichmentQueue(
+            self._run_enrichment_job,
+            workers=config.ENRICHMENT_WORKERS,
+            max_size=config.ENRICHMENT_QUEUE_SIZE
+        )
     
     def _setup_handlers(self):
         """Настраивает обработчики сообщений."""
@@ -353,7 +401,7 @@ class LegalBot:
             
             # Выполняем скрапинг
             scraper = create_scraper_from_config()
-            result = scraper.scrape_and_add(url, max_pages)
+            result = await run_io(scraper.scrape_and_add, url, max_pages)
             
             if result['success']:
                 success_text = f"""
@@ -464,7 +512,7 @@ class LegalBot:
             incremental_scraper = create_incremental_scraper(web_scraper, scraping_tracker)
             
             # Выполняем инкрементальное обновление
-            result = incremental_scraper.incremental_scrape(url, max_pages)
+            result = await run_io(incremental_scraper.incremental_scrape, url, max_pages)
             
             # Формируем отчет
             if result['pages_scraped'] > 0:
@@ -1038,10 +1086,12 @@ pip install psutil
         
         # Создаем контекст для аналитики
         context_id = create_question_context(user_question, user_id)
+        # Оценка фильтра нужна для финализации, даже если пул отклонил саму проверку
+        score, explanation = 0.0, ""
         
         try:
             # Проверяем, является ли вопрос юридическим
-            is_legal, score, explanation = is_legal_question(user_question)
+            is_legal, score, explanation = await run_cpu(is_legal_question, user_question)
             
             if not is_legal:
                 # Если вопрос не юридический, отклоняем его
@@ -1049,7 +1099,7 @@ pip install psutil
                            f"(оценка: {score:.3f}): {explanation}")
                 
                 # Финализируем контекст для отклоненного вопроса
-                finalize_question_context(context_id, accepted=False, ml_confidence=score, ml_explanation=explanation)
+                await run_io(finalize_question_context, context_id, accepted=False, ml_confidence=score, ml_explanation=explanation)
                 
                 rejection_message = get_rejection_message()
                 await message.answer(rejection_message, parse_mode="Markdown")
@@ -1062,8 +1112,33 @@ pip install psutil
             # Отправляем сообщение о том, что обрабатываем запрос
             processing_msg = await message.answer("🔍 Ищу информацию по вашему вопросу...")
             
+            # Проверяем, не отвечали ли мы недавно на похожий вопрос
+            cached_answer = await self._lookup_cached_answer(user_question)
+            if cached_answer:
+                await processing_msg.edit_text(cached_answer)
+                logger.info(f"✅ ИСТОЧНИК: Ответ из кеша отправлен пользователю {user_id}")
+                
+                # Финализируем контекст для ответа из кеша
+                await run_io(finalize_question_context, context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
+                             search_quality="high", answer_source="answer_cache")
+                return
+            
+            # Вопрос со ссылкой на конкретную статью отвечаем по индексу цитат, без векторного поиска
+            relevant_docs = await run_cpu(find_by_citation, user_question, n_results=config.MAX_RESULTS)
+            if relevant_docs:
+                logger.info(f"📑 ИСТОЧНИК: Индекс цитат - найдено {len(relevant_docs)} блоков для пользователя {user_id}")
+                await self._send_streamed_answer(processing_msg, user_question, relevant_docs)
+                
+                # Финализируем контекст для ответа по индексу цитат
+                await run_io(finalize_question_context, context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
+                             search_quality="high", answer_source="citation_index")
+                return
+            
             # Сначала ищем в базе знаний
-            relevant_docs = search_relevant_docs(user_question, n_results=config.MAX_RESULTS)
+            question_key = normalize_question(user_question)
+            relevant_docs, _ = await self._search_flight.run(
+                question_key, lambda: run_cpu(search_relevant_docs, user_question, n_results=config.MAX_RESULTS)
+            )
             
             # Логируем результаты анализа
             if relevant_docs:
@@ -1089,7 +1164,7 @@ pip install psutil
                 logger.info(f"🔍 РЕШЕНИЕ: Документы не найдены - всегда ищем на pravo.by")
             else:
                 # Проверяем качество лучшего результата
-                best_distance = min(doc['distance'] for doc in relevant_docs)
+                best_distance = min(relevance_distance(doc) for doc in relevant_docs)
                 # Используем более агрессивный порог для динамического поиска
                 if best_distance > 0.5:  # Снижен порог с 0.6 до 0.5
                     need_dynamic_search = True
@@ -1097,45 +1172,59 @@ pip install psutil
                 else:
                     logger.info(f"🔍 РЕШЕНИЕ: Хорошее качество результатов (дистанция: {best_distance:.3f}) - используем базу знаний")
             
+            if need_dynamic_search and relevant_docs and config.DYNAMIC_SEARCH_BACKGROUND:
+                # Слабое совпадение: отвечаем по базе знаний сразу, а pravo.by ищем в фоне
+                answered = asyncio.Event()
+                queued = self._enqueue_enrichment(processing_msg, user_question, question_key, context_id, answered,
+                                                  {doc['id'] for doc in relevant_docs})
+                suffix = ""
+                if queued and config.ENRICHMENT_EDIT_ANSWER:
+                    suffix = "\n\n🌐 Ищу дополнительную информацию на pravo.by - ответ может быть обновлен."
+                try:
+                    await self._send_streamed_answer(processing_msg, user_question, relevant_docs,
+                                                     suffix=suffix, cache_answer=False)
+                finally:
+                    answered.set()
+                logger.info(f"✅ ИСТОЧНИК: Ответ из базы знаний отправлен пользователю {user_id}, "
+                            f"пополнение с pravo.by {'в очереди' if queued else 'не запущено'}")
+                
+                # Финализируем контекст: ID контекста сохраняется в метаданных найденных в фоне блоков
+                await run_io(finalize_question_context, context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
+                             search_quality="low", answer_source="knowledge_base_enrichment")
+                return
+            
             if need_dynamic_search:
                 # Выполняем динамический поиск на pravo.by
                 await processing_msg.edit_text("🌐 Ищу актуальную информацию на pravo.by...")
                 
                 try:
-                    # Создаем динамический поисковик
-                    web_scraper = create_scraper_from_config()
-                    knowledge_base = get_knowledge_base()
-                    text_processor = TextProcessor()
-                    scraping_tracker = get_scraping_tracker()
-                    
-                    dynamic_searcher = create_dynamic_searcher(
-                        web_scraper, knowledge_base, text_processor, scraping_tracker
-                    )
-                    
                     # Выполняем динамический поиск
                     logger.info(f"🔍 ИСТОЧНИК: Запуск динамического поиска на pravo.by для пользователя {user_id}")
-                    dynamic_answer, success = dynamic_searcher.search_and_add_to_knowledge_base(user_question)
+                    (dynamic_docs, pages_count), _ = await self._dynamic_search_flight.run(
+                        question_key, lambda: self._run_dynamic_search(user_question, context_id)
+                    )
                     
-                    if success and dynamic_answer:
-                        await processing_msg.edit_text(dynamic_answer)
+                    if dynamic_docs:
+                        logger.info(f"🤖 ДИНАМИЧЕСКИЙ ПОИСК: Генерация ответа через OpenAI на основе новых данных из {pages_count} страниц")
+                        await self._send_streamed_answer(processing_msg, user_question, dynamic_docs,
+                                                         suffix=DynamicSearcher.format_source_info(pages_count))
                         logger.info(f"✅ ИСТОЧНИК: Динамический поиск успешен - ответ получен с pravo.by для пользователя {user_id}")
                         
                         # Финализируем контекст для успешного динамического поиска
-                        finalize_question_context(context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
-                                                search_quality="high", answer_source="dynamic_search")
+                        await run_io(finalize_question_context, context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
+                                     search_quality="high", answer_source="dynamic_search")
                         return
                     else:
                         # Если динамический поиск не помог, но в базе есть хоть что-то
                         if relevant_docs:
                             await processing_msg.edit_text("🔍 Информация на pravo.by не найдена. Генерирую ответ на основе базы знаний...")
-                            answer = get_answer(user_question, relevant_docs)
-                            await processing_msg.edit_text(answer)
+                            await self._send_streamed_answer(processing_msg, user_question, relevant_docs)
                             logger.info(f"✅ ИСТОЧНИК: Ответ получен из базы знаний после неуспешного поиска на pravo.by для пользователя {user_id}")
                             
                             # Финализируем контекст для ответа из базы знаний после неуспешного поиска
-                            search_quality = "medium" if min(doc['distance'] for doc in relevant_docs) <= 0.5 else "low"
-                            finalize_question_context(context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
-                                                    search_quality=search_quality, answer_source="knowledge_base_fallback")
+                            search_quality = "medium" if min(relevance_distance(doc) for doc in relevant_docs) <= 0.5 else "low"
+                            await run_io(finalize_question_context, context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
+                                         search_quality=search_quality, answer_source="knowledge_base_fallback")
                             return
                         else:
                             # Если динамический поиск не помог и в базе ничего нет
@@ -1156,8 +1245,8 @@ pip install psutil
                             await processing_msg.edit_text(no_info_response, parse_mode="Markdown")
                             
                             # Финализируем контекст для случая, когда информация не найдена
-                            finalize_question_context(context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
-                                                    search_quality="none", answer_source="no_answer")
+                            await run_io(finalize_question_context, context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
+                                         search_quality="none", answer_source="no_answer")
                             return
                         
                 except Exception as e:
@@ -1167,14 +1256,13 @@ pip install psutil
                     # Если произошла ошибка, но в базе есть документы - используем их
                     if relevant_docs:
                         await processing_msg.edit_text("⚠️ Ошибка поиска на pravo.by. Генерирую ответ на основе базы знаний...")
-                        answer = get_answer(user_question, relevant_docs)
-                        await processing_msg.edit_text(answer)
+                        await self._send_streamed_answer(processing_msg, user_question, relevant_docs)
                         logger.info(f"✅ ИСТОЧНИК: Ответ получен из базы знаний после ошибки поиска на pravo.by для пользователя {user_id}")
                         
                         # Финализируем контекст для ответа из базы знаний после ошибки поиска
-                        search_quality = "medium" if min(doc['distance'] for doc in relevant_docs) <= 0.5 else "low"
-                        finalize_question_context(context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
-                                                search_quality=search_quality, answer_source="knowledge_base_error")
+                        search_quality = "medium" if min(relevance_distance(doc) for doc in relevant_docs) <= 0.5 else "low"
+                        await run_io(finalize_question_context, context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
+                                     search_quality=search_quality, answer_source="knowledge_base_error")
                         return
                     else:
                         # Если ошибка и в базе ничего нет
@@ -1193,42 +1281,49 @@ pip install psutil
                         await processing_msg.edit_text(no_info_response, parse_mode="Markdown")
                         
                         # Финализируем контекст для случая ошибки без базы знаний
-                        finalize_question_context(context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
-                                                search_quality="error", answer_source="error")
+                        await run_io(finalize_question_context, context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
+                                     search_quality="error", answer_source="error")
                         return
             
             # Генерируем ответ с помощью LLM
             logger.info(f"🤖 ИСТОЧНИК: Генерация ответа через OpenAI на основе базы знаний для пользователя {user_id}")
-            answer = get_answer(user_question, relevant_docs)
-            
             # Отправляем ответ пользователю (без Markdown чтобы избежать ошибок парсинга)
-            await processing_msg.edit_text(answer)
+            await self._send_streamed_answer(processing_msg, user_question, relevant_docs)
             
             logger.info(f"✅ ИСТОЧНИК: Ответ отправлен пользователю {user_id} - OpenAI + База знаний")
             
             # Финализируем контекст для принятого вопроса
-            search_quality = "high" if relevant_docs and min(doc['distance'] for doc in relevant_docs) <= 0.5 else "medium"
-            finalize_question_context(context_id, accepted=True, ml_confidence=score, ml_explanation=explanation, 
-                                    search_quality=search_quality, answer_source="knowledge_base")
+            search_quality = "high" if relevant_docs and min(relevance_distance(doc) for doc in relevant_docs) <= 0.5 else "medium"
+            await run_io(finalize_question_context, context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
+                         search_quality=search_quality, answer_source="knowledge_base")
             
         except TelegramAPIError as e:
             if ERRORS: ERRORS.inc()
             logger.error(f"Ошибка Telegram API: {e}")
             # Если ошибка парсинга, отправляем ответ без форматирования
             try:
-                answer = get_answer(user_question, relevant_docs)
+                answer = await get_answer_async(user_question, relevant_docs)
                 await message.answer(answer)
                 
                 # Финализируем контекст для случая ошибки Telegram API с ответом
-                search_quality = "medium" if relevant_docs and min(doc['distance'] for doc in relevant_docs) <= 0.5 else "low"
-                finalize_question_context(context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
-                                        search_quality=search_quality, answer_source="telegram_api_error")
+                search_quality = "medium" if relevant_docs and min(relevance_distance(doc) for doc in relevant_docs) <= 0.5 else "low"
+                await run_io(finalize_question_context, context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
+                             search_quality=search_quality, answer_source="telegram_api_error")
             except:
                 await message.answer("Извините, произошла ошибка при отправке ответа.")
                 
                 # Финализируем контекст для критической ошибки
-                finalize_question_context(context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
-                                        search_quality="error", answer_source="critical_error")
+                await run_io(finalize_question_context, context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
+                             search_quality="error", answer_source="critical_error")
+        except ExecutorQueueFull as e:
+            logger.warning(f"⏳ Вопрос отклонен из-за перегрузки: {e}")
+            await message.answer("⏳ Сейчас бот обрабатывает слишком много вопросов. Пожалуйста, повторите вопрос через минуту.")
+            
+            try:
+                await run_io(finalize_question_context, context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
+                             search_quality="error", answer_source="overloaded")
+            except Exception:
+                logger.error("Ошибка при финализации контекста аналитики")
         except Exception as e:
             if ERRORS: ERRORS.inc()
             logger.error(f"Неожиданная ошибка при обработке вопроса: {e}")
@@ -1246,12 +1341,266 @@ pip install psutil
             
             # Финализируем контекст для неожиданной ошибки
             try:
-                finalize_question_context(context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
-                                        search_quality="error", answer_source="unexpected_error")
+                await run_io(finalize_question_context, context_id, accepted=True, ml_confidence=score, ml_explanation=explanation,
+                             search_quality="error", answer_source="unexpected_error")
             except:
                 # Если даже финализация не работает, просто логируем
                 logger.error("Ошибка при финализации контекста аналитики")
     
+    async def _send_streamed_answer(self, processing_msg: Message, user_question: str,
+                                    context_docs: list, suffix: str = "", cache_answer: bool = True) -> str:
+        """
+        Генерирует ответ и выводит его в сообщение по мере генерации.
+        
+        Сообщение редактируется не чаще, чем раз в STREAM_EDIT_INTERVAL секунд
+        или после STREAM_EDIT_CHARS новых символов, чтобы не упираться в
+        ограничения Telegram на частоту запросов. Итоговый ответ длиннее
+        TELEGRAM_MESSAGE_LIMIT продолжается в следующих сообщениях. Если такой же вопрос по тем же
+        документам уже генерируется для другого пользователя, сообщение получает
+        его итоговый ответ без повторного запроса к OpenAI.
+        
+        Args:
+            processing_msg: Сообщение, которое обновляется ответом
+            user_question: Вопрос пользователя
+            context_docs: Документы для контекста
+            suffix: Текст, добавляемый в конец ответа
+            cache_answer: Сохранить ответ в кеш ответов
+            
+        Returns:
+            Итоговый текст ответа
+        """
+        # Версию кеша фиксируем до генерации: если документы изменятся, ответ не сохранится
+        answer_cache = get_answer_cache()
+        cache_version = answer_cache.get_version() if answer_cache else None
+        
+        # Одинаковый вопрос с теми же документами генерируется один раз:
+        # остальные пользователи получают итоговый ответ, когда он будет готов
+        doc_ids = tuple(doc.get('id') or doc.get('content', '')[:100] for doc in context_docs)
+        (answer, completed), joined = await self._llm_flight.run(
+            (normalize_question(user_question), doc_ids),
+            lambda: self._generate_answer(processing_msg, user_question, context_docs)
+        )
+        
+        final_answer = answer + suffix
+        if not completed:
+            final_answer += "\n\n⚠️ Генерация ответа была прервана. Попробуйте задать вопрос еще раз."
+        first_part, *other_parts = split_message(final_answer)
+        try:
+            await processing_msg.edit_text(first_part)
+        except TelegramRetryAfter as e:
+            # Итоговый ответ обязательно доставляем - ждем, сколько попросил Telegram
+            await asyncio.sleep(e.retry_after)
+            await processing_msg.edit_text(first_part)
+        # Продолжение длинного ответа отправляем отдельными сообщениями
+        for part in other_parts:
+            try:
+                await processing_msg.answer(part)
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                await processing_msg.answer(part)
+        
+        if completed and not joined and cache_answer:
+            await self._store_cached_answer(user_question, context_docs, answer, cache_version)
+        return final_answer
+    
+    async def _generate_answer(self, processing_msg: Message, user_question: str, context_docs: list):
+        """
+        Генерирует ответ, показывая промежуточный текст в сообщении.
+        
+        Итоговую правку сообщения выполняет вызывающий код.
+        
+        Args:
+            processing_msg: Сообщение, в котором показывается ход генерации
+            user_question: Вопрос пользователя
+            context_docs: Документы для контекста
+            
+        Returns:
+            Tuple[текст_ответа, завершена_ли_генерация_полностью]
+        """
+        if not config.LLM_STREAMING:
+            return await get_answer_async(user_question, context_docs), True
+        
+        loop = asyncio.get_running_loop()
+        answer = ""
+        shown_length = 0
+        last_edit = 0.0
+        next_edit_allowed = 0.0
+        
+        try:
+            async for delta in get_llm_service().stream_answer_async(user_question, context_docs):
+                answer += delta
+                now = loop.time()
+                if now < next_edit_allowed:
+                    continue
+                if now - last_edit < config.STREAM_EDIT_INTERVAL and len(answer) - shown_length < config.STREAM_EDIT_CHARS:
+                    continue
+                
+                try:
+                    await processing_msg.edit_text(answer[:TELEGRAM_MESSAGE_LIMIT] + " ▌")
+                    shown_length = len(answer)
+                    last_edit = now
+                except TelegramRetryAfter as e:
+                    next_edit_allowed = now + e.retry_after
+                    logger.warning(f"Telegram ограничил частоту правок, пауза {e.retry_after} с")
+                except TelegramBadRequest as e:
+                    logger.debug(f"Промежуточная правка сообщения пропущена: {e}")
+        except Exception as e:
+            # Генерация оборвалась на середине - отдаем то, что успели получить
+            logger.error(f"Потоковая генерация ответа прервана: {e!r}")
+            return answer, False
+        
+        return answer, True
+    
+    async def _lookup_cached_answer(self, user_question: str):
+        """
+        Ищет в кеше ответ на семантически близкий вопрос.
+        
+        Args:
+            user_question: Вопрос пользователя
+            
+        Returns:
+            Ответ из кеша или None
+        """
+        answer_cache = get_answer_cache()
+        if answer_cache is None:
+            return None
+        try:
+            return await run_cpu(answer_cache.lookup, user_question)
+        except Exception as e:
+            logger.warning(f"Ошибка поиска в кеше ответов: {e}")
+            return None
+    
+    async def _store_cached_answer(self, user_question: str, context_docs: list, answer: str, cache_version):
+        """
+        Сохраняет успешно сгенерированный ответ в кеш.
+        
+        Args:
+            user_question: Вопрос пользователя
+            context_docs: Документы, на основе которых сгенерирован ответ
+            answer: Текст ответа без служебных приписок
+            cache_version: Версия кеша на момент начала генерации
+        """
+        answer_cache = get_answer_cache()
+        if answer_cache is None or get_llm_service().is_error_response(answer):
+            return
+        try:
+            doc_ids = [doc.get('id') for doc in context_docs]
+            await run_cpu(answer_cache.store, user_question, doc_ids, answer, cache_version)
+        except Exception as e:
+            logger.warning(f"Ошибка сохранения ответа в кеш: {e}")
+    
+    def _enqueue_enrichment(self, processing_msg: Message, user_question: str, question_key: str,
+                            context_id: str, answered: asyncio.Event, answered_doc_ids: set) -> bool:
+        """
+        Ставит динамический поиск по вопросу в фоновую очередь.
+        
+        Ответ обновляется, только если это включено (ENRICHMENT_EDIT_ANSWER)
+        и в найденных после пополнения документах есть блоки, которых не было
+        в первом ответе: иначе повторный запрос к LLM дал бы тот же ответ.
+        
+        Args:
+            processing_msg: Сообщение с ответом пользователю
+            user_question: Вопрос пользователя
+            question_key: Нормализованный вопрос
+            context_id: ID контекста вопроса для аналитики
+            answered: Событие, которое устанавливается после отправки первого ответа
+            answered_doc_ids: ID документов, по которым дан первый ответ
+            
+        Returns:
+            True если поиск поставлен в очередь
+        """
+        async def on_complete(dynamic_docs: list, pages_count: int):
+            if not config.ENRICHMENT_EDIT_ANSWER:
+                return
+            if not any(doc['id'] not in answered_doc_ids for doc in dynamic_docs):
+                logger.info(f"🔄 ФОНОВЫЙ ПОИСК: Новых блоков для ответа нет, ответ не обновляется")
+                return
+            # Не перезаписываем первый ответ, пока он еще генерируется
+            await answered.wait()
+            await self._update_enriched_answer(processing_msg, user_question, dynamic_docs, pages_count)
+        
+        return self._enrichment_queue.submit(EnrichmentJob(
+            key=question_key,
+            question=user_question,
+            context_id=context_id,
+            on_complete=on_complete
+        ))
+    
+    async def _run_enrichment_job(self, job: EnrichmentJob):
+        """
+        Выполняет фоновый динамический поиск по вопросу из очереди.
+        
+        Args:
+            job: Задача пополнения базы знаний
+            
+        Returns:
+            Tuple[релевантные_документы, количество_спарсенных_страниц]
+        """
+        logger.info(f"🌐 ФОНОВЫЙ ПОИСК: Пополняем базу знаний с pravo.by по вопросу: '{job.question[:50]}...'")
+        (dynamic_docs, pages_count), _ = await self._dynamic_search_flight.run(
+            job.key, lambda: self._run_dynamic_search(job.question, job.context_id)
+        )
+        logger.info(f"✅ ФОНОВЫЙ ПОИСК: Завершен, страниц pravo.by: {pages_count}")
+        return dynamic_docs, pages_count
+    
+    async def _update_enriched_answer(self, processing_msg: Message, user_question: str,
+                                      context_docs: list, pages_count: int):
+        """
+        Заменяет первый ответ ответом по пополненной базе знаний.
+        
+        Args:
+            processing_msg: Сообщение с первым ответом
+            user_question: Вопрос пользователя
+            context_docs: Документы из пополненной базы знаний
+            pages_count: Количество страниц pravo.by, добавленных в базу
+        """
+        answer_cache = get_answer_cache()
+        cache_version = answer_cache.get_version() if answer_cache else None
+        
+        answer = await get_answer_async(user_question, context_docs)
+        if get_llm_service().is_error_response(answer):
+            return
+        
+        try:
+            await processing_msg.edit_text(
+                "🔄 Ответ обновлен по новым данным pravo.by:\n\n" + answer + DynamicSearcher.format_source_info(pages_count)
+            )
+        except TelegramAPIError as e:
+            logger.warning(f"Не удалось обновить ответ после пополнения базы знаний: {e}")
+            return
+        await self._store_cached_answer(user_question, context_docs, answer, cache_version)
+    
+    def _create_dynamic_searcher(self) -> DynamicSearcher:
+        """
+        Создает динамический поисковик.
+        Блокирующая операция - вызывается только через I/O-пул.
+        """
+        web_scraper = create_scraper_from_config()
+        knowledge_base = get_knowledge_base()
+        text_processor = TextProcessor()
+        scraping_tracker = get_scraping_tracker()
+        
+        return create_dynamic_searcher(
+            web_scraper, knowledge_base, text_processor, scraping_tracker
+        )
+    
+    async def _run_dynamic_search(self, user_question: str, context_id: str = None):
+        """
+        Ищет на pravo.by и пополняет базу знаний.
+        Страницы загружаются параллельно через общую HTTP-сессию бота.
+        
+        Args:
+            user_question: Вопрос пользователя
+            context_id: ID контекста вопроса, по которому пополняется база
+            
+        Returns:
+            Tuple[релевантные_документы, количество_спарсенных_страниц]
+        """
+        dynamic_searcher = await run_io(self._create_dynamic_searcher)
+        if self._search_session is None or self._search_session.closed:
+            self._search_session = dynamic_searcher.create_session()
+        return await dynamic_searcher.search_and_index_async(user_question, self._search_session, context_id)
+    
     async def start_polling(self):
         """Запускает бота в режиме polling."""
         try:
@@ -1267,6 +1616,11 @@ pip install psutil
     async def stop(self):
         """Останавливает бота."""
         await self.bot.session.close()
+        await self._enrichment_queue.stop()
+        if self._search_session is not None:
+            await self._search_session.close()
+        await get_llm_service().aclose()
+        shutdown_executors(wait=False)
         logger.info("Бот остановлен")
 
 # Глобальный экземпляр бота
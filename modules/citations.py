@@ -0,0 +1,210 @@
+"""
+Модуль распознавания ссылок на статьи нормативных актов.
+
+При загрузке документов каждому блоку приписываются метаданные
+(кодекс, номер статьи, часть), а вопросы вида «статья 1014 ГК»
+разбираются в те же ключи для прямого поиска блоков без эмбеддингов.
+"""
+import re
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Кодексы и законы: каноническое сокращение -> шаблоны названий и аббревиатур
+ACT_PATTERNS = {
+    "гпк": [r"гражданск\w*\s+процессуальн\w*\s+кодекс\w*", r"\bгпк\b"],
+    "хпк": [r"хозяйственн\w*\s+процессуальн\w*\s+кодекс\w*", r"\bхпк\b"],
+    "упк": [r"уголовно[\s-]*процессуальн\w*\s+кодекс\w*", r"\bупк\b"],
+    "уик": [r"уголовно[\s-]*исполнительн\w*\s+кодекс\w*", r"\bуик\b"],
+    "пикоап": [r"процессуально[\s-]*исполнительн\w*\s+кодекс\w*", r"\bпикоап\b"],
+    "коап": [r"кодекс\w*\s+(?:республики\s+беларусь\s+)?об\s+административн\w*\s+правонарушени\w*", r"\bкоап\b"],
+    "кобс": [r"кодекс\w*\s+(?:республики\s+беларусь\s+)?о\s+браке\s+и\s+семье", r"\bкобс\b"],
+    "гк": [r"гражданск\w*\s+кодекс\w*", r"\bгк\b"],
+    "тамк": [r"таможенн\w*\s+кодекс\w*", r"\bтк\s+еаэс\b"],
+    "тк": [r"трудов\w*\s+кодекс\w*", r"\bтк\b"],
+    "ук": [r"уголовн\w*\s+кодекс\w*", r"\bук\b"],
+    "нк": [r"налогов\w*\s+кодекс\w*", r"\bнк\b"],
+    "жк": [r"жилищн\w*\s+кодекс\w*", r"\bжк\b"],
+    "бк": [r"бюджетн\w*\s+кодекс\w*", r"\bбк\b"],
+    "зк": [r"кодекс\w*\s+(?:республики\s+беларусь\s+)?о\s+земле", r"земельн\w*\s+кодекс\w*", r"\bзк\b"],
+    "ик": [r"избирательн\w*\s+кодекс\w*", r"\bик\b"],
+}
+
+_ACT_REGEXES = [(act, re.compile("|".join(patterns), re.IGNORECASE)) for act, patterns in ACT_PATTERNS.items()]
+
+# Заголовок статьи в тексте документа: «Статья 1014.» / «Статья 10-1.»
+ARTICLE_HEADING = re.compile(r"Статья\s*(\d+(?:-\d+)?)\.", re.IGNORECASE)
+# Номер части в начале блока внутри статьи: «2. Текст...»
+PART_HEADING = re.compile(r"^\s*(\d+)\.\s")
+# Ссылка на статью в вопросе: «статья 1014», «ст. 41», «ст 5», «статьи 9»
+ARTICLE_REFERENCE = re.compile(r"(?:\bстать\w*|\bст\b\.?)\s*(\d+(?:-\d+)?)", re.IGNORECASE)
+# Ссылка на часть: «часть 2», «ч. 2», «ч.2», «ч 2»
+PART_REFERENCE = re.compile(r"(?:\bчаст\w*|\bч\b\.?)\s*(\d+)", re.IGNORECASE)
+# Упоминание нормативного акта, не являющегося кодексом: номер статьи может относиться к нему
+OTHER_ACT_KEYWORDS = re.compile(
+    r"\b(?:закон\w*|конституци\w*|декрет\w*|указ(?:а|ом|е|у|ы|ов|ам|ами|ах)?\b|постановлени\w*)",
+    re.IGNORECASE
+)
+
+
+def detect_act(text: str) -> Optional[str]:
+    """
+    Определяет кодекс, о котором идет речь в тексте.
+
+    Args:
+        text: Текст (название документа, начало документа или вопрос)
+
+    Returns:
+        Каноническое сокращение кодекса или None
+    """
+    if not text:
+        return None
+    best_act, best_position = None, None
+    for act, regex in _ACT_REGEXES:
+        match = regex.search(text)
+        if match and (best_position is None or match.start() < best_position):
+            best_act, best_position = act, match.start()
+    return best_act
+
+
+def iter_chunk_annotations(chunks: Iterable[str], act: Optional[str]) -> Iterator[Dict[str, str]]:
+    """
+    Потоково определяет статью и часть для каждого блока документа.
+
+    Блоки идут в порядке документа: блок без заголовка статьи относится
+    к последней встреченной статье.
+
+    Args:
+        chunks: Блоки документа в исходном порядке
+        act: Сокращение кодекса или None
+
+    Yields:
+        Метаданные цитирования для каждого блока (пустой словарь,
+        если блок не относится к статье)
+    """
+    current_article = None
+    for chunk in chunks:
+        headings = ARTICLE_HEADING.findall(chunk)
+        heading_at_start = ARTICLE_HEADING.match(chunk.lstrip())
+        article = heading_at_start.group(1) if heading_at_start else current_article
+        if article is None and headings:
+            article = headings[0]
+
+        annotation = {}
+        if article:
+            annotation = {"citation_act": act or "", "citation_article": article}
+            part_match = PART_HEADING.match(chunk)
+            if part_match and not heading_at_start:
+                annotation["citation_part"] = part_match.group(1)
+        yield annotation
+
+        if headings:
+            current_article = headings[-1]
+
+
+def annotate_chunks(chunks: List[str], act: Optional[str]) -> List[Dict[str, str]]:
+    """
+    Определяет статью и часть для каждого блока документа.
+
+    Args:
+        chunks: Блоки документа в исходном порядке
+        act: Сокращение кодекса или None
+
+    Returns:
+        Список метаданных цитирования для каждого блока
+    """
+    return list(iter_chunk_annotations(chunks, act))
+
+
+def parse_citations(question: str) -> List[Tuple[str, str, Optional[str]]]:
+    """
+    Извлекает из вопроса ссылки на статьи кодексов.
+
+    Ссылка возвращается, только если распознан кодекс и вопрос не называет
+    другой акт: номер статьи в вопросах «статья 41 Конституции» или
+    «ст. 3 Закона об обращениях граждан» не должен сопоставляться со
+    статьей какого-либо кодекса.
+
+    Args:
+        question: Вопрос пользователя
+
+    Returns:
+        Список (кодекс, номер статьи, номер части или None)
+    """
+    act = detect_act(question)
+    if act is None or OTHER_ACT_KEYWORDS.search(question):
+        return []
+    part_match = PART_REFERENCE.search(question)
+    part = part_match.group(1) if part_match else None
+    return [(act, article, part) for article in ARTICLE_REFERENCE.findall(question)]
+
+
+class CitationIndex:
+    """Индекс блоков базы знаний по ссылкам «кодекс + статья»."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_citation: Dict[Tuple[str, str], Set[str]] = {}
+        self._doc_keys: Dict[str, Tuple[str, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_keys)
+
+    def add(self, doc_id: str, metadata: Dict) -> bool:
+        """
+        Добавляет блок в индекс, если в метаданных есть ссылка на статью.
+
+        Args:
+            doc_id: ID блока
+            metadata: Метаданные блока
+
+        Returns:
+            True если блок проиндексирован
+        """
+        article = (metadata or {}).get("citation_article")
+        if not article:
+            return False
+        # Статьи документов с неизвестным кодексом не смешиваем между файлами
+        act = metadata.get("citation_act") or f"file:{metadata.get('source_file') or metadata.get('url', '')}"
+        key = (act, str(article))
+        with self._lock:
+            self._remove(doc_id)
+            self._by_citation.setdefault(key, set()).add(doc_id)
+            self._doc_keys[doc_id] = key
+        return True
+
+    def _remove(self, doc_id: str):
+        """Удаляет блок из индекса. Вызывается под блокировкой."""
+        key = self._doc_keys.pop(doc_id, None)
+        if key is None:
+            return
+        doc_ids = self._by_citation.get(key)
+        if doc_ids is not None:
+            doc_ids.discard(doc_id)
+            if not doc_ids:
+                del self._by_citation[key]
+
+    def remove(self, doc_ids: Iterable[str]):
+        """Удаляет блоки из индекса."""
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+
+    def clear(self):
+        """Очищает индекс."""
+        with self._lock:
+            self._by_citation.clear()
+            self._doc_keys.clear()
+
+    def lookup(self, act: str, article: str) -> List[str]:
+        """
+        Возвращает блоки статьи кодекса.
+
+        Args:
+            act: Сокращение кодекса
+            article: Номер статьи
+
+        Returns:
+            Список ID блоков
+        """
+        with self._lock:
+            return list(self._by_citation.get((act, article), ()))
@@ -0,0 +1,182 @@
+"""
+Модуль обхода сайтов для скраперов.
+
+Общий движок обхода для WebScraper, IncrementalScraper и скрипта
+scrape_websites.py: очередь с приоритетом по глубине, учет посещенных
+страниц во множестве (или в фильтре Блума для очень больших обходов),
+несколько асинхронных обработчиков и ограничения по глубине и числу страниц.
+Частоту запросов к хостам ограничивает функция загрузки (HostLimiter).
+"""
+import asyncio
+import hashlib
+import itertools
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urldefrag, urlparse
+
+import config
+from modules.metrics import SCRAPING_ERRORS
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Фильтр Блума для учета посещенных URL при очень больших обходах."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        """
+        Инициализирует фильтр.
+
+        Args:
+            capacity: Ожидаемое количество элементов
+            error_rate: Допустимая доля ложноположительных ответов
+        """
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._count = 0
+
+    def _positions(self, item: str) -> List[int]:
+        """Вычисляет позиции битов элемента (двойное хеширование)."""
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str):
+        """Добавляет элемент."""
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self._count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def __len__(self) -> int:
+        return self._count
+
+
+@dataclass
+class CrawlResult:
+    """Результат обработки одной страницы обхода."""
+    url: str
+    depth: int
+    data: Any
+    links: List[str] = field(default_factory=list)
+
+
+def normalize_url(url: str) -> str:
+    """Убирает из URL фрагмент (#...), чтобы одна страница не посещалась дважды."""
+    return urldefrag(url)[0]
+
+
+class Crawler:
+    """Асинхронный обход сайтов с ограничением по глубине и числу страниц."""
+
+    def __init__(self, fetch: Callable[[str], Awaitable[Tuple[Any, Iterable[str]]]],
+                 workers: int = 4, max_pages: int = 50, max_depth: Optional[int] = None,
+                 same_domain: bool = True, bloom_capacity: int = 0):
+        """
+        Инициализирует обход.
+
+        Args:
+            fetch: Корутина загрузки страницы, возвращающая (данные или None, ссылки)
+            workers: Количество одновременно обрабатываемых страниц
+            max_pages: Максимальное количество страниц с данными
+            max_depth: Максимальная глубина ссылок от стартовых URL (None - без ограничения)
+            same_domain: Переходить только по ссылкам на домены стартовых URL
+            bloom_capacity: Ожидаемое число URL для фильтра Блума (0 - точное множество)
+        """
+        self.fetch = fetch
+        self.workers = max(1, workers)
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.same_domain = same_domain
+        self.bloom_capacity = bloom_capacity
+        self.stats = {"fetched": 0, "errors": 0, "skipped": 0}
+
+    async def crawl(self, start_urls: Iterable[str]) -> List[CrawlResult]:
+        """
+        Обходит сайты, начиная со стартовых URL.
+
+        Страницы обрабатываются в порядке глубины (обход в ширину),
+        каждый URL загружается не более одного раза.
+
+        Args:
+            start_urls: Стартовые URL
+
+        Returns:
+            Результаты страниц, для которых загрузка вернула данные
+        """
+        frontier: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        seen = BloomFilter(self.bloom_capacity) if self.bloom_capacity > 0 else set()
+        sequence = itertools.count()
+        results: List[CrawlResult] = []
+        domains: Set[str] = set()
+
+        def enqueue(url: str, depth: int):
+            url = normalize_url(url)
+            if not url or url in seen:
+                return
+            if self.max_depth is not None and depth > self.max_depth:
+                return
+            if self.same_domain and domains and urlparse(url).netloc not in domains:
+                return
+            seen.add(url)
+            frontier.put_nowait((depth, next(sequence), url))
+
+        start_urls = [normalize_url(url) for url in start_urls]
+        domains.update(urlparse(url).netloc for url in start_urls)
+        for url in start_urls:
+            enqueue(url, 0)
+
+        async def worker():
+            while True:
+                depth, _, url = await frontier.get()
+                try:
+                    if len(results) >= self.max_pages:
+                        self.stats["skipped"] += 1
+                        continue
+                    try:
+                        data, links = await self.fetch(url)
+                    except Exception as e:
+                        self.stats["errors"] += 1
+                        if SCRAPING_ERRORS: SCRAPING_ERRORS.inc()
+                        logger.error(f"Ошибка при обходе {url}: {e}")
+                        continue
+                    self.stats["fetched"] += 1
+                    if data is None or len(results) >= self.max_pages:
+                        continue
+                    links = list(links or [])
+                    results.append(CrawlResult(url=url, depth=depth, data=data, links=links))
+                    for link in links:
+                        enqueue(link, depth + 1)
+                finally:
+                    frontier.task_done()
+
+        tasks = [asyncio.ensure_future(worker()) for _ in range(self.workers)]
+        try:
+            await frontier.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        logger.info(f"Обход завершен: страниц {len(results)}, загружено {self.stats['fetched']}, "
+                    f"ошибок {self.stats['errors']}")
+        return results
+
+
+def create_crawler(fetch: Callable[[str], Awaitable[Tuple[Any, Iterable[str]]]],
+                   max_pages: int, max_depth: Optional[int] = None,
+                   workers: Optional[int] = None) -> Crawler:
+    """Создает обход; не переданные параметры берутся из конфигурации."""
+    return Crawler(
+        fetch,
+        workers=config.CRAWL_WORKERS if workers is None else workers,
+        max_pages=max_pages,
+        max_depth=config.CRAWL_MAX_DEPTH if max_depth is None else max_depth,
+        bloom_capacity=config.CRAWL_BLOOM_CAPACITY
+    )
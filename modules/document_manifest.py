@@ -0,0 +1,228 @@
+"""
+Модуль манифеста документов базы знаний.
+
+Хранит для каждого исходного файла список идентификаторов его блоков,
+чтобы обновлять и удалять документ целиком без перебора ID, и отпечаток
+файла (путь, размер, время изменения, хэш содержимого, версия разбиения),
+чтобы при обновлении пропускать неизмененные файлы.
+
+Манифест хранится в SQLite: изменения записываются построчно, а не
+перезаписью всего файла, и сразу видны другим процессам (бот, админ-панель,
+скрипты загрузки). Прежний JSON-манифест один раз импортируется при первом запуске.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Прежний JSON-манифест, импортируемый при первом запуске
+LEGACY_MANIFEST_FILE = "db/document_manifest.json"
+
+# Максимум параметров в одном запросе SQLite
+_BATCH = 500
+
+
+class DocumentManifest:
+    """Манифест исходных файлов и их блоков в базе знаний."""
+
+    def __init__(self, manifest_file: Optional[str]):
+        """
+        Инициализирует манифест.
+
+        Args:
+            manifest_file: Путь к файлу SQLite манифеста (None - только в памяти)
+        """
+        self.manifest_file = manifest_file
+        self._lock = threading.Lock()
+        if manifest_file:
+            directory = os.path.dirname(manifest_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        # Манифест одновременно изменяют несколько процессов: ждем освобождения записи
+        self._conn = sqlite3.connect(manifest_file or ":memory:", timeout=30, check_same_thread=False)
+        self._init_database()
+
+    def _init_database(self):
+        """Создает таблицы манифеста."""
+        with self._lock, self._conn:
+            if self.manifest_file:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS blocks (
+                    doc_id TEXT PRIMARY KEY,
+                    source_file TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    source_file TEXT PRIMARY KEY,
+                    updated_at TEXT NOT NULL,
+                    fingerprint TEXT  -- JSON: path, size, mtime_ns, sha256, chunker
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_blocks_source_file ON blocks(source_file)")
+
+    def _drop_empty_files(self, source_files: Iterable[str]):
+        """Удаляет записи файлов, у которых не осталось блоков. Вызывается в транзакции под блокировкой."""
+        for source_file in set(source_files):
+            self._conn.execute(
+                "DELETE FROM files WHERE source_file = ? AND NOT EXISTS "
+                "(SELECT 1 FROM blocks WHERE blocks.source_file = files.source_file)",
+                (source_file,)
+            )
+
+    def get_ids(self, source_file: str) -> List[str]:
+        """
+        Возвращает идентификаторы блоков файла.
+
+        Args:
+            source_file: Имя исходного файла
+
+        Returns:
+            Список ID блоков в порядке добавления
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id FROM blocks WHERE source_file = ? ORDER BY rowid", (source_file,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def has_file(self, source_file: str) -> bool:
+        """Проверяет, есть ли файл в манифесте."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM blocks WHERE source_file = ? LIMIT 1", (source_file,)
+            ).fetchone() is not None
+
+    def add_ids(self, ids_by_file: Dict[str, Iterable[str]]):
+        """
+        Добавляет идентификаторы блоков к файлам.
+
+        Args:
+            ids_by_file: Словарь имя_файла -> ID добавленных блоков
+        """
+        if not ids_by_file:
+            return
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            for source_file, doc_ids in ids_by_file.items():
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO blocks (doc_id, source_file) VALUES (?, ?)",
+                    ((doc_id, source_file) for doc_id in doc_ids)
+                )
+                self._conn.execute(
+                    "INSERT INTO files (source_file, updated_at) VALUES (?, ?) "
+                    "ON CONFLICT(source_file) DO UPDATE SET updated_at = excluded.updated_at",
+                    (source_file, now)
+                )
+
+    def get_fingerprints(self) -> Dict[str, Dict]:
+        """
+        Возвращает отпечатки файлов, загруженных с отпечатком.
+
+        Returns:
+            Словарь имя_файла -> отпечаток (path, size, mtime_ns, sha256, chunker)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source_file, fingerprint FROM files WHERE fingerprint IS NOT NULL"
+            ).fetchall()
+        return {source_file: json.loads(fingerprint) for source_file, fingerprint in rows}
+
+    def set_fingerprints(self, fingerprints: Dict[str, Dict]):
+        """
+        Сохраняет отпечатки файлов, блоки которых есть в манифесте.
+
+        Args:
+            fingerprints: Словарь имя_файла -> отпечаток
+        """
+        if not fingerprints:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE files SET fingerprint = ? WHERE source_file = ? "
+                "AND EXISTS (SELECT 1 FROM blocks WHERE blocks.source_file = files.source_file)",
+                ((json.dumps(fingerprint, ensure_ascii=False), source_file)
+                 for source_file, fingerprint in fingerprints.items())
+            )
+
+    def remove_ids(self, doc_ids: Iterable[str]):
+        """
+        Удаляет идентификаторы блоков из манифеста.
+
+        Args:
+            doc_ids: ID удаленных блоков
+        """
+        doc_ids = list(set(doc_ids))
+        if not doc_ids:
+            return
+        with self._lock, self._conn:
+            source_files = set()
+            for start in range(0, len(doc_ids), _BATCH):
+                batch = doc_ids[start:start + _BATCH]
+                placeholders = ','.join('?' * len(batch))
+                source_files.update(row[0] for row in self._conn.execute(
+                    f"SELECT DISTINCT source_file FROM blocks WHERE doc_id IN ({placeholders})", batch
+                ))
+                self._conn.execute(f"DELETE FROM blocks WHERE doc_id IN ({placeholders})", batch)
+            self._drop_empty_files(source_files)
+
+    def remove_file(self, source_file: str):
+        """Удаляет файл из манифеста."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM blocks WHERE source_file = ?", (source_file,))
+            self._conn.execute("DELETE FROM files WHERE source_file = ?", (source_file,))
+
+    def clear(self):
+        """Очищает манифест."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM blocks")
+            self._conn.execute("DELETE FROM files")
+
+    def migrate_json(self, path: str):
+        """
+        Однократно импортирует прежний JSON-манифест.
+
+        Args:
+            path: Путь к JSON-файлу манифеста
+        """
+        key = f"migrated:{os.path.basename(path)}"
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone() is not None:
+                return
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                files = json.load(f).get("files", {})
+        except Exception as e:
+            logger.error(f"Ошибка чтения прежнего манифеста документов {path}: {e}")
+            return
+
+        with self._lock, self._conn:
+            for source_file, entry in files.items():
+                if not entry.get("ids"):
+                    continue
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO blocks (doc_id, source_file) VALUES (?, ?)",
+                    ((doc_id, source_file) for doc_id in entry["ids"])
+                )
+                fingerprint = entry.get("fingerprint")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files (source_file, updated_at, fingerprint) VALUES (?, ?, ?)",
+                    (source_file, entry.get("updated_at") or datetime.now().isoformat(),
+                     json.dumps(fingerprint, ensure_ascii=False) if fingerprint else None)
+                )
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, "true"))
+        logger.info(f"📦 Импортирован манифест документов из {path}: {len(files)} файлов")
@@ -2,33 +2,42 @@
 Модуль для динамического поиска информации на pravo.by
 когда нет ответа в базе знаний
 """
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import aiohttp
 import re
 import logging
 from urllib.parse import urljoin, quote
 from typing import List, Dict, Optional, Tuple
-import time
 from datetime import datetime
 
+import config
 from .web_scraper import WebScraper
 from .knowledge_base import KnowledgeBase
 from .text_processing import TextProcessor
 from .scraping_tracker import ScrapingTracker
 from .legal_content_filter import create_legal_content_filter
+from .rate_limit import HostLimiter, get_host_limiter
+from .executors import run_cpu, run_io
+from .http_cache import CachedResponse
 
 logger = logging.getLogger(__name__)
 
+# Версия разбора страниц результатов поиска для HTTP-кеша
+SEARCH_PARSER = "search_results:v2"
+
 class DynamicSearcher:
     """Класс для динамического поиска информации на pravo.by"""
     
     def __init__(self, web_scraper: WebScraper, knowledge_base: KnowledgeBase, 
-                 text_processor: TextProcessor, scraping_tracker: ScrapingTracker):
+                 text_processor: TextProcessor, scraping_tracker: ScrapingTracker,
+                 host_limiter: Optional[HostLimiter] = None):
         self.web_scraper = web_scraper
         self.knowledge_base = knowledge_base
         self.text_processor = text_processor
         self.scraping_tracker = scraping_tracker
         self.legal_filter = create_legal_content_filter()
+        # Общий для всех поисков ограничитель частоты запросов к pravo.by
+        self.host_limiter = host_limiter or get_host_limiter()
         
         # Настройки поиска
         self.search_base_url = "https://pravo.by"
@@ -105,67 +114,121 @@ class DynamicSearcher:
         
         return keywords[:10]  # Ограничиваем количество ключевых слов
     
-    def _search_pravo_by(self, query: str) -> List[str]:
+    def create_session(self) -> aiohttp.ClientSession:
+        """
+        Создает HTTP-сессию для динамического поиска
+        
+        Returns:
+            Сессия aiohttp с заголовками веб-скрапера
+        """
+        return aiohttp.ClientSession(
+            headers={'User-Agent': self.web_scraper.session.headers.get('User-Agent', '')},
+            timeout=aiohttp.ClientTimeout(total=config.DYNAMIC_SEARCH_TIMEOUT)
+        )
+    
+    async def _fetch_page(self, session: aiohttp.ClientSession, url: str) -> CachedResponse:
+        """
+        Загружает страницу через HTTP-кеш с учетом ограничений частоты запросов к хосту
+        
+        Args:
+            session: HTTP-сессия
+            url: URL страницы
+            
+        Returns:
+            Ответ с телом страницы
+        """
+        http_cache = self.web_scraper.http_cache
+        if http_cache is not None:
+            return await http_cache.get_async(session, url, self.host_limiter)
+        async with self.host_limiter.limit(url):
+            async with session.get(url) as response:
+                response.raise_for_status()
+                return CachedResponse(url=url, content=await response.read(), headers=dict(response.headers))
+    
+    def _parse_search_page(self, response: CachedResponse, query: str) -> List[str]:
+        """Разбирает страницу результатов поиска и возвращает ссылки на найденные страницы"""
+        def parse():
+            return self._extract_search_results(response.content, query)
+        
+        http_cache = self.web_scraper.http_cache
+        if http_cache is None:
+            return parse()
+        return http_cache.cached_parse(response, SEARCH_PARSER, parse)
+    
+    async def _search_pravo_by(self, session: aiohttp.ClientSession, query: str) -> List[str]:
         """
         Выполняет поиск на pravo.by
         
+        Все способы поиска запрашиваются параллельно.
+        
         Args:
+            session: HTTP-сессия
             query: Поисковый запрос
             
         Returns:
             Список URL найденных страниц
         """
+        # Кодируем запрос для URL
+        encoded_query = quote(query)
+        
+        # Пробуем разные способы поиска
+        search_urls = [
+            f"{self.search_base_url}/search/?q={encoded_query}",
+            f"{self.search_base_url}/pravovaya-informatsiya/?search={encoded_query}",
+        ]
+        
+        async def search(search_url: str) -> List[str]:
+            try:
+                logger.info(f"Поиск по URL: {search_url}")
+                response = await self._fetch_page(session, search_url)
+                return await run_cpu(self._parse_search_page, response, query)
+            except Exception as e:
+                logger.error(f"Ошибка поиска по {search_url}: {e}")
+                return []
+        
         found_urls = []
+        for result_links in await asyncio.gather(*(search(url) for url in search_urls)):
+            for link in result_links:
+                full_url = urljoin(self.search_base_url, link)
+                if full_url not in found_urls:
+                    found_urls.append(full_url)
         
-        try:
-            # Кодируем запрос для URL
-            encoded_query = quote(query)
-            
-            # Пробуем разные способы поиска
-            search_urls = [
-                f"{self.search_base_url}/search/?q={encoded_query}",
-                f"{self.search_base_url}/pravovaya-informatsiya/?search={encoded_query}",
-            ]
-            
-            for search_url in search_urls:
-                try:
-                    logger.info(f"Поиск по URL: {search_url}")
-                    
-                    response = self.web_scraper.session.get(search_url, timeout=10)
-                    response.raise_for_status()
-                    
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    
-                    # Ищем ссылки на результаты поиска
-                    result_links = self._extract_search_results(soup, query)
-                    
-                    for link in result_links:
-                        full_url = urljoin(self.search_base_url, link)
-                        if full_url not in found_urls:
-                            found_urls.append(full_url)
-                    
-                    time.sleep(1)  # Задержка между запросами
-                    
-                except Exception as e:
-                    logger.error(f"Ошибка поиска по {search_url}: {e}")
-                    continue
-            
-            # Если не нашли через поиск, пробуем найти релевантные страницы
-            if not found_urls:
-                found_urls = self._find_relevant_pages(query)
-            
-            return found_urls[:self.max_search_results]
+        # Если не нашли через поиск, пробуем найти релевантные страницы
+        if not found_urls:
+            found_urls = self._find_relevant_pages(query)
+        
+        return found_urls[:self.max_search_results]
+    
+    async def _scrape_page(self, session: aiohttp.ClientSession, url: str) -> Optional[Dict]:
+        """
+        Загружает и разбирает страницу с результатом поиска
+        
+        Args:
+            session: HTTP-сессия
+            url: URL страницы
             
+        Returns:
+            Словарь с данными страницы или None
+        """
+        try:
+            logger.info(f"Скрапинг страницы: {url}")
+            response = await self._fetch_page(session, url)
+            page_data = await run_cpu(self.web_scraper.parse_cached_page, response)
         except Exception as e:
-            logger.error(f"Ошибка при поиске на pravo.by: {e}")
-            return []
+            logger.error(f"Ошибка парсинга {url}: {e}")
+            return None
+        
+        if page_data and len(page_data['content']) > 200:  # Минимальная длина контента
+            logger.info(f"📄 ДИНАМИЧЕСКИЙ ПОИСК: Успешно спарсена страница: {url}")
+            return page_data
+        return None
     
-    def _extract_search_results(self, soup: BeautifulSoup, query: str) -> List[str]:
+    def _extract_search_results(self, html: bytes, query: str) -> List[str]:
         """
         Извлекает ссылки из результатов поиска
         
         Args:
-            soup: BeautifulSoup объект страницы
+            html: HTML страницы результатов поиска
             query: Поисковый запрос
             
         Returns:
@@ -186,15 +249,12 @@ class DynamicSearcher:
         
         query_words = query.lower().split()
         
-        for selector in search_selectors:
-            elements = soup.select(selector)
-            for element in elements:
-                href = element.get('href')
-                text = element.get_text().lower()
-                
-                # Проверяем релевантность по ключевым словам
-                if href and any(word in text for word in query_words):
-                    links.append(href)
+        for href, text in self.web_scraper.html_extractor.select_links(html, search_selectors):
+            text = text.lower()
+            
+            # Проверяем релевантность по ключевым словам
+            if href and any(word in text for word in query_words):
+                links.append(href)
         
         return list(set(links))  # Убираем дубликаты
     
@@ -270,7 +330,7 @@ class DynamicSearcher:
             True если информация уже есть, False если нужен динамический поиск
         """
         try:
-            from .knowledge_base import search_relevant_docs
+            from .knowledge_base import search_relevant_docs, relevance_distance
             
             # Ищем документы, добавленные через динамический поиск
             relevant_docs = search_relevant_docs(user_question, n_results=5)
@@ -283,7 +343,7 @@ class DynamicSearcher:
             
             if dynamic_docs:
                 # Проверяем качество найденных динамических документов
-                best_distance = min(doc['distance'] for doc in dynamic_docs)
+                best_distance = min(relevance_distance(doc) for doc in dynamic_docs)
                 
                 if best_distance < 0.6:  # Увеличили порог с 0.4 до 0.6 для более гибкого кеширования
                     logger.info(f"🔄 ДИНАМИЧЕСКИЙ ПОИСК: Найдена релевантная информация (дистанция: {best_distance:.3f}) - используем кеш")
@@ -299,16 +359,40 @@ class DynamicSearcher:
             logger.error(f"Ошибка проверки кеша динамического поиска: {e}")
             return False
     
-    def search_and_add_to_knowledge_base(self, user_question: str) -> Tuple[Optional[str], bool]:
+    def search_and_index(self, user_question: str) -> Tuple[List[Dict], int]:
         """
-        Ищет информацию на pravo.by и добавляет в базу знаний
+        Синхронная обертка над search_and_index_async для скриптов
         
         Args:
             user_question: Вопрос пользователя
             
         Returns:
-            Tuple[найденная_информация, успешность_операции]
+            Tuple[релевантные_документы, количество_спарсенных_страниц]
+        """
+        return asyncio.run(self.search_and_index_async(user_question))
+    
+    async def search_and_index_async(self, user_question: str,
+                                     session: Optional[aiohttp.ClientSession] = None,
+                                     context_id: Optional[str] = None) -> Tuple[List[Dict], int]:
+        """
+        Ищет информацию на pravo.by, добавляет ее в базу знаний и
+        возвращает релевантные документы из обновленной базы знаний
+        
+        Поисковые запросы и загрузка найденных страниц выполняются
+        параллельно; частоту запросов ограничивает host_limiter.
+        
+        Args:
+            user_question: Вопрос пользователя
+            session: Общая HTTP-сессия (если не передана, создается временная)
+            context_id: ID контекста вопроса, по которому пополняется база
+            
+        Returns:
+            Tuple[релевантные_документы, количество_спарсенных_страниц]
         """
+        if session is None:
+            async with self.create_session() as own_session:
+                return await self.search_and_index_async(user_question, own_session, context_id)
+        
         logger.info(f"🔍 ДИНАМИЧЕСКИЙ ПОИСК: Запрос - {user_question}")
         
         try:
@@ -320,91 +404,124 @@ class DynamicSearcher:
             search_queries = self._generate_search_queries(user_question)
             logger.info(f"🔍 ДИНАМИЧЕСКИЙ ПОИСК: Сгенерированы запросы: {search_queries}")
             
-            all_found_urls = []
-            
-            # Выполняем поиск по каждому запросу
-            for query in search_queries:
-                found_urls = self._search_pravo_by(query)
-                all_found_urls.extend(found_urls)
+            # Выполняем поиск по всем запросам одновременно
+            search_results = await asyncio.gather(
+                *(self._search_pravo_by(session, query) for query in search_queries)
+            )
             
-            # Убираем дубликаты
-            unique_urls = list(set(all_found_urls))
+            # Убираем дубликаты, сохраняя порядок
+            unique_urls = list(dict.fromkeys(url for found_urls in search_results for url in found_urls))
             
             if not unique_urls:
                 logger.info("🚫 ДИНАМИЧЕСКИЙ ПОИСК: Релевантные страницы не найдены на pravo.by")
-                return None, False
+                return [], 0
             
             logger.info(f"🎯 ДИНАМИЧЕСКИЙ ПОИСК: Найдено {len(unique_urls)} релевантных страниц для парсинга")
             
-            # Парсим найденные страницы
-            scraped_data = []
-            for url in unique_urls[:self.max_search_results]:
-                try:
-                    page_data = self.web_scraper.scrape_single_page(url)
-                    if page_data and len(page_data['content']) > 200:  # Минимальная длина контента
-                        scraped_data.append(page_data)
-                        logger.info(f"📄 ДИНАМИЧЕСКИЙ ПОИСК: Успешно спарсена страница: {url}")
-                    
-                    time.sleep(1)  # Задержка между запросами
-                    
-                except Exception as e:
-                    logger.error(f"Ошибка парсинга {url}: {e}")
-                    continue
-            
-            if not scraped_data:
-                logger.info("🚫 ДИНАМИЧЕСКИЙ ПОИСК: Не удалось спарсить релевантные страницы")
-                return None, False
-            
-            # Фильтруем контент на юридическую релевантность
-            logger.info(f"🔍 ДИНАМИЧЕСКИЙ ПОИСК: Фильтрация {len(scraped_data)} страниц на юридическую релевантность")
-            filtered_data = self.legal_filter.filter_scraped_content(scraped_data)
-            
-            if not filtered_data:
-                logger.info("🚫 ДИНАМИЧЕСКИЙ ПОИСК: Ни одна страница не прошла фильтр юридической релевантности")
-                return None, False
-            
-            logger.info(f"✅ ДИНАМИЧЕСКИЙ ПОИСК: {len(filtered_data)} из {len(scraped_data)} страниц прошли фильтр")
-            
-            # Добавляем в базу знаний только отфильтрованный контент
-            logger.info(f"💾 ДИНАМИЧЕСКИЙ ПОИСК: Добавляем {len(filtered_data)} отфильтрованных страниц в базу знаний")
-            chunks_added = self.web_scraper.add_to_knowledge_base(filtered_data)
+            # Парсим найденные страницы одновременно
+            pages = await asyncio.gather(
+                *(self._scrape_page(session, url) for url in unique_urls[:self.max_search_results])
+            )
+            scraped_data = [page_data for page_data in pages if page_data]
             
-            if chunks_added > 0:
-                # Обновляем информацию о парсинге
-                self.scraping_tracker.update_scraping_info(
-                    "https://pravo.by/", 
-                    len(scraped_data), 
-                    chunks_added
-                )
-                
-                logger.info(f"✅ ДИНАМИЧЕСКИЙ ПОИСК: Добавлено {chunks_added} чанков в базу знаний")
-                
-                # Теперь пытаемся найти ответ в обновленной базе знаний
-                from .knowledge_base import search_relevant_docs
-                from .llm_service import get_answer
-                
-                relevant_docs = search_relevant_docs(user_question, n_results=5)
-                
-                if relevant_docs:
-                    logger.info(f"🤖 ДИНАМИЧЕСКИЙ ПОИСК: Генерация ответа через OpenAI на основе новых данных из {len(scraped_data)} страниц")
-                    answer = get_answer(user_question, relevant_docs)
-                    
-                    # Добавляем информацию об источнике
-                    source_info = f"\n\n📍 Информация найдена и добавлена из {len(scraped_data)} страниц pravo.by"
-                    answer += source_info
-                    
-                    logger.info(f"✅ ДИНАМИЧЕСКИЙ ПОИСК: Ответ успешно сгенерирован на основе новых данных")
-                    return answer, True
-                else:
-                    logger.info(f"🚫 ДИНАМИЧЕСКИЙ ПОИСК: Не удалось найти релевантные документы даже после добавления новых данных")
-                    return None, False
-            else:
-                logger.info("Не удалось добавить информацию в базу знаний")
-                return None, False
+            return await run_io(self._index_scraped_pages, user_question, scraped_data, context_id)
                 
         except Exception as e:
             logger.error(f"Ошибка динамического поиска: {e}")
+            return [], 0
+    
+    def _index_scraped_pages(self, user_question: str, scraped_data: List[Dict],
+                             context_id: Optional[str] = None) -> Tuple[List[Dict], int]:
+        """
+        Фильтрует спарсенные страницы, добавляет их в базу знаний и ищет
+        релевантные документы в обновленной базе знаний
+        
+        Args:
+            user_question: Вопрос пользователя
+            scraped_data: Спарсенные страницы
+            context_id: ID контекста вопроса, сохраняется в метаданных новых блоков
+            
+        Returns:
+            Tuple[релевантные_документы, количество_спарсенных_страниц]
+        """
+        if not scraped_data:
+            logger.info("🚫 ДИНАМИЧЕСКИЙ ПОИСК: Не удалось спарсить релевантные страницы")
+            return [], 0
+        
+        # Фильтруем контент на юридическую релевантность
+        logger.info(f"🔍 ДИНАМИЧЕСКИЙ ПОИСК: Фильтрация {len(scraped_data)} страниц на юридическую релевантность")
+        filtered_data = self.legal_filter.filter_scraped_content(scraped_data)
+        
+        if not filtered_data:
+            logger.info("🚫 ДИНАМИЧЕСКИЙ ПОИСК: Ни одна страница не прошла фильтр юридической релевантности")
+            return [], 0
+        
+        logger.info(f"✅ ДИНАМИЧЕСКИЙ ПОИСК: {len(filtered_data)} из {len(scraped_data)} страниц прошли фильтр")
+        
+        # Помечаем страницы вопросом, ради которого они найдены
+        if context_id:
+            for page_data in filtered_data:
+                page_data['question_context_id'] = context_id
+        
+        # Добавляем в базу знаний только отфильтрованный контент (уже проиндексированные блоки не дублируются)
+        logger.info(f"💾 ДИНАМИЧЕСКИЙ ПОИСК: Добавляем {len(filtered_data)} отфильтрованных страниц в базу знаний")
+        index_stats = self.web_scraper.index_pages(filtered_data)
+        chunks_added = index_stats['added']
+        
+        if index_stats['chunks'] <= 0:
+            logger.info("Не удалось добавить информацию в базу знаний")
+            return [], 0
+        
+        # Обновляем информацию о парсинге
+        self.scraping_tracker.update_scraping_info(
+            "https://pravo.by/", 
+            len(scraped_data), 
+            chunks_added
+        )
+        
+        logger.info(f"✅ ДИНАМИЧЕСКИЙ ПОИСК: Добавлено {chunks_added} чанков в базу знаний")
+        
+        # Теперь пытаемся найти ответ в обновленной базе знаний
+        from .knowledge_base import search_relevant_docs
+        
+        relevant_docs = search_relevant_docs(user_question, n_results=5)
+        
+        if not relevant_docs:
+            logger.info(f"🚫 ДИНАМИЧЕСКИЙ ПОИСК: Не удалось найти релевантные документы даже после добавления новых данных")
+            return [], 0
+        
+        return relevant_docs, len(scraped_data)
+    
+    @staticmethod
+    def format_source_info(pages_count: int) -> str:
+        """Возвращает подпись об источнике ответа динамического поиска"""
+        return f"\n\n📍 Информация найдена и добавлена из {pages_count} страниц pravo.by"
+    
+    def search_and_add_to_knowledge_base(self, user_question: str) -> Tuple[Optional[str], bool]:
+        """
+        Ищет информацию на pravo.by и добавляет в базу знаний
+        
+        Args:
+            user_question: Вопрос пользователя
+            
+        Returns:
+            Tuple[найденная_информация, успешность_операции]
+        """
+        relevant_docs, pages_count = self.search_and_index(user_question)
+        
+        if not relevant_docs:
             return None, False
+        
+        from .llm_service import get_answer
+        
+        logger.info(f"🤖 ДИНАМИЧЕСКИЙ ПОИСК: Генерация ответа через OpenAI на основе новых данных из {pages_count} страниц")
+        answer = get_answer(user_question, relevant_docs)
+        
+        # Добавляем информацию об источнике
+        answer += self.format_source_info(pages_count)
+        
+        logger.info(f"✅ ДИНАМИЧЕСКИЙ ПОИСК: Ответ успешно сгенерирован на основе новых данных")
+        return answer, True
     
     def get_search_statistics(self) -> Dict:
         """Возвращает статистику динамического поиска"""
@@ -417,6 +534,7 @@ class DynamicSearcher:
 
 
 def create_dynamic_searcher(web_scraper: WebScraper, knowledge_base: KnowledgeBase, 
-                          text_processor: TextProcessor, scraping_tracker: ScrapingTracker) -> DynamicSearcher:
+                          text_processor: TextProcessor, scraping_tracker: ScrapingTracker,
+                          host_limiter: Optional[HostLimiter] = None) -> DynamicSearcher:
     """Создает экземпляр динамического поисковика"""
-    return DynamicSearcher(web_scraper, knowledge_base, text_processor, scraping_tracker) 
\ No newline at end of file
+    return DynamicSearcher(web_scraper, knowledge_base, text_processor, scraping_tracker, host_limiter) 
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Модуль фоновой очереди пополнения базы знаний.
+
+Если база знаний отвечает на вопрос слабо, пользователь сразу получает
+ответ по имеющимся документам, а динамический поиск на pravo.by
+выполняется в фоне. Новые блоки помогают следующим похожим вопросам.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from modules.metrics import ENRICHMENT_QUEUE_DEPTH, ENRICHMENT_JOBS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EnrichmentJob:
+    """Задача фонового пополнения базы знаний."""
+    key: str
+    question: str
+    context_id: str
+    # Вызывается с результатом поиска (документы, количество страниц) после освобождения обработчика
+    on_complete: Optional[Callable[[List[Dict], int], Awaitable[None]]] = None
+
+
+class EnrichmentQueue:
+    """Ограниченная очередь фоновых динамических поисков."""
+
+    def __init__(self, handler: Callable[[EnrichmentJob], Awaitable[Tuple[List[Dict], int]]],
+                 workers: int = 2, max_size: int = 32):
+        """
+        Инициализирует очередь.
+
+        Args:
+            handler: Корутина, выполняющая поиск и пополнение базы для задачи
+            workers: Количество одновременно выполняемых задач
+            max_size: Максимальное количество задач в очереди
+        """
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_size = max(1, max_size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._callbacks: Set[asyncio.Task] = set()
+        self._pending: Set[str] = set()
+        self._stats = {"queued": 0, "done": 0, "empty": 0, "failed": 0, "dropped": 0, "duplicate": 0}
+
+    def _count(self, result: str):
+        """Учитывает результат задачи в статистике и метриках."""
+        self._stats[result] += 1
+        if ENRICHMENT_JOBS: ENRICHMENT_JOBS.labels(result=result).inc()
+
+    def _update_depth(self):
+        """Обновляет метрику глубины очереди."""
+        if ENRICHMENT_QUEUE_DEPTH and self._queue is not None: ENRICHMENT_QUEUE_DEPTH.set(self._queue.qsize())
+
+    def start(self):
+        """Запускает обработчики очереди в текущем event loop."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Запущена очередь пополнения базы знаний: обработчиков={self.workers}, очередь={self.max_size}")
+
+    def submit(self, job: EnrichmentJob) -> bool:
+        """
+        Ставит задачу в очередь.
+
+        Повторный вопрос, который уже ждет или выполняется, не добавляется.
+
+        Args:
+            job: Задача пополнения
+
+        Returns:
+            True если задача поставлена в очередь
+        """
+        self.start()
+        if job.key in self._pending:
+            self._count("duplicate")
+            return False
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._count("dropped")
+            logger.warning(f"Очередь пополнения базы знаний заполнена, вопрос пропущен: '{job.question[:50]}...'")
+            return False
+        self._pending.add(job.key)
+        self._count("queued")
+        self._update_depth()
+        return True
+
+    async def _run_callback(self, job: EnrichmentJob, docs: List[Dict], pages_count: int):
+        """Вызывает on_complete задачи, не занимая обработчик очереди."""
+        try:
+            await job.on_complete(docs, pages_count)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка обработки результата пополнения базы знаний: {e}")
+
+    async def _worker(self):
+        """Обрабатывает задачи очереди."""
+        while True:
+            job = await self._queue.get()
+            self._update_depth()
+            try:
+                docs, pages_count = await self.handler(job)
+                self._count("done" if docs else "empty")
+                if job.on_complete is not None:
+                    # Ожидание первого ответа и повторный запрос к LLM не держат обработчик
+                    task = asyncio.ensure_future(self._run_callback(job, docs, pages_count))
+                    self._callbacks.add(task)
+                    task.add_done_callback(self._callbacks.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._count("failed")
+                logger.error(f"Ошибка фонового пополнения базы знаний: {e}")
+            finally:
+                self._pending.discard(job.key)
+                self._queue.task_done()
+
+    async def join(self):
+        """Ждет завершения всех задач очереди и обработки их результатов."""
+        if self._queue is not None:
+            await self._queue.join()
+        while self._callbacks:
+            await asyncio.gather(*list(self._callbacks), return_exceptions=True)
+
+    async def stop(self):
+        """Останавливает обработчики; незавершенные задачи отбрасываются."""
+        for task in self._tasks + list(self._callbacks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._callbacks, return_exceptions=True)
+        self._tasks = []
+        self._callbacks.clear()
+        self._queue = None
+        self._pending.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает статистику очереди."""
+        return {
+            **self._stats,
+            "pending": len(self._pending),
+            "callbacks": len(self._callbacks),
+            "workers": self.workers,
+            "max_size": self.max_size
+        }
@@ -0,0 +1,169 @@
+"""
+Модуль пулов исполнителей для вынесения блокирующих операций из event loop бота.
+
+CPU-пул используется для ML-фильтра, эмбеддингов и поиска в ChromaDB,
+I/O-пул - для HTTP-запросов, скрапинга и записи в SQLite.
+"""
+import asyncio
+import functools
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+import config
+from modules.metrics import EXECUTOR_QUEUE_DEPTH, EXECUTOR_ACTIVE_TASKS, EXECUTOR_REJECTED_TASKS
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorQueueFull(RuntimeError):
+    """Пул и его очередь заполнены, задача отклонена."""
+
+
+class BoundedExecutor:
+    """Пул потоков с ограниченной очередью задач и метриками Prometheus."""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        """
+        Инициализирует пул.
+
+        Args:
+            name: Имя пула (используется в метриках и именах потоков)
+            max_workers: Количество потоков
+            max_queue: Максимальное количество задач, ожидающих свободного потока
+        """
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix=f"{name}-pool")
+        # Семафор ограничивает число задач в пуле; создается отдельно для каждого event loop
+        self._slots = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        logger.info(f"Инициализирован пул '{name}': потоков={self.max_workers}, очередь={self.max_queue}")
+
+    def _get_slots(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        """Возвращает семафор пула для текущего event loop."""
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = asyncio.Semaphore(self.max_workers + self.max_queue)
+            self._slots[loop] = slots
+        return slots
+
+    def _update_metrics(self):
+        """Обновляет метрики глубины очереди и активных задач."""
+        if EXECUTOR_QUEUE_DEPTH: EXECUTOR_QUEUE_DEPTH.labels(pool=self.name).set(self._queued)
+        if EXECUTOR_ACTIVE_TASKS: EXECUTOR_ACTIVE_TASKS.labels(pool=self.name).set(self._active)
+
+    def _call(self, state: Dict[str, bool], func: Callable, args: tuple, kwargs: dict) -> Any:
+        """Выполняет задачу в потоке пула, учитывая ее в метриках."""
+        with self._lock:
+            if not state['started']:
+                state['started'] = True
+                self._queued -= 1
+            self._active += 1
+            self._update_metrics()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._update_metrics()
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Выполняет блокирующую функцию в пуле, не блокируя event loop.
+
+        Если все потоки заняты, задача ждет в очереди пула. Если заполнена
+        и очередь, задача сразу отклоняется, чтобы под нагрузкой не копить
+        неограниченное число ожидающих корутин.
+
+        Args:
+            func: Блокирующая функция
+            *args: Позиционные аргументы функции
+            **kwargs: Именованные аргументы функции
+
+        Returns:
+            Результат функции
+
+        Raises:
+            ExecutorQueueFull: Если пул и его очередь заполнены
+        """
+        loop = asyncio.get_running_loop()
+        slots = self._get_slots(loop)
+        if slots.locked():
+            if EXECUTOR_REJECTED_TASKS: EXECUTOR_REJECTED_TASKS.labels(pool=self.name).inc()
+            raise ExecutorQueueFull(f"Пул '{self.name}' перегружен: очередь из {self.max_queue} задач заполнена")
+        state = {'started': False}
+
+        with self._lock:
+            self._queued += 1
+            self._update_metrics()
+
+        try:
+            # Свободный слот есть, и никто не ждет семафор: захват происходит без ожидания
+            async with slots:
+                call = functools.partial(self._call, state, func, args, kwargs)
+                return await loop.run_in_executor(self._executor, call)
+        finally:
+            # Задача отменена или упала до старта в потоке - убираем ее из очереди
+            with self._lock:
+                if not state['started']:
+                    state['started'] = True
+                    self._queued -= 1
+                    self._update_metrics()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Возвращает текущую загрузку пула."""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "active": self._active
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Останавливает пул."""
+        self._executor.shutdown(wait=wait)
+        logger.info(f"Пул '{self.name}' остановлен")
+
+
+# Глобальные пулы
+_cpu_executor = None
+_io_executor = None
+
+def get_cpu_executor() -> BoundedExecutor:
+    """Возвращает глобальный пул для CPU-нагруженных операций."""
+    global _cpu_executor
+    if _cpu_executor is None:
+        _cpu_executor = BoundedExecutor("cpu", config.CPU_POOL_SIZE, config.CPU_POOL_MAX_QUEUE)
+    return _cpu_executor
+
+def get_io_executor() -> BoundedExecutor:
+    """Возвращает глобальный пул для операций ввода-вывода."""
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = BoundedExecutor("io", config.IO_POOL_SIZE, config.IO_POOL_MAX_QUEUE)
+    return _io_executor
+
+async def run_cpu(func: Callable, *args, **kwargs) -> Any:
+    """Выполняет CPU-нагруженную функцию в CPU-пуле."""
+    return await get_cpu_executor().run(func, *args, **kwargs)
+
+async def run_io(func: Callable, *args, **kwargs) -> Any:
+    """Выполняет функцию ввода-вывода в I/O-пуле."""
+    return await get_io_executor().run(func, *args, **kwargs)
+
+def shutdown_executors(wait: bool = True):
+    """Останавливает глобальные пулы."""
+    global _cpu_executor, _io_executor
+    for executor in (_cpu_executor, _io_executor):
+        if executor is not None:
+            executor.shutdown(wait=wait)
+    _cpu_executor = None
+    _io_executor = None
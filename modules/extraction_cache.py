@@ -0,0 +1,311 @@
+"""
+Модуль постоянного кеша извлечения текста из документов.
+
+Извлечение текста из PDF и Word (PyMuPDF, python-docx) - самая медленная
+часть загрузки документов в базу знаний. Кеш хранит в SQLite сжатый
+постраничный текст и структурные блоки документа с ключом по хешу
+содержимого файла и версии извлечения, поэтому повторная загрузка,
+перестроение базы знаний и эксперименты с разбиением на блоки не разбирают
+неизмененные файлы заново. Блоки дополнительно привязаны к версии разбиения:
+при ее смене блоки строятся заново из сохраненного текста.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import config
+from modules.text_processing import EXTRACTOR_VERSION, iter_document_pages
+
+logger = logging.getLogger(__name__)
+
+# Таблицы с записями кеша: постраничный текст и структурные блоки
+_TABLES = ('texts', 'blocks')
+
+# Версия формата записей блоков (PRAGMA user_version): 1 - построчная запись
+_BLOCKS_FORMAT = 1
+
+
+def file_sha256(file_path: str) -> str:
+    """
+    Вычисляет SHA-256 содержимого файла, читая его частями.
+
+    Args:
+        file_path: Путь к файлу
+
+    Returns:
+        Хеш в шестнадцатеричном виде
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _iter_lines(data: bytes, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Построчно распаковывает сжатые zlib строки, не распаковывая все данные сразу."""
+    decompressor = zlib.decompressobj()
+    buffer = b""
+    for start in range(0, len(data), chunk_size):
+        buffer += decompressor.decompress(data[start:start + chunk_size])
+        *lines, buffer = buffer.split(b"\n")
+        yield from lines
+    buffer += decompressor.flush()
+    if buffer:
+        yield buffer
+
+
+class ExtractionCache:
+    """Кеш извлеченного текста и структурных блоков документов в SQLite с вытеснением по LRU."""
+
+    def __init__(self, db_path: Optional[str], max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Инициализирует кеш.
+
+        Args:
+            db_path: Путь к файлу SQLite (None - только в памяти)
+            max_bytes: Максимальный суммарный размер сжатых записей
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        # Кеш открывают параллельно процессы пула загрузки: ждем освобождения записи
+        self._conn = sqlite3.connect(db_path or ":memory:", timeout=30, check_same_thread=False)
+        self._init_database()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def _init_database(self):
+        """Создает таблицы кеша."""
+        with self._lock, self._conn:
+            if self.db_path:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS texts (
+                    sha256 TEXT NOT NULL,
+                    extractor TEXT NOT NULL,
+                    data BLOB NOT NULL,  -- JSON-строки [номер страницы, текст], сжатые zlib
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (sha256, extractor)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS blocks (
+                    sha256 TEXT NOT NULL,
+                    extractor TEXT NOT NULL,
+                    chunker TEXT NOT NULL,
+                    data BLOB NOT NULL,  -- JSON-строки: начало текста, затем [блок, первая страница, последняя страница], сжатые zlib
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (sha256, extractor, chunker)
+                )
+            """)
+            for table in _TABLES:
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_accessed_at ON {table}(accessed_at)")
+            # Блоки прежнего формата (одна JSON-запись на документ) не читаются построчно
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < _BLOCKS_FORMAT:
+                self._conn.execute("DELETE FROM blocks")
+                self._conn.execute(f"PRAGMA user_version = {_BLOCKS_FORMAT}")
+
+    def _get(self, table: str, key: Dict[str, str]) -> Optional[bytes]:
+        """Возвращает сжатые данные записи и отмечает обращение к ней."""
+        where = " AND ".join(f"{column} = ?" for column in key)
+        with self._lock:
+            row = self._conn.execute(f"SELECT data FROM {table} WHERE {where}", tuple(key.values())).fetchone()
+            self._stats["hits" if row else "misses"] += 1
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute(f"UPDATE {table} SET accessed_at = ? WHERE {where}",
+                                   (time.time(),) + tuple(key.values()))
+        return row[0]
+
+    def _put(self, table: str, key: Dict[str, str], data: bytes):
+        """Сохраняет сжатые данные записи и вытесняет старые записи сверх лимита."""
+        columns = tuple(key) + ('data', 'size', 'accessed_at')
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    tuple(key.values()) + (data, len(data), time.time())
+                )
+            self._evict()
+
+    def _evict(self):
+        """Вытесняет давно не использованные записи сверх лимита. Вызывается под блокировкой."""
+        # Размер считается по базе: в кеш пишут несколько процессов
+        total = sum(self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+                    for table in _TABLES)
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        with self._conn:
+            rows = self._conn.execute(
+                " UNION ALL ".join(f"SELECT '{table}', rowid, size, accessed_at FROM {table}" for table in _TABLES)
+                + " ORDER BY accessed_at"
+            ).fetchall()
+            for table, rowid, size, _ in rows:
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute(f"DELETE FROM {table} WHERE rowid = ?", (rowid,))
+                total -= size
+                evicted += 1
+        logger.debug(f"Кеш извлечения: вытеснено {evicted} записей")
+
+    def get_pages(self, sha256: str, extractor: str = EXTRACTOR_VERSION) -> Optional[Iterator[Tuple[Optional[int], str]]]:
+        """
+        Возвращает сохраненный текст документа.
+
+        Args:
+            sha256: Хеш содержимого файла
+            extractor: Версия извлечения текста
+
+        Returns:
+            Итератор (номер страницы или None, текст) или None, если текста нет в кеше
+        """
+        data = self._get('texts', {'sha256': sha256, 'extractor': extractor})
+        if data is None:
+            return None
+        return (tuple(json.loads(line)) for line in _iter_lines(data))
+
+    def store_pages(self, sha256: str, pages: Iterable[Tuple[Optional[int], str]],
+                    extractor: str = EXTRACTOR_VERSION) -> Iterator[Tuple[Optional[int], str]]:
+        """
+        Передает страницы дальше, попутно сжимая их, и сохраняет текст после последней страницы.
+
+        Текст не сохраняется, если извлечение прервалось с ошибкой.
+
+        Args:
+            sha256: Хеш содержимого файла
+            pages: Страницы документа (номер страницы или None, текст)
+            extractor: Версия извлечения текста
+
+        Yields:
+            Те же страницы
+        """
+        compressor = zlib.compressobj()
+        parts = []
+        for page in pages:
+            parts.append(compressor.compress(json.dumps(page, ensure_ascii=False).encode('utf-8') + b"\n"))
+            yield page
+        parts.append(compressor.flush())
+        self._put('texts', {'sha256': sha256, 'extractor': extractor}, b"".join(parts))
+
+    def get_blocks(self, sha256: str, chunker: str, extractor: str = EXTRACTOR_VERSION) -> Optional[
+            Tuple[str, Iterator[Tuple[str, Optional[int], Optional[int]]]]]:
+        """
+        Возвращает сохраненные структурные блоки документа.
+
+        Args:
+            sha256: Хеш содержимого файла
+            chunker: Версия разбиения на блоки
+            extractor: Версия извлечения текста
+
+        Returns:
+            Tuple[начало текста документа, итератор (блок, первая страница, последняя страница)]
+            или None, если блоков нет в кеше
+        """
+        data = self._get('blocks', {'sha256': sha256, 'extractor': extractor, 'chunker': chunker})
+        if data is None:
+            return None
+        lines = _iter_lines(data)
+        head = json.loads(next(lines))
+        return head, (tuple(json.loads(line)) for line in lines)
+
+    def store_blocks(self, sha256: str, chunker: str, head: str,
+                     blocks: Iterable[Tuple[str, Optional[int], Optional[int]]],
+                     extractor: str = EXTRACTOR_VERSION) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+        """
+        Передает блоки дальше, попутно сжимая их, и сохраняет блоки после последнего.
+
+        Блоки не сохраняются, если разбиение прервалось с ошибкой.
+
+        Args:
+            sha256: Хеш содержимого файла
+            chunker: Версия разбиения на блоки
+            head: Начало текста документа (для определения кодекса)
+            blocks: Блоки документа (блок, первая страница, последняя страница)
+            extractor: Версия извлечения текста
+
+        Yields:
+            Те же блоки
+        """
+        compressor = zlib.compressobj()
+        parts = [compressor.compress(json.dumps(head, ensure_ascii=False).encode('utf-8') + b"\n")]
+        for block in blocks:
+            parts.append(compressor.compress(json.dumps(block, ensure_ascii=False).encode('utf-8') + b"\n"))
+            yield block
+        parts.append(compressor.flush())
+        self._put('blocks', {'sha256': sha256, 'extractor': extractor, 'chunker': chunker}, b"".join(parts))
+
+    def clear(self):
+        """Очищает кеш."""
+        with self._lock, self._conn:
+            for table in _TABLES:
+                self._conn.execute(f"DELETE FROM {table}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Возвращает статистику кеша."""
+        with self._lock:
+            stats = dict(self._stats)
+            for table in _TABLES:
+                entries, size = self._conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {table}").fetchone()
+                stats[f"{table}_entries"] = entries
+                stats["size_bytes"] = stats.get("size_bytes", 0) + size
+            stats["max_bytes"] = self.max_bytes
+            return stats
+
+
+def iter_cached_document_pages(file_path: str, sha256: Optional[str] = None,
+                               cache: Optional[ExtractionCache] = None) -> Iterator[Tuple[Optional[int], str]]:
+    """
+    Постранично возвращает текст документа из кеша извлечения или извлекает его из файла.
+
+    Args:
+        file_path: Путь к файлу документа
+        sha256: Хеш содержимого файла (вычисляется, если не передан)
+        cache: Кеш извлечения (по умолчанию глобальный; без кеша текст извлекается из файла)
+
+    Yields:
+        Tuple[номер страницы или None, текст]
+    """
+    cache = cache or get_extraction_cache()
+    if cache is None:
+        yield from iter_document_pages(file_path)
+        return
+    sha256 = sha256 or file_sha256(file_path)
+    pages = cache.get_pages(sha256)
+    if pages is None:
+        pages = cache.store_pages(sha256, iter_document_pages(file_path))
+    yield from pages
+
+
+# Глобальный экземпляр кеша
+_extraction_cache = None
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """
+    Возвращает глобальный кеш извлечения текста.
+
+    Returns:
+        Кеш или None, если кеш отключен
+    """
+    global _extraction_cache
+    if not config.EXTRACTION_CACHE_ENABLED:
+        return None
+    if _extraction_cache is None:
+        _extraction_cache = ExtractionCache(
+            config.EXTRACTION_CACHE_PATH,
+            max_bytes=int(config.EXTRACTION_CACHE_MAX_MB * 1024 * 1024)
+        )
+    return _extraction_cache
@@ -0,0 +1,365 @@
+"""
+Модуль извлечения данных из HTML для скраперов.
+
+Общий для WebScraper, IncrementalScraper и DynamicSearcher способ получить
+заголовок, основной текст, мета-дату изменения и ссылки страницы за один
+разбор. Поддерживаются несколько движков разбора: selectolax и lxml
+(быстрые, на C) и BeautifulSoup (медленный, но всегда доступный). Движок
+выбирается настройкой HTML_PARSER; "auto" берет самый быстрый из установленных.
+"""
+import logging
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Элементы, не относящиеся к основному контенту страницы
+STRIP_TAGS = ('script', 'style', 'nav', 'header', 'footer', 'aside')
+
+# Селекторы основного контента в порядке приоритета
+MAIN_CONTENT_SELECTORS = (
+    'main', 'article', '.content', '.main-content',
+    '.post-content', '.entry-content', '#content', '#main'
+)
+
+# Мета-теги с датой последнего изменения страницы
+MODIFIED_META = (('name', 'last-modified'), ('property', 'article:modified_time'))
+
+# Порядок выбора движка в режиме "auto"
+AUTO_ORDER = ('selectolax', 'lxml', 'bs4')
+
+_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+_XML_DECLARATION_RE = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+Html = Union[str, bytes]
+
+
+@dataclass
+class ExtractedHtml:
+    """Данные, извлеченные из страницы за один разбор."""
+    title: Optional[str] = None
+    text: str = ""
+    meta_modified: Optional[str] = None
+    links: List[Tuple[str, str]] = field(default_factory=list)
+
+
+def decode_html(html: Html) -> str:
+    """
+    Декодирует тело страницы в строку.
+
+    Кодировка берется из мета-тега charset, иначе пробуется UTF-8,
+    а затем windows-1251, распространенная на белорусских сайтах.
+
+    Args:
+        html: HTML страницы (строка или байты)
+
+    Returns:
+        HTML в виде строки
+    """
+    if isinstance(html, str):
+        return html
+    match = _CHARSET_RE.search(html[:4096])
+    if match:
+        try:
+            return html.decode(match.group(1).decode('ascii'), errors='replace')
+        except LookupError:
+            pass
+    try:
+        return html.decode('utf-8')
+    except UnicodeDecodeError:
+        return html.decode('cp1251', errors='replace')
+
+
+def _join_text(parts) -> str:
+    """Склеивает текстовые узлы так же, как get_text(separator=' ', strip=True)."""
+    return ' '.join(part for part in (part.strip() for part in parts) if part)
+
+
+class HtmlExtractor:
+    """Базовый класс движка извлечения данных из HTML."""
+
+    name = "base"
+
+    def extract(self, html: Html, with_links: bool = False,
+                main_selectors: Sequence[str] = MAIN_CONTENT_SELECTORS) -> ExtractedHtml:
+        """
+        Извлекает заголовок, мета-дату изменения, основной текст и ссылки страницы
+
+        Ссылки собираются до удаления навигации: меню сайта тоже ведут на документы.
+
+        Args:
+            html: HTML страницы (строка или байты)
+            with_links: Собирать ли ссылки (href, текст ссылки)
+            main_selectors: CSS-селекторы основного контента в порядке приоритета
+
+        Returns:
+            Извлеченные данные
+        """
+        raise NotImplementedError
+
+    def select_links(self, html: Html, selectors: Sequence[str]) -> List[Tuple[Optional[str], str]]:
+        """
+        Находит элементы по CSS-селекторам
+
+        Args:
+            html: HTML страницы (строка или байты)
+            selectors: CSS-селекторы
+
+        Returns:
+            Список (href или None, текст элемента) в порядке селекторов
+        """
+        raise NotImplementedError
+
+
+class BeautifulSoupExtractor(HtmlExtractor):
+    """Извлечение через BeautifulSoup с html.parser."""
+
+    name = "bs4"
+
+    def __init__(self):
+        from bs4 import BeautifulSoup
+        self._soup = lambda html: BeautifulSoup(html, 'html.parser')
+
+    def extract(self, html: Html, with_links: bool = False,
+                main_selectors: Sequence[str] = MAIN_CONTENT_SELECTORS) -> ExtractedHtml:
+        soup = self._soup(html)
+        result = ExtractedHtml()
+
+        if with_links:
+            result.links = [(link.get('href'), link.get_text()) for link in soup.find_all('a', href=True)]
+
+        for attribute, value in MODIFIED_META:
+            meta = soup.find('meta', {attribute: value})
+            if meta:
+                result.meta_modified = meta.get('content')
+                break
+
+        for element in soup(list(STRIP_TAGS)):
+            element.decompose()
+
+        title = soup.find('title')
+        if title:
+            result.title = title.get_text().strip()
+
+        for selector in main_selectors:
+            content_elem = soup.select_one(selector)
+            if content_elem:
+                result.text = content_elem.get_text(separator=' ', strip=True)
+                break
+
+        if not result.text:
+            body = soup.find('body')
+            if body:
+                result.text = body.get_text(separator=' ', strip=True)
+
+        return result
+
+    def select_links(self, html: Html, selectors: Sequence[str]) -> List[Tuple[Optional[str], str]]:
+        soup = self._soup(html)
+        return [(element.get('href'), element.get_text())
+                for selector in selectors for element in soup.select(selector)]
+
+
+_SIMPLE_SELECTOR_RE = re.compile(r'([a-zA-Z][\w-]*|\*)?((?:[.#][\w-]+|\[[\w-]+(?:[*^]?=["\'][^"\']*["\'])?\])*)$')
+_SELECTOR_PART_RE = re.compile(r'\.([\w-]+)|#([\w-]+)|\[([\w-]+)(?:([*^]?=)["\']([^"\']*)["\'])?\]')
+
+
+@lru_cache(maxsize=128)
+def css_to_xpath(selector: str):
+    """
+    Переводит простой CSS-селектор в скомпилированное XPath-выражение lxml
+
+    Поддерживаются теги, классы, id, атрибуты ([a], [a="v"], [a*="v"], [a^="v"])
+    и комбинатор потомка (пробел) - этого достаточно для селекторов скраперов.
+
+    Args:
+        selector: CSS-селектор
+
+    Returns:
+        lxml.etree.XPath
+    """
+    from lxml import etree
+
+    steps = []
+    for compound in selector.split():
+        match = _SIMPLE_SELECTOR_RE.match(compound)
+        if not match or not (match.group(1) or match.group(2)):
+            raise ValueError(f"Неподдерживаемый CSS-селектор: {selector}")
+        predicates = []
+        for class_name, element_id, attribute, operator, value in _SELECTOR_PART_RE.findall(match.group(2)):
+            if class_name:
+                predicates.append(f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')")
+            elif element_id:
+                predicates.append(f"@id='{element_id}'")
+            elif not operator:
+                predicates.append(f"@{attribute}")
+            elif operator == '=':
+                predicates.append(f"@{attribute}='{value}'")
+            elif operator == '*=':
+                predicates.append(f"contains(@{attribute}, '{value}')")
+            else:
+                predicates.append(f"starts-with(@{attribute}, '{value}')")
+        steps.append((match.group(1) or '*') + ''.join(f"[{predicate}]" for predicate in predicates))
+    return etree.XPath('descendant-or-self::' + '//'.join(steps))
+
+
+class LxmlExtractor(HtmlExtractor):
+    """Извлечение через lxml (libxml2)."""
+
+    name = "lxml"
+
+    def __init__(self):
+        import lxml.html
+        self._html = lxml.html
+        self._parser = lxml.html.HTMLParser(remove_comments=True)
+
+    def _parse(self, html: Html):
+        """Строит дерево документа или возвращает None для пустой страницы."""
+        text = _XML_DECLARATION_RE.sub('', decode_html(html), count=1)
+        try:
+            return self._html.document_fromstring(text, parser=self._parser)
+        except self._html.etree.ParserError:
+            return None
+
+    def extract(self, html: Html, with_links: bool = False,
+                main_selectors: Sequence[str] = MAIN_CONTENT_SELECTORS) -> ExtractedHtml:
+        root = self._parse(html)
+        result = ExtractedHtml()
+        if root is None:
+            return result
+
+        if with_links:
+            result.links = [(link.get('href'), link.text_content()) for link in root.iter('a') if link.get('href') is not None]
+
+        for attribute, value in MODIFIED_META:
+            meta = root.find(f".//meta[@{attribute}='{value}']")
+            if meta is not None:
+                result.meta_modified = meta.get('content')
+                break
+
+        for element in list(root.iter(*STRIP_TAGS)):
+            element.drop_tree()
+
+        title = root.find('.//title')
+        if title is not None:
+            result.title = title.text_content().strip()
+
+        for selector in main_selectors:
+            found = css_to_xpath(selector)(root)
+            if found:
+                result.text = _join_text(found[0].itertext())
+                break
+
+        if not result.text:
+            body = root.find('.//body')
+            if body is not None:
+                result.text = _join_text(body.itertext())
+
+        return result
+
+    def select_links(self, html: Html, selectors: Sequence[str]) -> List[Tuple[Optional[str], str]]:
+        root = self._parse(html)
+        if root is None:
+            return []
+        return [(element.get('href'), element.text_content())
+                for selector in selectors for element in css_to_xpath(selector)(root)]
+
+
+class SelectolaxExtractor(HtmlExtractor):
+    """Извлечение через selectolax (lexbor)."""
+
+    name = "selectolax"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser = LexborHTMLParser
+
+    def extract(self, html: Html, with_links: bool = False,
+                main_selectors: Sequence[str] = MAIN_CONTENT_SELECTORS) -> ExtractedHtml:
+        tree = self._parser(decode_html(html))
+        result = ExtractedHtml()
+
+        if with_links:
+            result.links = [(link.attributes.get('href'), link.text()) for link in tree.css('a[href]')]
+
+        for attribute, value in MODIFIED_META:
+            meta = tree.css_first(f'meta[{attribute}="{value}"]')
+            if meta is not None:
+                result.meta_modified = meta.attributes.get('content')
+                break
+
+        tree.strip_tags(list(STRIP_TAGS))
+
+        title = tree.css_first('title')
+        if title is not None:
+            result.title = title.text().strip()
+
+        for selector in main_selectors:
+            content_elem = tree.css_first(selector)
+            if content_elem is not None:
+                result.text = content_elem.text(separator=' ', strip=True)
+                break
+
+        if not result.text and tree.body is not None:
+            result.text = tree.body.text(separator=' ', strip=True)
+
+        return result
+
+    def select_links(self, html: Html, selectors: Sequence[str]) -> List[Tuple[Optional[str], str]]:
+        tree = self._parser(decode_html(html))
+        return [(element.attributes.get('href'), element.text())
+                for selector in selectors for element in tree.css(selector)]
+
+
+EXTRACTORS = {
+    'selectolax': SelectolaxExtractor,
+    'lxml': LxmlExtractor,
+    'bs4': BeautifulSoupExtractor,
+}
+
+_extractors: Dict[str, HtmlExtractor] = {}
+
+
+def get_available_extractors() -> List[str]:
+    """Возвращает названия движков, библиотеки которых установлены."""
+    available = []
+    for name in AUTO_ORDER:
+        try:
+            get_html_extractor(name)
+            available.append(name)
+        except ImportError:
+            pass
+    return available
+
+
+def get_html_extractor(name: Optional[str] = None) -> HtmlExtractor:
+    """
+    Возвращает движок извлечения данных из HTML
+
+    Args:
+        name: selectolax, lxml, bs4 или auto (по умолчанию - HTML_PARSER из конфигурации)
+
+    Returns:
+        Экземпляр HtmlExtractor
+
+    Raises:
+        ImportError: Если библиотека явно выбранного движка не установлена
+        ValueError: Если движок неизвестен
+    """
+    name = (name or config.HTML_PARSER).lower()
+    if name == 'auto':
+        for candidate in AUTO_ORDER:
+            try:
+                return get_html_extractor(candidate)
+            except ImportError:
+                continue
+    if name not in EXTRACTORS:
+        raise ValueError(f"Неизвестный движок разбора HTML: {name}")
+    if name not in _extractors:
+        _extractors[name] = EXTRACTORS[name]()
+        logger.info(f"🧩 Разбор HTML: {name}")
+    return _extractors[name]
@@ -0,0 +1,360 @@
+"""
+Модуль постоянного кеша HTTP-ответов для скраперов.
+
+Тела страниц хранятся в SQLite в сжатом виде вместе с ETag и Last-Modified.
+Свежие записи (моложе TTL) отдаются без обращения к сайту, устаревшие
+перепроверяются условным запросом: ответ 304 обходится без загрузки тела.
+Результаты разбора страниц кешируются по хешу тела, поэтому при попадании
+в кеш HTML повторно не разбирается.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+import config
+from modules.metrics import HTTP_CACHE_REQUESTS, HTTP_CACHE_BYTES_SAVED, HTTP_CACHE_SIZE_BYTES, HTTP_CACHE_HIT_RATIO
+
+logger = logging.getLogger(__name__)
+
+# Заголовки ответа, которые сохраняются вместе с телом
+STORED_HEADERS = ('etag', 'last-modified', 'content-type', 'content-length')
+
+
+@dataclass
+class CachedResponse:
+    """Ответ на GET-запрос, полученный из сети или из кеша."""
+    url: str
+    content: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+    # Тело не загружалось: свежая запись или ответ 304
+    from_cache: bool = False
+    content_hash: str = ""
+
+    def __post_init__(self):
+        if not self.content_hash:
+            self.content_hash = hashlib.sha1(self.content).hexdigest()
+
+
+def _select_headers(headers) -> Dict[str, str]:
+    """Оставляет только сохраняемые заголовки, приводя имена к нижнему регистру."""
+    return {name.lower(): value for name, value in headers.items() if name.lower() in STORED_HEADERS}
+
+
+class HttpCache:
+    """Кеш HTTP-ответов в SQLite с вытеснением по LRU и размеру."""
+
+    def __init__(self, db_path: Optional[str], max_bytes: int = 256 * 1024 * 1024,
+                 ttl_seconds: float = 3600):
+        """
+        Инициализирует кеш.
+
+        Args:
+            db_path: Путь к файлу SQLite (None - только в памяти)
+            max_bytes: Максимальный суммарный размер сжатых тел
+            ttl_seconds: Сколько секунд запись считается свежей без перепроверки
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path or ":memory:", check_same_thread=False)
+        self._init_database()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self._stats = {"hits": 0, "revalidated": 0, "misses": 0, "bytes_saved": 0}
+        if HTTP_CACHE_SIZE_BYTES: HTTP_CACHE_SIZE_BYTES.set(self._total_bytes)
+
+    def _init_database(self):
+        """Создает таблицы кеша."""
+        with self._lock, self._conn:
+            if self.db_path:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,  -- тело, сжатое zlib
+                    body_hash TEXT NOT NULL,
+                    headers TEXT NOT NULL,  -- JSON с ETag, Last-Modified и т.п.
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,  -- время загрузки или последней перепроверки
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS parsed (
+                    url TEXT NOT NULL,
+                    parser TEXT NOT NULL,
+                    body_hash TEXT NOT NULL,
+                    data TEXT NOT NULL,  -- JSON с результатом разбора
+                    PRIMARY KEY (url, parser)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses(accessed_at)")
+
+    def _count(self, result: str, saved_bytes: int = 0):
+        """Учитывает результат запроса в статистике и метриках."""
+        with self._lock:
+            self._stats[result] += 1
+            self._stats["bytes_saved"] += saved_bytes
+            total = self._stats["hits"] + self._stats["revalidated"] + self._stats["misses"]
+            hit_ratio = (self._stats["hits"] + self._stats["revalidated"]) / total
+        if HTTP_CACHE_REQUESTS: HTTP_CACHE_REQUESTS.labels(result=result).inc()
+        if HTTP_CACHE_BYTES_SAVED and saved_bytes: HTTP_CACHE_BYTES_SAVED.inc(saved_bytes)
+        if HTTP_CACHE_HIT_RATIO: HTTP_CACHE_HIT_RATIO.set(hit_ratio)
+
+    def lookup(self, url: str, max_age: Optional[float] = None) -> Optional[CachedResponse]:
+        """
+        Возвращает сохраненный ответ.
+
+        Args:
+            url: Адрес страницы
+            max_age: Максимальный возраст свежей записи в секундах (по умолчанию ttl_seconds)
+
+        Returns:
+            Ответ из кеша (с признаком свежести в from_cache) или None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, body_hash, headers, stored_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        body, body_hash, headers, stored_at = row
+        return CachedResponse(
+            url=url,
+            content=zlib.decompress(body),
+            headers=json.loads(headers),
+            from_cache=time.time() - stored_at < (self.ttl_seconds if max_age is None else max_age),
+            content_hash=body_hash
+        )
+
+    @staticmethod
+    def conditional_headers(cached: Optional[CachedResponse]) -> Dict[str, str]:
+        """Возвращает заголовки условного запроса для перепроверки записи."""
+        headers = {}
+        if cached is not None:
+            if cached.headers.get('etag'):
+                headers['If-None-Match'] = cached.headers['etag']
+            if cached.headers.get('last-modified'):
+                headers['If-Modified-Since'] = cached.headers['last-modified']
+        return headers
+
+    def store(self, url: str, content: bytes, headers) -> CachedResponse:
+        """
+        Сохраняет загруженный ответ.
+
+        Args:
+            url: Адрес страницы
+            content: Тело ответа
+            headers: Заголовки ответа
+
+        Returns:
+            Ответ, соответствующий сохраненной записи
+        """
+        response = CachedResponse(url=url, content=content, headers=_select_headers(headers))
+        if 'no-store' in headers.get('Cache-Control', headers.get('cache-control', '')).lower():
+            return response
+
+        body = zlib.compress(content)
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                old = self._conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (url, body, body_hash, headers, size, stored_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (url, body, response.content_hash, json.dumps(response.headers), len(body), now, now)
+                )
+            self._total_bytes += len(body) - (old[0] if old else 0)
+            self._evict()
+        return response
+
+    def refresh(self, cached: CachedResponse, headers) -> CachedResponse:
+        """
+        Продлевает свежесть записи после ответа 304.
+
+        Args:
+            cached: Ответ из кеша
+            headers: Заголовки ответа 304
+
+        Returns:
+            Ответ из кеша с обновленными заголовками
+        """
+        cached.headers.update(_select_headers(headers))
+        cached.from_cache = True
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE responses SET headers = ?, stored_at = ?, accessed_at = ? WHERE url = ?",
+                (json.dumps(cached.headers), now, now, cached.url)
+            )
+        return cached
+
+    def _evict(self):
+        """Вытесняет давно не использованные записи сверх лимита. Вызывается под блокировкой."""
+        if self._total_bytes > self.max_bytes:
+            evicted = 0
+            with self._conn:
+                rows = self._conn.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall()
+                for url, size in rows:
+                    if self._total_bytes <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                    self._conn.execute("DELETE FROM parsed WHERE url = ?", (url,))
+                    self._total_bytes -= size
+                    evicted += 1
+            logger.debug(f"HTTP-кеш: вытеснено {evicted} страниц")
+        if HTTP_CACHE_SIZE_BYTES: HTTP_CACHE_SIZE_BYTES.set(self._total_bytes)
+
+    def get(self, session, url: str, timeout: float = 10, max_age: Optional[float] = None) -> CachedResponse:
+        """
+        Загружает страницу через requests.Session с использованием кеша.
+
+        Args:
+            session: Сессия requests
+            url: Адрес страницы
+            timeout: Таймаут запроса в секундах
+            max_age: Максимальный возраст записи без перепроверки (0 - всегда перепроверять)
+
+        Returns:
+            Ответ из кеша или из сети
+        """
+        cached = self.lookup(url, max_age)
+        if cached is not None and cached.from_cache:
+            self._count("hits", len(cached.content))
+            return cached
+
+        response = session.get(url, timeout=timeout, headers=self.conditional_headers(cached))
+        if cached is not None and response.status_code == 304:
+            self._count("revalidated", len(cached.content))
+            return self.refresh(cached, response.headers)
+        response.raise_for_status()
+        self._count("misses")
+        return self.store(url, response.content, response.headers)
+
+    async def get_async(self, session, url: str, limiter=None, max_age: Optional[float] = None) -> CachedResponse:
+        """
+        Загружает страницу через aiohttp.ClientSession с использованием кеша.
+
+        Свежие записи отдаются без обращения к сайту и не расходуют лимит запросов.
+
+        Args:
+            session: Сессия aiohttp
+            url: Адрес страницы
+            limiter: Ограничитель частоты запросов (HostLimiter) или None
+            max_age: Максимальный возраст записи без перепроверки (0 - всегда перепроверять)
+
+        Returns:
+            Ответ из кеша или из сети
+        """
+        from modules.executors import run_io
+
+        cached = await run_io(self.lookup, url, max_age)
+        if cached is not None and cached.from_cache:
+            self._count("hits", len(cached.content))
+            return cached
+
+        async def fetch():
+            async with session.get(url, headers=self.conditional_headers(cached)) as response:
+                if cached is not None and response.status == 304:
+                    return None, response.headers
+                response.raise_for_status()
+                return await response.read(), response.headers
+
+        if limiter is not None:
+            async with limiter.limit(url):
+                content, headers = await fetch()
+        else:
+            content, headers = await fetch()
+
+        if content is None:
+            self._count("revalidated", len(cached.content))
+            return await run_io(self.refresh, cached, headers)
+        self._count("misses")
+        return await run_io(self.store, url, content, headers)
+
+    def cached_parse(self, response: CachedResponse, parser: str, parse_fn: Callable[[], Any]) -> Any:
+        """
+        Возвращает результат разбора страницы, разбирая ее только при изменении тела.
+
+        Args:
+            response: Ответ, полученный через кеш
+            parser: Имя и версия разборщика (например, "page:v1")
+            parse_fn: Функция разбора; результат должен сериализоваться в JSON
+
+        Returns:
+            Результат разбора
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body_hash, data FROM parsed WHERE url = ? AND parser = ?", (response.url, parser)
+            ).fetchone()
+        if row is not None and row[0] == response.content_hash:
+            return json.loads(row[1])
+
+        value = parse_fn()
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO parsed (url, parser, body_hash, data) VALUES (?, ?, ?, ?)",
+                    (response.url, parser, response.content_hash, json.dumps(value, ensure_ascii=False))
+                )
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Результат разбора {parser} не сохранен в кеш: {e}")
+        return value
+
+    def clear(self):
+        """Очищает кеш."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM responses")
+                self._conn.execute("DELETE FROM parsed")
+            self._total_bytes = 0
+        if HTTP_CACHE_SIZE_BYTES: HTTP_CACHE_SIZE_BYTES.set(0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает статистику кеша."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            total = self._stats["hits"] + self._stats["revalidated"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": entries,
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hit_ratio": (self._stats["hits"] + self._stats["revalidated"]) / total if total else 0.0
+            }
+
+
+# Глобальный экземпляр кеша
+_http_cache = None
+
+def get_http_cache() -> Optional[HttpCache]:
+    """
+    Возвращает глобальный кеш HTTP-ответов.
+
+    Returns:
+        Кеш или None, если кеш отключен
+    """
+    global _http_cache
+    if not config.HTTP_CACHE_ENABLED:
+        return None
+    if _http_cache is None:
+        _http_cache = HttpCache(
+            config.HTTP_CACHE_PATH,
+            max_bytes=int(config.HTTP_CACHE_MAX_MB * 1024 * 1024),
+            ttl_seconds=config.HTTP_CACHE_TTL
+        )
+    return _http_cache
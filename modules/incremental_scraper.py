@@ -1,61 +1,38 @@
 """
 Модуль для инкрементального парсинга сайтов - парсит только новую/измененную информацию
 """
-import json
-import os
+import asyncio
 import hashlib
-import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Set, Optional, Tuple
 import logging
 from urllib.parse import urlparse, urljoin
-import requests
-from bs4 import BeautifulSoup
+import aiohttp
 
 from .web_scraper import WebScraper
 from .scraping_tracker import ScrapingTracker
+from .page_store import PageStore, get_page_store
+from .executors import run_cpu
+from modules.metrics import PAGE_CHECKS
 
 logger = logging.getLogger(__name__)
 
-# Файл для хранения информации о страницах
-PAGES_INFO_FILE = "pages_info.json"
+# Версия разбора страниц для HTTP-кеша
+PAGE_INFO_PARSER = "page_info:v3"
 
 class IncrementalScraper:
     """Класс для инкрементального парсинга сайтов"""
     
-    def __init__(self, web_scraper: WebScraper, scraping_tracker: ScrapingTracker):
+    def __init__(self, web_scraper: WebScraper, scraping_tracker: ScrapingTracker,
+                 page_store: Optional[PageStore] = None):
         self.web_scraper = web_scraper
         self.scraping_tracker = scraping_tracker
-        self.pages_info_file = PAGES_INFO_FILE
-        self.pages_info = self._load_pages_info()
+        # URL -> {content_hash, last_check, etag, last_modified, http_content_length, title, ...}
+        self.page_store = page_store or get_page_store()
         
         # Настройки для определения изменений
         self.check_interval_hours = 24  # Проверять изменения каждые 24 часа
         self.content_hash_threshold = 0.1  # Минимальный процент изменений для обновления
-        
-    def _load_pages_info(self) -> Dict:
-        """Загружает информацию о страницах из файла"""
-        try:
-            if os.path.exists(self.pages_info_file):
-                with open(self.pages_info_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            else:
-                return {
-                    "pages": {},  # URL -> {hash, last_check, last_modified, title, chunks_count}
-                    "site_maps": {},  # domain -> {urls, last_scan}
-                    "last_full_scan": None
-                }
-        except Exception as e:
-            logger.error(f"Ошибка загрузки информации о страницах: {e}")
-            return {"pages": {}, "site_maps": {}, "last_full_scan": None}
-    
-    def _save_pages_info(self):
-        """Сохраняет информацию о страницах в файл"""
-        try:
-            with open(self.pages_info_file, 'w', encoding='utf-8') as f:
-                json.dump(self.pages_info, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"Ошибка сохранения информации о страницах: {e}")
     
     def _get_content_hash(self, content: str) -> str:
         """Вычисляет хэш контента страницы"""
@@ -64,41 +41,59 @@ class IncrementalScraper:
         normalized = ' '.join(normalized.split())  # Убираем лишние пробелы
         return hashlib.md5(normalized.encode('utf-8')).hexdigest()
     
-    def _get_page_info(self, url: str) -> Optional[Dict]:
-        """Получает информацию о странице без полного парсинга"""
+    @staticmethod
+    def _get_validators(headers) -> Dict:
+        """Извлекает из заголовков ответа ETag, Last-Modified и Content-Length"""
+        headers = {name.lower(): value for name, value in headers.items()}
+        return {
+            'etag': headers.get('etag'),
+            'last_modified': headers.get('last-modified'),
+            'http_content_length': headers.get('content-length')
+        }
+    
+    @staticmethod
+    def _same_validators(page_info: Dict, validators: Dict) -> Optional[bool]:
+        """
+        Сравнивает сохраненные и текущие валидаторы страницы
+        
+        Returns:
+            True/False, если по заголовкам можно судить об изменении, иначе None
+        """
+        if page_info.get('etag') and validators['etag']:
+            return page_info['etag'] == validators['etag']
+        if page_info.get('last_modified') and validators['last_modified']:
+            if page_info['last_modified'] != validators['last_modified']:
+                return False
+            if page_info.get('http_content_length') and validators['http_content_length']:
+                return page_info['http_content_length'] == validators['http_content_length']
+            return True
+        return None
+    
+    async def _get_page_info_async(self, session: aiohttp.ClientSession, url: str) -> Optional[Dict]:
+        """Загружает страницу и получает ее заголовок, хэш контента и валидаторы"""
         try:
-            response = self.web_scraper.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
+            # Проверка изменений не должна получать страницу из кеша без перепроверки на сайте
+            response = await self.web_scraper._download_async(session, url, max_age=0)
             
-            # Получаем заголовок
-            title = soup.find('title')
-            title_text = title.get_text().strip() if title else "Без заголовка"
-            
-            # Получаем дату последнего изменения из мета-тегов или headers
-            last_modified = None
-            
-            # Пробуем получить из HTTP заголовков
-            if 'last-modified' in response.headers:
-                last_modified = response.headers['last-modified']
-            
-            # Пробуем получить из мета-тегов
-            if not last_modified:
-                meta_modified = soup.find('meta', {'name': 'last-modified'}) or \
-                              soup.find('meta', {'property': 'article:modified_time'})
-                if meta_modified:
-                    last_modified = meta_modified.get('content')
+            # Разбор выполняется только если тело страницы изменилось с прошлой загрузки
+            http_cache = self.web_scraper.http_cache
+            if http_cache is not None:
+                page_info = await run_cpu(
+                    http_cache.cached_parse, response, PAGE_INFO_PARSER, lambda: self._parse_page_info(response.content)
+                )
+            else:
+                page_info = await run_cpu(self._parse_page_info, response.content)
             
-            # Получаем основной контент для хэширования
-            content = self._extract_main_content(soup)
-            content_hash = self._get_content_hash(content)
+            validators = self._get_validators(response.headers)
             
             return {
-                'title': title_text,
-                'content_hash': content_hash,
-                'last_modified': last_modified,
-                'content_length': len(content),
+                'title': page_info['title'],
+                'content_hash': page_info['content_hash'],
+                # Отправляется в If-Modified-Since, поэтому только из HTTP-заголовка
+                'last_modified': validators['last_modified'],
+                'etag': validators['etag'],
+                'http_content_length': validators['http_content_length'],
+                'content_length': page_info['content_length'],
                 'check_time': datetime.now().isoformat()
             }
             
@@ -106,32 +101,76 @@ class IncrementalScraper:
             logger.error(f"Ошибка получения информации о странице {url}: {e}")
             return None
     
-    def _extract_main_content(self, soup: BeautifulSoup) -> str:
-        """Извлекает основной контент страницы"""
-        # Удаляем ненужные элементы
-        for element in soup(['script', 'style', 'nav', 'header', 'footer', 'aside']):
-            element.decompose()
-        
-        # Ищем основной контент
-        main_content_selectors = [
-            'main', 'article', '.content', '.main-content', 
-            '.post-content', '.entry-content', '#content', '#main'
-        ]
-        
-        content = ""
-        for selector in main_content_selectors:
-            content_elem = soup.select_one(selector)
-            if content_elem:
-                content = content_elem.get_text(separator=' ', strip=True)
-                break
-        
-        # Если не нашли основной контент, берем весь body
-        if not content:
-            body = soup.find('body')
-            if body:
-                content = body.get_text(separator=' ', strip=True)
-        
-        return content
+    async def _check_page_async(self, session: aiohttp.ClientSession, url: str, page_info: Dict) -> Tuple[str, Optional[Dict]]:
+        """
+        Проверяет, изменилась ли страница
+        
+        Сначала выполняется условный HEAD-запрос с сохраненными ETag/Last-Modified;
+        страница загружается и хэшируется, только если по заголовкам нельзя
+        судить об изменении.
+        
+        Args:
+            session: HTTP-сессия
+            url: URL страницы
+            page_info: Сохраненная информация о странице
+            
+        Returns:
+            Tuple[результат (unchanged, changed, deleted), обновления информации о странице]
+        """
+        request_headers = {}
+        if page_info.get('etag'):
+            request_headers['If-None-Match'] = page_info['etag']
+        if page_info.get('last_modified'):
+            request_headers['If-Modified-Since'] = page_info['last_modified']
+        
+        if request_headers:
+            try:
+                async with self.web_scraper.host_limiter.limit(url):
+                    async with session.head(url, headers=request_headers, allow_redirects=True) as response:
+                        status = response.status
+                        validators = self._get_validators(response.headers)
+                
+                if status == 304:
+                    if PAGE_CHECKS: PAGE_CHECKS.labels(result='not_modified').inc()
+                    return "unchanged", {'check_time': datetime.now().isoformat()}
+                if status in (404, 410):
+                    if PAGE_CHECKS: PAGE_CHECKS.labels(result='deleted').inc()
+                    return "deleted", None
+                if status == 200 and self._same_validators(page_info, validators):
+                    if PAGE_CHECKS: PAGE_CHECKS.labels(result='same_headers').inc()
+                    return "unchanged", {'check_time': datetime.now().isoformat()}
+            except Exception as e:
+                logger.debug(f"Условный запрос к {url} не удался, загружаем страницу: {e}")
+        
+        # Сервер не ответил по заголовкам - сравниваем хэш контента
+        current_info = await self._get_page_info_async(session, url)
+        if not current_info:
+            if PAGE_CHECKS: PAGE_CHECKS.labels(result='deleted').inc()
+            return "deleted", None
+        if PAGE_CHECKS: PAGE_CHECKS.labels(result='downloaded').inc()
+        
+        updates = {
+            'last_check': current_info['check_time'],
+            'content_hash': current_info['content_hash'],
+            'title': current_info['title'],
+            'etag': current_info['etag'],
+            'last_modified': current_info['last_modified'],
+            'http_content_length': current_info['http_content_length']
+        }
+        changed = page_info.get('content_hash') != current_info['content_hash']
+        return ("changed" if changed else "unchanged"), updates
+    
+    def _parse_page_info(self, html: bytes) -> Dict:
+        """Извлекает из HTML заголовок и хэш контента"""
+        extracted = self.web_scraper.html_extractor.extract(html)
+        # Тот же текст, что сохраняется при парсинге страницы, чтобы хэши совпадали
+        content = self.web_scraper._clean_text(extracted.text)
+        
+        return {
+            'title': extracted.title or "Без заголовка",
+            'content_hash': self._get_content_hash(content),
+            'content_length': len(content)
+        }
     
     def _discover_site_urls(self, start_url: str, max_pages: int = 100) -> List[str]:
         """Обнаруживает все URL сайта для парсинга"""
@@ -139,8 +178,8 @@ class IncrementalScraper:
             domain = urlparse(start_url).netloc
             
             # Проверяем, есть ли уже карта сайта
-            if domain in self.pages_info["site_maps"]:
-                site_map = self.pages_info["site_maps"][domain]
+            site_map = self.page_store.get_site_map(domain)
+            if site_map:
                 # Если карта свежая (менее 7 дней), используем её
                 if site_map.get("last_scan"):
                     last_scan = datetime.fromisoformat(site_map["last_scan"])
@@ -150,48 +189,12 @@ class IncrementalScraper:
             
             logger.info(f"Сканируем сайт {domain} для обнаружения страниц...")
             
-            urls_found = set()
-            urls_to_check = [start_url]
-            checked_urls = set()
-            
-            while urls_to_check and len(urls_found) < max_pages:
-                current_url = urls_to_check.pop(0)
-                
-                if current_url in checked_urls:
-                    continue
-                
-                checked_urls.add(current_url)
-                
-                try:
-                    response = self.web_scraper.session.get(current_url, timeout=10)
-                    response.raise_for_status()
-                    
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    
-                    # Добавляем текущий URL
-                    urls_found.add(current_url)
-                    
-                    # Ищем новые ссылки
-                    new_links = self.web_scraper.get_legal_links(soup, current_url)
-                    for link in new_links:
-                        if link not in checked_urls and len(urls_found) < max_pages:
-                            urls_to_check.append(link)
-                    
-                    time.sleep(self.web_scraper.delay)
-                    
-                except Exception as e:
-                    logger.error(f"Ошибка при сканировании {current_url}: {e}")
-                    continue
-            
-            urls_list = list(urls_found)
+            # Обходим сайт общим движком: страницы загружаются параллельно
+            results = self.web_scraper.crawl([start_url], max_pages=max_pages, discover_only=True)
+            urls_list = [result.url for result in results]
             
             # Сохраняем карту сайта
-            self.pages_info["site_maps"][domain] = {
-                "urls": urls_list,
-                "last_scan": datetime.now().isoformat(),
-                "total_urls": len(urls_list)
-            }
-            self._save_pages_info()
+            self.page_store.set_site_map(domain, urls_list, datetime.now().isoformat())
             
             logger.info(f"Обнаружено {len(urls_list)} URL для {domain}")
             return urls_list
@@ -204,6 +207,18 @@ class IncrementalScraper:
         """
         Проверяет изменения на страницах
         
+        Args:
+            urls: Список URL для проверки
+            
+        Returns:
+            Tuple[новые_страницы, измененные_страницы, удаленные_страницы]
+        """
+        return asyncio.run(self.check_for_changes_async(urls))
+    
+    async def check_for_changes_async(self, urls: List[str]) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Проверяет изменения на страницах, опрашивая сайты параллельно
+        
         Args:
             urls: Список URL для проверки
             
@@ -216,48 +231,39 @@ class IncrementalScraper:
         
         logger.info(f"Проверяем изменения на {len(urls)} страницах...")
         
-        # Проверяем существующие страницы
+        # Отбираем страницы, которые пора перепроверить
+        known_pages = self.page_store.get_pages(urls)
+        check_before = (datetime.now() - timedelta(hours=self.check_interval_hours)).isoformat()
+        stale_urls = []
         for url in urls:
-            if url not in self.pages_info["pages"]:
+            if url not in known_pages:
                 new_pages.append(url)
-                continue
-            
-            page_info = self.pages_info["pages"][url]
-            
-            # Проверяем, нужно ли проверять страницу
-            if page_info.get("last_check"):
-                last_check = datetime.fromisoformat(page_info["last_check"])
-                if datetime.now() - last_check < timedelta(hours=self.check_interval_hours):
-                    continue
-            
-            # Получаем текущую информацию о странице
-            current_info = self._get_page_info(url)
-            if not current_info:
+            elif not known_pages[url].get("last_check") or known_pages[url]["last_check"] < check_before:
+                stale_urls.append(url)
+        
+        # Проверяем страницы параллельно (частоту запросов к хосту ограничивает HostLimiter)
+        async with self.web_scraper.create_session() as session:
+            results = await asyncio.gather(*(
+                self._check_page_async(session, url, known_pages[url]) for url in stale_urls
+            ))
+        
+        checked_pages = {}
+        for url, (status, updates) in zip(stale_urls, results):
+            if status == "deleted":
                 deleted_pages.append(url)
                 continue
-            
-            # Сравниваем хэши
-            old_hash = page_info.get("content_hash")
-            new_hash = current_info["content_hash"]
-            
-            if old_hash != new_hash:
+            if status == "changed":
                 changed_pages.append(url)
                 logger.info(f"Обнаружены изменения на странице: {url}")
             
             # Обновляем информацию о проверке
-            self.pages_info["pages"][url].update({
-                "last_check": current_info["check_time"],
-                "content_hash": new_hash,
-                "title": current_info["title"]
-            })
+            checked_pages[url] = {**known_pages[url], **updates}
+        self.page_store.upsert_pages(checked_pages)
         
-        # Проверяем удаленные страницы
+        # Страницы доменов проверяемых URL, которых больше нет на сайте
         existing_urls = set(urls)
-        for url in list(self.pages_info["pages"].keys()):
-            if url not in existing_urls:
-                deleted_pages.append(url)
-        
-        self._save_pages_info()
+        for domain in {urlparse(url).netloc for url in urls}:
+            deleted_pages.extend(url for url in self.page_store.get_domain_urls(domain) if url not in existing_urls)
         
         logger.info(f"Найдено: {len(new_pages)} новых, {len(changed_pages)} измененных, {len(deleted_pages)} удаленных страниц")
         
@@ -282,6 +288,10 @@ class IncrementalScraper:
         # Проверяем изменения
         new_pages, changed_pages, deleted_pages = self.check_for_changes(all_urls)
         
+        # Блоки исчезнувших страниц удаляем из базы знаний, затем забываем сами страницы
+        if deleted_pages:
+            self.page_store.delete_pages(self.web_scraper.remove_pages(deleted_pages))
+        
         # Парсим новые и измененные страницы
         pages_to_scrape = new_pages + changed_pages
         
@@ -298,29 +308,27 @@ class IncrementalScraper:
         
         logger.info(f"Парсим {len(pages_to_scrape)} страниц...")
         
-        # Парсим страницы
+        # Парсим страницы параллельно, без перехода по ссылкам
+        results = self.web_scraper.crawl(pages_to_scrape, max_pages=len(pages_to_scrape), max_depth=0)
         scraped_data = []
-        for url in pages_to_scrape:
-            page_data = self.web_scraper.scrape_single_page(url)
-            if page_data:
-                scraped_data.append(page_data)
-                
-                # Обновляем информацию о странице
-                content_hash = self._get_content_hash(page_data["content"])
-                self.pages_info["pages"][url] = {
-                    "content_hash": content_hash,
-                    "title": page_data["title"],
-                    "last_check": datetime.now().isoformat(),
-                    "last_scraped": datetime.now().isoformat(),
-                    "content_length": len(page_data["content"])
-                }
+        scraped_pages = {}
+        for result in results:
+            page_data = result.data
+            scraped_data.append(page_data)
             
-            time.sleep(self.web_scraper.delay)
+            # Обновляем информацию о странице: валидаторы ответа и хэш в том же виде, что при проверке
+            validators = self._get_validators(page_data.get("http_headers") or {})
+            scraped_pages[result.url] = {
+                **validators,
+                "content_hash": self._get_content_hash(page_data["content"]),
+                "title": page_data["title"],
+                "last_check": datetime.now().isoformat(),
+                "last_scraped": datetime.now().isoformat(),
+                "content_length": len(page_data["content"])
+            }
         
-        # Удаляем информацию об удаленных страницах
-        for url in deleted_pages:
-            if url in self.pages_info["pages"]:
-                del self.pages_info["pages"][url]
+        # Сохраняем информацию о страницах
+        self.page_store.upsert_pages(scraped_pages)
         
         # Добавляем в базу знаний
         chunks_added = 0
@@ -334,9 +342,6 @@ class IncrementalScraper:
             chunks_added
         )
         
-        # Сохраняем информацию о страницах
-        self._save_pages_info()
-        
         result = {
             "total_urls_checked": len(all_urls),
             "new_pages": len(new_pages),
@@ -363,38 +368,21 @@ class IncrementalScraper:
         """
         logger.info(f"Выполняем полное пересканирование: {start_url}")
         
-        # Очищаем информацию о сайте
-        domain = urlparse(start_url).netloc
-        if domain in self.pages_info["site_maps"]:
-            del self.pages_info["site_maps"][domain]
-        
-        # Очищаем информацию о страницах этого домена
-        urls_to_remove = [url for url in self.pages_info["pages"].keys() 
-                         if urlparse(url).netloc == domain]
-        for url in urls_to_remove:
-            del self.pages_info["pages"][url]
+        # Очищаем информацию о карте сайта и страницах этого домена
+        self.page_store.delete_domain(urlparse(start_url).netloc)
         
         # Выполняем полный парсинг
         return self.incremental_scrape(start_url, max_pages)
     
     def get_scraping_statistics(self) -> Dict:
         """Возвращает статистику парсинга"""
-        total_pages = len(self.pages_info["pages"])
-        
-        # Группируем по доменам
-        domains = {}
-        for url in self.pages_info["pages"].keys():
-            domain = urlparse(url).netloc
-            if domain not in domains:
-                domains[domain] = 0
-            domains[domain] += 1
+        domains = self.page_store.count_pages_by_domain()
         
         return {
-            "total_pages_tracked": total_pages,
+            "total_pages_tracked": sum(domains.values()),
             "domains": domains,
-            "site_maps": {domain: info["total_urls"] 
-                         for domain, info in self.pages_info["site_maps"].items()},
-            "last_full_scan": self.pages_info.get("last_full_scan")
+            "site_maps": self.page_store.get_site_map_sizes(),
+            "last_full_scan": self.page_store.get_value("last_full_scan")
         }
 
 
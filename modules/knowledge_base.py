@@ -10,8 +10,11 @@ import disable_telemetry
 
 import os
 import logging
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Iterable, Set
 from datetime import datetime
 import hashlib
 
@@ -20,10 +23,19 @@ os.environ["ANONYMIZED_TELEMETRY"] = "False"
 os.environ["CHROMA_TELEMETRY"] = "False"
 
 import chromadb
+import numpy as np
 from chromadb.config import Settings
 from chromadb.utils import embedding_functions
-from config import CHROMA_DB_PATH
+from config import (
+    CHROMA_DB_PATH, KB_BATCH_SIZE, DOCUMENT_MANIFEST_PATH, KB_EMBEDDING_CACHE_SIZE, KB_COUNT_REFRESH_SECONDS,
+    HYBRID_SEARCH_ENABLED, BM25_INDEX_PATH, HYBRID_CANDIDATES, HYBRID_RRF_K, HYBRID_LEXICAL_MIN_TERMS,
+    KB_VERSION_PATH
+)
 from modules.metrics import DB_ERRORS, DB_RESPONSE_TIME
+from modules.document_manifest import DocumentManifest, LEGACY_MANIFEST_FILE
+from modules.bm25_index import BM25Index, tokenize
+from modules.citations import CitationIndex, parse_citations
+from modules.single_flight import normalize_question
 
 # Отключаем логирование телеметрии ChromaDB
 telemetry_logger = logging.getLogger('chromadb.telemetry')
@@ -38,40 +50,150 @@ posthog_logger.addHandler(logging.NullHandler())
 # Настройка логирования для этого модуля
 logger = logging.getLogger(__name__)
 
+# Подписчики на изменения документов (например, кеш ответов).
+# Получают список затронутых ID или None, если изменилась вся коллекция.
+_change_listeners: List[Callable[[Optional[List[str]]], None]] = []
+
+def add_change_listener(listener: Callable[[Optional[List[str]]], None]):
+    """
+    Регистрирует обработчик изменений документов базы знаний.
+    
+    Args:
+        listener: Функция, принимающая список ID измененных документов
+                  или None при полной очистке коллекции
+    """
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+def remove_change_listener(listener: Callable[[Optional[List[str]]], None]):
+    """Удаляет обработчик изменений документов базы знаний."""
+    if listener in _change_listeners:
+        _change_listeners.remove(listener)
+
+def get_documents_version(version_file: Optional[str] = KB_VERSION_PATH) -> Optional[str]:
+    """
+    Возвращает версию документов базы знаний, общую для всех процессов.
+    
+    Версия меняется при каждом изменении документов, в том числе скриптами
+    загрузки и админ-панелью, работающими в отдельных процессах.
+    
+    Args:
+        version_file: Файл версии
+        
+    Returns:
+        Версия или None, если документы еще не изменялись
+    """
+    if not version_file:
+        return None
+    try:
+        with open(version_file, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def _bump_documents_version(version_file: Optional[str]):
+    """Записывает новую версию документов (атомарно, через временный файл)."""
+    if not version_file:
+        return
+    try:
+        directory = os.path.dirname(version_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_file = f"{version_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(f"{os.getpid()}-{time.time_ns()}")
+        os.replace(temp_file, version_file)
+    except OSError as e:
+        logger.error(f"Не удалось обновить версию базы знаний: {e}")
+
+def _notify_documents_changed(doc_ids: Optional[Iterable[str]], version_file: Optional[str] = KB_VERSION_PATH):
+    """Обновляет версию документов и уведомляет подписчиков текущего процесса об изменении."""
+    _bump_documents_version(version_file)
+    ids = list(doc_ids) if doc_ids is not None else None
+    for listener in list(_change_listeners):
+        try:
+            listener(ids)
+        except Exception as e:
+            logger.error(f"Ошибка обработчика изменений базы знаний: {e}")
+
+def relevance_distance(doc: Dict[str, Any]) -> float:
+    """
+    Возвращает дистанцию документа для порогов релевантности.
+
+    При гибридном поиске учитывает буквальное совпадение запроса с текстом:
+    сильное лексическое совпадение считается таким же надежным, как близкий вектор.
+
+    Args:
+        doc: Найденный документ
+
+    Returns:
+        Меньшая из векторной и лексической дистанций
+    """
+    return doc.get('relevance_distance', doc['distance'])
+
 class KnowledgeBase:
     """Класс для управления базой знаний."""
     
-    def __init__(self, collection_name: str = "legal_docs"):
+    def __init__(self, collection_name: str = "legal_docs", client=None, embedding_function=None,
+                 manifest_file: Optional[str] = DOCUMENT_MANIFEST_PATH,
+                 bm25_index_file: Optional[str] = BM25_INDEX_PATH,
+                 version_file: Optional[str] = KB_VERSION_PATH):
         """
         Инициализирует базу знаний.
         
         Args:
             collection_name: Имя коллекции в ChromaDB
+            client: Готовый клиент ChromaDB (по умолчанию - PersistentClient в CHROMA_DB_PATH)
+            embedding_function: Функция эмбеддингов (по умолчанию - модель ChromaDB)
+            manifest_file: Файл манифеста документов (None - только в памяти)
+            bm25_index_file: Файл BM25-индекса (None - только в памяти)
+            version_file: Файл версии документов для других процессов (None - не записывать)
         """
         self.collection_name = collection_name
-        self.client = None
+        self.client = client
+        self.version_file = version_file
         self.collection = None
+        # Явная функция эмбеддингов: та же модель, что ChromaDB использует по умолчанию,
+        # но доступная для вычисления векторов вопросов вне коллекции
+        self.embedding_function = embedding_function or embedding_functions.DefaultEmbeddingFunction()
+        # Манифест блоков по исходным файлам для обновления документов целиком
+        self.manifest = DocumentManifest(manifest_file)
+        if manifest_file:
+            self.manifest.migrate_json(LEGACY_MANIFEST_FILE)
+        # Лексический индекс для гибридного поиска
+        self.bm25 = BM25Index(bm25_index_file)
+        self._bm25_checked = False
+        # Индекс блоков по ссылкам «кодекс + статья»; строится по метаданным коллекции
+        self.citations = CitationIndex()
+        self._citations_count: Optional[int] = None
+        # LRU эмбеддингов запросов и количество документов, хранимые в памяти
+        self._embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._embedding_cache_lock = threading.Lock()
+        self._document_count: Optional[int] = None
+        self._document_count_checked_at = 0.0
         self._initialize_db()
     
     def _initialize_db(self):
         """Инициализирует подключение к ChromaDB."""
         try:
-            # Создаем директорию для базы данных, если она не существует
-            os.makedirs(CHROMA_DB_PATH, exist_ok=True)
-            
-            # Инициализируем клиент ChromaDB
-            self.client = chromadb.PersistentClient(
-                path=CHROMA_DB_PATH,
-                settings=Settings(
-                    anonymized_telemetry=False,
-                    allow_reset=True,
-                    is_persistent=True
+            if self.client is None:
+                # Создаем директорию для базы данных, если она не существует
+                os.makedirs(CHROMA_DB_PATH, exist_ok=True)
+                
+                # Инициализируем клиент ChromaDB
+                self.client = chromadb.PersistentClient(
+                    path=CHROMA_DB_PATH,
+                    settings=Settings(
+                        anonymized_telemetry=False,
+                        allow_reset=True,
+                        is_persistent=True
+                    )
                 )
-            )
             
             # Получаем или создаем коллекцию
             self.collection = self.client.get_or_create_collection(
                 name=self.collection_name,
+                embedding_function=self.embedding_function,
                 metadata={"hnsw:space": "cosine"}  # Используем косинусное сходство
             )
             
@@ -93,40 +215,251 @@ class KnowledgeBase:
         Returns:
             True если документ добавлен успешно, False в противном случае
         """
+        return self.add_documents([doc_id], [document_text], [metadata]) == 1
+    
+    def add_documents(self, doc_ids: List[str], document_texts: List[str],
+                      metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+                      batch_size: Optional[int] = None,
+                      embeddings: Optional[List[List[float]]] = None,
+                      overwrite: bool = False) -> int:
+        """
+        Добавляет документы в базу знаний пакетами.
+        
+        Существование документов проверяется одним запросом, эмбеддинги
+        вычисляются и записываются пакетами по batch_size документов.
+        Уже существующие документы и пустые тексты пропускаются.
+        
+        Args:
+            doc_ids: Уникальные идентификаторы документов
+            document_texts: Тексты документов
+            metadatas: Метаданные документов
+            batch_size: Размер пакета (по умолчанию KB_BATCH_SIZE)
+            embeddings: Готовые эмбеддинги документов (вычисляются, если не переданы)
+            overwrite: Перезаписывать существующие документы на месте, а не пропускать их
+            
+        Returns:
+            Количество записанных документов
+        """
+        if metadatas is None:
+            metadatas = [None] * len(doc_ids)
+        if embeddings is None:
+            embeddings = [None] * len(doc_ids)
+        if not (len(doc_ids) == len(document_texts) == len(metadatas) == len(embeddings)):
+            raise ValueError("Количество ID, текстов и метаданных должно совпадать")
+        
+        batch_size = max(1, batch_size or KB_BATCH_SIZE)
+        # ChromaDB ограничивает размер одной записи
+        get_max_batch_size = getattr(self.client, "get_max_batch_size", None)
+        if get_max_batch_size:
+            batch_size = min(batch_size, get_max_batch_size())
+        
+        # Отбрасываем пустые тексты и повторяющиеся ID
+        candidates = {}
+        for doc_id, document_text, metadata, embedding in zip(doc_ids, document_texts, metadatas, embeddings):
+            if not document_text or not document_text.strip():
+                logger.warning(f"Пустой текст для документа {doc_id}")
+                continue
+            if doc_id not in candidates:
+                candidates[doc_id] = (document_text, metadata, embedding)
+        if not candidates:
+            return 0
+        
+        # Одна проверка существования на весь набор
         try:
             with DB_RESPONSE_TIME.time():
-                if not document_text or not document_text.strip():
-                    logger.warning(f"Пустой текст для документа {doc_id}")
-                    return False
+                existing = set(self.collection.get(ids=list(candidates), include=[]).get('ids', []))
+        except Exception as e:
+            if DB_ERRORS: DB_ERRORS.inc()
+            logger.error(f"Ошибка проверки существования документов: {e}")
+            return 0
+        if existing and not overwrite:
+            logger.debug(f"{len(existing)} документов уже существуют в базе знаний - пропускаем")
+        
+        new_ids = [doc_id for doc_id in candidates if overwrite or doc_id not in existing]
+        added_count = 0
+        ids_by_file: Dict[str, List[str]] = {}
+        added_ids = set()
+        added_date = datetime.now().isoformat()
+        
+        for start in range(0, len(new_ids), batch_size):
+            batch_ids = new_ids[start:start + batch_size]
+            batch_texts = [candidates[doc_id][0] for doc_id in batch_ids]
+            batch_metadatas = []
+            for doc_id, document_text in zip(batch_ids, batch_texts):
+                # Добавляем текущее время и размер документа в метаданные
+                metadata = dict(candidates[doc_id][1] or {})
+                metadata.update({
+                    "length": len(document_text),
+                    "doc_id": doc_id,
+                    "added_date": added_date
+                })
+                batch_metadatas.append(metadata)
             
-            # Проверяем, существует ли уже документ с таким ID
-            if self.document_exists(doc_id):
-                logger.debug(f"Документ {doc_id} уже существует в базе знаний - пропускаем")
-                return False
+            try:
+                with DB_RESPONSE_TIME.time():
+                    batch_embeddings = [candidates[doc_id][2] for doc_id in batch_ids]
+                    if any(embedding is None for embedding in batch_embeddings):
+                        batch_embeddings = self.embedding_function(batch_texts)
+                    # При перезаписи старая версия блока остается, пока не записана новая
+                    write = self.collection.upsert if overwrite else self.collection.add
+                    write(
+                        ids=batch_ids,
+                        documents=batch_texts,
+                        metadatas=batch_metadatas,
+                        embeddings=batch_embeddings
+                    )
+            except Exception as e:
+                if DB_ERRORS: DB_ERRORS.inc()
+                logger.error(f"Ошибка добавления пакета из {len(batch_ids)} документов (первый: {batch_ids[0]}): {e}")
+                continue
             
-            if metadata is None:
-                metadata = {}
+            added_count += len(batch_ids)
+            added_ids.update(batch_ids)
+            created = sum(1 for doc_id in batch_ids if doc_id not in existing)
+            if self._citations_count is not None:
+                self.citations.remove([doc_id for doc_id in batch_ids if doc_id in existing])
+                for doc_id, metadata in zip(batch_ids, batch_metadatas):
+                    self.citations.add(doc_id, metadata)
+                self._citations_count += created
+            if self._document_count is not None:
+                self._document_count += created
+            for doc_id, metadata in zip(batch_ids, batch_metadatas):
+                if metadata.get("source_file"):
+                    ids_by_file.setdefault(metadata["source_file"], []).append(doc_id)
+            _notify_documents_changed(batch_ids, self.version_file)
+        
+        self.manifest.add_ids(ids_by_file)
+        if added_count:
+            self.bm25.add_documents((doc_id, candidates[doc_id][0]) for doc_id in new_ids
+                                   if doc_id in added_ids)
+        logger.debug(f"Добавлено {added_count} из {len(doc_ids)} документов в базу знаний")
+        return added_count
+    
+    def upsert_documents(self, doc_ids: List[str], document_texts: List[str],
+                         metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+                         batch_size: Optional[int] = None) -> Dict[str, int]:
+        """
+        Добавляет новые документы и обновляет существующие.
+        
+        У существующих документов с тем же текстом обновляются только
+        метаданные, без вычисления эмбеддингов. Документы с измененным
+        текстом заменяются, новые добавляются пакетами.
+        
+        Args:
+            doc_ids: Идентификаторы документов
+            document_texts: Тексты документов
+            metadatas: Метаданные документов
+            batch_size: Размер пакета при добавлении
             
-            # Добавляем текущее время и размер документа в метаданные
+        Returns:
+            Словарь с количеством добавленных (с вычислением эмбеддингов) и обновленных документов
+        """
+        if metadatas is None:
+            metadatas = [None] * len(doc_ids)
+        if not (len(doc_ids) == len(document_texts) == len(metadatas)):
+            raise ValueError("Количество ID, текстов и метаданных должно совпадать")
+        
+        candidates = {}
+        for doc_id, document_text, metadata in zip(doc_ids, document_texts, metadatas):
+            if document_text and document_text.strip() and doc_id not in candidates:
+                candidates[doc_id] = (document_text, metadata)
+        if not candidates:
+            return {"added": 0, "updated": 0}
+        
+        try:
+            with DB_RESPONSE_TIME.time():
+                existing = self.collection.get(ids=list(candidates), include=["documents", "metadatas"])
+        except Exception as e:
+            if DB_ERRORS: DB_ERRORS.inc()
+            logger.error(f"Ошибка проверки существования документов: {e}")
+            return {"added": 0, "updated": 0}
+        
+        unchanged_ids, unchanged_metadatas, changed_ids = [], [], []
+        for doc_id, document_text, old_metadata in zip(existing.get('ids', []), existing.get('documents', []),
+                                                       existing.get('metadatas', [])):
+            if document_text != candidates[doc_id][0]:
+                changed_ids.append(doc_id)
+                continue
+            metadata = dict(candidates[doc_id][1] or {})
             metadata.update({
                 "length": len(document_text),
                 "doc_id": doc_id,
-                "added_date": datetime.now().isoformat()
+                "added_date": (old_metadata or {}).get("added_date", datetime.now().isoformat())
             })
+            unchanged_ids.append(doc_id)
+            unchanged_metadatas.append(metadata)
+        
+        updated_count = 0
+        if unchanged_ids:
+            try:
+                with DB_RESPONSE_TIME.time():
+                    self.collection.update(ids=unchanged_ids, metadatas=unchanged_metadatas)
+                updated_count = len(unchanged_ids)
+                if self._citations_count is not None:
+                    self.citations.remove(unchanged_ids)
+                    for doc_id, metadata in zip(unchanged_ids, unchanged_metadatas):
+                        self.citations.add(doc_id, metadata)
+            except Exception as e:
+                if DB_ERRORS: DB_ERRORS.inc()
+                logger.error(f"Ошибка обновления метаданных {len(unchanged_ids)} документов: {e}")
+        
+        # Документы с новым текстом удаляем и добавляем заново вместе с новыми
+        self.delete_documents(changed_ids)
+        unchanged = set(unchanged_ids)
+        new_ids = [doc_id for doc_id in candidates if doc_id not in unchanged]
+        added_count = self.add_documents(
+            new_ids, [candidates[doc_id][0] for doc_id in new_ids], [candidates[doc_id][1] for doc_id in new_ids],
+            batch_size
+        ) if new_ids else 0
+        return {"added": added_count, "updated": updated_count}
+    
+    def embed_query(self, query_text: str) -> List[float]:
+        """
+        Вычисляет эмбеддинг текста запроса.
+        
+        Эмбеддинги последних запросов хранятся в LRU-кеше по нормализованному
+        тексту, поэтому повторный поиск по тому же вопросу не обращается к модели.
+        
+        Args:
+            query_text: Текст запроса
             
-            self.collection.add(
-                documents=[document_text],
-                metadatas=[metadata],
-                ids=[doc_id]
-            )
-            
-            logger.debug(f"Документ {doc_id} добавлен в базу знаний")
-            return True
-            
-        except Exception as e:
-            if DB_ERRORS: DB_ERRORS.inc()
-            logger.error(f"Ошибка добавления документа {doc_id}: {e}")
-            return False
+        Returns:
+            Вектор эмбеддинга
+        """
+        key = normalize_question(query_text)
+        with self._embedding_cache_lock:
+            embedding = self._embedding_cache.get(key)
+            if embedding is not None:
+                self._embedding_cache.move_to_end(key)
+                return embedding
+        
+        embedding = [float(value) for value in self.embedding_function([query_text])[0]]
+        
+        with self._embedding_cache_lock:
+            self._embedding_cache[key] = embedding
+            self._embedding_cache.move_to_end(key)
+            while len(self._embedding_cache) > KB_EMBEDDING_CACHE_SIZE:
+                self._embedding_cache.popitem(last=False)
+        return embedding
+    
+    def count_documents(self) -> int:
+        """
+        Возвращает количество документов в коллекции.
+        
+        Значение поддерживается в памяти при добавлении документов; удаление
+        сбрасывает его. Раз в KB_COUNT_REFRESH_SECONDS, а также пока коллекция
+        пуста, значение перечитывается из ChromaDB - базу могут пополнять
+        скрипты в других процессах.
+        
+        Returns:
+            Количество документов
+        """
+        now = time.monotonic()
+        if (not self._document_count or
+                now - self._document_count_checked_at > KB_COUNT_REFRESH_SECONDS):
+            self._document_count = self.collection.count()
+            self._document_count_checked_at = now
+        return self._document_count
     
     def search_relevant_docs(self, query_text: str, n_results: int = 3) -> List[Dict[str, Any]]:
         """
@@ -146,7 +479,7 @@ class KnowledgeBase:
                     return []
             
             # Получаем количество документов в коллекции
-            collection_count = self.collection.count()
+            collection_count = self.count_documents()
             if collection_count == 0:
                 logger.warning("База знаний пуста")
                 return []
@@ -154,28 +487,41 @@ class KnowledgeBase:
             # Ограничиваем количество результатов доступным количеством документов
             n_results = min(n_results, collection_count)
             
+            query_embedding = self.embed_query(query_text)
+            n_candidates = min(max(n_results, HYBRID_CANDIDATES), collection_count) if HYBRID_SEARCH_ENABLED else n_results
+            
             results = self.collection.query(
-                query_texts=[query_text],
-                n_results=n_results
+                query_embeddings=[query_embedding],
+                n_results=n_candidates
             )
             
+            ids = results.get('ids', [[]])[0]
             documents = results.get('documents', [[]])[0]
             distances = results.get('distances', [[]])[0]
             metadatas = results.get('metadatas', [[]])[0]
             
+            candidates = []
+            for i, (doc, distance) in enumerate(zip(documents, distances)):
+                metadata = metadatas[i] if i < len(metadatas) and metadatas[i] else {}
+                candidates.append({
+                    'id': ids[i] if i < len(ids) else metadata.get('doc_id'),
+                    'content': doc,
+                    'metadata': metadata,
+                    'distance': distance
+                })
+            
+            if HYBRID_SEARCH_ENABLED:
+                candidates = self._fuse_with_lexical(query_text, query_embedding, candidates, n_candidates)
+            
             # Фильтруем результаты по релевантности
             # Для косинусного расстояния: 0.0-0.3 отлично, 0.3-0.5 хорошо, 0.5-0.8 удовлетворительно, >0.8 плохо
-            relevant_docs = []
-            for i, (doc, distance) in enumerate(zip(documents, distances)):
-                if distance < 0.9:  # Порог релевантности (слегка увеличен для максимального покрытия)
-                    metadata = metadatas[i] if i < len(metadatas) and metadatas[i] else {}
-                    relevant_docs.append({
-                        'content': doc,
-                        'metadata': metadata,
-                        'distance': distance
-                    })
+            relevant_docs = [
+                doc for doc in candidates
+                if relevance_distance(doc) < 0.9  # Порог релевантности (слегка увеличен для максимального покрытия)
+            ][:n_results]
             
             logger.info(f"📊 БАЗА ЗНАНИЙ: Найдено {len(relevant_docs)} релевантных документов для запроса: '{query_text[:50]}...'")
+            distances = [relevance_distance(doc) for doc in candidates[:n_results]]
             if distances:
                 avg_distance = sum(distances) / len(distances)
                 min_distance = min(distances)
@@ -198,6 +544,195 @@ class KnowledgeBase:
             logger.error(f"Ошибка поиска документов: {e}")
             return []
     
+    def _ensure_lexical_index(self):
+        """Строит BM25-индекс по коллекции, если индекса еще нет (например, после обновления бота)."""
+        if self._bm25_checked:
+            return
+        self._bm25_checked = True
+        if len(self.bm25) == 0 and self.count_documents() > 0:
+            self.rebuild_lexical_index()
+    
+    def rebuild_lexical_index(self, page_size: int = 1000) -> int:
+        """
+        Перестраивает BM25-индекс по всем документам коллекции.
+        
+        Args:
+            page_size: Количество документов, читаемых из ChromaDB за один запрос
+            
+        Returns:
+            Количество проиндексированных документов
+        """
+        logger.info("📚 Построение BM25-индекса по базе знаний...")
+        self.bm25.clear()
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents"], limit=page_size, offset=offset)
+            page_ids = page.get('ids', [])
+            if not page_ids:
+                break
+            self.bm25.add_documents(zip(page_ids, page.get('documents', [])))
+            offset += len(page_ids)
+        logger.info(f"✅ BM25-индекс построен: {len(self.bm25)} документов")
+        return len(self.bm25)
+    
+    def _forget_citations(self, doc_ids: Iterable[str]):
+        """Удаляет блоки из индекса цитат после удаления из коллекции."""
+        if self._citations_count is None:
+            return
+        self.citations.remove(doc_ids)
+        self._citations_count = self.collection.count()
+    
+    def _ensure_citation_index(self):
+        """
+        Строит индекс цитат по метаданным коллекции.
+        
+        Индекс перестраивается, если количество документов изменилось не через
+        этот экземпляр (например, базу пополнил скрипт в другом процессе).
+        """
+        count = self.count_documents()
+        if self._citations_count == count:
+            return
+        
+        self.citations.clear()
+        offset = 0
+        page_size = 1000
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            page_ids = page.get('ids', [])
+            if not page_ids:
+                break
+            for doc_id, metadata in zip(page_ids, page.get('metadatas', [])):
+                self.citations.add(doc_id, metadata)
+            offset += len(page_ids)
+        self._citations_count = count
+        logger.info(f"📑 Индекс цитат построен: {len(self.citations)} блоков со ссылками на статьи")
+    
+    def find_by_citation(self, query_text: str, n_results: int = 10) -> List[Dict[str, Any]]:
+        """
+        Находит блоки статей, на которые прямо ссылается запрос («статья 1014 ГК»).
+        
+        Поиск выполняется по индексу цитат без вычисления эмбеддингов.
+        Если в запросе указана часть статьи, возвращаются блоки этой части.
+        
+        Args:
+            query_text: Текст запроса
+            n_results: Максимальное количество блоков
+            
+        Returns:
+            Список блоков в порядке документа (пустой, если запрос не ссылается
+            на известную статью)
+        """
+        citations = parse_citations(query_text)
+        if not citations:
+            return []
+        
+        try:
+            self._ensure_citation_index()
+            docs = []
+            for act, article, part in citations:
+                doc_ids = self.citations.lookup(act, article)
+                if not doc_ids:
+                    continue
+                fetched = self.collection.get(ids=doc_ids, include=["documents", "metadatas"])
+                article_docs = [
+                    {
+                        'id': doc_id,
+                        'content': fetched['documents'][i],
+                        'metadata': fetched['metadatas'][i] or {},
+                        'distance': 0.0
+                    }
+                    for i, doc_id in enumerate(fetched.get('ids', []))
+                ]
+                if part:
+                    part_docs = [doc for doc in article_docs if doc['metadata'].get('citation_part') == part]
+                    article_docs = part_docs or article_docs
+                article_docs.sort(key=lambda doc: (
+                    doc['metadata'].get('block_index', doc['metadata'].get('chunk_index', 0)), doc['id']
+                ))
+                docs.extend(article_docs)
+        except Exception as e:
+            if DB_ERRORS: DB_ERRORS.inc()
+            logger.error(f"Ошибка поиска по индексу цитат: {e}")
+            return []
+        
+        if docs:
+            logger.info(f"📑 БАЗА ЗНАНИЙ: По ссылкам {citations} найдено {len(docs)} блоков")
+        return docs[:n_results]
+    
+    def _fuse_with_lexical(self, query_text: str, query_embedding: List[float],
+                           vector_docs: List[Dict[str, Any]], n_candidates: int) -> List[Dict[str, Any]]:
+        """
+        Объединяет векторные результаты с результатами BM25 по reciprocal rank fusion.
+        
+        Для каждого документа рассчитывается доля запроса, буквально найденная
+        в тексте (с весами IDF). Поле distance остается векторной дистанцией,
+        объединенная оценка сохраняется в fused_score. relevance_distance
+        снижается только при совпадении номера статьи или документа, чтобы
+        вопросы с точными ссылками на нормы не уходили в медленный динамический
+        поиск, а обычные вопросы маршрутизировались по векторной дистанции.
+        
+        Args:
+            query_text: Текст запроса
+            query_embedding: Эмбеддинг запроса
+            vector_docs: Результаты векторного поиска в порядке релевантности
+            n_candidates: Количество кандидатов от BM25
+            
+        Returns:
+            Документы в порядке объединенного рейтинга
+        """
+        try:
+            self._ensure_lexical_index()
+            lexical_hits = self.bm25.search(query_text, n_candidates)
+        except Exception as e:
+            logger.warning(f"Лексический поиск недоступен, используем только векторный: {e}")
+            return vector_docs
+        
+        docs = {doc['id']: doc for doc in vector_docs}
+        fused_scores = {}
+        for rank, doc in enumerate(vector_docs):
+            fused_scores[doc['id']] = 1.0 / (HYBRID_RRF_K + rank + 1)
+        for rank, (doc_id, _) in enumerate(lexical_hits):
+            fused_scores[doc_id] = fused_scores.get(doc_id, 0.0) + 1.0 / (HYBRID_RRF_K + rank + 1)
+        
+        # Документы, найденные только BM25, дочитываем из коллекции вместе с эмбеддингами
+        missing_ids = [doc_id for doc_id, _ in lexical_hits if doc_id not in docs]
+        if missing_ids:
+            fetched = self.collection.get(ids=missing_ids, include=["documents", "metadatas", "embeddings"])
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            query_norm = np.linalg.norm(query_vector) or 1.0
+            for i, doc_id in enumerate(fetched.get('ids', [])):
+                vector = np.asarray(fetched['embeddings'][i], dtype=np.float32)
+                similarity = float(vector @ query_vector) / ((np.linalg.norm(vector) or 1.0) * query_norm)
+                docs[doc_id] = {
+                    'id': doc_id,
+                    'content': fetched['documents'][i],
+                    'metadata': fetched['metadatas'][i] or {},
+                    'distance': 1.0 - similarity
+                }
+        
+        fused_ids = [doc_id for doc_id in sorted(fused_scores, key=fused_scores.get, reverse=True) if doc_id in docs]
+        query_terms = len(set(tokenize(query_text)))
+        coverages = self.bm25.coverage(query_text, fused_ids)
+        fused_docs = []
+        for doc_id in fused_ids:
+            doc = docs[doc_id]
+            coverage, matched_terms = coverages[doc_id]
+            doc['fused_score'] = fused_scores[doc_id]
+            doc['lexical_score'] = coverage
+            doc['relevance_distance'] = doc['distance']
+            # Дистанцию снижает только точная ссылка на норму (номер статьи или документа):
+            # совпадение обычных слов вопроса влияет лишь на объединенный рейтинг
+            if any(term.isdigit() for term in matched_terms):
+                # Короткие запросы из одного-двух термов не должны давать полного доверия
+                lexical_distance = 1.0 - coverage * min(1.0, query_terms / max(1, HYBRID_LEXICAL_MIN_TERMS))
+                doc['relevance_distance'] = min(doc['distance'], lexical_distance)
+            fused_docs.append(doc)
+        
+        if lexical_hits:
+            lexical_only = len(missing_ids)
+            logger.info(f"🔤 БАЗА ЗНАНИЙ: BM25 нашел {len(lexical_hits)} документов, из них {lexical_only} вне векторной выдачи")
+        return fused_docs
+    
     def should_use_dynamic_search(self, query_text: str, n_results: int = 3) -> tuple[bool, List[Dict[str, Any]]]:
         """
         Определяет, нужно ли использовать динамический поиск на основе качества результатов.
@@ -219,7 +754,7 @@ class KnowledgeBase:
                 return True, []
             
             # Проверяем качество лучшего результата
-            best_distance = min(doc['distance'] for doc in relevant_docs)
+            best_distance = min(relevance_distance(doc) for doc in relevant_docs)
             
             # Проверяем семантическое соответствие запроса
             query_lower = query_text.lower()
@@ -298,6 +833,30 @@ class KnowledgeBase:
             logger.error(f"Ошибка проверки существования документа {doc_id}: {e}")
             return False
     
+    def get_existing_ids(self, doc_ids: Iterable[str]) -> Set[str]:
+        """
+        Возвращает ID документов, которые есть в базе знаний.
+        
+        Используется для подтверждения записи: при ошибке проверки
+        возвращается пустое множество.
+        
+        Args:
+            doc_ids: Идентификаторы документов
+            
+        Returns:
+            Множество существующих ID
+        """
+        doc_ids = list(dict.fromkeys(doc_ids))
+        if not doc_ids:
+            return set()
+        try:
+            with DB_RESPONSE_TIME.time():
+                return set(self.collection.get(ids=doc_ids, include=[]).get('ids', []))
+        except Exception as e:
+            if DB_ERRORS: DB_ERRORS.inc()
+            logger.error(f"Ошибка проверки существования {len(doc_ids)} документов: {e}")
+            return set()
+    
     def get_collection_stats(self) -> Dict[str, Any]:
         """
         Возвращает статистику коллекции.
@@ -307,6 +866,8 @@ class KnowledgeBase:
         """
         try:
             count = self.collection.count()
+            self._document_count = count
+            self._document_count_checked_at = time.monotonic()
             return {
                 "total_documents": count,
                 "collection_name": self.collection_name,
@@ -328,12 +889,161 @@ class KnowledgeBase:
         """
         try:
             self.collection.delete(ids=[doc_id])
+            self._document_count = None
+            self.manifest.remove_ids([doc_id])
+            self.bm25.remove_documents([doc_id])
+            self._forget_citations([doc_id])
+            _notify_documents_changed([doc_id], self.version_file)
             logger.info(f"Документ {doc_id} удален из базы знаний")
             return True
         except Exception as e:
             logger.error(f"Ошибка удаления документа {doc_id}: {e}")
             return False
     
+    def delete_documents(self, doc_ids: Iterable[str]) -> int:
+        """
+        Удаляет документы одним запросом.
+        
+        Args:
+            doc_ids: Идентификаторы документов
+            
+        Returns:
+            Количество документов, переданных на удаление
+        """
+        doc_ids = list(dict.fromkeys(doc_ids))
+        if not doc_ids:
+            return 0
+        try:
+            with DB_RESPONSE_TIME.time():
+                self.collection.delete(ids=doc_ids)
+            self._document_count = None
+        except Exception as e:
+            if DB_ERRORS: DB_ERRORS.inc()
+            logger.error(f"Ошибка удаления {len(doc_ids)} документов: {e}")
+            return 0
+        
+        self.manifest.remove_ids(doc_ids)
+        self.bm25.remove_documents(doc_ids)
+        self._forget_citations(doc_ids)
+        _notify_documents_changed(doc_ids, self.version_file)
+        logger.info(f"🗑️ Удалено {len(doc_ids)} документов")
+        return len(doc_ids)
+    
+    @staticmethod
+    def _build_where(filters: Dict[str, Any]) -> Dict[str, Any]:
+        """Строит фильтр ChromaDB по равенству полей метаданных."""
+        conditions = [{key: value} for key, value in filters.items()]
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+    
+    def get_ids_where(self, **filters) -> List[str]:
+        """
+        Возвращает ID документов с заданными значениями метаданных.
+        
+        Args:
+            **filters: Поля метаданных и их значения (например, source_file="law.pdf")
+            
+        Returns:
+            Список ID документов
+        """
+        if not filters:
+            raise ValueError("Не задан ни один фильтр метаданных")
+        result = self.collection.get(where=self._build_where(filters), include=[])
+        return result.get('ids', [])
+    
+    def has_documents_where(self, **filters) -> bool:
+        """
+        Проверяет, есть ли документы с заданными значениями метаданных.
+        
+        Args:
+            **filters: Поля метаданных и их значения
+            
+        Returns:
+            True если найден хотя бы один документ
+        """
+        if set(filters) == {"source_file"} and self.manifest.has_file(filters["source_file"]):
+            return True
+        try:
+            result = self.collection.get(where=self._build_where(filters), limit=1, include=[])
+            return len(result.get('ids', [])) > 0
+        except Exception as e:
+            logger.error(f"Ошибка поиска документов по метаданным {filters}: {e}")
+            return False
+    
+    def delete_where(self, **filters) -> int:
+        """
+        Удаляет все документы с заданными значениями метаданных одним запросом.
+        
+        Args:
+            **filters: Поля метаданных и их значения (например, source_file="law.pdf")
+            
+        Returns:
+            Количество удаленных документов
+        """
+        try:
+            with DB_RESPONSE_TIME.time():
+                doc_ids = set(self.get_ids_where(**filters))
+                # Блоки из манифеста удаляем даже без метаданных (документы старого формата)
+                if set(filters) == {"source_file"}:
+                    doc_ids.update(self.manifest.get_ids(filters["source_file"]))
+                if doc_ids:
+                    self.collection.delete(ids=list(doc_ids))
+                    self._document_count = None
+        except Exception as e:
+            if DB_ERRORS: DB_ERRORS.inc()
+            logger.error(f"Ошибка удаления документов по метаданным {filters}: {e}")
+            return 0
+        
+        if set(filters) == {"source_file"}:
+            self.manifest.remove_file(filters["source_file"])
+        self.manifest.remove_ids(doc_ids)
+        if doc_ids:
+            self.bm25.remove_documents(doc_ids)
+            self._forget_citations(doc_ids)
+            _notify_documents_changed(doc_ids, self.version_file)
+            logger.info(f"🗑️ Удалено {len(doc_ids)} документов по фильтру {filters}")
+        return len(doc_ids)
+    
+    def replace_document(self, source_file: str, doc_ids: List[str], document_texts: List[str],
+                         metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+                         batch_size: Optional[int] = None) -> Dict[str, int]:
+        """
+        Заменяет все блоки исходного файла новой версией.
+        
+        Новые блоки записываются первыми (блоки с теми же ID перезаписываются
+        на месте), и только после записи всех новых блоков удаляются старые
+        блоки, которых нет в новой версии. Если запись не удалась, например
+        из-за ошибки вычисления эмбеддингов, старые блоки не удаляются и
+        документ не пропадает из базы знаний.
+        
+        Args:
+            source_file: Имя исходного файла
+            doc_ids: ID новых блоков
+            document_texts: Тексты новых блоков
+            metadatas: Метаданные новых блоков
+            batch_size: Размер пакета при добавлении
+            
+        Returns:
+            Словарь с количеством удаленных и добавленных блоков
+        """
+        if metadatas is None:
+            metadatas = [None] * len(doc_ids)
+        if not (len(doc_ids) == len(document_texts) == len(metadatas)):
+            raise ValueError("Количество ID, текстов и метаданных должно совпадать")
+        metadatas = [dict(metadata or {}, source_file=source_file) for metadata in metadatas]
+        
+        # Блоки из манифеста учитываем даже без метаданных (документы старого формата)
+        old_ids = set(self.get_ids_where(source_file=source_file)) | set(self.manifest.get_ids(source_file))
+        expected = {doc_id for doc_id, document_text in zip(doc_ids, document_texts)
+                    if document_text and document_text.strip()}
+        added_count = self.add_documents(doc_ids, document_texts, metadatas, batch_size, overwrite=True)
+        if added_count < len(expected):
+            logger.error(f"Документ {source_file} записан не полностью ({added_count} из {len(expected)} блоков), "
+                         f"старые блоки сохранены")
+            return {"deleted": 0, "added": added_count}
+        
+        deleted_count = self.delete_documents(sorted(old_ids - expected))
+        return {"deleted": deleted_count, "added": added_count}
+    
     def clear_collection(self) -> bool:
         """
         Очищает всю коллекцию.
@@ -346,8 +1056,15 @@ class KnowledgeBase:
             self.client.delete_collection(name=self.collection_name)
             self.collection = self.client.create_collection(
                 name=self.collection_name,
+                embedding_function=self.embedding_function,
                 metadata={"hnsw:space": "cosine"}
             )
+            self._document_count = 0
+            self.manifest.clear()
+            self.bm25.clear()
+            self.citations.clear()
+            self._citations_count = 0
+            _notify_documents_changed(None, self.version_file)
             logger.info("База знаний очищена")
             return True
         except Exception as e:
@@ -369,10 +1086,20 @@ def add_document(doc_id: str, document_text: str, metadata: Dict[str, Any] = Non
     """Добавляет документ в базу знаний."""
     return get_knowledge_base().add_document(doc_id, document_text, metadata)
 
+def add_documents(doc_ids: List[str], document_texts: List[str],
+                  metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+                  batch_size: Optional[int] = None) -> int:
+    """Добавляет документы в базу знаний пакетами."""
+    return get_knowledge_base().add_documents(doc_ids, document_texts, metadatas, batch_size)
+
 def search_relevant_docs(query_text: str, n_results: int = 3) -> List[Dict[str, Any]]:
     """Ищет релевантные документы."""
     return get_knowledge_base().search_relevant_docs(query_text, n_results) 
 
+def find_by_citation(query_text: str, n_results: int = 10) -> List[Dict[str, Any]]:
+    """Находит блоки статей, на которые прямо ссылается запрос."""
+    return get_knowledge_base().find_by_citation(query_text, n_results)
+
 def should_use_dynamic_search(query_text: str, n_results: int = 3) -> tuple[bool, List[Dict[str, Any]]]:
     """Определяет, нужно ли использовать динамический поиск."""
     return get_knowledge_base().should_use_dynamic_search(query_text, n_results) 
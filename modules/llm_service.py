@@ -1,13 +1,22 @@
 """
 Модуль для взаимодействия с языковыми моделями (LLM).
 """
+import asyncio
 import logging
-from typing import List, Dict, Any
+import random
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator
 from datetime import datetime
-from openai import OpenAI
-from config import OPENAI_API_KEY, DEFAULT_MODEL, MAX_TOKENS
+import httpx
+import openai
+from openai import OpenAI, AsyncOpenAI
+from config import (
+    OPENAI_API_KEY, DEFAULT_MODEL, MAX_TOKENS,
+    OPENAI_REQUEST_DEADLINE, OPENAI_MAX_RETRIES, OPENAI_RETRY_BASE_DELAY, OPENAI_RETRY_MAX_DELAY,
+    OPENAI_MAX_CONNECTIONS, OPENAI_KEEPALIVE_EXPIRY, OPENAI_MAX_CONCURRENCY
+)
 from .scraping_tracker import get_scraping_summary
-from modules.metrics import ML_ERRORS
+from modules.metrics import ML_ERRORS, LLM_RESPONSE_TIME, LLM_RETRIES, LLM_IN_FLIGHT
 
 logger = logging.getLogger(__name__)
 
@@ -80,19 +89,213 @@ class LLMService:
         """
         self.model = model
         self.client = None
+        self.async_client = None
+        self._async_loop = None
+        self._concurrency = None
+        # Задачи закрытия клиентов прежних event loop (ссылки держим до завершения)
+        self._closing = set()
         logger.info(f"Инициализирован LLM сервис с моделью: {model}")
     
+    def _check_api_key(self):
+        """Проверяет, что ключ OpenAI настроен."""
+        if not OPENAI_API_KEY or OPENAI_API_KEY.startswith("ВАШ_") or OPENAI_API_KEY.startswith("sk-test"):
+            raise ValueError(
+                "Необходимо настроить валидный OPENAI_API_KEY в файле .env. "
+                "Получите ключ на https://platform.openai.com/api-keys"
+            )
+    
     def _get_client(self):
         """Получает клиент OpenAI, инициализируя его при необходимости."""
         if self.client is None:
-            if not OPENAI_API_KEY or OPENAI_API_KEY.startswith("ВАШ_") or OPENAI_API_KEY.startswith("sk-test"):
-                raise ValueError(
-                    "Необходимо настроить валидный OPENAI_API_KEY в файле .env. "
-                    "Получите ключ на https://platform.openai.com/api-keys"
-                )
+            self._check_api_key()
             self.client = OpenAI(api_key=OPENAI_API_KEY)
         return self.client
     
+    def _get_async_client(self) -> AsyncOpenAI:
+        """
+        Получает общий асинхронный клиент OpenAI с пулом keep-alive соединений.
+        
+        Клиент и семафор конкурентности привязаны к event loop, поэтому
+        при смене loop они создаются заново, а прежний клиент закрывается.
+        """
+        loop = asyncio.get_running_loop()
+        if self.async_client is None or self._async_loop is not loop:
+            self._check_api_key()
+            if self.async_client is not None:
+                self._close_stale_client(self.async_client, self._async_loop, loop)
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                    keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(OPENAI_REQUEST_DEADLINE, connect=10.0)
+            )
+            # Повторы выполняем сами - с джиттером и с учетом общего дедлайна
+            self.async_client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client, max_retries=0)
+            self._concurrency = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+            self._async_loop = loop
+            logger.info(f"🤖 OPENAI: Асинхронный клиент создан (соединений: {OPENAI_MAX_CONNECTIONS}, "
+                       f"одновременных запросов: {OPENAI_MAX_CONCURRENCY})")
+        return self.async_client
+    
+    def _close_stale_client(self, client: AsyncOpenAI, old_loop: Optional[asyncio.AbstractEventLoop],
+                            loop: asyncio.AbstractEventLoop):
+        """
+        Закрывает клиент прежнего event loop, чтобы не оставлять открытым его пул соединений.
+        
+        Если прежний loop еще работает в другом потоке, клиент закрывается в нем,
+        иначе - в текущем loop.
+        
+        Args:
+            client: Прежний асинхронный клиент
+            old_loop: Event loop, в котором клиент был создан
+            loop: Текущий event loop
+        """
+        async def close():
+            try:
+                await client.close()
+            except Exception as e:
+                logger.debug(f"Не удалось закрыть прежний клиент OpenAI: {e!r}")
+        
+        if old_loop is not None and old_loop.is_running() and not old_loop.is_closed():
+            asyncio.run_coroutine_threadsafe(close(), old_loop)
+        else:
+            task = loop.create_task(close())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+    
+    def _build_messages(self, user_question: str, context_docs: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """
+        Формирует сообщения для запроса к OpenAI.
+        
+        Args:
+            user_question: Вопрос пользователя
+            context_docs: Список релевантных документов из базы знаний
+            
+        Returns:
+            Список сообщений чата
+        """
+        # Формируем контекст из найденных документов
+        context = self._format_context(context_docs)
+        
+        # Формируем полный промпт для пользователя
+        user_prompt = self._create_user_prompt(user_question, context, context_docs)
+        
+        return [
+            {"role": "system", "content": get_system_prompt()},
+            {"role": "user", "content": user_prompt}
+        ]
+    
+    def _log_usage(self, response, answer: str):
+        """Логирует статистику использования токенов."""
+        usage = response.usage
+        if usage:
+            logger.info(f"🤖 OPENAI: Использовано токенов: {usage.total_tokens} "
+                       f"(промпт: {usage.prompt_tokens}, ответ: {usage.completion_tokens})")
+        logger.info(f"📝 OPENAI: Длина ответа: {len(answer)} символов")
+    
+    @staticmethod
+    def _get_retry_reason(error: Exception) -> Optional[str]:
+        """
+        Определяет, можно ли повторить запрос после ошибки.
+        
+        Returns:
+            Причина повтора для метрик или None, если ошибка не временная
+        """
+        if isinstance(error, openai.RateLimitError):
+            return "rate_limit"
+        if isinstance(error, openai.APIStatusError) and error.status_code >= 500:
+            return "server_error"
+        if isinstance(error, openai.APITimeoutError):
+            return "timeout"
+        if isinstance(error, openai.APIConnectionError):
+            return "connection"
+        return None
+    
+    @staticmethod
+    def _get_retry_delay(attempt: int, error: Exception) -> float:
+        """
+        Вычисляет задержку перед повтором: экспоненциальный backoff с полным джиттером.
+        Если сервер прислал Retry-After, ждем не меньше указанного времени.
+        """
+        delay = random.uniform(0, min(OPENAI_RETRY_MAX_DELAY, OPENAI_RETRY_BASE_DELAY * (2 ** attempt)))
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                delay = max(delay, float(response.headers.get("retry-after", 0)))
+            except (TypeError, ValueError):
+                pass
+        return delay
+    
+    def _get_retry_delay_or_none(self, error: Exception, attempt: int, deadline: float) -> Optional[float]:
+        """
+        Решает, повторять ли запрос после ошибки.
+        
+        Returns:
+            Задержка перед повтором или None, если повторять не нужно
+        """
+        reason = self._get_retry_reason(error)
+        if reason is None or attempt >= OPENAI_MAX_RETRIES:
+            return None
+        delay = self._get_retry_delay(attempt, error)
+        if asyncio.get_running_loop().time() + delay >= deadline:
+            return None
+        if LLM_RETRIES: LLM_RETRIES.labels(reason=reason).inc()
+        logger.warning(f"🔁 OPENAI: Повтор {attempt + 1}/{OPENAI_MAX_RETRIES} через {delay:.1f} с ({reason}): {error}")
+        return delay
+    
+    async def _create_completion_async(self, messages: List[Dict[str, str]], **kwargs):
+        """
+        Выполняет запрос к OpenAI с дедлайном, ограничением конкурентности и повторами.
+        
+        Args:
+            messages: Сообщения чата
+            **kwargs: Дополнительные параметры chat.completions.create
+            
+        Returns:
+            Ответ OpenAI
+            
+        Raises:
+            asyncio.TimeoutError: Если дедлайн запроса исчерпан
+            openai.OpenAIError: Если ошибка не временная или повторы закончились
+        """
+        client = self._get_async_client()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + OPENAI_REQUEST_DEADLINE
+        attempt = 0
+        
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError("Дедлайн запроса к OpenAI исчерпан")
+            
+            # Ожидание слота тоже входит в дедлайн
+            await asyncio.wait_for(self._concurrency.acquire(), timeout=remaining)
+            try:
+                if LLM_IN_FLIGHT: LLM_IN_FLIGHT.inc()
+                return await asyncio.wait_for(
+                    client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        max_tokens=MAX_TOKENS,
+                        temperature=0.3,  # Низкая температура для более точных ответов
+                        top_p=0.9,
+                        **kwargs
+                    ),
+                    timeout=deadline - loop.time()
+                )
+            except Exception as e:
+                delay = self._get_retry_delay_or_none(e, attempt, deadline)
+                if delay is None:
+                    raise
+                attempt += 1
+            finally:
+                if LLM_IN_FLIGHT: LLM_IN_FLIGHT.dec()
+                self._concurrency.release()
+            
+            await asyncio.sleep(delay)
+    
     def get_answer(self, user_question: str, context_docs: List[Dict[str, Any]]) -> str:
         """
         Генерирует ответ на основе вопроса пользователя и контекста.
@@ -105,31 +308,19 @@ class LLMService:
             Сгенерированный ответ
         """
         try:
-            # Формируем контекст из найденных документов
-            context = self._format_context(context_docs)
-            
-            # Формируем полный промпт для пользователя
-            user_prompt = self._create_user_prompt(user_question, context, context_docs)
+            messages = self._build_messages(user_question, context_docs)
             
             # Отправляем запрос к OpenAI
             response = self._get_client().chat.completions.create(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": get_system_prompt()},
-                    {"role": "user", "content": user_prompt}
-                ],
+                messages=messages,
                 max_tokens=MAX_TOKENS,
                 temperature=0.3,  # Низкая температура для более точных ответов
                 top_p=0.9
             )
             
             answer = response.choices[0].message.content.strip()
-            
-            # Логируем статистику использования токенов
-            usage = response.usage
-            logger.info(f"🤖 OPENAI: Использовано токенов: {usage.total_tokens} "
-                       f"(промпт: {usage.prompt_tokens}, ответ: {usage.completion_tokens})")
-            logger.info(f"📝 OPENAI: Длина ответа: {len(answer)} символов")
+            self._log_usage(response, answer)
             
             return answer
             
@@ -138,6 +329,138 @@ class LLMService:
             logger.error(f"Ошибка при генерации ответа: {e}")
             return self._get_error_response()
     
+    async def get_answer_async(self, user_question: str, context_docs: List[Dict[str, Any]]) -> str:
+        """
+        Асинхронно генерирует ответ на основе вопроса пользователя и контекста.
+        
+        Медленная генерация занимает только свою корутину, а не поток.
+        
+        Args:
+            user_question: Вопрос пользователя
+            context_docs: Список релевантных документов из базы знаний
+            
+        Returns:
+            Сгенерированный ответ
+        """
+        start_time = time.monotonic()
+        try:
+            messages = self._build_messages(user_question, context_docs)
+            response = await self._create_completion_async(messages)
+            
+            answer = response.choices[0].message.content.strip()
+            self._log_usage(response, answer)
+            
+            return answer
+            
+        except Exception as e:
+            ML_ERRORS.inc()
+            logger.error(f"Ошибка при асинхронной генерации ответа: {e!r}")
+            return self._get_error_response()
+        finally:
+            if LLM_RESPONSE_TIME: LLM_RESPONSE_TIME.observe(time.monotonic() - start_time)
+    
+    async def _iter_stream_deltas(self, stream, deadline: float) -> AsyncIterator[str]:
+        """
+        Читает потоковый ответ OpenAI и возвращает текстовые фрагменты.
+        
+        Args:
+            stream: Потоковый ответ chat.completions
+            deadline: Дедлайн запроса по часам event loop
+        """
+        loop = asyncio.get_running_loop()
+        iterator = stream.__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), timeout=max(0.0, deadline - loop.time()))
+                except StopAsyncIteration:
+                    break
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                await close()
+    
+    async def stream_answer_async(self, user_question: str, context_docs: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """
+        Генерирует ответ в потоковом режиме, возвращая фрагменты текста по мере генерации.
+        
+        Повторы выполняются только до получения первого фрагмента. Если запрос
+        не удался до первого фрагмента, возвращается сообщение об ошибке.
+        
+        Args:
+            user_question: Вопрос пользователя
+            context_docs: Список релевантных документов из базы знаний
+            
+        Yields:
+            Фрагменты ответа
+            
+        Raises:
+            Exception: Если генерация прервалась после первого фрагмента,
+                       чтобы вызывающий код не принял неполный ответ за готовый
+        """
+        start_time = time.monotonic()
+        answer_length = 0
+        try:
+            client = self._get_async_client()
+            messages = self._build_messages(user_question, context_docs)
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + OPENAI_REQUEST_DEADLINE
+            attempt = 0
+            
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError("Дедлайн запроса к OpenAI исчерпан")
+                
+                # Слот занимается на все время генерации, чтобы не выйти за лимит токенов
+                await asyncio.wait_for(self._concurrency.acquire(), timeout=remaining)
+                try:
+                    if LLM_IN_FLIGHT: LLM_IN_FLIGHT.inc()
+                    stream = await asyncio.wait_for(
+                        client.chat.completions.create(
+                            model=self.model,
+                            messages=messages,
+                            max_tokens=MAX_TOKENS,
+                            temperature=0.3,
+                            top_p=0.9,
+                            stream=True
+                        ),
+                        timeout=deadline - loop.time()
+                    )
+                    async for delta in self._iter_stream_deltas(stream, deadline):
+                        answer_length += len(delta)
+                        yield delta
+                    logger.info(f"📝 OPENAI: Длина потокового ответа: {answer_length} символов")
+                    return
+                except Exception as e:
+                    delay = None if answer_length else self._get_retry_delay_or_none(e, attempt, deadline)
+                    if delay is None:
+                        raise
+                    attempt += 1
+                finally:
+                    if LLM_IN_FLIGHT: LLM_IN_FLIGHT.dec()
+                    self._concurrency.release()
+                
+                await asyncio.sleep(delay)
+                
+        except Exception as e:
+            ML_ERRORS.inc()
+            logger.error(f"Ошибка при потоковой генерации ответа: {e!r}")
+            if answer_length:
+                raise
+            yield self._get_error_response()
+        finally:
+            if LLM_RESPONSE_TIME: LLM_RESPONSE_TIME.observe(time.monotonic() - start_time)
+    
+    async def aclose(self):
+        """Закрывает асинхронный клиент и его пул соединений."""
+        if self.async_client is not None:
+            await self.async_client.close()
+            self.async_client = None
+            self._async_loop = None
+    
     def _format_context(self, docs: List[Dict[str, Any]]) -> str:
         """
         Форматирует документы в контекст для промпта.
@@ -314,6 +637,18 @@ class LLMService:
 Если проблема повторяется, свяжитесь с технической поддержкой.
 """
     
+    def is_error_response(self, answer: str) -> bool:
+        """
+        Проверяет, является ли ответ сообщением об ошибке генерации.
+        
+        Args:
+            answer: Текст ответа
+            
+        Returns:
+            True если это сообщение об ошибке
+        """
+        return answer.strip() == self._get_error_response().strip()
+    
     def get_model_info(self) -> dict:
         """
         Возвращает информацию о текущей модели.
@@ -349,4 +684,18 @@ def get_answer(user_question: str, context_docs: List[Dict[str, Any]]) -> str:
         Сгенерированный ответ
     """
     llm_service = get_llm_service()
-    return llm_service.get_answer(user_question, context_docs) 
\ No newline at end of file
+    return llm_service.get_answer(user_question, context_docs)
+
+async def get_answer_async(user_question: str, context_docs: List[Dict[str, Any]]) -> str:
+    """
+    Асинхронная функция-обертка для получения ответа от LLM.
+    
+    Args:
+        user_question: Вопрос пользователя
+        context_docs: Список релевантных документов из базы знаний
+        
+    Returns:
+        Сгенерированный ответ
+    """
+    llm_service = get_llm_service()
+    return await llm_service.get_answer_async(user_question, context_docs) 
\ No newline at end of file
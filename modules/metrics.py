@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Summary, start_http_server
+from prometheus_client import Counter, Gauge, Summary, start_http_server
 import logging
 import threading
 
@@ -11,6 +11,24 @@ DB_ERRORS = Counter('db_errors_total', 'Ошибки базы данных')
 SCRAPING_ERRORS = Counter('scraping_errors_total', 'Ошибки скрапинга')
 DB_RESPONSE_TIME = Summary('db_response_time_seconds', 'Время ответа базы данных')
 ACTIVE_USERS = Counter('active_users_total', 'Количество уникальных пользователей за сутки')
+EXECUTOR_QUEUE_DEPTH = Gauge('executor_queue_depth', 'Задачи, ожидающие свободного потока в пуле', ['pool'])
+EXECUTOR_ACTIVE_TASKS = Gauge('executor_active_tasks', 'Задачи, выполняющиеся в пуле', ['pool'])
+EXECUTOR_REJECTED_TASKS = Counter('executor_rejected_tasks_total', 'Задачи, отклоненные из-за заполненной очереди пула', ['pool'])
+LLM_RESPONSE_TIME = Summary('llm_response_time_seconds', 'Время ответа OpenAI')
+LLM_RETRIES = Counter('llm_retries_total', 'Повторные запросы к OpenAI', ['reason'])
+LLM_IN_FLIGHT = Gauge('llm_requests_in_flight', 'Запросы к OpenAI в обработке')
+ANSWER_CACHE_HITS = Counter('answer_cache_hits_total', 'Попадания в кеш ответов')
+ANSWER_CACHE_MISSES = Counter('answer_cache_misses_total', 'Промахи кеша ответов')
+ANSWER_CACHE_EVICTIONS = Counter('answer_cache_evictions_total', 'Вытеснения из кеша ответов', ['reason'])
+ANSWER_CACHE_SIZE = Gauge('answer_cache_size', 'Количество ответов в кеше')
+SINGLE_FLIGHT_JOINED = Counter('single_flight_joined_total', 'Запросы, дождавшиеся результата такого же выполняющегося запроса', ['stage'])
+ENRICHMENT_QUEUE_DEPTH = Gauge('enrichment_queue_depth', 'Вопросы, ожидающие фонового динамического поиска')
+ENRICHMENT_JOBS = Counter('enrichment_jobs_total', 'Задачи фонового динамического поиска', ['result'])
+HTTP_CACHE_REQUESTS = Counter('http_cache_requests_total', 'Запросы страниц через HTTP-кеш', ['result'])
+HTTP_CACHE_BYTES_SAVED = Counter('http_cache_bytes_saved_total', 'Байты тел страниц, не загруженные благодаря HTTP-кешу')
+HTTP_CACHE_SIZE_BYTES = Gauge('http_cache_size_bytes', 'Размер сжатых тел в HTTP-кеше')
+HTTP_CACHE_HIT_RATIO = Gauge('http_cache_hit_ratio', 'Доля запросов страниц, обслуженных HTTP-кешем')
+PAGE_CHECKS = Counter('page_checks_total', 'Проверки изменений страниц инкрементальным скрапером', ['result'])
 
 _metrics_server_started = False
 
@@ -0,0 +1,352 @@
+"""
+Модуль хранения информации о страницах и истории парсинга в SQLite.
+
+Заменяет pages_info.json инкрементального скрапера и scraping_info.json
+трекера парсинга: каждое изменение записывается построчно (upsert), а не
+перезаписью всего файла, а выборки по домену и дате проверки идут по индексам.
+Существующие JSON-файлы один раз импортируются при первом запуске.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Поля записи страницы (кроме url и domain)
+PAGE_FIELDS = (
+    'content_hash', 'title', 'etag', 'last_modified', 'http_content_length',
+    'content_length', 'last_check', 'last_scraped'
+)
+
+# Прежние JSON-файлы, импортируемые при первом запуске
+PAGES_INFO_FILE = "pages_info.json"
+SCRAPING_INFO_FILE = "scraping_info.json"
+
+# Сколько записей истории парсинга хранить
+HISTORY_LIMIT = 10
+
+# Максимум параметров в одном запросе SQLite
+_BATCH = 500
+
+
+class PageStore:
+    """Хранилище информации о страницах сайтов и истории парсинга."""
+
+    def __init__(self, db_path: Optional[str]):
+        """
+        Инициализирует хранилище.
+
+        Args:
+            db_path: Путь к файлу SQLite (None - только в памяти)
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path or ":memory:", check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_database()
+
+    def _init_database(self):
+        """Создает таблицы хранилища."""
+        with self._lock, self._conn:
+            if self.db_path:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    domain TEXT NOT NULL,
+                    content_hash TEXT,
+                    title TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    http_content_length TEXT,
+                    content_length INTEGER,
+                    last_check TEXT,  -- ISO-дата последней проверки изменений
+                    last_scraped TEXT
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS site_maps (
+                    domain TEXT PRIMARY KEY,
+                    urls TEXT NOT NULL,  -- JSON-список URL
+                    last_scan TEXT NOT NULL,
+                    total_urls INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS scraping_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date TEXT NOT NULL,
+                    time TEXT NOT NULL,
+                    site TEXT NOT NULL,
+                    pages_scraped INTEGER NOT NULL,
+                    chunks_added INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS page_chunks (
+                    url TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,  -- ID блока в базе знаний
+                    position INTEGER NOT NULL,
+                    PRIMARY KEY (url, chunk_id)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT  -- JSON
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_domain_last_check ON pages(domain, last_check)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_last_check ON pages(last_check)")
+
+    # --- Страницы ---
+
+    def get_pages(self, urls: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Возвращает записи страниц.
+
+        Args:
+            urls: URL страниц
+
+        Returns:
+            Словарь URL -> запись (только для известных страниц)
+        """
+        urls = list(urls)
+        pages = {}
+        with self._lock:
+            for start in range(0, len(urls), _BATCH):
+                batch = urls[start:start + _BATCH]
+                rows = self._conn.execute(
+                    f"SELECT * FROM pages WHERE url IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for row in rows:
+                    page = dict(row)
+                    pages[page.pop('url')] = page
+        return pages
+
+    def get_page(self, url: str) -> Optional[Dict]:
+        """Возвращает запись страницы или None."""
+        return self.get_pages([url]).get(url)
+
+    def upsert_pages(self, pages: Dict[str, Dict]):
+        """
+        Добавляет или обновляет записи страниц одной транзакцией.
+
+        Args:
+            pages: Словарь URL -> поля записи; отсутствующие поля сохраняются как NULL
+        """
+        if not pages:
+            return
+        columns = ('url', 'domain') + PAGE_FIELDS
+        updates = ', '.join(f"{column} = excluded.{column}" for column in columns[1:])
+        rows = [
+            (url, urlparse(url).netloc) + tuple(page.get(field) for field in PAGE_FIELDS)
+            for url, page in pages.items()
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO pages ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(url) DO UPDATE SET {updates}",
+                rows
+            )
+
+    def delete_pages(self, urls: Iterable[str]):
+        """Удаляет записи страниц."""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM pages WHERE url = ?", [(url,) for url in urls])
+
+    def get_domain_urls(self, domain: str) -> List[str]:
+        """Возвращает URL всех известных страниц домена."""
+        with self._lock:
+            rows = self._conn.execute("SELECT url FROM pages WHERE domain = ?", (domain,)).fetchall()
+        return [row['url'] for row in rows]
+
+    def delete_domain(self, domain: str):
+        """Удаляет записи страниц и карту сайта домена."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages WHERE domain = ?", (domain,))
+            self._conn.execute("DELETE FROM site_maps WHERE domain = ?", (domain,))
+
+    def count_pages_by_domain(self) -> Dict[str, int]:
+        """Возвращает количество известных страниц по доменам."""
+        with self._lock:
+            rows = self._conn.execute("SELECT domain, COUNT(*) AS pages FROM pages GROUP BY domain").fetchall()
+        return {row['domain']: row['pages'] for row in rows}
+
+    # --- Блоки страниц в базе знаний ---
+
+    def get_chunk_ids(self, urls: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Возвращает ID блоков базы знаний, созданных из страниц.
+
+        Args:
+            urls: URL страниц
+
+        Returns:
+            Словарь URL -> ID блоков по порядку (только для проиндексированных страниц)
+        """
+        urls = list(urls)
+        chunk_ids: Dict[str, List[str]] = {}
+        with self._lock:
+            for start in range(0, len(urls), _BATCH):
+                batch = urls[start:start + _BATCH]
+                rows = self._conn.execute(
+                    f"SELECT url, chunk_id FROM page_chunks WHERE url IN ({','.join('?' * len(batch))}) "
+                    f"ORDER BY url, position", batch
+                ).fetchall()
+                for row in rows:
+                    chunk_ids.setdefault(row['url'], []).append(row['chunk_id'])
+        return chunk_ids
+
+    def set_chunk_ids(self, chunk_ids: Dict[str, List[str]]):
+        """
+        Заменяет списки блоков страниц одной транзакцией.
+
+        Args:
+            chunk_ids: Словарь URL -> ID блоков по порядку
+        """
+        if not chunk_ids:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM page_chunks WHERE url = ?", [(url,) for url in chunk_ids])
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO page_chunks (url, chunk_id, position) VALUES (?, ?, ?)",
+                [(url, chunk_id, position) for url, ids in chunk_ids.items() for position, chunk_id in enumerate(ids)]
+            )
+
+    def delete_chunk_ids(self, urls: Iterable[str]):
+        """Удаляет списки блоков страниц."""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM page_chunks WHERE url = ?", [(url,) for url in urls])
+
+    # --- Карты сайтов ---
+
+    def get_site_map(self, domain: str) -> Optional[Dict]:
+        """Возвращает карту сайта {urls, last_scan, total_urls} или None."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM site_maps WHERE domain = ?", (domain,)).fetchone()
+        if row is None:
+            return None
+        return {'urls': json.loads(row['urls']), 'last_scan': row['last_scan'], 'total_urls': row['total_urls']}
+
+    def set_site_map(self, domain: str, urls: List[str], last_scan: str):
+        """Сохраняет карту сайта."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO site_maps (domain, urls, last_scan, total_urls) VALUES (?, ?, ?, ?)",
+                (domain, json.dumps(urls, ensure_ascii=False), last_scan, len(urls))
+            )
+
+    def get_site_map_sizes(self) -> Dict[str, int]:
+        """Возвращает количество URL в картах сайтов по доменам."""
+        with self._lock:
+            rows = self._conn.execute("SELECT domain, total_urls FROM site_maps").fetchall()
+        return {row['domain']: row['total_urls'] for row in rows}
+
+    # --- История парсинга и прочие значения ---
+
+    def get_value(self, key: str, default=None):
+        """Возвращает сохраненное значение."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row['value']) if row else default
+
+    def set_values(self, values: Dict):
+        """Сохраняет значения одной транзакцией."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value, ensure_ascii=False)) for key, value in values.items()]
+            )
+
+    def add_history_entry(self, entry: Dict):
+        """Добавляет запись в историю парсинга, оставляя последние HISTORY_LIMIT."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO scraping_history (date, time, site, pages_scraped, chunks_added) VALUES (?, ?, ?, ?, ?)",
+                (entry['date'], entry['time'], entry['site'], entry['pages_scraped'], entry['chunks_added'])
+            )
+            self._conn.execute(
+                "DELETE FROM scraping_history WHERE id NOT IN "
+                "(SELECT id FROM scraping_history ORDER BY id DESC LIMIT ?)", (HISTORY_LIMIT,)
+            )
+
+    def get_history(self) -> List[Dict]:
+        """Возвращает историю парсинга от старых записей к новым."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, time, site, pages_scraped, chunks_added FROM scraping_history ORDER BY id"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    # --- Миграция JSON-файлов ---
+
+    def _start_migration(self, path: str) -> Optional[Dict]:
+        """Возвращает содержимое JSON-файла, если он еще не импортирован."""
+        key = f"migrated:{os.path.basename(path)}"
+        if not os.path.exists(path) or self.get_value(key):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Ошибка чтения {path} для импорта: {e}")
+            return None
+
+    def migrate_pages_info(self, path: str):
+        """
+        Однократно импортирует pages_info.json инкрементального скрапера.
+
+        Args:
+            path: Путь к файлу
+        """
+        data = self._start_migration(path)
+        if data is None:
+            return
+        self.upsert_pages(data.get("pages", {}))
+        for domain, site_map in data.get("site_maps", {}).items():
+            self.set_site_map(domain, site_map.get("urls", []), site_map.get("last_scan") or "")
+        self.set_values({"last_full_scan": data.get("last_full_scan"), f"migrated:{os.path.basename(path)}": True})
+        logger.info(f"📦 Импортировано из {path}: {len(data.get('pages', {}))} страниц, "
+                    f"{len(data.get('site_maps', {}))} карт сайтов")
+
+    def migrate_scraping_info(self, path: str):
+        """
+        Однократно импортирует scraping_info.json трекера парсинга.
+
+        Args:
+            path: Путь к файлу
+        """
+        data = self._start_migration(path)
+        if data is None:
+            return
+        for entry in data.get("scraping_history", []):
+            self.add_history_entry(entry)
+        values = {key: value for key, value in data.items() if key != "scraping_history"}
+        values[f"migrated:{os.path.basename(path)}"] = True
+        self.set_values(values)
+        logger.info(f"📦 Импортирована история парсинга из {path}")
+
+
+# Глобальное хранилище
+_page_store = None
+
+
+def get_page_store() -> PageStore:
+    """Возвращает глобальное хранилище информации о страницах."""
+    global _page_store
+    if _page_store is None:
+        _page_store = PageStore(config.PAGE_STORE_PATH)
+        _page_store.migrate_pages_info(PAGES_INFO_FILE)
+        _page_store.migrate_scraping_info(SCRAPING_INFO_FILE)
+    return _page_store
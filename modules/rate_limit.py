@@ -0,0 +1,130 @@
+"""
+Модуль ограничения частоты HTTP-запросов к внешним сайтам.
+
+Вместо фиксированных пауз между запросами каждый хост получает
+ограничение на число одновременных соединений и «ведро токенов»,
+задающее среднюю частоту запросов с допустимым всплеском.
+"""
+import asyncio
+import logging
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+from urllib.parse import urlparse
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Асинхронное ведро токенов."""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Инициализирует ведро.
+
+        Args:
+            rate: Скорость пополнения, токенов в секунду
+            capacity: Вместимость ведра (максимальный всплеск запросов)
+        """
+        self.rate = max(rate, 1e-6)
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        """Пополняет ведро за прошедшее время."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def reserve(self) -> float:
+        """
+        Резервирует токен.
+
+        Если токенов нет, баланс уходит в минус: следующие вызовы ждут
+        дольше, и порядок ожидающих сохраняется без блокировок.
+
+        Returns:
+            Сколько секунд нужно подождать перед запросом
+        """
+        self._refill()
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self):
+        """Ждет, пока ведро разрешит очередной запрос."""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class HostLimiter:
+    """Ограничивает одновременные запросы и их частоту для каждого хоста."""
+
+    def __init__(self, max_concurrency: int, rate: float, burst: float):
+        """
+        Инициализирует ограничитель.
+
+        Args:
+            max_concurrency: Максимум одновременных запросов к одному хосту
+            rate: Средняя частота запросов к одному хосту, запросов в секунду
+            burst: Количество запросов, которые можно отправить без ожидания
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        # Семафоры привязаны к event loop, поэтому хранятся отдельно для каждого
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _get_semaphore(self, host: str) -> asyncio.Semaphore:
+        """Возвращает семафор хоста для текущего event loop."""
+        loop = asyncio.get_running_loop()
+        semaphores = self._semaphores.get(loop)
+        if semaphores is None:
+            semaphores = {}
+            self._semaphores[loop] = semaphores
+        semaphore = semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            semaphores[host] = semaphore
+        return semaphore
+
+    def _get_bucket(self, host: str) -> TokenBucket:
+        """Возвращает ведро токенов хоста."""
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self._buckets[host] = bucket
+        return bucket
+
+    @asynccontextmanager
+    async def limit(self, url: str) -> AsyncIterator[None]:
+        """
+        Контекст одного запроса к хосту URL.
+
+        Args:
+            url: Адрес запроса
+        """
+        host = urlparse(url).netloc.lower()
+        async with self._get_semaphore(host):
+            await self._get_bucket(host).acquire()
+            yield
+
+
+# Глобальный ограничитель запросов к внешним сайтам
+_host_limiter = None
+
+def get_host_limiter() -> HostLimiter:
+    """Возвращает глобальный ограничитель запросов с настройками из конфигурации."""
+    global _host_limiter
+    if _host_limiter is None:
+        _host_limiter = HostLimiter(
+            max_concurrency=config.DYNAMIC_SEARCH_HOST_CONCURRENCY,
+            rate=config.DYNAMIC_SEARCH_RATE,
+            burst=config.DYNAMIC_SEARCH_BURST
+        )
+    return _host_limiter
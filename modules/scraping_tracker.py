@@ -1,55 +1,20 @@
 """
 Модуль для отслеживания информации о парсинге сайтов
 """
-import json
-import os
 from datetime import datetime
 from typing import Dict, Optional
+from urllib.parse import urlparse
 import logging
 
-logger = logging.getLogger(__name__)
+from .page_store import PageStore, get_page_store
 
-# Путь к файлу с информацией о парсинге
-SCRAPING_INFO_FILE = "scraping_info.json"
+logger = logging.getLogger(__name__)
 
 class ScrapingTracker:
     """Класс для отслеживания информации о парсинге"""
     
-    def __init__(self, info_file: str = SCRAPING_INFO_FILE):
-        self.info_file = info_file
-        self.info = self._load_info()
-    
-    def _load_info(self) -> Dict:
-        """Загружает информацию о парсинге из файла"""
-        try:
-            if os.path.exists(self.info_file):
-                with open(self.info_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            else:
-                return {
-                    "last_scraping_date": None,
-                    "last_scraped_sites": [],
-                    "total_pages_scraped": 0,
-                    "total_chunks_added": 0,
-                    "scraping_history": []
-                }
-        except Exception as e:
-            logger.error(f"Ошибка загрузки информации о парсинге: {e}")
-            return {
-                "last_scraping_date": None,
-                "last_scraped_sites": [],
-                "total_pages_scraped": 0,
-                "total_chunks_added": 0,
-                "scraping_history": []
-            }
-    
-    def _save_info(self):
-        """Сохраняет информацию о парсинге в файл"""
-        try:
-            with open(self.info_file, 'w', encoding='utf-8') as f:
-                json.dump(self.info, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"Ошибка сохранения информации о парсинге: {e}")
+    def __init__(self, page_store: Optional[PageStore] = None):
+        self.page_store = page_store or get_page_store()
     
     def update_scraping_info(self, site_url: str, pages_scraped: int, chunks_added: int):
         """
@@ -65,41 +30,30 @@ class ScrapingTracker:
             current_time = datetime.now().strftime("%H:%M")
             
             # Извлекаем домен из URL
-            from urllib.parse import urlparse
             domain = urlparse(site_url).netloc
             
-            # Обновляем основную информацию
-            self.info["last_scraping_date"] = current_date
-            self.info["last_scraping_time"] = current_time
-            
             # Добавляем сайт в список, если его там нет
-            if domain not in self.info["last_scraped_sites"]:
-                self.info["last_scraped_sites"].append(domain)
+            sites = self.page_store.get_value("last_scraped_sites", [])
+            if domain not in sites:
+                sites.append(domain)
             
-            # Обновляем статистику
-            self.info["total_pages_scraped"] = self.info.get("total_pages_scraped", 0) + pages_scraped
-            self.info["total_chunks_added"] = self.info.get("total_chunks_added", 0) + chunks_added
+            # Обновляем основную информацию и статистику
+            self.page_store.set_values({
+                "last_scraping_date": current_date,
+                "last_scraping_time": current_time,
+                "last_scraped_sites": sites,
+                "total_pages_scraped": self.page_store.get_value("total_pages_scraped", 0) + pages_scraped,
+                "total_chunks_added": self.page_store.get_value("total_chunks_added", 0) + chunks_added
+            })
             
-            # Добавляем в историю
-            history_entry = {
+            # Добавляем в историю (хранятся последние 10 записей)
+            self.page_store.add_history_entry({
                 "date": current_date,
                 "time": current_time,
                 "site": domain,
                 "pages_scraped": pages_scraped,
                 "chunks_added": chunks_added
-            }
-            
-            if "scraping_history" not in self.info:
-                self.info["scraping_history"] = []
-            
-            self.info["scraping_history"].append(history_entry)
-            
-            # Оставляем только последние 10 записей в истории
-            if len(self.info["scraping_history"]) > 10:
-                self.info["scraping_history"] = self.info["scraping_history"][-10:]
-            
-            # Сохраняем
-            self._save_info()
+            })
             
             logger.info(f"Обновлена информация о парсинге: {domain} ({pages_scraped} страниц, {chunks_added} чанков)")
             
@@ -114,11 +68,11 @@ class ScrapingTracker:
             Словарь с информацией о последнем парсинге
         """
         return {
-            "date": self.info.get("last_scraping_date"),
-            "time": self.info.get("last_scraping_time"),
-            "sites": self.info.get("last_scraped_sites", []),
-            "total_pages": self.info.get("total_pages_scraped", 0),
-            "total_chunks": self.info.get("total_chunks_added", 0)
+            "date": self.page_store.get_value("last_scraping_date"),
+            "time": self.page_store.get_value("last_scraping_time"),
+            "sites": self.page_store.get_value("last_scraped_sites", []),
+            "total_pages": self.page_store.get_value("total_pages_scraped", 0),
+            "total_chunks": self.page_store.get_value("total_chunks_added", 0)
         }
     
     def get_scraping_summary(self) -> str:
@@ -0,0 +1,81 @@
+"""
+Модуль объединения одинаковых запросов, выполняющихся одновременно.
+
+Если несколько пользователей одновременно задают один и тот же вопрос,
+тяжелый этап (поиск, динамический поиск на pravo.by, запрос к OpenAI)
+выполняется один раз, а остальные запросы ждут его результата.
+"""
+import asyncio
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from modules.metrics import SINGLE_FLIGHT_JOINED
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """
+    Приводит вопрос к нормализованному виду для сравнения.
+
+    Регистр, буква «ё», пунктуация и лишние пробелы не учитываются.
+
+    Args:
+        question: Текст вопроса
+
+    Returns:
+        Нормализованный текст
+    """
+    text = question.lower().replace('ё', 'е')
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class SingleFlight:
+    """Выполняет не более одной задачи на ключ одновременно."""
+
+    def __init__(self, name: str):
+        """
+        Инициализирует группу.
+
+        Args:
+            name: Имя этапа (используется в метриках и логах)
+        """
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        """Удаляет завершенную задачу из списка выполняющихся."""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Выполняет задачу или присоединяется к уже выполняющейся с тем же ключом.
+
+        Задача выполняется отдельно от вызывающей корутины: отмена одного
+        из ожидающих не отменяет вычисление для остальных.
+
+        Args:
+            key: Ключ задачи
+            func: Функция, создающая корутину задачи
+
+        Returns:
+            Tuple[результат, получен_ли_результат_чужого_вызова]
+        """
+        task = self._calls.get(key)
+        joined = task is not None
+        if joined:
+            if SINGLE_FLIGHT_JOINED: SINGLE_FLIGHT_JOINED.labels(stage=self.name).inc()
+            logger.info(f"🔗 ОБЪЕДИНЕНИЕ: Этап '{self.name}' уже выполняется для такого же вопроса - ждем результат")
+        else:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+
+        return await asyncio.shield(task), joined
+
+    def in_flight(self) -> int:
+        """Возвращает количество выполняющихся задач."""
+        return len(self._calls)
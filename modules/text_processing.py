@@ -6,36 +6,43 @@ import fitz  # PyMuPDF
 import logging
 import os
 from pathlib import Path
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
-def extract_text_from_pdf(pdf_path: str) -> str:
+# Версия разбиения документов на блоки: при изменении split_text_into_structure
+# неизмененные файлы загружаются в базу знаний заново
+CHUNKER_VERSION = "structure:v4"
+
+# Версия извлечения текста из документов: при ее изменении (в том числе при обновлении
+# PyMuPDF) кеш извлечения (modules/extraction_cache.py) не используется для старых записей
+EXTRACTOR_VERSION = f"text:v1;pymupdf:{fitz.VersionBind}"
+
+# Максимальный размер блока при структурном разбиении
+MAX_CHUNK_SIZE = 1000
+
+# Размер окна текста, которое потоковое разбиение держит в памяти
+STRUCTURE_WINDOW_SIZE = 16 * MAX_CHUNK_SIZE
+
+def iter_pdf_pages(pdf_path: str) -> Iterator[Tuple[int, str]]:
     """
-    Извлекает весь текст из PDF-файла.
+    Постранично извлекает текст из PDF-файла.
     
     Args:
         pdf_path: Путь к PDF-файлу
         
-    Returns:
-        Извлеченный текст из всех страниц PDF
+    Yields:
+        Tuple[номер страницы (с 1), текст страницы]
         
     Raises:
         FileNotFoundError: Если файл не найден
         Exception: При ошибке чтения PDF
     """
     try:
-        doc = fitz.open(pdf_path)
-        full_text = ""
-        
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            page_text = page.get_text()  # type: ignore
-            full_text += page_text + "\n\n"
-            
-        doc.close()
-        logger.info(f"Извлечено {len(full_text)} символов из файла {pdf_path}")
-        return full_text.strip()
-        
+        with fitz.open(pdf_path) as doc:
+            for page_num, page in enumerate(doc, 1):
+                yield page_num, page.get_text()  # type: ignore
     except FileNotFoundError:
         logger.error(f"Файл не найден: {pdf_path}")
         raise
@@ -43,6 +50,24 @@ def extract_text_from_pdf(pdf_path: str) -> str:
         logger.error(f"Ошибка при чтении PDF файла {pdf_path}: {e}")
         raise
 
+def extract_text_from_pdf(pdf_path: str) -> str:
+    """
+    Извлекает весь текст из PDF-файла.
+    
+    Args:
+        pdf_path: Путь к PDF-файлу
+        
+    Returns:
+        Извлеченный текст из всех страниц PDF
+        
+    Raises:
+        FileNotFoundError: Если файл не найден
+        Exception: При ошибке чтения PDF
+    """
+    full_text = "\n\n".join(page_text for _, page_text in iter_pdf_pages(pdf_path))
+    logger.info(f"Извлечено {len(full_text)} символов из файла {pdf_path}")
+    return full_text.strip()
+
 def extract_text_from_docx(docx_path: str) -> str:
     """
     Извлекает весь текст из DOCX-файла.
@@ -159,6 +184,24 @@ def extract_text_from_document(file_path: str) -> str:
         raise ValueError(f"Неподдерживаемый формат файла: {file_extension}. "
                         f"Поддерживаемые форматы: {', '.join(supported_formats)}")
 
+def iter_document_pages(file_path: str) -> Iterator[Tuple[Optional[int], str]]:
+    """
+    Постранично извлекает текст из документа.
+    
+    PDF читается по одной странице, документы Word возвращаются
+    одной частью без номера страницы.
+    
+    Args:
+        file_path: Путь к файлу документа
+        
+    Yields:
+        Tuple[номер страницы или None, текст]
+    """
+    if Path(file_path).suffix.lower() == '.pdf':
+        yield from iter_pdf_pages(file_path)
+    else:
+        yield None, extract_text_from_document(file_path)
+
 def get_supported_extensions() -> list[str]:
     """
     Возвращает список поддерживаемых расширений файлов.
@@ -184,6 +227,9 @@ def is_supported_document(file_path: str) -> bool:
 def recursive_semantic_splitter(text: str, separators: list[str], max_chunk_size: int) -> list[str]:
     """
     Рекурсивно разделяет текст на семантические части, используя иерархию разделителей.
+    
+    Прежняя реализация разбиения, оставлена для сравнения в scripts/benchmark_chunker.py;
+    документы разбиваются однопроходным split_text_into_structure.
 
     Args:
         text (str): Исходный текст для разделения.
@@ -240,9 +286,219 @@ def recursive_semantic_splitter(text: str, separators: list[str], max_chunk_size
             
     return final_chunks
 
+# Иерархия разделителей для юридических документов
+STRUCTURE_SEPARATORS = [
+    r"Глава\s*\d+\.",           # Глава 1.
+    r"Раздел\s*\d+\.",          # Раздел 1.
+    r"Статья\s*\d+\.",          # Статья 1.
+    r"§\s*\d+\.",               # § 1.
+    r"^\s*\d+\.",               # 1. (нумерованные пункты)
+    r"^\s*\d+\.\d+\.",          # 1.1. (подпункты)
+    r"^\s*[а-яА-Я]\)\s+",       # а) (буквенные пункты)
+    r"\n\s*\n",                 # Разделитель абзацев (пустая строка)
+    r"^\s*\d+\)\s+",            # 1) (нумерованные списки)
+]
+
+# Однопроходный поиск границ структурных элементов. Уровни соответствуют индексам
+# STRUCTURE_SEPARATORS: заголовки (0-3) ищутся по первому слову, пункты (4, 6, 8) -
+# в начале строки, абзац (7) - перевод строки перед пустой строкой. Выражение без
+# групп, чтобы re мог быстро пропускать текст до первого символа совпадения.
+_STRUCTURE_PATTERN = re.compile(
+    r"Глава\s*\d+\.|Раздел\s*\d+\.|Статья\s*\d+\.|§\s*\d+\."
+    r"|\n(?:[ \t]*\d+(?:\.|\)\s)|[ \t]*[а-яА-Я]\)\s|(?=[ \t]*\n))"
+)
+_HEADING_LEVELS = {"Г": 0, "Р": 1, "С": 2, "§": 3}
+_POINT_LEVEL, _LETTER_POINT_LEVEL, _PARAGRAPH_LEVEL, _LIST_ITEM_LEVEL = 4, 6, 7, 8
+
+def find_structure_boundaries(text: str) -> List[Tuple[int, int]]:
+    """
+    Находит границы структурных элементов текста за один проход.
+    
+    Args:
+        text: Текст документа
+        
+    Returns:
+        Список (позиция начала элемента, уровень в STRUCTURE_SEPARATORS) по возрастанию позиции
+    """
+    boundaries = []
+    for match in _STRUCTURE_PATTERN.finditer(text):
+        token = match.group()
+        if token[0] != "\n":
+            boundaries.append((match.start(), _HEADING_LEVELS[token[0]]))
+        elif len(token) == 1:
+            boundaries.append((match.start(), _PARAGRAPH_LEVEL))
+        else:
+            # Пункт начинается с начала строки, после перевода строки
+            if token.endswith("."):
+                level = _POINT_LEVEL
+            elif token.rstrip()[-2].isdigit():
+                level = _LIST_ITEM_LEVEL
+            else:
+                level = _LETTER_POINT_LEVEL
+            boundaries.append((match.start() + 1, level))
+    return boundaries
+
+def _structure_spans(text: str, max_chunk_size: int,
+                     boundaries: Optional[List[Tuple[int, int]]] = None,
+                     split_short: bool = False) -> List[Tuple[int, int]]:
+    """
+    Делит текст на части не длиннее max_chunk_size по найденным границам.
+    
+    Часть, превышающая размер, делится по границам самого крупного уровня
+    внутри нее, слишком большие подчасти - по следующим уровням; часть без
+    границ режется по размеру. Соседние пункты, подпункты и абзацы одной
+    части снова объединяются, пока помещаются в max_chunk_size; статьи и
+    более крупные элементы не объединяются, чтобы блок относился к одной
+    статье. Заголовок без текста (например, главы перед ее статьями)
+    присоединяется к следующей за ним части. Каждая граница просматривается
+    не больше одного раза на уровень, поэтому время линейно по длине текста.
+    
+    Args:
+        text: Текст документа
+        max_chunk_size: Максимальный размер части
+        boundaries: Границы из find_structure_boundaries (вычисляются, если не переданы)
+        split_short: Делить по границам верхнего уровня и текст короче max_chunk_size
+        
+    Returns:
+        Список (начало, конец) частей текста
+    """
+    if boundaries is None:
+        boundaries = find_structure_boundaries(text)
+    positions = [position for position, _ in boundaries]
+    
+    def heading_level(position: int) -> Optional[int]:
+        index = bisect_left(positions, position)
+        if index < len(positions) and positions[index] == position and boundaries[index][1] < _POINT_LEVEL:
+            return boundaries[index][1]
+        return None
+    
+    def split(start: int, end: int, min_level: int, force: bool,
+              body: Optional[int] = None) -> List[Tuple[int, int]]:
+        # body - начало текста после присоединенного заголовка: границы до него не делят часть
+        if end - start <= max_chunk_size and not force:
+            return [(start, end)]
+        body = start if body is None else body
+        inner = boundaries[bisect_right(positions, body):bisect_left(positions, end)]
+        levels = [level for _, level in inner if level >= min_level]
+        if not levels:
+            if end - start <= max_chunk_size:
+                return [(start, end)]
+            return [(i, min(i + max_chunk_size, end)) for i in range(start, end, max_chunk_size)]
+        level = min(levels)
+        cuts = [start] + [position for position, boundary_level in inner if boundary_level == level] + [end]
+        # Заголовок более крупного элемента без текста остается с первой частью после него
+        head_level = heading_level(body)
+        if (len(cuts) > 2 and head_level is not None and head_level < level
+                and "\n" not in text[body:cuts[1]].strip() and cuts[1] - start < max_chunk_size):
+            body = cuts.pop(1)
+        pieces = []
+        for piece_start, piece_end in zip(cuts, cuts[1:]):
+            pieces.extend(split(piece_start, piece_end, level + 1, False,
+                                body if piece_start == start else None))
+        if level < _POINT_LEVEL:
+            return pieces
+        # Соседние пункты и абзацы объединяются до max_chunk_size
+        merged = [pieces[0]]
+        for piece_start, piece_end in pieces[1:]:
+            if piece_end - merged[-1][0] <= max_chunk_size:
+                merged[-1] = (merged[-1][0], piece_end)
+            else:
+                merged.append((piece_start, piece_end))
+        return merged
+    
+    return split(0, len(text), 0, split_short)
+
+def _top_split_level(boundaries: List[Tuple[int, int]]) -> Optional[int]:
+    """Возвращает самый крупный уровень границ, которые делят текст (не в его начале)."""
+    return min((level for position, level in boundaries if position > 0), default=None)
+
+def iter_structure_blocks(pages: Iterable[Tuple[Optional[int], str]],
+                          max_chunk_size: int = MAX_CHUNK_SIZE,
+                          window_size: int = STRUCTURE_WINDOW_SIZE) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+    """
+    Потоково разделяет текст документа на структурированные блоки.
+    
+    Страницы накапливаются в окне; когда окно превышает window_size, часть
+    до последней границы верхнего уровня структуры документа (например,
+    главы) разбивается на блоки и отдается, а остаток остается в окне.
+    Так результат совпадает с разбиением всего текста, а в памяти находится
+    окно, но не весь документ. Если граница верхнего уровня долго не
+    встречается, окно режется по границам следующих уровней.
+    
+    Args:
+        pages: Страницы документа: (номер страницы или None, текст)
+        max_chunk_size: Максимальный размер блока
+        window_size: Размер окна текста
+        
+    Yields:
+        Tuple[текст блока, первая страница блока, последняя страница блока]
+    """
+    window = ""
+    # Начала страниц в окне: (смещение, номер страницы)
+    page_starts: list = []
+    # Уровень границ, по которым документ делится на верхнем уровне
+    top_level = None
+    emitted = False
+    
+    def page_at(position: int) -> Optional[int]:
+        page = None
+        for start, page_num in page_starts:
+            if start > position:
+                break
+            page = page_num
+        return page
+    
+    def emit(end: int, boundaries: List[Tuple[int, int]]) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+        # Короткий остаток большого документа делится по верхнему уровню, как и весь текст
+        split_short = emitted and top_level is not None and end <= max_chunk_size
+        boundaries = [(position, level) for position, level in boundaries
+                      if position < end and (not split_short or level == top_level)]
+        for start, stop in _structure_spans(window[:end], max_chunk_size, boundaries, split_short):
+            block = window[start:stop]
+            stripped = block.strip()
+            if len(stripped) > 10:  # Минимальная длина блока
+                start += len(block) - len(block.lstrip())
+                yield stripped, page_at(start), page_at(start + len(stripped) - 1)
+    
+    for page_num, page_text in pages:
+        if window:
+            window += "\n\n"
+        page_starts.append((len(window), page_num))
+        window += page_text
+        
+        while len(window) > window_size:
+            boundaries = find_structure_boundaries(window)
+            level = _top_split_level(boundaries)
+            if level is not None and (top_level is None or level < top_level):
+                top_level = level
+            cut = None
+            if top_level is not None:
+                # Последняя граница верхнего уровня, отрезающая часть длиннее блока
+                cut = max((position for position, level in boundaries
+                           if level == top_level and position >= max_chunk_size), default=None)
+                # Слишком длинная часть верхнего уровня режется по границам следующих уровней
+                if cut is None and len(window) > 4 * window_size:
+                    cut = max((position for position, level in boundaries
+                               if level > top_level and position >= max_chunk_size), default=None)
+            if cut is None:
+                if len(window) <= 4 * window_size:
+                    break
+                cut = len(window)
+            yield from emit(cut, boundaries)
+            emitted = True
+            page_starts = [(0, page_at(cut))] + [(start - cut, page) for start, page in page_starts if start > cut]
+            window = window[cut:]
+    
+    boundaries = find_structure_boundaries(window)
+    level = _top_split_level(boundaries)
+    if level is not None and (top_level is None or level < top_level):
+        top_level = level
+    if window.strip():
+        yield from emit(len(window), boundaries)
+
 def split_text_into_structure(text: str) -> list[str]:
     """
-    Разделяет текст на семантические части с использованием рекурсивного алгоритма.
+    Разделяет текст на семантические части по структурным границам.
     
     Распознает следующие структурные элементы:
     - Главы: Глава 1., Глава 2.
@@ -264,33 +520,8 @@ def split_text_into_structure(text: str) -> list[str]:
     if not text or not text.strip():
         return []
     
-    # Определяем иерархию разделителей для юридических документов
-    # Используем регулярные выражения для большей гибкости
-    separators = [
-        r"Глава\s*\d+\.",           # Глава 1.
-        r"Раздел\s*\d+\.",          # Раздел 1.
-        r"Статья\s*\d+\.",          # Статья 1.
-        r"§\s*\d+\.",               # § 1.
-        r"^\s*\d+\.",               # 1. (нумерованные пункты)
-        r"^\s*\d+\.\d+\.",          # 1.1. (подпункты)
-        r"^\s*[а-яА-Я]\)\s+",       # а) (буквенные пункты)
-        r"\n\s*\n",                 # Разделитель абзацев (пустая строка)
-        r"^\s*\d+\)\s+",            # 1) (нумерованные списки)
-    ]
-    
-    # Устанавливаем максимальный размер чанка (можно настроить)
-    max_chunk_size = 1000
-    
     try:
-        chunks = recursive_semantic_splitter(text, separators, max_chunk_size)
-        
-        # Фильтруем пустые блоки и слишком короткие
-        filtered_blocks = []
-        for block in chunks:
-            clean_block = block.strip()
-            if clean_block and len(clean_block) > 10:  # Минимальная длина блока
-                filtered_blocks.append(clean_block)
-        
+        filtered_blocks = [block for block, _, _ in iter_structure_blocks([(None, text)])]
         logger.info(f"Разделено на {len(filtered_blocks)} структурированных блоков")
         return filtered_blocks
         
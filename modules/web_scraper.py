@@ -5,23 +5,109 @@
 import requests
 from bs4 import BeautifulSoup
 import re
-import time
 import logging
-from urllib.parse import urljoin, urlparse
-from typing import List, Dict, Set, Optional
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit, parse_qsl, urlencode
+from typing import List, Dict, Set, Optional, Tuple
 import asyncio
 import aiohttp
 from concurrent.futures import ThreadPoolExecutor
 import json
 import os
+import hashlib
+from datetime import datetime
 
 from .text_processing import TextProcessor
 from .knowledge_base import KnowledgeBase
 from .legal_content_filter import create_legal_content_filter
+from .citations import detect_act, annotate_chunks
+from .http_cache import CachedResponse, get_http_cache
+from .executors import run_cpu
+from .rate_limit import get_host_limiter
+from .crawler import CrawlResult, create_crawler
+from .page_store import get_page_store
+from .html_extract import ExtractedHtml, get_html_extractor
 from modules.metrics import SCRAPING_ERRORS
 
 logger = logging.getLogger(__name__)
 
+# Версия разбора страниц: при изменении parse_page старые результаты в HTTP-кеше не используются
+PAGE_PARSER = "page:v2"
+PAGE_LINKS_PARSER = "page_links:v2"
+
+# Ключевые слова для юридических страниц (РБ + РФ)
+LEGAL_KEYWORDS = [
+    # Общие правовые термины
+    'закон', 'кодекс', 'постановление', 'указ', 'приказ',
+    'регламент', 'положение', 'инструкция', 'методика',
+    'право', 'юридический', 'правовой', 'законодательство',
+    'суд', 'адвокат', 'нотариус', 'договор', 'иск',
+    'заявление', 'жалоба', 'апелляция', 'кассация',
+
+    # Специфика для Беларуси
+    'республика беларусь', 'беларусь', 'белорусский',
+    'совет министров', 'национальное собрание', 'парламент',
+    'конституционный суд', 'верховный суд', 'хозяйственный суд',
+    'прокуратура', 'министерство юстиции', 'нотариат',
+    'исполнительный комитет', 'облисполком', 'горисполком',
+    'трудовой кодекс', 'гражданский кодекс', 'уголовный кодекс',
+    'административный кодекс', 'процессуальный кодекс',
+    'декрет', 'распоряжение', 'решение', 'определение'
+]
+
+# Стандартные порты, которые не входят в канонический URL
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonical_url(url: str) -> str:
+    """
+    Приводит URL страницы к каноническому виду
+    
+    Схема и домен приводятся к нижнему регистру, удаляются стандартный порт,
+    фрагмент и метки utm_*, параметры запроса сортируются.
+    
+    Args:
+        url: URL страницы
+        
+    Returns:
+        Канонический URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{parts.port}"
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_')
+    ))
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+
+def make_chunk_ids(url: str, chunks: List[str]) -> List[str]:
+    """
+    Вычисляет ID блоков страницы по хэшам канонического URL и текста блока
+    
+    ID не зависят от процесса и времени парсинга: неизмененный блок сохраняет
+    свой ID при повторном парсинге страницы, повторяющиеся на странице блоки
+    различаются номером повтора.
+    
+    Args:
+        url: URL страницы
+        chunks: Тексты блоков страницы
+        
+    Returns:
+        Список ID блоков
+    """
+    url_hash = hashlib.sha1(canonical_url(url).encode('utf-8')).hexdigest()[:16]
+    occurrences: Dict[str, int] = {}
+    ids = []
+    for chunk in chunks:
+        chunk_hash = hashlib.sha1(chunk.encode('utf-8')).hexdigest()[:16]
+        occurrence = occurrences.get(chunk_hash, 0)
+        occurrences[chunk_hash] = occurrence + 1
+        ids.append(f"web_{url_hash}_{chunk_hash}" + (f"_{occurrence}" if occurrence else ""))
+    return ids
+
 
 class WebScraper:
     """Класс для скрапинга юридических сайтов"""
@@ -36,7 +122,12 @@ class WebScraper:
         })
         self.visited_urls: Set[str] = set()
         self.max_pages = 50  # Максимальное количество страниц для скрапинга
-        self.delay = 1  # Задержка между запросами в секундах
+        self.delay = 1  # Устарело: частоту запросов к хосту задает host_limiter
+        self.http_cache = get_http_cache()
+        self.host_limiter = get_host_limiter()
+        self.html_extractor = get_html_extractor()
+        # Манифест URL -> ID блоков в базе знаний
+        self.page_store = get_page_store()
         
     def scrape_single_page(self, url: str) -> Optional[Dict]:
         """
@@ -51,57 +142,94 @@ class WebScraper:
         try:
             logger.info(f"Скрапинг страницы: {url}")
             
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Удаляем ненужные элементы
-            for element in soup(['script', 'style', 'nav', 'header', 'footer', 'aside']):
-                element.decompose()
-            
-            # Извлекаем заголовок
-            title = soup.find('title')
-            title_text = title.get_text().strip() if title else "Без заголовка"
-            
-            # Извлекаем основной контент
-            content = ""
+            response = self.fetch_page(url)
+            return self.parse_cached_page(response)
             
-            # Ищем основной контент в различных тегах
-            main_content_selectors = [
-                'main', 'article', '.content', '.main-content', 
-                '.post-content', '.entry-content', '#content', '#main'
-            ]
-            
-            for selector in main_content_selectors:
-                content_elem = soup.select_one(selector)
-                if content_elem:
-                    content = content_elem.get_text(separator=' ', strip=True)
-                    break
-            
-            # Если не нашли основной контент, берем весь body
-            if not content:
-                body = soup.find('body')
-                if body:
-                    content = body.get_text(separator=' ', strip=True)
+        except Exception as e:
+            if SCRAPING_ERRORS: SCRAPING_ERRORS.inc()
+            logger.error(f"Ошибка при скрапинге {url}: {e}")
+            return None
+    
+    def fetch_page(self, url: str, timeout: float = 10) -> CachedResponse:
+        """
+        Загружает страницу через HTTP-кеш (или напрямую, если кеш отключен)
+        
+        Args:
+            url: URL страницы
+            timeout: Таймаут запроса в секундах
             
-            # Очищаем текст
-            content = self._clean_text(content)
+        Returns:
+            Ответ с телом страницы
+        """
+        if self.http_cache is not None:
+            return self.http_cache.get(self.session, url, timeout=timeout)
+        response = self.session.get(url, timeout=timeout)
+        response.raise_for_status()
+        return CachedResponse(url=url, content=response.content, headers=dict(response.headers))
+    
+    def parse_cached_page(self, response: CachedResponse) -> Optional[Dict]:
+        """
+        Разбирает страницу, используя сохраненный результат, если тело не изменилось
+        
+        Args:
+            response: Ответ, полученный через fetch_page
             
-            if len(content) < 100:  # Слишком короткий контент
-                return None
+        Returns:
+            Словарь с данными страницы или None
+        """
+        if self.http_cache is None:
+            return self.parse_page(response.url, response.content)
+        return self.http_cache.cached_parse(
+            response, PAGE_PARSER, lambda: self.parse_page(response.url, response.content)
+        )
+    
+    def parse_page(self, url: str, html) -> Optional[Dict]:
+        """
+        Извлекает заголовок и основной текст из HTML страницы
+        
+        Args:
+            url: URL страницы
+            html: HTML страницы (строка или байты)
             
-            return {
-                'url': url,
-                'title': title_text,
-                'content': content,
-                'domain': urlparse(url).netloc
-            }
+        Returns:
+            Словарь с данными страницы или None, если контента слишком мало
+        """
+        return self._build_page(url, self.html_extractor.extract(html))
+    
+    def parse_page_with_links(self, url: str, html) -> Dict:
+        """
+        Разбирает HTML один раз и извлекает из одного дерева и контент, и ссылки
+        
+        Args:
+            url: URL страницы
+            html: HTML страницы (строка или байты)
             
-        except Exception as e:
-            if SCRAPING_ERRORS: SCRAPING_ERRORS.inc()
-            logger.error(f"Ошибка при скрапинге {url}: {e}")
+        Returns:
+            Словарь {'page': данные страницы или None, 'links': список URL}
+        """
+        extracted = self.html_extractor.extract(html, with_links=True)
+        return {'page': self._build_page(url, extracted), 'links': self._filter_legal_links(extracted.links, url)}
+    
+    def _parse_cached_page_with_links(self, response: CachedResponse) -> Dict:
+        """Разбирает страницу со ссылками, используя сохраненный результат, если тело не изменилось"""
+        parse = lambda: self.parse_page_with_links(response.url, response.content)
+        if self.http_cache is None:
+            return parse()
+        return self.http_cache.cached_parse(response, PAGE_LINKS_PARSER, parse)
+    
+    def _build_page(self, url: str, extracted: ExtractedHtml) -> Optional[Dict]:
+        """Формирует данные страницы из извлеченного заголовка и текста"""
+        content = self._clean_text(extracted.text)
+        
+        if len(content) < 100:  # Слишком короткий контент
             return None
+        
+        return {
+            'url': url,
+            'title': extracted.title or "Без заголовка",
+            'content': content,
+            'domain': urlparse(url).netloc
+        }
     
     def _clean_text(self, text: str) -> str:
         """
@@ -132,35 +260,28 @@ class WebScraper:
             soup: BeautifulSoup объект страницы
             base_url: Базовый URL
             
+        Returns:
+            Список URL для дальнейшего скрапинга
+        """
+        anchors = ((link.get('href'), link.get_text()) for link in soup.find_all('a', href=True))
+        return self._filter_legal_links(anchors, base_url)
+    
+    def _filter_legal_links(self, anchors, base_url: str) -> List[str]:
+        """
+        Отбирает ссылки на юридические страницы того же домена
+        
+        Args:
+            anchors: Пары (href, текст ссылки)
+            base_url: Базовый URL
+            
         Returns:
             Список URL для дальнейшего скрапинга
         """
         links = []
         domain = urlparse(base_url).netloc
         
-        # Ключевые слова для юридических страниц (РБ + РФ)
-        legal_keywords = [
-            # Общие правовые термины
-            'закон', 'кодекс', 'постановление', 'указ', 'приказ',
-            'регламент', 'положение', 'инструкция', 'методика',
-            'право', 'юридический', 'правовой', 'законодательство',
-            'суд', 'адвокат', 'нотариус', 'договор', 'иск',
-            'заявление', 'жалоба', 'апелляция', 'кассация',
-            
-            # Специфика для Беларуси
-            'республика беларусь', 'беларусь', 'белорусский',
-            'совет министров', 'национальное собрание', 'парламент',
-            'конституционный суд', 'верховный суд', 'хозяйственный суд',
-            'прокуратура', 'министерство юстиции', 'нотариат',
-            'исполнительный комитет', 'облисполком', 'горисполком',
-            'трудовой кодекс', 'гражданский кодекс', 'уголовный кодекс',
-            'административный кодекс', 'процессуальный кодекс',
-            'декрет', 'распоряжение', 'решение', 'определение'
-        ]
-        
-        for link in soup.find_all('a', href=True):
-            href = link.get('href')
-            link_text = link.get_text().lower()
+        for href, link_text in anchors:
+            link_text = link_text.lower()
             
             # Проверяем, что ссылка ведет на тот же домен
             full_url = urljoin(base_url, href)
@@ -168,170 +289,138 @@ class WebScraper:
                 continue
             
             # Проверяем ключевые слова в тексте ссылки
-            if any(keyword in link_text for keyword in legal_keywords):
+            if any(keyword in link_text for keyword in LEGAL_KEYWORDS):
                 links.append(full_url)
             
             # Проверяем ключевые слова в URL
-            if any(keyword in href.lower() for keyword in legal_keywords):
+            if any(keyword in href.lower() for keyword in LEGAL_KEYWORDS):
                 links.append(full_url)
         
         return list(set(links))  # Убираем дубликаты
     
-    def scrape_website(self, start_url: str, max_pages: int = None) -> List[Dict]:
+    def create_session(self) -> aiohttp.ClientSession:
+        """
+        Создает асинхронную HTTP-сессию с заголовками скрапера
+        
+        Returns:
+            Сессия aiohttp
+        """
+        return aiohttp.ClientSession(
+            headers={'User-Agent': self.session.headers.get('User-Agent', '')},
+            timeout=aiohttp.ClientTimeout(total=10)
+        )
+    
+    async def _download_async(self, session: aiohttp.ClientSession, url: str,
+                              max_age: Optional[float] = None) -> CachedResponse:
+        """
+        Загружает страницу через HTTP-кеш с учетом ограничений частоты запросов к хосту
+        
+        Args:
+            session: HTTP-сессия
+            url: URL страницы
+            max_age: Максимальный возраст записи кеша без перепроверки (по умолчанию HTTP_CACHE_TTL)
+        """
+        if self.http_cache is not None:
+            return await self.http_cache.get_async(session, url, self.host_limiter, max_age=max_age)
+        async with self.host_limiter.limit(url):
+            async with session.get(url) as response:
+                response.raise_for_status()
+                return CachedResponse(url=url, content=await response.read(), headers=dict(response.headers))
+    
+    async def fetch_page_with_links_async(self, session: aiohttp.ClientSession, url: str) -> Tuple[Optional[Dict], List[str]]:
+        """
+        Загружает и разбирает страницу один раз для контента и ссылок
+        
+        Args:
+            session: HTTP-сессия
+            url: URL страницы
+            
+        Returns:
+            Tuple[данные страницы (с заголовками ответа в http_headers) или None, список URL]
+        """
+        logger.info(f"Скрапинг страницы: {url}")
+        response = await self._download_async(session, url)
+        result = await run_cpu(self._parse_cached_page_with_links, response)
+        page = result['page']
+        if page is not None:
+            # Заголовки ETag/Last-Modified нужны инкрементальному скраперу для условных запросов
+            page = {**page, 'http_headers': dict(response.headers)}
+        return page, result['links']
+    
+    async def crawl_async(self, start_urls: List[str], max_pages: int, max_depth: Optional[int] = None,
+                          discover_only: bool = False, workers: Optional[int] = None) -> List[CrawlResult]:
+        """
+        Обходит сайт общим движком обхода
+        
+        Args:
+            start_urls: Стартовые URL
+            max_pages: Максимальное количество страниц
+            max_depth: Глубина переходов по ссылкам (0 - только стартовые URL,
+                       None - из конфигурации)
+            discover_only: Учитывать все загруженные страницы, а не только
+                           страницы с достаточным количеством контента
+            workers: Количество одновременно загружаемых страниц (None - из конфигурации)
+            
+        Returns:
+            Результаты обхода; в data - данные страницы (или URL при discover_only)
+        """
+        async with self.create_session() as session:
+            async def fetch(url: str):
+                page_data, links = await self.fetch_page_with_links_async(session, url)
+                return (url if discover_only else page_data), links
+            
+            crawler = create_crawler(fetch, max_pages=max_pages, max_depth=max_depth, workers=workers)
+            return await crawler.crawl(start_urls)
+    
+    def crawl(self, start_urls: List[str], max_pages: int, max_depth: Optional[int] = None,
+              discover_only: bool = False, workers: Optional[int] = None) -> List[CrawlResult]:
+        """Синхронная обертка над crawl_async (вызывается из потоков и скриптов)"""
+        return asyncio.run(self.crawl_async(start_urls, max_pages, max_depth, discover_only, workers))
+    
+    def scrape_website(self, start_url: str, max_pages: int = None, max_depth: Optional[int] = None,
+                       workers: Optional[int] = None) -> List[Dict]:
         """
         Скрапинг всего сайта начиная с указанного URL
         
         Args:
             start_url: Начальный URL для скрапинга
             max_pages: Максимальное количество страниц
+            max_depth: Глубина переходов по ссылкам (None - из конфигурации)
+            workers: Количество одновременно загружаемых страниц (None - из конфигурации)
             
         Returns:
             Список словарей с данными страниц
         """
-        if max_pages is None:
-            max_pages = self.max_pages
-            
-        pages_data = []
-        urls_to_visit = [start_url]
-        self.visited_urls.clear()
-        
-        page_count = 0
-        
-        try:
-            while urls_to_visit and page_count < max_pages:
-                current_url = urls_to_visit.pop(0)
-                
-                if current_url in self.visited_urls:
-                    continue
-                
-                self.visited_urls.add(current_url)
-                
-                # Скрапим текущую страницу
-                page_data = self.scrape_single_page(current_url)
-                
-                if page_data:
-                    pages_data.append(page_data)
-                    page_count += 1
-                    
-                    # Получаем новые ссылки для посещения
-                    try:
-                        response = self.session.get(current_url, timeout=10)
-                        soup = BeautifulSoup(response.content, 'html.parser')
-                        new_links = self.get_legal_links(soup, current_url)
-                        
-                        # Добавляем новые ссылки в очередь
-                        for link in new_links:
-                            if link not in self.visited_urls and link not in urls_to_visit:
-                                urls_to_visit.append(link)
-                                
-                    except Exception as e:
-                        logger.error(f"Ошибка при получении ссылок с {current_url}: {e}")
-                
-                # Задержка между запросами
-                time.sleep(self.delay)
-        except Exception as e:
-            if SCRAPING_ERRORS: SCRAPING_ERRORS.inc()
-            logger.error(f"Ошибка при скрапинге сайта {start_url}: {e}")
-        
-        logger.info(f"Скрапинг завершен. Обработано страниц: {len(pages_data)}")
-        return pages_data
+        return asyncio.run(self.scrape_website_async(start_url, max_pages, max_depth, workers))
     
-    async def scrape_website_async(self, start_url: str, max_pages: int = None) -> List[Dict]:
+    async def scrape_website_async(self, start_url: str, max_pages: int = None, max_depth: Optional[int] = None,
+                                   workers: Optional[int] = None) -> List[Dict]:
         """
         Асинхронный скрапинг сайта
         
         Args:
             start_url: Начальный URL для скрапинга
             max_pages: Максимальное количество страниц
+            max_depth: Глубина переходов по ссылкам (None - из конфигурации)
+            workers: Количество одновременно загружаемых страниц (None - из конфигурации)
             
         Returns:
             Список словарей с данными страниц
         """
         if max_pages is None:
             max_pages = self.max_pages
-            
-        pages_data = []
-        urls_to_visit = [start_url]
-        self.visited_urls.clear()
         
-        async with aiohttp.ClientSession() as session:
-            page_count = 0
-            
-            while urls_to_visit and page_count < max_pages:
-                current_url = urls_to_visit.pop(0)
-                
-                if current_url in self.visited_urls:
-                    continue
-                    
-                self.visited_urls.add(current_url)
-                
-                # Асинхронный скрапинг страницы
-                page_data = await self._scrape_page_async(session, current_url)
-                
-                if page_data:
-                    pages_data.append(page_data)
-                    page_count += 1
-                    
-                    # Получаем новые ссылки
-                    new_links = await self._get_links_async(session, current_url)
-                    
-                    for link in new_links:
-                        if link not in self.visited_urls and link not in urls_to_visit:
-                            urls_to_visit.append(link)
-                
-                await asyncio.sleep(self.delay)
-        
-        logger.info(f"Асинхронный скрапинг завершен. Обработано страниц: {len(pages_data)}")
-        return pages_data
-    
-    async def _scrape_page_async(self, session: aiohttp.ClientSession, url: str) -> Optional[Dict]:
-        """Асинхронный скрапинг одной страницы"""
-        try:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    return None
-                    
-                content = await response.text()
-                soup = BeautifulSoup(content, 'html.parser')
-                
-                # Удаляем ненужные элементы
-                for element in soup(['script', 'style', 'nav', 'header', 'footer', 'aside']):
-                    element.decompose()
-                
-                title = soup.find('title')
-                title_text = title.get_text().strip() if title else "Без заголовка"
-                
-                content_text = soup.get_text(separator=' ', strip=True)
-                content_text = self._clean_text(content_text)
-                
-                if len(content_text) < 100:
-                    return None
-                
-                return {
-                    'url': url,
-                    'title': title_text,
-                    'content': content_text,
-                    'domain': urlparse(url).netloc
-                }
-                
-        except Exception as e:
-            logger.error(f"Ошибка при асинхронном скрапинге {url}: {e}")
-            return None
-    
-    async def _get_links_async(self, session: aiohttp.ClientSession, url: str) -> List[str]:
-        """Асинхронное получение ссылок со страницы"""
+        pages_data = []
         try:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    return []
-                    
-                content = await response.text()
-                soup = BeautifulSoup(content, 'html.parser')
-                return self.get_legal_links(soup, url)
-                
+            results = await self.crawl_async([start_url], max_pages, max_depth, workers=workers)
+            pages_data = [result.data for result in results]
+            self.visited_urls = {result.url for result in results}
         except Exception as e:
-            logger.error(f"Ошибка при получении ссылок с {url}: {e}")
-            return []
+            if SCRAPING_ERRORS: SCRAPING_ERRORS.inc()
+            logger.error(f"Ошибка при скрапинге сайта {start_url}: {e}")
+        
+        logger.info(f"Скрапинг завершен. Обработано страниц: {len(pages_data)}")
+        return pages_data
     
     def add_to_knowledge_base(self, pages_data: List[Dict]) -> int:
         """
@@ -356,25 +445,67 @@ class WebScraper:
         
         logger.info(f"✅ WEB_SCRAPER: {len(filtered_pages)} из {len(pages_data)} страниц прошли фильтр")
         
-        added_count = 0
+        return self.index_pages(filtered_pages)['added']
+    
+    def _get_indexed_chunk_ids(self, page_urls: Dict[str, str]) -> Dict[str, List[str]]:
+        """
+        Возвращает ID блоков страниц из манифеста, а для страниц вне манифеста - по метаданным url
+        
+        Args:
+            page_urls: Словарь канонический URL -> URL страницы
+        """
+        chunk_ids = self.page_store.get_chunk_ids(list(page_urls))
+        for key, url in page_urls.items():
+            if key not in chunk_ids:
+                # Блоки, добавленные до появления манифеста (со случайными ID)
+                try:
+                    chunk_ids[key] = self.knowledge_base.get_ids_where(url=url)
+                except Exception as e:
+                    logger.error(f"Ошибка поиска блоков страницы {url}: {e}")
+                    chunk_ids[key] = []
+        return chunk_ids
+    
+    def index_pages(self, pages_data: List[Dict]) -> Dict[str, int]:
+        """
+        Синхронизирует блоки страниц в базе знаний с их текущим содержимым
         
-        for page_data in filtered_pages:
+        Эмбеддинги вычисляются только для новых и измененных блоков,
+        у неизмененных блоков обновляются метаданные, блоки, исчезнувшие
+        со страницы, удаляются после подтверждения записи всех ее новых блоков.
+        
+        Args:
+            pages_data: Список словарей с данными страниц (уже отфильтрованных)
+            
+        Returns:
+            Словарь: pages - страниц, chunks - блоков на страницах,
+            added - добавлено блоков, updated - обновлено блоков, deleted - удалено блоков
+        """
+        doc_ids = []
+        chunk_texts = []
+        chunk_metadatas = []
+        page_chunk_ids: Dict[str, List[str]] = {}
+        page_urls: Dict[str, str] = {}
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        for page_data in pages_data:
             try:
                 # Разбиваем контент на чанки
                 chunks = self.text_processor.split_text(page_data['content'])
+                # Ссылки «кодекс + статья» для прямого поиска по номеру статьи
+                act = detect_act(page_data['title']) or detect_act(page_data['content'][:3000])
+                citations = annotate_chunks(chunks, act)
+                page_key = canonical_url(page_data['url'])
+                if page_key in page_chunk_ids:
+                    # Та же страница под другим адресом
+                    continue
+                chunk_ids = make_chunk_ids(page_key, chunks)
                 
-                for i, chunk in enumerate(chunks):
-                    # Создаем уникальный ID для чанка из динамического поиска
-                    # Добавляем префикс "dynamic_" и timestamp для уникальности
-                    from datetime import datetime
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    url_hash = hash(page_data['url']) % 1000000  # Получаем короткий хеш
-                    doc_id = f"dynamic_{timestamp}_{url_hash}_chunk_{i:03d}"
-                    
+                for i, (doc_id, chunk) in enumerate(zip(chunk_ids, chunks)):
                     # Создаем метаданные для чанка
                     metadata = {
                         'source': 'web_scraper',
                         'url': page_data['url'],
+                        'canonical_url': page_key,
                         'title': page_data['title'],
                         'domain': page_data['domain'],
                         'chunk_index': i,
@@ -384,29 +515,85 @@ class WebScraper:
                         'scraped_at': timestamp,
                         'legal_score': page_data.get('legal_score', 0.0),
                         'legal_explanation': page_data.get('legal_explanation', ''),
-                        'filtered_at': page_data.get('filtered_at', '')
+                        'filtered_at': page_data.get('filtered_at', ''),
+                        'question_context_id': page_data.get('question_context_id', ''),
+                        **citations[i]
                     }
                     
-                    # Добавляем в базу знаний с правильным порядком параметров
-                    if self.knowledge_base.add_document(doc_id, chunk, metadata):
-                        added_count += 1
-                        logger.debug(f"Добавлен динамический чанк {doc_id} из {page_data['url']}")
-                    else:
-                        logger.warning(f"Не удалось добавить динамический чанк {doc_id}")
+                    doc_ids.append(doc_id)
+                    chunk_texts.append(chunk)
+                    chunk_metadatas.append(metadata)
+                
+                page_chunk_ids[page_key] = chunk_ids
+                page_urls[page_key] = page_data['url']
                     
             except Exception as e:
-                logger.error(f"Ошибка при добавлении страницы {page_data['url']}: {e}")
+                logger.error(f"Ошибка при подготовке страницы {page_data['url']}: {e}")
         
-        logger.info(f"💾 WEB_SCRAPER: Добавлено в базу знаний: {added_count} чанков из {len(filtered_pages)} отфильтрованных страниц")
-        return added_count
+        previous_ids = self._get_indexed_chunk_ids(page_urls)
+        
+        # Для уже существующих блоков обновляются только метаданные, без вычисления эмбеддингов
+        upserted = self.knowledge_base.upsert_documents(doc_ids, chunk_texts, chunk_metadatas) \
+            if doc_ids else {'added': 0, 'updated': 0}
+        
+        # Старые блоки страницы удаляем, только если все ее новые блоки записаны
+        written_ids = self.knowledge_base.get_existing_ids(doc_ids)
+        confirmed_chunk_ids = {
+            page_key: chunk_ids for page_key, chunk_ids in page_chunk_ids.items()
+            if all(doc_id in written_ids for doc_id in chunk_ids)
+        }
+        if len(confirmed_chunk_ids) < len(page_chunk_ids):
+            logger.warning(f"⚠️ WEB_SCRAPER: {len(page_chunk_ids) - len(confirmed_chunk_ids)} страниц записаны "
+                           f"не полностью, их прежние блоки сохранены")
+        
+        # Удаляем блоки, которых больше нет на страницах
+        vanished_ids = []
+        for page_key, chunk_ids in confirmed_chunk_ids.items():
+            current = set(chunk_ids)
+            vanished_ids.extend(doc_id for doc_id in previous_ids.get(page_key, []) if doc_id not in current)
+        deleted_count = self.knowledge_base.delete_documents(vanished_ids) if vanished_ids else 0
+        self.page_store.set_chunk_ids(confirmed_chunk_ids)
+        
+        logger.info(f"💾 WEB_SCRAPER: {len(page_chunk_ids)} страниц, {len(doc_ids)} чанков: "
+                    f"добавлено {upserted['added']}, обновлено {upserted['updated']}, удалено {deleted_count}")
+        return {'pages': len(page_chunk_ids), 'chunks': len(doc_ids), 'added': upserted['added'],
+                'updated': upserted['updated'], 'deleted': deleted_count}
+    
+    def remove_pages(self, urls: List[str]) -> List[str]:
+        """
+        Удаляет из базы знаний блоки страниц, исчезнувших с сайта
+        
+        Блоки удаляются из коллекции, BM25 и индекса ссылок на статьи,
+        затем из манифеста блоков страниц.
+        
+        Args:
+            urls: URL удаленных страниц
+            
+        Returns:
+            URL страниц, блоков которых больше нет в базе знаний
+        """
+        page_urls = {canonical_url(url): url for url in urls}
+        chunk_ids = self._get_indexed_chunk_ids(page_urls)
+        doc_ids = list(dict.fromkeys(doc_id for ids in chunk_ids.values() for doc_id in ids))
+        if doc_ids and self.knowledge_base.delete_documents(doc_ids) < len(doc_ids):
+            # Манифест сохраняется, чтобы повторить удаление при следующей проверке
+            logger.error(f"❌ WEB_SCRAPER: не удалось удалить блоки {len(page_urls)} удаленных страниц")
+            return []
+        self.page_store.delete_chunk_ids(list(page_urls))
+        if doc_ids:
+            logger.info(f"🗑️ WEB_SCRAPER: удалено {len(doc_ids)} блоков {len(page_urls)} исчезнувших страниц")
+        return list(urls)
     
-    def scrape_and_add(self, start_url: str, max_pages: int = None) -> Dict:
+    def scrape_and_add(self, start_url: str, max_pages: int = None, max_depth: Optional[int] = None,
+                       workers: Optional[int] = None) -> Dict:
         """
         Скрапинг сайта и добавление в базу знаний
         
         Args:
             start_url: Начальный URL для скрапинга
             max_pages: Максимальное количество страниц
+            max_depth: Глубина переходов по ссылкам (None - из конфигурации)
+            workers: Количество одновременно загружаемых страниц (None - из конфигурации)
             
         Returns:
             Словарь с результатами операции
@@ -414,7 +601,7 @@ class WebScraper:
         logger.info(f"Начинаем скрапинг сайта: {start_url}")
         
         # Скрапим сайт
-        pages_data = self.scrape_website(start_url, max_pages)
+        pages_data = self.scrape_website(start_url, max_pages, max_depth, workers)
         
         if not pages_data:
             return {
@@ -450,10 +637,11 @@ def create_scraper_from_config() -> WebScraper:
     Returns:
         Экземпляр WebScraper
     """
-    from .knowledge_base import KnowledgeBase
+    from .knowledge_base import get_knowledge_base
     from .text_processing import TextProcessor
     
-    knowledge_base = KnowledgeBase()
+    # Общий экземпляр базы знаний: у него общий кеш эмбеддингов и счетчик документов
+    knowledge_base = get_knowledge_base()
     text_processor = TextProcessor()
     
     return WebScraper(knowledge_base, text_processor)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Скрипт для сравнения скорости структурного разбиения документов на блоки.
+
+Сравнивает однопроходное разбиение split_text_into_structure с прежним
+recursive_semantic_splitter на тексте кодексов: скорость, количество блоков
+и долю блоков, нарезанных по размеру без учета структуры. Текст документов
+берется из кеша извлечения, поэтому повторные запуски не разбирают PDF заново.
+"""
+
+import sys
+import time
+import random
+import logging
+import argparse
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules.text_processing import (
+    MAX_CHUNK_SIZE, STRUCTURE_SEPARATORS, recursive_semantic_splitter, split_text_into_structure
+)
+from modules.extraction_cache import iter_cached_document_pages
+
+
+def make_code(articles: int, seed: int = 0) -> str:
+    """
+    Создает текст кодекса из глав, статей и нумерованных пунктов
+
+    Args:
+        articles: Количество статей
+        seed: Начальное значение генератора случайных чисел
+
+    Returns:
+        Текст кодекса
+    """
+    rng = random.Random(seed)
+    words = ["трудовой", "договор", "наниматель", "работник", "заключается", "в", "письменной", "форме",
+             "если", "иное", "не", "предусмотрено", "настоящим", "Кодексом"]
+    parts = []
+    for article in range(1, articles + 1):
+        if article % 25 == 1:
+            parts.append(f"Глава {article // 25 + 1}. ОБЩИЕ ПОЛОЖЕНИЯ")
+        parts.append(f"Статья {article}. {' '.join(rng.choices(words, k=8))}")
+        for point in range(1, rng.randint(1, 8)):
+            parts.append(f"{point}. {' '.join(rng.choices(words, k=rng.randint(10, 120)))}")
+            if rng.random() < 0.3:
+                parts.extend(f"{letter}) {' '.join(rng.choices(words, k=15))}" for letter in "абв")
+    return "\n".join(parts)
+
+
+def measure(split, text: str, repeat: int):
+    """Возвращает время одного разбиения и полученные блоки"""
+    blocks = split(text)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        split(text)
+    return (time.perf_counter() - start) / repeat, blocks
+
+
+def benchmark(texts: dict, repeat: int):
+    """
+    Сравнивает разбиения на каждом тексте
+
+    Args:
+        texts: Словарь название -> текст
+        repeat: Количество повторов разбиения
+    """
+    splitters = {
+        "recursive": lambda text: [block.strip() for block in
+                                   recursive_semantic_splitter(text, STRUCTURE_SEPARATORS, MAX_CHUNK_SIZE)
+                                   if len(block.strip()) > 10],
+        "single-pass": split_text_into_structure,
+    }
+    print(f"{'документ':<24}{'разбиение':<14}{'МБ/с':>10}{'блоков':>9}{'по размеру':>12}{'ускорение':>12}")
+    for name, text in texts.items():
+        baseline = None
+        megabytes = len(text.encode('utf-8')) / 1024 / 1024
+        for splitter_name, split in splitters.items():
+            elapsed, blocks = measure(split, text, repeat)
+            baseline = baseline or elapsed
+            # Блоки ровно максимального размера получены нарезкой по размеру
+            sliced = sum(len(block) == MAX_CHUNK_SIZE for block in blocks)
+            print(f"{name[:23]:<24}{splitter_name:<14}{megabytes / elapsed:>10.2f}{len(blocks):>9}"
+                  f"{sliced:>12}{baseline / elapsed:>11.1f}x")
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description='Сравнение скорости структурного разбиения документов')
+    parser.add_argument('files', nargs='*', type=Path, help='Документы PDF/DOCX (по умолчанию - синтетические кодексы)')
+    parser.add_argument('--articles', type=int, nargs='+', default=[500, 2000],
+                        help='Количество статей в синтетических кодексах')
+    parser.add_argument('--repeat', type=int, default=3, help='Количество повторов разбиения')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.files:
+        texts = {path.name: "\n\n".join(page_text for _, page_text in iter_cached_document_pages(str(path))).strip()
+                 for path in args.files}
+    else:
+        texts = {f"кодекс, {articles} статей": make_code(articles) for articles in args.articles}
+    benchmark(texts, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
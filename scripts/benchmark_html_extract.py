@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Скрипт для сравнения скорости движков разбора HTML на сохраненных страницах.
+
+Для каждого установленного движка (selectolax, lxml, bs4) измеряет скорость
+извлечения заголовка, текста и ссылок и проверяет, что извлеченный текст
+совпадает с результатом BeautifulSoup.
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import requests
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules.html_extract import get_available_extractors, get_html_extractor
+
+DEFAULT_FIXTURES = Path(__file__).parent.parent / "tests" / "fixtures" / "html"
+
+
+def download_fixtures(urls: list, fixtures_dir: Path):
+    """
+    Сохраняет страницы для последующих замеров
+
+    Args:
+        urls: URL страниц
+        fixtures_dir: Папка для сохранения
+    """
+    fixtures_dir.mkdir(parents=True, exist_ok=True)
+    session = requests.Session()
+    session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    for i, url in enumerate(urls, 1):
+        response = session.get(url, timeout=30)
+        response.raise_for_status()
+        path = fixtures_dir / f"downloaded_{i}.html"
+        path.write_bytes(response.content)
+        print(f"💾 {url} -> {path} ({len(response.content) / 1024:.0f} КБ)")
+
+
+def benchmark(fixtures_dir: Path, repeat: int):
+    """
+    Замеряет скорость разбора страниц каждым движком
+
+    Args:
+        fixtures_dir: Папка с сохраненными страницами
+        repeat: Количество повторов разбора каждой страницы
+    """
+    pages = [path.read_bytes() for path in sorted(fixtures_dir.glob("*.html"))]
+    if not pages:
+        print(f"❌ В папке {fixtures_dir} нет страниц *.html")
+        return
+
+    total_mb = sum(len(page) for page in pages) / 1024 / 1024
+    print(f"📄 Страниц: {len(pages)}, объем: {total_mb:.2f} МБ, повторов: {repeat}")
+
+    reference = None
+    if 'bs4' in get_available_extractors():
+        bs4 = get_html_extractor('bs4')
+        reference = [bs4.extract(page, with_links=True) for page in pages]
+
+    print(f"{'движок':<12}{'стр/с':>10}{'МБ/с':>10}{'ускорение':>12}  совпадение с bs4")
+    baseline = None
+    for name in reversed(get_available_extractors()):
+        extractor = get_html_extractor(name)
+        results = [extractor.extract(page, with_links=True) for page in pages]
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for page in pages:
+                extractor.extract(page, with_links=True)
+        elapsed = time.perf_counter() - start
+
+        pages_per_second = len(pages) * repeat / elapsed
+        baseline = baseline or pages_per_second
+        if reference is None:
+            match = "-"
+        else:
+            same = sum(result.text == expected.text and result.title == expected.title
+                       for result, expected in zip(results, reference))
+            match = f"{same}/{len(pages)}"
+        print(f"{name:<12}{pages_per_second:>10.1f}{total_mb * repeat / elapsed:>10.2f}"
+              f"{pages_per_second / baseline:>11.1f}x  {match}")
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description='Сравнение скорости движков разбора HTML')
+    parser.add_argument('--fixtures', type=Path, default=DEFAULT_FIXTURES, help='Папка с сохраненными страницами')
+    parser.add_argument('--repeat', type=int, default=20, help='Количество повторов разбора каждой страницы')
+    parser.add_argument('--download', nargs='+', metavar='URL', help='Сначала сохранить страницы в папку')
+
+    args = parser.parse_args()
+
+    if args.download:
+        download_fixtures(args.download, args.fixtures)
+    benchmark(args.fixtures, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Скрипт для удаления дубликатов блоков веб-страниц из базы знаний.
+
+Раньше ID блоков строились из времени парсинга и hash() URL, который
+меняется между запусками процесса, поэтому повторный парсинг страницы
+добавлял в коллекцию копии тех же блоков. Скрипт группирует блоки
+веб-страниц по каноническому URL и тексту, оставляет для каждой группы
+один блок с детерминированным ID (см. make_chunk_ids) и удаляет остальные.
+Блок с новым ID записывается с уже вычисленным эмбеддингом.
+"""
+
+import sys
+import hashlib
+import logging
+import argparse
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules.knowledge_base import KnowledgeBase, get_knowledge_base
+from modules.web_scraper import canonical_url
+
+# Настройка логирования
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Префиксы ID блоков веб-страниц: старые случайные и детерминированные
+WEB_ID_PREFIXES = ('dynamic_', 'web_')
+
+
+def _sha1(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def find_duplicates(kb: KnowledgeBase, page_size: int = 1000) -> Dict[Tuple[str, str], List[Tuple[str, Dict]]]:
+    """
+    Группирует блоки веб-страниц по каноническому URL и хэшу текста
+
+    Args:
+        kb: База знаний
+        page_size: Количество блоков, читаемых из ChromaDB за один запрос
+
+    Returns:
+        Словарь (канонический URL, хэш текста) -> список (ID, метаданные) для групп,
+        которые нужно привести к одному блоку с детерминированным ID
+    """
+    groups: Dict[Tuple[str, str], List[Tuple[str, Dict]]] = {}
+    offset = 0
+    while True:
+        page = kb.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        page_ids = page.get('ids', [])
+        if not page_ids:
+            break
+        for doc_id, document_text, metadata in zip(page_ids, page.get('documents', []), page.get('metadatas', [])):
+            metadata = metadata or {}
+            if not metadata.get('url') or not doc_id.startswith(WEB_ID_PREFIXES):
+                continue
+            key = (canonical_url(metadata['url']), _sha1(document_text))
+            groups.setdefault(key, []).append((doc_id, metadata))
+        offset += len(page_ids)
+
+    duplicates = {}
+    for (url, text_hash), chunks in groups.items():
+        stable_prefix = f"web_{_sha1(url)}_{text_hash}"
+        if any(not doc_id.startswith(stable_prefix) for doc_id, _ in chunks):
+            duplicates[(url, text_hash)] = chunks
+    return duplicates
+
+
+def dedupe(kb: KnowledgeBase, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Оставляет по одному блоку с детерминированным ID на каждую пару (страница, текст)
+
+    Args:
+        kb: База знаний
+        dry_run: Только посчитать дубликаты, не изменяя коллекцию
+
+    Returns:
+        Словарь: groups - групп с дубликатами, added - записано блоков с новым ID,
+        deleted - удалено блоков
+    """
+    duplicates = find_duplicates(kb)
+    to_add: Dict[str, Tuple[str, Dict]] = {}
+    to_delete: List[str] = []
+    for (url, text_hash), chunks in duplicates.items():
+        stable_prefix = f"web_{_sha1(url)}_{text_hash}"
+        stable = [doc_id for doc_id, _ in chunks if doc_id.startswith(stable_prefix)]
+        if not stable:
+            # Самый свежий блок становится блоком с детерминированным ID
+            source_id, metadata = max(chunks, key=lambda chunk: chunk[1].get('added_date', ''))
+            to_add[stable_prefix] = (source_id, metadata)
+        to_delete.extend(doc_id for doc_id, _ in chunks if not doc_id.startswith(stable_prefix))
+
+    stats = {'groups': len(duplicates), 'added': len(to_add), 'deleted': len(to_delete)}
+    if dry_run or not duplicates:
+        return stats
+
+    if to_add:
+        source = kb.collection.get(ids=[source_id for source_id, _ in to_add.values()],
+                                   include=["documents", "embeddings"])
+        source_by_id = {doc_id: (document_text, embedding) for doc_id, document_text, embedding
+                        in zip(source['ids'], source['documents'], source['embeddings'])}
+        new_ids = list(to_add)
+        metadatas = []
+        for doc_id in new_ids:
+            source_id, metadata = to_add[doc_id]
+            metadata = dict(metadata)
+            metadata['canonical_url'] = canonical_url(metadata['url'])
+            metadatas.append(metadata)
+        stats['added'] = kb.add_documents(
+            new_ids,
+            [source_by_id[to_add[doc_id][0]][0] for doc_id in new_ids],
+            metadatas,
+            embeddings=[list(source_by_id[to_add[doc_id][0]][1]) for doc_id in new_ids]
+        )
+        if stats['added'] < len(new_ids):
+            # Не удаляем старые блоки, для которых не удалось записать замену
+            written = set(kb.collection.get(ids=new_ids, include=[]).get('ids', []))
+            kept = {to_add[doc_id][0] for doc_id in new_ids if doc_id not in written}
+            to_delete = [doc_id for doc_id in to_delete if doc_id not in kept]
+
+    stats['deleted'] = kb.delete_documents(to_delete)
+    return stats
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description='Удаление дубликатов блоков веб-страниц из базы знаний')
+    parser.add_argument('--dry-run', action='store_true', help='Только показать количество дубликатов')
+
+    args = parser.parse_args()
+
+    kb = get_knowledge_base()
+    before = kb.count_documents()
+    stats = dedupe(kb, dry_run=args.dry_run)
+
+    if args.dry_run:
+        print(f"🔍 Групп с дубликатами: {stats['groups']}, будет записано блоков: {stats['added']}, "
+              f"будет удалено: {stats['deleted']} из {before}")
+    else:
+        print(f"✅ Групп с дубликатами: {stats['groups']}, записано блоков: {stats['added']}, "
+              f"удалено: {stats['deleted']}. Блоков в базе: {before} -> {kb.count_documents()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,21 +4,31 @@
 """
 import os
 import sys
+import time
+import queue
+import itertools
 import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 # Добавляем корневую папку проекта в sys.path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+import config
 from config import load_config
 from modules.text_processing import (
-    extract_text_from_document, 
-    split_text_into_structure, 
+    iter_structure_blocks,
     get_supported_extensions,
-    is_supported_document
+    is_supported_document,
+    CHUNKER_VERSION
 )
-from modules.knowledge_base import add_document, get_knowledge_base
+from modules.extraction_cache import file_sha256, get_extraction_cache, iter_cached_document_pages
+from modules.knowledge_base import KnowledgeBase, add_documents, get_knowledge_base
+from modules.citations import detect_act, iter_chunk_annotations
 
 # Настройка логирования
 logging.basicConfig(
@@ -27,10 +37,164 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Символов начала документа, по которым определяется кодекс
+HEAD_LENGTH = 3000
+
+def iter_document_blocks(file_path: str, source_folder: str = "data/documents",
+                         sha256: Optional[str] = None) -> Iterator[Tuple[str, str, Dict]]:
+    """
+    Потоково извлекает из файла документа блоки с ID и метаданными.
+    
+    Текст читается постранично и разбивается на блоки скользящим окном,
+    статьи блоков определяются последовательным проходом, поэтому в памяти
+    находится окно текста, а не весь документ. Блоки берутся из кеша
+    извлечения, если файл с тем же содержимым уже разбирался той же версией
+    извлечения и разбиения, и сохраняются в кеш после последнего блока.
+    
+    Args:
+        file_path: Путь к файлу документа
+        source_folder: Папка-источник для метаданных
+        sha256: Хеш содержимого файла (вычисляется, если не передан)
+        
+    Yields:
+        Tuple[ID блока, текст блока, метаданные блока]
+        
+    Raises:
+        Exception: Ошибка извлечения текста (часть блоков могла быть уже отдана)
+    """
+    filename = os.path.basename(file_path)
+    file_extension = Path(file_path).suffix.lower()
+    base_name = os.path.splitext(filename)[0]
+    
+    cache = get_extraction_cache()
+    if cache is not None:
+        sha256 = sha256 or file_sha256(file_path)
+    cached = cache.get_blocks(sha256, CHUNKER_VERSION) if cache is not None else None
+    if cached is not None:
+        head, structure_blocks = cached
+        logger.info(f"♻️ Блоки файла {filename} взяты из кеша извлечения")
+    else:
+        head = ""
+        
+        def track_pages():
+            nonlocal head
+            for page_num, page_text in iter_cached_document_pages(file_path, sha256, cache):
+                if len(head) < HEAD_LENGTH:
+                    head += page_text[:HEAD_LENGTH - len(head)]
+                yield page_num, page_text
+        
+        structure_blocks = iter_structure_blocks(track_pages())
+        # Кодекс определяется по началу текста: первые блоки придерживаем, пока оно не прочитано
+        first_blocks = []
+        for block in structure_blocks:
+            first_blocks.append(block)
+            if len(head) >= HEAD_LENGTH:
+                break
+        structure_blocks = itertools.chain(first_blocks, structure_blocks)
+        if cache is not None:
+            structure_blocks = cache.store_blocks(sha256, CHUNKER_VERSION, head, structure_blocks)
+    
+    # Определяем кодекс по имени файла или заголовку и статьи для каждого блока
+    act = detect_act(base_name) or detect_act(head)
+    structure_blocks, block_texts = itertools.tee(structure_blocks)
+    citations = iter_chunk_annotations((block for block, _, _ in block_texts), act)
+    
+    for i, ((block, page_start, page_end), citation) in enumerate(zip(structure_blocks, citations)):
+        # Метаданные для блока
+        metadata = {
+            "source_file": filename,
+            "source_folder": source_folder,
+            "file_type": file_extension,
+            "block_index": i,
+            "block_length": len(block),
+            **citation
+        }
+        if page_start is not None:
+            metadata["page_start"] = page_start
+            metadata["page_end"] = page_end
+        # Уникальный ID блока
+        yield f"{base_name}_block_{i:03d}", block, metadata
+
+def prepare_document_blocks(file_path: str, source_folder: str = "data/documents",
+                            sha256: Optional[str] = None) -> Optional[Tuple[List[str], List[str], List[Dict]]]:
+    """
+    Извлекает текст из файла документа и разбивает его на блоки с ID и метаданными.
+    
+    Собирает блоки документа в списки для загрузки одного файла; конвейер
+    ingest_documents передает блоки стадии записи потоково.
+    
+    Args:
+        file_path: Путь к файлу документа
+        source_folder: Папка-источник для метаданных
+        sha256: Хеш содержимого файла (вычисляется, если не передан)
+        
+    Returns:
+        Tuple[ID блоков, тексты блоков, метаданные блоков] или None, если файл не удалось обработать
+    """
+    filename = os.path.basename(file_path)
+    
+    # Проверяем поддерживаемый формат
+    if not is_supported_document(file_path):
+        logger.warning(f"❌ Неподдерживаемый формат файла: {Path(file_path).suffix.lower()}")
+        return None
+    
+    doc_ids = []
+    text_blocks = []
+    metadatas = []
+    try:
+        for doc_id, block, metadata in iter_document_blocks(file_path, source_folder, sha256):
+            doc_ids.append(doc_id)
+            text_blocks.append(block)
+            metadatas.append(metadata)
+    except Exception as e:
+        logger.error(f"❌ Ошибка извлечения текста из {filename}: {e}")
+        return None
+    
+    if not text_blocks:
+        logger.warning(f"❌ Файл {filename} пуст или не содержит текста")
+        return None
+    
+    return doc_ids, text_blocks, metadatas
+
+def file_fingerprint(file_path: str, previous: Optional[Dict] = None) -> Dict:
+    """
+    Вычисляет отпечаток файла для манифеста документов.
+    
+    Если размер и время изменения совпадают с предыдущим отпечатком,
+    хэш содержимого берется из него без чтения файла.
+    
+    Args:
+        file_path: Путь к файлу
+        previous: Предыдущий отпечаток файла из манифеста
+        
+    Returns:
+        Отпечаток: path, size, mtime_ns, sha256, chunker
+    """
+    stat = os.stat(file_path)
+    fingerprint = {
+        "path": os.path.abspath(file_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "chunker": CHUNKER_VERSION
+    }
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+        fingerprint["sha256"] = previous.get("sha256")
+    else:
+        fingerprint["sha256"] = file_sha256(file_path)
+    return fingerprint
+
+def is_file_unchanged(fingerprint: Dict, previous: Optional[Dict]) -> bool:
+    """Проверяет, совпадают ли содержимое файла и версия разбиения с загруженными в базу знаний."""
+    return bool(previous) and previous.get("sha256") == fingerprint["sha256"] \
+        and previous.get("chunker") == fingerprint["chunker"]
+
 def update_document_file(file_path: str, source_folder: str = "data/documents") -> int:
     """
     Обновляет документ в базе знаний, удаляя старые блоки и добавляя новые.
     
+    Старые блоки удаляются одним запросом по метаданным source_file,
+    поэтому пропуски в нумерации блоков не оставляют «осиротевших» блоков.
+    
     Args:
         file_path: Путь к файлу документа
         source_folder: Папка-источник для метаданных
@@ -41,36 +205,23 @@ def update_document_file(file_path: str, source_folder: str = "data/documents")
     try:
         filename = os.path.basename(file_path)
         file_extension = Path(file_path).suffix.lower()
-        base_name = os.path.splitext(filename)[0]
         
         logger.info(f"🔄 Обновляю файл: {filename} (формат: {file_extension})")
         
-        # Проверяем поддерживаемый формат
-        if not is_supported_document(file_path):
-            logger.warning(f"❌ Неподдерживаемый формат файла: {file_extension}")
+        # Сначала готовим новую версию, чтобы при ошибке не потерять старую
+        prepared = prepare_document_blocks(file_path, source_folder)
+        if prepared is None:
             return 0
+        doc_ids, text_blocks, metadatas = prepared
         
-        # Получаем базу знаний
         kb = get_knowledge_base()
-        
-        # Удаляем все существующие блоки этого документа
-        deleted_count = 0
-        block_index = 0
-        while True:
-            doc_id = f"{base_name}_block_{block_index:03d}"
-            if kb.document_exists(doc_id):
-                if kb.delete_document(doc_id):
-                    deleted_count += 1
-                block_index += 1
-            else:
-                break
+        result = kb.replace_document(filename, doc_ids, text_blocks, metadatas)
+        deleted_count, added_count = result["deleted"], result["added"]
+        if added_count > 0:
+            kb.manifest.set_fingerprints({filename: file_fingerprint(file_path)})
         
         if deleted_count > 0:
             logger.info(f"🗑️ Удалено {deleted_count} старых блоков документа {filename}")
-        
-        # Теперь добавляем новую версию документа
-        added_count = process_document_file(file_path, source_folder)
-        
         if added_count > 0:
             logger.info(f"✅ Документ {filename} обновлен: удалено {deleted_count}, добавлено {added_count} блоков")
         
@@ -97,52 +248,15 @@ def process_document_file(file_path: str, source_folder: str = "data/documents")
         
         logger.info(f"📄 Обрабатываю файл: {filename} (формат: {file_extension})")
         
-        # Проверяем поддерживаемый формат
-        if not is_supported_document(file_path):
-            logger.warning(f"❌ Неподдерживаемый формат файла: {file_extension}")
-            return 0
-        
-        # Извлекаем текст из документа
-        try:
-            full_text = extract_text_from_document(file_path)
-        except Exception as e:
-            logger.error(f"❌ Ошибка извлечения текста из {filename}: {e}")
-            return 0
-        
-        if not full_text.strip():
-            logger.warning(f"❌ Файл {filename} пуст или не содержит текста")
+        prepared = prepare_document_blocks(file_path, source_folder)
+        if prepared is None:
             return 0
+        doc_ids, text_blocks, metadatas = prepared
         
-        # Разделяем текст на структурированные блоки
-        text_blocks = split_text_into_structure(full_text)
-        
-        if not text_blocks:
-            logger.warning(f"❌ Не удалось разделить текст из файла {filename}")
-            return 0
-        
-        # Добавляем каждый блок в базу знаний
-        added_count = 0
-        base_name = os.path.splitext(filename)[0]
-        
-        for i, block in enumerate(text_blocks):
-            # Создаем уникальный ID для каждого блока
-            doc_id = f"{base_name}_block_{i:03d}"
-            
-            # Метаданные для блока
-            metadata = {
-                "source_file": filename,
-                "source_folder": source_folder,
-                "file_type": file_extension,
-                "block_index": i,
-                "total_blocks": len(text_blocks),
-                "block_length": len(block)
-            }
-            
-            # Добавляем блок в базу знаний
-            if add_document(doc_id, block, metadata):
-                added_count += 1
-            else:
-                logger.warning(f"❌ Не удалось добавить блок {i} из файла {filename}")
+        # Добавляем блоки в базу знаний пакетами
+        added_count = add_documents(doc_ids, text_blocks, metadatas)
+        if added_count < len(text_blocks):
+            logger.warning(f"❌ Не удалось добавить {len(text_blocks) - added_count} блоков из файла {filename}")
         
         logger.info(f"✅ Добавлено {added_count} блоков из файла {filename}")
         return added_count
@@ -151,12 +265,304 @@ def process_document_file(file_path: str, source_folder: str = "data/documents")
         logger.error(f"💥 Критическая ошибка при обработке файла {file_path}: {e}")
         return 0
 
-def populate_from_directory(data_dir: str = "data/documents") -> dict:
+def _stream_document(file_path: str, source_folder: str, batch_size: int, put: Callable[[Tuple], None]):
+    """
+    Передает блоки документа стадии записи пакетами по batch_size.
+    
+    Для каждого пакета отправляется ("blocks", имя файла, ID, тексты, метаданные),
+    в конце - ("done", имя файла, количество блоков или None, страниц PDF, отпечаток файла).
+    Ошибки извлечения не выбрасываются, а передаются в сообщении done.
+    
+    Args:
+        file_path: Путь к файлу документа
+        source_folder: Папка-источник для метаданных
+        batch_size: Блоков в одном пакете
+        put: Функция отправки сообщения
+    """
+    filename = os.path.basename(file_path)
+    try:
+        fingerprint = file_fingerprint(file_path)
+    except OSError:
+        fingerprint = None
+    if not is_supported_document(file_path):
+        logger.warning(f"❌ Неподдерживаемый формат файла: {Path(file_path).suffix.lower()}")
+        put(("done", filename, None, 0, fingerprint))
+        return
+    
+    blocks = 0
+    pages = 0
+    batch: Tuple[List[str], List[str], List[Dict]] = ([], [], [])
+    try:
+        for doc_id, block, metadata in iter_document_blocks(file_path, source_folder,
+                                                             fingerprint["sha256"] if fingerprint else None):
+            batch[0].append(doc_id)
+            batch[1].append(block)
+            batch[2].append(metadata)
+            blocks += 1
+            pages = max(pages, metadata.get("page_end") or 0)
+            if len(batch[0]) >= batch_size:
+                put(("blocks", filename) + batch)
+                batch = ([], [], [])
+        if batch[0]:
+            put(("blocks", filename) + batch)
+    except Exception as e:
+        logger.error(f"❌ Ошибка извлечения текста из {filename}: {e}")
+        blocks = None
+    if blocks == 0:
+        logger.warning(f"❌ Файл {filename} пуст или не содержит текста")
+        blocks = None
+    put(("done", filename, blocks, pages, fingerprint))
+
+# Очередь сообщений процесса пула загрузки к основному процессу
+_worker_messages = None
+
+def _init_worker(messages):
+    """Запоминает очередь сообщений при запуске процесса пула."""
+    global _worker_messages
+    _worker_messages = messages
+
+def _prepare_in_worker(file_path: str, source_folder: str, batch_size: int):
+    """
+    Готовит блоки документа в процессе пула (извлечение текста и разбиение на блоки)
+    и передает их пакетами через очередь сообщений.
+    """
+    _stream_document(file_path, source_folder, batch_size, _worker_messages.put)
+
+class _BlockWriter(threading.Thread):
+    """
+    Стадия записи конвейера: собирает пакеты блоков нескольких файлов,
+    вычисляет эмбеддинги и записывает их в базу знаний.
+    
+    Сообщения очереди: ("blocks", имя файла, ID, тексты, метаданные) и
+    ("done", имя файла, извлечение успешно). Файл считается загруженным,
+    когда записаны все его блоки; для этого хранятся только ID блоков.
+    """
+    
+    def __init__(self, kb: KnowledgeBase, batch_size: int, replace: bool, max_queue: int):
+        super().__init__(name="ingest-writer", daemon=True)
+        self.kb = kb
+        self.batch_size = batch_size
+        self.replace = replace
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max(1, max_queue))
+        self.added: Dict[str, int] = {}
+        self.failed: List[str] = []
+        self.error: Optional[BaseException] = None
+        self._pending: List[Tuple[str, List[str], List[str], List[Dict]]] = []
+        self._pending_blocks = 0
+        # Записанные блоки файлов: expected - ID непустых блоков, existing - бывшие в базе до записи,
+        # missing - сколько блоков не удалось записать
+        self._files: Dict[str, Dict] = {}
+        # Файлы, извлечение которых завершено: (имя файла, извлечение успешно)
+        self._finished: List[Tuple[str, bool]] = []
+    
+    def run(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                if item[0] == "done":
+                    self._finished.append(item[1:])
+                    if not self._pending:
+                        self._finalize()
+                    continue
+                _, filename, doc_ids, texts, metadatas = item
+                self._pending.append((filename, doc_ids, texts, metadatas))
+                self._pending_blocks += len(doc_ids)
+                if self._pending_blocks >= self.batch_size:
+                    self._flush()
+            self._flush()
+        except BaseException as e:
+            self.error = e
+            # Освобождаем очередь, чтобы не заблокировать стадию извлечения
+            while self.queue.get() is not None:
+                pass
+    
+    def _file_state(self, filename: str) -> Dict:
+        return self._files.setdefault(filename, {"expected": set(), "existing": set(), "missing": 0})
+    
+    def _flush(self):
+        """Записывает накопленные блоки одним вызовом add_documents и завершает готовые файлы."""
+        if not self._pending:
+            self._finalize()
+            return
+        pending, self._pending, self._pending_blocks = self._pending, [], 0
+        
+        all_ids = [doc_id for _, doc_ids, _, _ in pending for doc_id in doc_ids]
+        existing = set() if self.replace else self.kb.get_existing_ids(all_ids)
+        # При замене блоки перезаписываются на месте: старая версия остается, пока не записана новая
+        self.kb.add_documents(
+            all_ids,
+            [text for _, _, texts, _ in pending for text in texts],
+            [metadata for _, _, _, metadatas in pending for metadata in metadatas],
+            self.batch_size,
+            overwrite=self.replace
+        )
+        if self.replace:
+            # ID новой версии совпадают со старыми: записанным считается блок с новым текстом
+            stored_texts = self.kb.collection.get(ids=all_ids, include=["documents"])
+            stored_text = dict(zip(stored_texts.get('ids', []), stored_texts.get('documents', [])))
+            new_text = {doc_id: text for _, doc_ids, texts, _ in pending for doc_id, text in zip(doc_ids, texts)}
+            stored = {doc_id for doc_id, text in stored_text.items() if text == new_text[doc_id]}
+        else:
+            stored = self.kb.get_existing_ids(all_ids)
+        
+        for filename, doc_ids, texts, _ in pending:
+            state = self._file_state(filename)
+            expected = {doc_id for doc_id, text in zip(doc_ids, texts) if text and text.strip()}
+            state["expected"] |= expected
+            state["existing"] |= expected & existing
+            state["missing"] += len(expected - stored)
+        self._finalize()
+    
+    def _finalize(self):
+        """Подводит итог по файлам, извлечение которых завершено и блоки записаны."""
+        finished, self._finished = self._finished, []
+        for filename, extracted in finished:
+            state = self._files.pop(filename, None) or {"expected": set(), "existing": set(), "missing": 0}
+            expected = state["expected"]
+            if state["missing"]:
+                logger.error(f"❌ Файл {filename} записан не полностью: нет {state['missing']} из {len(expected)} блоков")
+            if not extracted or state["missing"]:
+                self.failed.append(filename)
+                # Недописанный файл не оставляем в базе наполовину; при замене
+                # перезаписанные блоки вернет повторная загрузка файла
+                partial_ids = sorted(expected - state["existing"]) if not self.replace else []
+                if partial_ids:
+                    self.kb.delete_documents(partial_ids)
+                continue
+            # Файл загружен, если все его блоки есть в базе, в том числе после прошлого запуска
+            self.added[filename] = len(expected) if self.replace else len(expected - state["existing"])
+            if self.replace:
+                # Блоки, которых нет в новой версии, удаляются после записи всех ее блоков
+                old_ids = set(self.kb.get_ids_where(source_file=filename)) | set(self.kb.manifest.get_ids(filename))
+                stale_ids = sorted(old_ids - expected)
+                if stale_ids:
+                    self.kb.delete_documents(stale_ids)
+
+def ingest_documents(file_paths: List[str], source_folder: str = "data/documents",
+                     workers: Optional[int] = None, batch_size: Optional[int] = None,
+                     replace: bool = False, kb: Optional[KnowledgeBase] = None) -> Dict:
+    """
+    Загружает документы в базу знаний конвейером.
+    
+    Извлечение текста и разбиение на блоки выполняются в пуле процессов,
+    блоки через ограниченные очереди передаются стадии записи пакетами по
+    batch_size, и она вычисляет эмбеддинги и записывает их. Документ целиком
+    в памяти не собирается: очереди ограничены, поэтому потребление памяти
+    зависит от числа процессов и размера пакета, а не от размера документов.
+    При workers=1 документы обрабатываются последовательно в текущем процессе.
+    
+    Args:
+        file_paths: Пути к файлам документов
+        source_folder: Папка-источник для метаданных
+        workers: Количество процессов извлечения (по умолчанию INGEST_WORKERS или число ядер)
+        batch_size: Блоков в одном пакете эмбеддингов и записи (по умолчанию KB_BATCH_SIZE)
+        replace: Заменять старые версии файлов: блоки перезаписываются, а блоки, которых
+                 нет в новой версии, удаляются после полной записи файла
+        kb: База знаний (по умолчанию глобальный экземпляр)
+        
+    Отпечатки записанных файлов сохраняются в манифест документов.
+    
+    Returns:
+        Словарь: added - блоков записано по именам загруженных файлов (0, если все блоки
+        уже были в базе), failed - файлы, которые не удалось обработать или записать полностью, pages - страниц PDF, chunks - блоков, elapsed - время в секундах
+    """
+    workers = workers or config.INGEST_WORKERS or os.cpu_count() or 1
+    workers = max(1, min(workers, len(file_paths) or 1))
+    batch_size = max(1, batch_size or config.KB_BATCH_SIZE)
+    kb = kb or get_knowledge_base()
+    
+    writer = _BlockWriter(kb, batch_size, replace, max_queue=workers * 2)
+    writer.start()
+    result = {"added": {}, "failed": [], "pages": 0, "chunks": 0, "elapsed": 0.0}
+    start = time.monotonic()
+    done = 0
+    fingerprints: Dict[str, Dict] = {}
+    
+    def accept(message: Tuple):
+        nonlocal done
+        if message[0] == "blocks":
+            writer.queue.put(message)
+            return
+        _, filename, blocks, pages, fingerprint = message
+        done += 1
+        if fingerprint:
+            fingerprints[filename] = fingerprint
+        if blocks is not None:
+            result["pages"] += pages
+            result["chunks"] += blocks
+            logger.info(f"📄 [{done}/{len(file_paths)}] {filename}: {blocks} блоков")
+        writer.queue.put(("done", filename, blocks is not None))
+        if done % 10 == 0 or done == len(file_paths):
+            elapsed = max(time.monotonic() - start, 1e-6)
+            logger.info(f"📈 Обработано {done}/{len(file_paths)} файлов: "
+                        f"{result['pages'] / elapsed:.1f} стр./с, {result['chunks'] / elapsed:.1f} блоков/с")
+    
+    try:
+        if workers == 1:
+            # Последовательная обработка без пула процессов
+            for file_path in file_paths:
+                _stream_document(file_path, source_folder, batch_size, accept)
+        else:
+            logger.info(f"⚙️ Извлечение текста в {workers} процессах, пакет записи: {batch_size} блоков")
+            # spawn: дочерние процессы не наследуют потоки ChromaDB и ONNX родителя
+            context = multiprocessing.get_context("spawn")
+            # Пакеты блоков идут через ограниченную очередь: медленная запись приостанавливает извлечение
+            messages = context.Queue(maxsize=workers * 2)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                     initializer=_init_worker, initargs=(messages,)) as pool:
+                running = {pool.submit(_prepare_in_worker, file_path, source_folder, batch_size): file_path
+                           for file_path in file_paths}
+                finished = set()
+                try:
+                    while len(finished) < len(file_paths):
+                        try:
+                            message = messages.get(timeout=0.5)
+                        except queue.Empty:
+                            # Аварийно завершившийся процесс пула не пришлет сообщение done
+                            for future in [future for future in running if future.done()]:
+                                filename = os.path.basename(running.pop(future))
+                                if future.exception() is not None and filename not in finished:
+                                    logger.error(f"❌ Ошибка обработки файла {filename}: {future.exception()}")
+                                    finished.add(filename)
+                                    accept(("done", filename, None, 0, None))
+                            continue
+                        if message[0] == "done":
+                            finished.add(message[1])
+                        accept(message)
+                except BaseException:
+                    # Освобождаем очередь, чтобы процессы пула могли завершиться
+                    for future in running:
+                        future.cancel()
+                    while not all(future.done() for future in running):
+                        try:
+                            messages.get(timeout=0.1)
+                        except queue.Empty:
+                            pass
+                    raise
+    finally:
+        writer.queue.put(None)
+        writer.join()
+    if writer.error:
+        raise writer.error
+    
+    result["added"].update(writer.added)
+    result["failed"].extend(writer.failed)
+    kb.manifest.set_fingerprints({filename: fingerprints[filename] for filename in result["added"]
+                                  if filename in fingerprints})
+    result["elapsed"] = time.monotonic() - start
+    return result
+
+def populate_from_directory(data_dir: str = "data/documents", workers: Optional[int] = None,
+                            batch_size: Optional[int] = None) -> dict:
     """
     Наполняет базу знаний из всех поддерживаемых файлов в указанной директории.
     
     Args:
         data_dir: Путь к директории с файлами документов
+        workers: Количество процессов извлечения текста (1 - последовательно)
+        batch_size: Блоков в одном пакете эмбеддингов и записи
         
     Returns:
         Статистика обработки
@@ -196,18 +602,13 @@ def populate_from_directory(data_dir: str = "data/documents") -> dict:
     logger.info(f"📚 Найдено {len(document_files)} файлов для обработки")
     logger.info(f"📊 Типы файлов: {dict(stats['file_types'])}")
     
-    # Обрабатываем каждый файл
-    for filename in document_files:
-        file_path = os.path.join(data_dir, filename)
-        
-        blocks_added = process_document_file(file_path, data_dir)
-        
-        if blocks_added > 0:
-            stats["processed_files"] += 1
-            stats["total_blocks"] += blocks_added
-        else:
-            stats["failed_files"].append(filename)
+    result = ingest_documents([os.path.join(data_dir, filename) for filename in document_files],
+                              data_dir, workers, batch_size)
     
+    stats["processed_files"] = len(result["added"])
+    stats["total_blocks"] = sum(result["added"].values())
+    stats["failed_files"] = result["failed"]
+    stats.update(pages=result["pages"], chunks=result["chunks"], elapsed=result["elapsed"])
     return stats
 
 def show_statistics(stats: dict):
@@ -225,6 +626,9 @@ def show_statistics(stats: dict):
     print(f"✅ Успешно обработано: {stats['processed_files']}")
     print(f"❌ Не удалось обработать: {len(stats['failed_files'])}")
     print(f"📝 Всего добавлено блоков: {stats['total_blocks']}")
+    if stats.get('elapsed'):
+        print(f"⏱️ Время: {stats['elapsed']:.1f} с, {stats['pages'] / stats['elapsed']:.1f} стр./с, "
+              f"{stats['chunks'] / stats['elapsed']:.1f} блоков/с")
     
     if stats.get('file_types'):
         print(f"\n📋 Типы обработанных файлов:")
@@ -240,6 +644,14 @@ def show_statistics(stats: dict):
 
 def main():
     """Основная функция скрипта."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Наполнение базы знаний из документов")
+    parser.add_argument("--workers", "-w", type=int, help="Процессов извлечения текста (1 - последовательно)")
+    parser.add_argument("--batch-size", "-b", type=int, help="Блоков в одном пакете эмбеддингов и записи")
+    
+    args = parser.parse_args()
+    
     logger.info("🚀 Запуск скрипта наполнения базы знаний")
     
     try:
@@ -263,7 +675,7 @@ def main():
         logger.info(f"📋 Поддерживаемые форматы документов: {', '.join(supported_formats)}")
         
         # Наполняем базу знаний
-        stats = populate_from_directory(data_dir)
+        stats = populate_from_directory(data_dir, args.workers, args.batch_size)
         
         # Показываем статистику
         show_statistics(stats)
@@ -12,6 +12,7 @@ from pathlib import Path
 # Добавляем корневую директорию проекта в путь
 sys.path.append(str(Path(__file__).parent.parent))
 
+import config
 from modules.web_scraper import WebScraper, create_scraper_from_config
 from modules.knowledge_base import KnowledgeBase
 from modules.text_processing import TextProcessor
@@ -29,18 +30,20 @@ def setup_logging():
     )
 
 
-def scrape_single_site(url: str, max_pages: int = 20):
+def scrape_single_site(url: str, max_pages: int = 20, max_depth: int = None, workers: int = None):
     """
     Скрапинг одного сайта
     
     Args:
         url: URL сайта для скрапинга
         max_pages: Максимальное количество страниц
+        max_depth: Глубина переходов по ссылкам (None - из конфигурации)
+        workers: Количество одновременно загружаемых страниц (None - из конфигурации)
     """
     print(f"🚀 Начинаем скрапинг сайта: {url}")
     
     scraper = create_scraper_from_config()
-    result = scraper.scrape_and_add(url, max_pages)
+    result = scraper.scrape_and_add(url, max_pages, max_depth, workers)
     
     if result['success']:
         print(f"✅ Скрапинг завершен успешно!")
@@ -52,13 +55,15 @@ def scrape_single_site(url: str, max_pages: int = 20):
     return result
 
 
-def scrape_multiple_sites(urls: list, max_pages_per_site: int = 10):
+def scrape_multiple_sites(urls: list, max_pages_per_site: int = 10, max_depth: int = None, workers: int = None):
     """
     Скрапинг нескольких сайтов
     
     Args:
         urls: Список URL для скрапинга
         max_pages_per_site: Максимальное количество страниц на сайт
+        max_depth: Глубина переходов по ссылкам (None - из конфигурации)
+        workers: Количество одновременно загружаемых страниц (None - из конфигурации)
     """
     print(f"🌐 Начинаем скрапинг {len(urls)} сайтов")
     
@@ -69,7 +74,7 @@ def scrape_multiple_sites(urls: list, max_pages_per_site: int = 10):
     for i, url in enumerate(urls, 1):
         print(f"\n📋 Сайт {i}/{len(urls)}: {url}")
         
-        result = scraper.scrape_and_add(url, max_pages_per_site)
+        result = scraper.scrape_and_add(url, max_pages_per_site, max_depth, workers)
         
         if result['success']:
             total_pages += result['pages_scraped']
@@ -131,6 +136,20 @@ def main():
         help='Максимальное количество страниц для скрапинга (по умолчанию: 20)'
     )
     
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=config.CRAWL_WORKERS,
+        help=f'Количество одновременно загружаемых страниц (по умолчанию: {config.CRAWL_WORKERS})'
+    )
+    
+    parser.add_argument(
+        '--max-depth',
+        type=int,
+        default=config.CRAWL_MAX_DEPTH,
+        help=f'Глубина переходов по ссылкам от стартовой страницы (по умолчанию: {config.CRAWL_MAX_DEPTH})'
+    )
+    
     parser.add_argument(
         '--sites-file',
         type=str,
@@ -164,7 +183,7 @@ def main():
     if args.demo:
         print("🎯 Запуск демо-скрапинга популярных юридических сайтов")
         sites = get_legal_sites_list()[:3]  # Берем первые 3 сайта для демо
-        scrape_multiple_sites(sites, max_pages_per_site=5)
+        scrape_multiple_sites(sites, max_pages_per_site=5, max_depth=args.max_depth, workers=args.workers)
         return
     
     if args.sites_file:
@@ -179,11 +198,11 @@ def main():
             print("❌ Файл пуст или не содержит валидных URL")
             return
         
-        scrape_multiple_sites(urls, args.max_pages)
+        scrape_multiple_sites(urls, args.max_pages, args.max_depth, args.workers)
         return
     
     if args.url:
-        scrape_single_site(args.url, args.max_pages)
+        scrape_single_site(args.url, args.max_pages, args.max_depth, args.workers)
         return
     
     # Если не указаны аргументы, показываем справку
@@ -6,6 +6,7 @@ import os
 import sys
 import logging
 from pathlib import Path
+from typing import Optional
 
 # Добавляем корневую папку проекта в sys.path
 project_root = Path(__file__).parent.parent
@@ -14,7 +15,9 @@ sys.path.insert(0, str(project_root))
 from config import load_config
 from modules.text_processing import get_supported_extensions, is_supported_document
 from modules.knowledge_base import get_knowledge_base
-from scripts.populate_db import update_document_file, show_statistics
+from scripts.populate_db import (
+    update_document_file, show_statistics, ingest_documents, file_fingerprint, is_file_unchanged
+)
 
 # Настройка логирования
 logging.basicConfig(
@@ -42,21 +45,10 @@ def update_specific_document(file_path: str) -> bool:
         return False
     
     filename = os.path.basename(file_path)
-    base_name = os.path.splitext(filename)[0]
     
     # Проверяем, существует ли документ в базе знаний
     kb = get_knowledge_base()
-    doc_exists = False
-    block_index = 0
-    
-    while True:
-        doc_id = f"{base_name}_block_{block_index:03d}"
-        if kb.document_exists(doc_id):
-            doc_exists = True
-            break
-        block_index += 1
-        if block_index > 10:  # Проверяем первые 10 блоков
-            break
+    doc_exists = kb.has_documents_where(source_file=filename)
     
     if not doc_exists:
         logger.warning(f"⚠️ Документ {filename} не найден в базе знаний")
@@ -79,12 +71,19 @@ def update_specific_document(file_path: str) -> bool:
         logger.error(f"❌ Не удалось обновить документ {filename}")
         return False
 
-def update_all_documents(data_dir: str = "data/documents") -> dict:
+def update_all_documents(data_dir: str = "data/documents", workers: Optional[int] = None,
+                         batch_size: Optional[int] = None) -> dict:
     """
     Обновляет все документы в указанной директории.
     
+    Файлы, содержимое которых не изменилось с последней загрузки (по отпечатку
+    в манифесте документов), пропускаются. Блоки файлов, удаленных из директории,
+    удаляются из базы знаний.
+    
     Args:
         data_dir: Путь к директории с файлами документов
+        workers: Количество процессов извлечения текста (1 - последовательно)
+        batch_size: Блоков в одном пакете эмбеддингов и записи
         
     Returns:
         Статистика обновления
@@ -93,6 +92,8 @@ def update_all_documents(data_dir: str = "data/documents") -> dict:
         "total_files": 0,
         "updated_files": 0,
         "new_files": 0,
+        "skipped_files": 0,
+        "deleted_files": [],
         "failed_files": [],
         "total_blocks": 0,
         "file_types": {}
@@ -126,33 +127,56 @@ def update_all_documents(data_dir: str = "data/documents") -> dict:
     logger.info(f"📊 Типы файлов: {dict(stats['file_types'])}")
     
     kb = get_knowledge_base()
+    fingerprints = kb.manifest.get_fingerprints()
     
-    # Обрабатываем каждый файл
+    # Удаляем блоки файлов, которых больше нет в директории
+    data_path = os.path.abspath(data_dir)
+    present = set(document_files)
+    for filename, fingerprint in fingerprints.items():
+        if filename not in present and os.path.dirname(fingerprint.get("path", "")) == data_path:
+            deleted_count = kb.delete_where(source_file=filename)
+            stats["deleted_files"].append(filename)
+            logger.info(f"🗑️ Файл {filename} удален из папки: удалено {deleted_count} блоков")
+    
+    # Пропускаем файлы, не изменившиеся с последней загрузки
+    changed_files = []
     for filename in document_files:
         file_path = os.path.join(data_dir, filename)
-        base_name = os.path.splitext(filename)[0]
-        
-        # Проверяем, существует ли документ в базе знаний
-        doc_exists = kb.document_exists(f"{base_name}_block_000")
-        
-        if doc_exists:
-            # Обновляем существующий документ
-            blocks_added = update_document_file(file_path, data_dir)
-            if blocks_added > 0:
-                stats["updated_files"] += 1
-                stats["total_blocks"] += blocks_added
-            else:
-                stats["failed_files"].append(filename)
-        else:
-            # Добавляем новый документ
-            from scripts.populate_db import process_document_file
-            blocks_added = process_document_file(file_path, data_dir)
-            if blocks_added > 0:
-                stats["new_files"] += 1
-                stats["total_blocks"] += blocks_added
-            else:
-                stats["failed_files"].append(filename)
+        previous = fingerprints.get(filename)
+        try:
+            fingerprint = file_fingerprint(file_path, previous)
+        except OSError as e:
+            logger.error(f"❌ Не удалось прочитать файл {filename}: {e}")
+            stats["failed_files"].append(filename)
+            continue
+        if is_file_unchanged(fingerprint, previous) and kb.manifest.has_file(filename):
+            stats["skipped_files"] += 1
+            if fingerprint != previous:
+                # Файл перезаписан с тем же содержимым: запоминаем новое время изменения
+                kb.manifest.set_fingerprints({filename: fingerprint})
+            continue
+        changed_files.append(filename)
+    
+    if stats["skipped_files"]:
+        logger.info(f"⏭️ Пропущено неизмененных файлов: {stats['skipped_files']}")
+    if not changed_files:
+        return stats
     
+    # Проверяем, какие документы уже есть в базе знаний
+    existing_files = {filename for filename in changed_files if kb.has_documents_where(source_file=filename)}
+    
+    # Существующие документы заменяются новой версией, новые добавляются
+    result = ingest_documents([os.path.join(data_dir, filename) for filename in changed_files],
+                              data_dir, workers, batch_size, replace=True, kb=kb)
+    
+    for filename, blocks_added in result["added"].items():
+        if filename in existing_files:
+            stats["updated_files"] += 1
+        else:
+            stats["new_files"] += 1
+        stats["total_blocks"] += blocks_added
+    stats["failed_files"].extend(result["failed"])
+    stats.update(pages=result["pages"], chunks=result["chunks"], elapsed=result["elapsed"])
     return stats
 
 def show_update_statistics(stats: dict):
@@ -169,8 +193,13 @@ def show_update_statistics(stats: dict):
     print(f"📁 Всего файлов найдено: {stats['total_files']}")
     print(f"🔄 Обновлено существующих: {stats['updated_files']}")
     print(f"➕ Добавлено новых: {stats['new_files']}")
+    print(f"⏭️ Пропущено неизмененных: {stats.get('skipped_files', 0)}")
+    print(f"🗑️ Удалено отсутствующих: {len(stats.get('deleted_files', []))}")
     print(f"❌ Не удалось обработать: {len(stats['failed_files'])}")
     print(f"📝 Всего блоков обработано: {stats['total_blocks']}")
+    if stats.get('elapsed'):
+        print(f"⏱️ Время: {stats['elapsed']:.1f} с, {stats['pages'] / stats['elapsed']:.1f} стр./с, "
+              f"{stats['chunks'] / stats['elapsed']:.1f} блоков/с")
     
     if stats.get('file_types'):
         print(f"\n📋 Типы обработанных файлов:")
@@ -192,6 +221,8 @@ def main():
     parser.add_argument("--file", "-f", help="Обновить конкретный файл")
     parser.add_argument("--all", "-a", action="store_true", help="Обновить все файлы в папке")
     parser.add_argument("--dir", "-d", default="data/documents", help="Папка с документами")
+    parser.add_argument("--workers", "-w", type=int, help="Процессов извлечения текста (1 - последовательно)")
+    parser.add_argument("--batch-size", "-b", type=int, help="Блоков в одном пакете эмбеддингов и записи")
     
     args = parser.parse_args()
     
@@ -210,10 +241,10 @@ def main():
         
         elif args.all:
             # Обновляем все файлы
-            stats = update_all_documents(args.dir)
+            stats = update_all_documents(args.dir, args.workers, args.batch_size)
             show_update_statistics(stats)
             
-            if stats["updated_files"] > 0 or stats["new_files"] > 0:
+            if stats["updated_files"] > 0 or stats["new_files"] > 0 or stats["skipped_files"] > 0:
                 logger.info("✅ Обновление документов завершено успешно!")
             else:
                 logger.warning("❌ Не удалось обновить ни одного документа")
@@ -229,6 +260,8 @@ def main():
             print("  --file, -f    Обновить конкретный файл")
             print("  --all, -a     Обновить все файлы в папке")
             print("  --dir, -d     Папка с документами (по умолчанию: data/documents)")
+            print("  --workers, -w Процессов извлечения текста (1 - последовательно)")
+            print("  --batch-size, -b Блоков в одном пакете эмбеддингов и записи")
             
     except Exception as e:
         logger.error(f"💥 Критическая ошибка: {e}")
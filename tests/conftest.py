@@ -0,0 +1,52 @@
+"""
+Общие фикстуры тестов
+"""
+
+import sys
+import uuid
+from pathlib import Path
+
+import chromadb
+import pytest
+from chromadb.api.types import EmbeddingFunction
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+import config
+from modules import http_cache, page_store
+from modules.knowledge_base import KnowledgeBase
+
+
+class FakeEmbeddingFunction(EmbeddingFunction):
+    """Детерминированные эмбеддинги с подсчетом вызовов"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, input):
+        self.calls.append(len(input))
+        return [[float(len(text)), float(sum(map(ord, text)) % 97), 1.0] for text in input]
+
+
+@pytest.fixture
+def knowledge_base():
+    """Создает базу знаний в памяти с фиктивными эмбеддингами, без файлов на диске"""
+    kb = KnowledgeBase(f"test_{uuid.uuid4().hex}", client=chromadb.EphemeralClient(),
+                       embedding_function=FakeEmbeddingFunction(),
+                       manifest_file=None, bm25_index_file=None, version_file=None)
+    yield kb
+    kb.client.delete_collection(kb.collection_name)
+
+
+@pytest.fixture
+def scraper_stores(tmp_path, monkeypatch):
+    """Переносит глобальные HTTP-кеш и хранилище страниц скраперов во временную папку"""
+    monkeypatch.setattr(config, "HTTP_CACHE_PATH", str(tmp_path / "http_cache.db"))
+    monkeypatch.setattr(config, "PAGE_STORE_PATH", str(tmp_path / "page_store.db"))
+    monkeypatch.setattr(http_cache, "_http_cache", None)
+    monkeypatch.setattr(page_store, "_page_store", None)
+    # Прежние JSON-файлы проекта не импортируются во временное хранилище
+    monkeypatch.setattr(page_store, "PAGES_INFO_FILE", str(tmp_path / "pages_info.json"))
+    monkeypatch.setattr(page_store, "SCRAPING_INFO_FILE", str(tmp_path / "scraping_info.json"))
+    return tmp_path
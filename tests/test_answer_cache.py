@@ -0,0 +1,132 @@
+"""
+Тесты для семантического кеша ответов
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules import answer_cache as cache_module
+from modules import knowledge_base as kb_module
+from modules.answer_cache import SemanticAnswerCache
+
+# Фиктивные эмбеддинги: перефразировки одного вопроса почти совпадают
+VECTORS = {
+    "как открыть ИП": [1.0, 0.0, 0.0],
+    "регистрация ИП в РБ": [0.98, 0.2, 0.0],
+    "как расторгнуть брак": [0.0, 1.0, 0.0],
+    "сроки исковой давности": [0.0, 0.0, 1.0],
+}
+
+
+class TestSemanticAnswerCache:
+    """Тесты для класса SemanticAnswerCache"""
+
+    @pytest.fixture
+    def cache(self):
+        """Создает кеш с фиктивной функцией эмбеддингов"""
+        return SemanticAnswerCache(max_entries=2, ttl_seconds=60, similarity_threshold=0.95,
+                                   embed_fn=VECTORS.__getitem__)
+
+    def test_hit_on_paraphrase(self, cache):
+        """Тест попадания в кеш для перефразированного вопроса"""
+        assert cache.store("как открыть ИП", ["doc_1"], "Ответ про ИП")
+        assert cache.lookup("регистрация ИП в РБ") == "Ответ про ИП"
+        assert cache.get_stats()['hits'] == 1
+
+    def test_miss_on_different_question(self, cache):
+        """Тест промаха для вопроса на другую тему"""
+        cache.store("как открыть ИП", ["doc_1"], "Ответ про ИП")
+        assert cache.lookup("как расторгнуть брак") is None
+        assert cache.get_stats()['misses'] == 1
+
+    def test_lru_eviction(self, cache):
+        """Тест вытеснения давно не использованных ответов"""
+        cache.store("как открыть ИП", ["doc_1"], "Ответ 1")
+        cache.store("как расторгнуть брак", ["doc_2"], "Ответ 2")
+        cache.lookup("как открыть ИП")
+        cache.store("сроки исковой давности", ["doc_3"], "Ответ 3")
+
+        assert cache.lookup("как расторгнуть брак") is None
+        assert cache.lookup("как открыть ИП") == "Ответ 1"
+        assert cache.get_stats()['entries'] == 2
+
+    def test_ttl_expiration(self, cache, monkeypatch):
+        """Тест истечения времени жизни ответа"""
+        now = [1000.0]
+        monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+        cache.store("как открыть ИП", ["doc_1"], "Ответ про ИП")
+
+        now[0] += 61
+        assert cache.lookup("как открыть ИП") is None
+        assert cache.get_stats()['entries'] == 0
+
+    def test_invalidate_by_document(self, cache):
+        """Тест удаления ответов при изменении документов"""
+        cache.store("как открыть ИП", ["doc_1", "doc_2"], "Ответ 1")
+        cache.store("как расторгнуть брак", ["doc_3"], "Ответ 2")
+
+        cache.invalidate_documents(["doc_2"])
+        assert cache.lookup("как открыть ИП") is None
+        assert cache.lookup("как расторгнуть брак") == "Ответ 2"
+
+        cache.invalidate_documents(None)
+        assert cache.get_stats()['entries'] == 0
+
+    def test_stale_version_not_stored(self, cache):
+        """Тест отказа сохранять ответ, если документы изменились во время генерации"""
+        version = cache.get_version()
+        cache.invalidate_documents(["doc_1"])
+        assert not cache.store("как открыть ИП", ["doc_1"], "Устаревший ответ", version)
+        assert cache.lookup("как открыть ИП") is None
+
+    def test_answer_without_documents_not_stored(self, cache):
+        """Тест отказа сохранять ответ без документов контекста"""
+        assert not cache.store("как открыть ИП", [None], "Ответ")
+
+
+class TestCrossProcessInvalidation:
+    """Тесты для сброса кеша по общей версии документов"""
+
+    @pytest.fixture
+    def version_file(self, tmp_path):
+        """Путь к файлу версии документов во временной папке"""
+        return str(tmp_path / "kb_version")
+
+    @pytest.fixture
+    def cache(self, version_file):
+        """Создает кеш, отслеживающий версию документов в файле"""
+        cache = SemanticAnswerCache(similarity_threshold=0.95, embed_fn=VECTORS.__getitem__,
+                                    version_fn=lambda: kb_module.get_documents_version(version_file))
+        kb_module.add_change_listener(cache.invalidate_documents)
+        yield cache
+        kb_module.remove_change_listener(cache.invalidate_documents)
+
+    def test_change_in_other_process_clears_cache(self, cache, version_file):
+        """Изменение документов другим процессом сбрасывает кеш и отбрасывает генерируемый ответ"""
+        cache.store("как открыть ИП", ["doc_1"], "Ответ 1")
+        version = cache.get_version()
+
+        # Другой процесс только обновляет файл версии, подписчики этого процесса не вызываются
+        kb_module._bump_documents_version(version_file)
+
+        assert cache.lookup("как открыть ИП") is None
+        assert not cache.store("как расторгнуть брак", ["doc_2"], "Ответ 2", version)
+
+    def test_change_in_same_process_keeps_unrelated_answers(self, cache, version_file):
+        """Изменение документов в том же процессе удаляет только зависящие от них ответы"""
+        cache.store("как открыть ИП", ["doc_1"], "Ответ 1")
+        cache.store("как расторгнуть брак", ["doc_2"], "Ответ 2")
+
+        kb_module._notify_documents_changed(["doc_2"], version_file)
+
+        assert cache.lookup("как открыть ИП") == "Ответ 1"
+        assert cache.lookup("как расторгнуть брак") is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,104 @@
+"""
+Тесты для модуля ссылок на статьи нормативных актов
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules.citations import CitationIndex, annotate_chunks, detect_act, parse_citations
+
+
+class TestParsing:
+    """Тесты распознавания кодексов и ссылок"""
+
+    @pytest.mark.parametrize("text, act", [
+        ("ГРАЖДАНСКИЙ КОДЕКС РЕСПУБЛИКИ БЕЛАРУСЬ", "гк"),
+        ("Гражданский процессуальный кодекс", "гпк"),
+        ("Кодекс Республики Беларусь о браке и семье", "кобс"),
+        ("статья 41 ТК РБ", "тк"),
+        ("Кодекс об административных правонарушениях", "коап"),
+        ("Положение о порядке", None),
+    ])
+    def test_detect_act(self, text, act):
+        """Тест определения кодекса"""
+        assert detect_act(text) == act
+
+    def test_parse_citations(self):
+        """Тест извлечения ссылок на статью и часть"""
+        assert parse_citations("Что говорит ч. 2 ст. 1014 ГК?") == [("гк", "1014", "2")]
+        assert parse_citations("статья 9 Трудового кодекса") == [("тк", "9", None)]
+        assert parse_citations("Как открыть ИП?") == []
+
+    @pytest.mark.parametrize("question", [
+        "Что говорит статья 41 Конституции?",
+        "ст. 3 Закона об обращениях граждан",
+        "статья 5 Кодекса о культуре",
+        "ст. 2 Декрета №8 и ТК",
+        "статья 41",
+    ])
+    def test_no_citation_without_recognised_code(self, question):
+        """Тест отказа от ссылки, если кодекс не распознан или вопрос называет другой акт"""
+        assert parse_citations(question) == []
+
+    def test_abbreviations_without_dot(self):
+        """Тест сокращений «ст» и «ч» без точки"""
+        assert parse_citations("ст 5 ТК") == [("тк", "5", None)]
+        assert parse_citations("ч 2 ст 1014 ГК") == [("гк", "1014", "2")]
+
+
+class TestAnnotateChunks:
+    """Тесты разметки блоков документа"""
+
+    def test_articles_and_parts(self):
+        """Тест наследования статьи и определения части"""
+        chunks = [
+            "ГРАЖДАНСКИЙ КОДЕКС РЕСПУБЛИКИ БЕЛАРУСЬ",
+            "Статья 1. Отношения, регулируемые гражданским законодательством",
+            "1. Гражданское законодательство регулирует...",
+            "2. Участниками отношений являются... Статья 2. Основные начала",
+            "1. Гражданское законодательство основывается...",
+        ]
+        annotations = annotate_chunks(chunks, "гк")
+
+        assert annotations[0] == {}
+        assert annotations[1] == {"citation_act": "гк", "citation_article": "1"}
+        assert annotations[2] == {"citation_act": "гк", "citation_article": "1", "citation_part": "1"}
+        assert annotations[3]["citation_article"] == "1"
+        assert annotations[4] == {"citation_act": "гк", "citation_article": "2", "citation_part": "1"}
+
+
+class TestCitationIndex:
+    """Тесты для класса CitationIndex"""
+
+    def test_lookup_by_act_and_article(self):
+        """Тест поиска блоков по кодексу и статье"""
+        index = CitationIndex()
+        index.add("gk_1", {"citation_act": "гк", "citation_article": "1014"})
+        index.add("tk_1", {"citation_act": "тк", "citation_article": "1014"})
+        index.add("other", {"source_file": "x.pdf"})
+
+        assert index.lookup("гк", "1014") == ["gk_1"]
+        assert len(index) == 2
+
+    def test_article_not_matched_across_acts(self):
+        """Тест того, что статья ищется только в указанном кодексе"""
+        index = CitationIndex()
+        index.add("gk_2", {"citation_act": "гк", "citation_article": "7"})
+
+        assert index.lookup("тк", "7") == []
+
+    def test_remove(self):
+        """Тест удаления блоков из индекса"""
+        index = CitationIndex()
+        index.add("gk_1", {"citation_act": "гк", "citation_article": "1"})
+        index.remove(["gk_1"])
+        assert index.lookup("гк", "1") == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,150 @@
+"""
+Тесты для движка обхода сайтов
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+import config
+from modules.crawler import Crawler, BloomFilter, create_crawler, normalize_url
+
+
+SITE = {
+    "https://pravo.by/": ["https://pravo.by/a", "https://pravo.by/b", "https://other.by/x"],
+    "https://pravo.by/a": ["https://pravo.by/a/1", "https://pravo.by/#top", "https://pravo.by/b"],
+    "https://pravo.by/b": ["https://pravo.by/b/1"],
+    "https://pravo.by/a/1": ["https://pravo.by/a/1/deep"],
+    "https://pravo.by/b/1": [],
+    "https://pravo.by/a/1/deep": [],
+}
+
+
+class TestCrawler:
+    """Тесты для класса Crawler"""
+
+    @pytest.fixture
+    def fetched(self):
+        """Список загруженных URL"""
+        return []
+
+    @pytest.fixture
+    def fetch(self, fetched):
+        """Загрузка страницы из словаря SITE"""
+        async def fetch(url):
+            fetched.append(url)
+            await asyncio.sleep(0)
+            if url not in SITE:
+                raise RuntimeError("404")
+            return {'url': url}, SITE[url]
+        return fetch
+
+    def test_each_url_fetched_once(self, fetch, fetched):
+        """Каждый URL загружается один раз, фрагменты и чужие домены отбрасываются"""
+        results = asyncio.run(Crawler(fetch, workers=3, max_pages=100).crawl(["https://pravo.by/"]))
+
+        assert sorted(result.url for result in results) == sorted(SITE)
+        assert len(fetched) == len(set(fetched)) == len(SITE)
+        assert "https://other.by/x" not in fetched
+
+    def test_breadth_first_order_with_single_worker(self, fetch, fetched):
+        """Страницы обходятся в порядке глубины"""
+        results = asyncio.run(Crawler(fetch, workers=1, max_pages=100).crawl(["https://pravo.by/"]))
+
+        assert [result.depth for result in results] == sorted(result.depth for result in results)
+        assert fetched[:3] == ["https://pravo.by/", "https://pravo.by/a", "https://pravo.by/b"]
+
+    def test_max_depth(self, fetch):
+        """Ссылки глубже max_depth не загружаются"""
+        results = asyncio.run(Crawler(fetch, max_pages=100, max_depth=1).crawl(["https://pravo.by/"]))
+        assert {result.url for result in results} == {"https://pravo.by/", "https://pravo.by/a", "https://pravo.by/b"}
+
+        results = asyncio.run(Crawler(fetch, max_pages=100, max_depth=0).crawl(["https://pravo.by/a", "https://pravo.by/b"]))
+        assert {result.url for result in results} == {"https://pravo.by/a", "https://pravo.by/b"}
+
+    def test_max_pages(self, fetch):
+        """Количество страниц ограничено max_pages"""
+        results = asyncio.run(Crawler(fetch, workers=4, max_pages=2).crawl(["https://pravo.by/"]))
+        assert len(results) == 2
+
+    def test_errors_and_empty_pages_are_skipped(self, fetched):
+        """Ошибки загрузки и страницы без данных не останавливают обход"""
+        async def fetch(url):
+            fetched.append(url)
+            if url.endswith("/broken"):
+                raise RuntimeError("500")
+            if url.endswith("/empty"):
+                return None, ["https://pravo.by/after-empty"]
+            return url, ["https://pravo.by/broken", "https://pravo.by/empty"] if url == "https://pravo.by/" else []
+
+        crawler = Crawler(fetch, max_pages=10)
+        results = asyncio.run(crawler.crawl(["https://pravo.by/"]))
+
+        # Ссылки со страницы без данных не используются
+        assert [result.url for result in results] == ["https://pravo.by/"]
+        assert crawler.stats["errors"] == 1
+        assert "https://pravo.by/after-empty" not in fetched
+
+    def test_pages_fetched_concurrently(self):
+        """Несколько обработчиков загружают страницы одновременно"""
+        urls = [f"https://pravo.by/{i}" for i in range(8)]
+
+        async def fetch(url):
+            await asyncio.sleep(0.1)
+            return url, []
+
+        async def run():
+            start = time.monotonic()
+            results = await Crawler(fetch, workers=8, max_pages=100, max_depth=0).crawl(urls)
+            return results, time.monotonic() - start
+
+        results, elapsed = asyncio.run(run())
+        assert len(results) == 8
+        assert elapsed < 0.4
+
+    def test_bloom_filter_seen_tracking(self, fetch, fetched):
+        """Обход с фильтром Блума также не загружает страницы повторно"""
+        results = asyncio.run(Crawler(fetch, max_pages=100, bloom_capacity=1000).crawl(["https://pravo.by/"]))
+        assert len(results) == len(SITE)
+        assert len(fetched) == len(set(fetched))
+
+
+class TestBloomFilter:
+    """Тесты для фильтра Блума"""
+
+    def test_membership(self):
+        """Добавленные элементы всегда находятся, ложных срабатываний мало"""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"https://pravo.by/document/{i}")
+
+        assert all(f"https://pravo.by/document/{i}" in bloom for i in range(1000))
+        false_positives = sum(f"https://pravo.by/other/{i}" in bloom for i in range(1000))
+        assert false_positives < 50
+
+
+def test_create_crawler_parameters_override_config():
+    """Явно переданные параметры обхода имеют приоритет, конфигурация не изменяется"""
+    async def fetch(url):
+        return url, []
+
+    crawler = create_crawler(fetch, max_pages=10, max_depth=1, workers=2)
+    default = create_crawler(fetch, max_pages=10)
+
+    assert (crawler.workers, crawler.max_depth) == (2, 1)
+    assert (default.workers, default.max_depth) == (config.CRAWL_WORKERS, config.CRAWL_MAX_DEPTH)
+
+
+def test_normalize_url():
+    """Фрагмент URL не влияет на адрес страницы"""
+    assert normalize_url("https://pravo.by/a#section") == "https://pravo.by/a"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
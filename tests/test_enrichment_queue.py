@@ -0,0 +1,151 @@
+"""
+Тесты для фоновой очереди пополнения базы знаний
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules.enrichment_queue import EnrichmentQueue, EnrichmentJob
+
+
+class TestEnrichmentQueue:
+    """Тесты для класса EnrichmentQueue"""
+
+    def test_job_runs_in_background(self):
+        """Задача выполняется после возврата submit и вызывает on_complete"""
+        completed = []
+
+        async def handler(job):
+            await asyncio.sleep(0.01)
+            return [{'id': f"doc_{job.key}"}], 1
+
+        async def on_complete(docs, pages_count):
+            completed.append((docs, pages_count))
+
+        async def scenario():
+            queue = EnrichmentQueue(handler, workers=1, max_size=4)
+            assert queue.submit(EnrichmentJob("q1", "Вопрос", "ctx-1", on_complete))
+            assert completed == []
+            await queue.join()
+            stats = queue.get_stats()
+            await queue.stop()
+            return stats
+
+        stats = asyncio.run(scenario())
+        assert completed == [([{'id': 'doc_q1'}], 1)]
+        assert stats["done"] == 1
+        assert stats["pending"] == 0
+
+    def test_duplicate_question_is_not_queued(self):
+        """Одинаковый вопрос не ставится в очередь повторно, пока первый не обработан"""
+        calls = []
+
+        async def handler(job):
+            calls.append(job.context_id)
+            await asyncio.sleep(0.01)
+            return [], 0
+
+        async def scenario():
+            queue = EnrichmentQueue(handler, workers=2, max_size=4)
+            first = queue.submit(EnrichmentJob("q", "Вопрос", "ctx-1"))
+            second = queue.submit(EnrichmentJob("q", "Вопрос", "ctx-2"))
+            await queue.join()
+            third = queue.submit(EnrichmentJob("q", "Вопрос", "ctx-3"))
+            await queue.join()
+            stats = queue.get_stats()
+            await queue.stop()
+            return (first, second, third), stats
+
+        results, stats = asyncio.run(scenario())
+        assert results == (True, False, True)
+        assert calls == ["ctx-1", "ctx-3"]
+        assert stats["duplicate"] == 1
+        assert stats["empty"] == 2
+
+    def test_full_queue_drops_jobs(self):
+        """Переполненная очередь отбрасывает новые задачи, не блокируя вызывающий код"""
+        release = None
+
+        async def handler(job):
+            await release.wait()
+            return [], 0
+
+        async def scenario():
+            nonlocal release
+            release = asyncio.Event()
+            queue = EnrichmentQueue(handler, workers=1, max_size=1)
+            accepted = [queue.submit(EnrichmentJob(f"q{i}", "Вопрос", f"ctx-{i}")) for i in range(2)]
+            # Обработчик забрал первую задачу - в очереди освободилось место
+            await asyncio.sleep(0)
+            accepted += [queue.submit(EnrichmentJob(f"q{i}", "Вопрос", f"ctx-{i}")) for i in range(2, 4)]
+            release.set()
+            await queue.join()
+            stats = queue.get_stats()
+            await queue.stop()
+            return accepted, stats
+
+        accepted, stats = asyncio.run(scenario())
+        assert accepted == [True, False, True, False]
+        assert stats["dropped"] == 2
+
+    def test_slow_on_complete_does_not_hold_worker(self):
+        """Ожидание в on_complete не занимает обработчик: следующая задача выполняется сразу"""
+        handled = []
+        release = None
+
+        async def handler(job):
+            handled.append(job.key)
+            return [{'id': job.key}], 1
+
+        async def on_complete(docs, pages_count):
+            await release.wait()
+
+        async def scenario():
+            nonlocal release
+            release = asyncio.Event()
+            queue = EnrichmentQueue(handler, workers=1, max_size=4)
+            queue.submit(EnrichmentJob("q1", "Вопрос", "ctx-1", on_complete))
+            queue.submit(EnrichmentJob("q2", "Вопрос", "ctx-2", on_complete))
+            for _ in range(5):
+                await asyncio.sleep(0)
+            before_release = (list(handled), queue.get_stats()["callbacks"])
+            release.set()
+            await queue.join()
+            stats = queue.get_stats()
+            await queue.stop()
+            return before_release, stats
+
+        (handled_before, callbacks), stats = asyncio.run(scenario())
+        assert handled_before == ["q1", "q2"]
+        assert callbacks == 2
+        assert stats["callbacks"] == 0
+
+    def test_handler_errors_do_not_stop_worker(self):
+        """Ошибка одной задачи не останавливает обработку следующих"""
+        async def handler(job):
+            if job.key == "bad":
+                raise RuntimeError("pravo.by недоступен")
+            return [{'id': 'doc'}], 1
+
+        async def scenario():
+            queue = EnrichmentQueue(handler, workers=1, max_size=4)
+            queue.submit(EnrichmentJob("bad", "Вопрос", "ctx-1"))
+            queue.submit(EnrichmentJob("good", "Вопрос", "ctx-2"))
+            await queue.join()
+            stats = queue.get_stats()
+            await queue.stop()
+            return stats
+
+        stats = asyncio.run(scenario())
+        assert stats["failed"] == 1
+        assert stats["done"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
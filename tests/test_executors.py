@@ -0,0 +1,83 @@
+"""
+Тесты для модуля пулов исполнителей
+"""
+
+import asyncio
+import threading
+import time
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules.executors import BoundedExecutor, ExecutorQueueFull
+
+
+class TestBoundedExecutor:
+    """Тесты для класса BoundedExecutor"""
+
+    @pytest.fixture
+    def executor(self):
+        """Создает пул из двух потоков с очередью на одну задачу"""
+        executor = BoundedExecutor("test", max_workers=2, max_queue=1)
+        yield executor
+        executor.shutdown()
+
+    def test_run_returns_result(self, executor):
+        """Тест получения результата блокирующей функции"""
+        result = asyncio.run(executor.run(lambda a, b=0: a + b, 2, b=3))
+        assert result == 5
+
+    def test_run_in_worker_thread(self, executor):
+        """Тест выполнения функции вне потока event loop"""
+        main_thread = threading.get_ident()
+        worker_thread = asyncio.run(executor.run(threading.get_ident))
+        assert worker_thread != main_thread
+
+    def test_event_loop_not_blocked(self, executor):
+        """Тест того, что блокирующие задачи выполняются параллельно"""
+        async def scenario():
+            start = time.monotonic()
+            await asyncio.gather(executor.run(time.sleep, 0.2), executor.run(time.sleep, 0.2))
+            return time.monotonic() - start
+
+        assert asyncio.run(scenario()) < 0.35
+
+    def test_queue_is_bounded(self, executor):
+        """Тест отклонения задач сверх потоков и очереди пула"""
+        release = threading.Event()
+        peak = {'value': 0}
+
+        async def scenario():
+            tasks = [asyncio.create_task(executor.run(release.wait, 1)) for _ in range(5)]
+            await asyncio.sleep(0.1)
+            stats = executor.get_stats()
+            peak['value'] = stats['active']
+            queued = stats['queued']
+            release.set()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            return queued, results
+
+        queued, results = asyncio.run(scenario())
+        assert peak['value'] == 2
+        assert queued == 1
+        assert results[:3] == [True, True, True]
+        assert all(isinstance(result, ExecutorQueueFull) for result in results[3:])
+        assert executor.get_stats()['queued'] == 0
+        assert executor.get_stats()['active'] == 0
+
+    def test_exception_propagates(self, executor):
+        """Тест проброса исключения из пула"""
+        def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            asyncio.run(executor.run(fail))
+        assert executor.get_stats()['active'] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
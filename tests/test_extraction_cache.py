@@ -0,0 +1,116 @@
+"""
+Тесты для кеша извлечения текста из документов
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules import extraction_cache
+from modules.extraction_cache import ExtractionCache, file_sha256, iter_cached_document_pages
+
+
+class TestExtractionCache:
+    """Тесты для хранения текста и блоков в ExtractionCache"""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        """Создает кеш в SQLite-файле во временной папке"""
+        return ExtractionCache(str(tmp_path / "extraction_cache.db"))
+
+    def test_pages_round_trip(self, cache):
+        """Страницы сохраняются после полного прохода и читаются в том же порядке"""
+        pages = [(page_num, f"Статья {page_num}.\nТекст страницы " * 500) for page_num in range(1, 30)]
+
+        passed = list(cache.store_pages("abc", iter(pages), extractor="text:v1"))
+
+        assert passed == pages
+        assert list(cache.get_pages("abc", extractor="text:v1")) == pages
+        assert cache.get_pages("abc", extractor="text:v2") is None
+
+    def test_failed_extraction_not_stored(self, cache):
+        """Если извлечение прервалось с ошибкой, текст не сохраняется"""
+        def broken_pages():
+            yield 1, "Статья 1."
+            raise RuntimeError("поврежденный PDF")
+
+        with pytest.raises(RuntimeError):
+            list(cache.store_pages("abc", broken_pages()))
+
+        assert cache.get_pages("abc") is None
+
+    def test_blocks_keyed_on_chunker_version(self, cache):
+        """Блоки хранятся отдельно для каждой версии разбиения"""
+        blocks = [("Статья 1. Текст", 1, 1), ("Статья 2. Текст", 1, 2)]
+
+        assert list(cache.store_blocks("abc", "structure:v3", "Кодекс", iter(blocks))) == blocks
+
+        head, cached = cache.get_blocks("abc", "structure:v3")
+        assert (head, list(cached)) == ("Кодекс", blocks)
+        assert cache.get_blocks("abc", "structure:v4") is None
+        assert cache.get_stats()["blocks_entries"] == 1
+
+    def test_failed_chunking_not_stored(self, cache):
+        """Если разбиение прервалось с ошибкой, блоки не сохраняются"""
+        def broken_blocks():
+            yield "Статья 1. Текст", 1, 1
+            raise RuntimeError("поврежденный PDF")
+
+        with pytest.raises(RuntimeError):
+            list(cache.store_blocks("abc", "structure:v3", "Кодекс", broken_blocks()))
+
+        assert cache.get_blocks("abc", "structure:v3") is None
+
+    def test_legacy_blocks_dropped(self, tmp_path):
+        """Блоки прежнего формата удаляются при открытии кеша"""
+        db_path = str(tmp_path / "extraction_cache.db")
+        cache = ExtractionCache(db_path)
+        list(cache.store_blocks("abc", "structure:v3", "Кодекс", [("Статья 1.", 1, 1)]))
+        cache._conn.execute("PRAGMA user_version = 0")
+        cache._conn.commit()
+
+        assert ExtractionCache(db_path).get_blocks("abc", "structure:v3") is None
+
+    def test_eviction_by_size(self, tmp_path):
+        """Сверх лимита вытесняются давно не использованные записи"""
+        cache = ExtractionCache(None, max_bytes=3000)
+        for name in ("first", "second", "third"):
+            list(cache.store_blocks(name, "v1", "", [(name * 10 + str(i), None, None) for i in range(300)]))
+        cache.get_blocks("first", "v1")
+        list(cache.store_blocks("fourth", "v1", "", [("fourth" * 10 + str(i), None, None) for i in range(300)]))
+
+        assert cache.get_blocks("fourth", "v1") is not None
+        assert cache.get_stats()["size_bytes"] <= 3000
+        assert cache.get_blocks("second", "v1") is None
+
+
+def test_cached_document_pages_skip_extraction(tmp_path, monkeypatch):
+    """Повторное чтение документа с тем же содержимым не вызывает извлечение текста"""
+    path = tmp_path / "code.docx"
+    path.write_bytes(b"docx content")
+    calls = []
+
+    def fake_pages(file_path):
+        calls.append(file_path)
+        yield None, "Статья 1. Текст документа"
+
+    monkeypatch.setattr(extraction_cache, "iter_document_pages", fake_pages)
+    cache = ExtractionCache(None)
+
+    first = list(iter_cached_document_pages(str(path), cache=cache))
+    # Копия файла с тем же содержимым тоже берется из кеша
+    copy = tmp_path / "copy.docx"
+    copy.write_bytes(path.read_bytes())
+    second = list(iter_cached_document_pages(str(copy), cache=cache))
+
+    assert first == second == [(None, "Статья 1. Текст документа")]
+    assert len(calls) == 1
+    assert cache.get_pages(file_sha256(str(path))) is not None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,106 @@
+"""
+Тесты для движков извлечения данных из HTML
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules.html_extract import get_available_extractors, get_html_extractor, decode_html, css_to_xpath
+
+FIXTURES = Path(__file__).parent / "fixtures" / "html"
+BACKENDS = ['bs4', 'lxml', 'selectolax']
+
+SEARCH_SELECTORS = [
+    'a[href*="/novosti/"]',
+    'a[href*="/pravovaya-informatsiya/"]',
+    '.search-result a',
+    '.result-item a'
+]
+
+
+@pytest.fixture(params=BACKENDS)
+def extractor(request):
+    """Движок разбора HTML (пропускается, если библиотека не установлена)"""
+    if request.param not in get_available_extractors():
+        pytest.skip(f"{request.param} не установлен")
+    return get_html_extractor(request.param)
+
+
+class TestHtmlExtractor:
+    """Тесты для движков HtmlExtractor"""
+
+    def test_document_matches_beautifulsoup(self, extractor):
+        """Движок извлекает из страницы pravo.by то же, что BeautifulSoup"""
+        html = (FIXTURES / "pravo_by_document.html").read_bytes()
+        expected = get_html_extractor('bs4').extract(html, with_links=True)
+
+        result = extractor.extract(html, with_links=True)
+
+        assert result.title == expected.title
+        assert result.text == expected.text
+        assert result.meta_modified == expected.meta_modified == "2024-03-15T10:00:00+03:00"
+        assert sorted(href for href, _ in result.links) == sorted(href for href, _ in expected.links)
+
+    def test_navigation_and_scripts_removed(self, extractor):
+        """Навигация, скрипты и комментарии не попадают в текст, ссылки меню собираются"""
+        html = (FIXTURES / "pravo_by_document.html").read_bytes()
+
+        result = extractor.extract(html, with_links=True)
+
+        assert result.text.startswith("ТРУДОВОЙ КОДЕКС РЕСПУБЛИКИ БЕЛАРУСЬ")
+        assert "dataLayer" not in result.text
+        assert "версия документа" not in result.text
+        assert "Новости" not in result.text
+        assert "О портале" not in result.text
+        assert ("/pravovaya-informatsiya/trudovoe-pravo/", "Трудовое право") in result.links
+
+    def test_body_used_without_main_content(self, extractor):
+        """Без основного блока текст берется из body"""
+        html = "<html><head><title> Указ </title></head><body><div>Текст <b>указа</b></div><footer>Подвал</footer></body></html>"
+
+        result = extractor.extract(html)
+
+        assert result.title == "Указ"
+        assert result.text == "Текст указа"
+        assert result.meta_modified is None
+
+    def test_select_links(self, extractor):
+        """Поиск элементов по селекторам совпадает с BeautifulSoup"""
+        html = (FIXTURES / "pravo_by_search.html").read_bytes()
+        expected = get_html_extractor('bs4').select_links(html, SEARCH_SELECTORS)
+
+        result = extractor.select_links(html, SEARCH_SELECTORS)
+
+        assert result == expected
+        assert (None, "Ссылка без адреса о трудовом договоре") in result
+
+    def test_empty_document(self, extractor):
+        """Пустая страница не вызывает ошибок"""
+        result = extractor.extract(b"", with_links=True)
+        assert result.text == "" and result.links == []
+        assert extractor.select_links(b"", SEARCH_SELECTORS) == []
+
+
+def test_decode_html_uses_declared_charset():
+    """Кодировка берется из мета-тега, иначе пробуется UTF-8 и windows-1251"""
+    text = "<html><head><meta charset=\"windows-1251\"></head><body>Кодекс</body></html>"
+    assert decode_html(text.encode('cp1251')) == text
+    assert decode_html("<p>Кодекс</p>".encode('utf-8')) == "<p>Кодекс</p>"
+    assert decode_html("<p>Кодекс</p>".encode('cp1251')) == "<p>Кодекс</p>"
+
+
+def test_unsupported_selector_rejected():
+    """Сложные CSS-селекторы не переводятся в XPath молча"""
+    if 'lxml' not in get_available_extractors():
+        pytest.skip("lxml не установлен")
+    with pytest.raises(ValueError):
+        css_to_xpath("ul > li:first-child")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
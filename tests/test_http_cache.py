@@ -0,0 +1,231 @@
+"""
+Тесты для кеша HTTP-ответов
+"""
+
+import asyncio
+import sys
+import zlib
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules.http_cache import HttpCache
+
+
+class FakeResponse:
+    """Ответ requests с нужным статусом и заголовками"""
+
+    def __init__(self, status_code=200, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    """Сессия requests, отвечающая заранее заданными ответами"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, timeout=None, headers=None):
+        self.requests.append(headers or {})
+        return self.responses.pop(0)
+
+
+class FakeAsyncResponse:
+    """Ответ aiohttp для использования в async with"""
+
+    def __init__(self, status=200, body=b"", headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise RuntimeError(f"HTTP {self.status}")
+
+    async def read(self):
+        return self.body
+
+
+class FakeAsyncSession:
+    """Сессия aiohttp, отвечающая заранее заданными ответами"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None):
+        self.requests.append(headers or {})
+        return self.responses.pop(0)
+
+
+class TestHttpCache:
+    """Тесты для класса HttpCache"""
+
+    URL = "https://pravo.by/document/?guid=3871&p0=hk9900296"
+    BODY = "<html><title>Гражданский кодекс</title><body>Статья 1.</body></html>".encode("utf-8")
+
+    @pytest.fixture
+    def cache(self):
+        """Создает кеш в памяти"""
+        return HttpCache(None, max_bytes=1024 * 1024, ttl_seconds=3600)
+
+    def test_fresh_entry_served_without_request(self, cache):
+        """Свежая запись отдается без обращения к сайту"""
+        session = FakeSession(FakeResponse(content=self.BODY, headers={'ETag': '"v1"'}))
+
+        first = cache.get(session, self.URL)
+        second = cache.get(session, self.URL)
+
+        assert not first.from_cache
+        assert second.from_cache
+        assert second.content == self.BODY
+        assert len(session.requests) == 1
+        stats = cache.get_stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1
+        assert stats["bytes_saved"] == len(self.BODY)
+
+    def test_stale_entry_revalidated_with_304(self, cache):
+        """Устаревшая запись перепроверяется условным запросом"""
+        cache.ttl_seconds = 0
+        session = FakeSession(
+            FakeResponse(content=self.BODY, headers={'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}),
+            FakeResponse(status_code=304, headers={'ETag': '"v1"'})
+        )
+
+        cache.get(session, self.URL)
+        revalidated = cache.get(session, self.URL)
+
+        assert session.requests[1] == {
+            'If-None-Match': '"v1"',
+            'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'
+        }
+        assert revalidated.from_cache
+        assert revalidated.content == self.BODY
+        assert cache.get_stats()["revalidated"] == 1
+
+    def test_changed_page_replaces_entry(self, cache):
+        """Измененная страница загружается заново и заменяет запись"""
+        cache.ttl_seconds = 0
+        new_body = self.BODY.replace(b"1.", b"2.")
+        session = FakeSession(
+            FakeResponse(content=self.BODY, headers={'ETag': '"v1"'}),
+            FakeResponse(content=new_body, headers={'ETag': '"v2"'})
+        )
+
+        first = cache.get(session, self.URL)
+        second = cache.get(session, self.URL)
+
+        assert second.content == new_body
+        assert second.content_hash != first.content_hash
+        assert cache.lookup(self.URL).headers['etag'] == '"v2"'
+
+    def test_no_store_is_not_cached(self, cache):
+        """Ответы с Cache-Control: no-store не сохраняются"""
+        session = FakeSession(
+            FakeResponse(content=self.BODY, headers={'Cache-Control': 'no-store'}),
+            FakeResponse(content=self.BODY)
+        )
+
+        cache.get(session, self.URL)
+        cache.get(session, self.URL)
+
+        assert len(session.requests) == 2
+
+    def test_lru_eviction_by_size(self):
+        """При превышении размера вытесняются давно не использованные страницы"""
+        body = bytes(range(256)) * 8  # плохо сжимается
+        entry_size = len(zlib.compress(body))
+        cache = HttpCache(None, max_bytes=entry_size * 2, ttl_seconds=3600)
+
+        cache.store("https://pravo.by/a", body, {})
+        cache.store("https://pravo.by/b", body, {})
+        cache.lookup("https://pravo.by/a")  # a использовалась недавно
+        cache.store("https://pravo.by/c", body, {})
+
+        assert cache.lookup("https://pravo.by/a") is not None
+        assert cache.lookup("https://pravo.by/b") is None
+        assert cache.lookup("https://pravo.by/c") is not None
+        assert cache.get_stats()["size_bytes"] <= entry_size * 2
+
+    def test_parsed_result_reused_until_body_changes(self, cache):
+        """Результат разбора берется из кеша, пока тело страницы не изменится"""
+        calls = []
+
+        def parse():
+            calls.append(1)
+            return {'title': 'Гражданский кодекс'}
+
+        response = cache.store(self.URL, self.BODY, {})
+        assert cache.cached_parse(response, "page:v1", parse) == {'title': 'Гражданский кодекс'}
+        assert cache.cached_parse(cache.lookup(self.URL), "page:v1", parse) == {'title': 'Гражданский кодекс'}
+        assert len(calls) == 1
+
+        changed = cache.store(self.URL, self.BODY + b" ", {})
+        cache.cached_parse(changed, "page:v1", parse)
+        assert len(calls) == 2
+
+    def test_async_revalidation(self, cache):
+        """Асинхронная загрузка перепроверяет запись условным запросом"""
+        cache.ttl_seconds = 0
+        session = FakeAsyncSession(
+            FakeAsyncResponse(body=self.BODY, headers={'ETag': '"v1"'}),
+            FakeAsyncResponse(status=304)
+        )
+
+        async def fetch_twice():
+            first = await cache.get_async(session, self.URL)
+            second = await cache.get_async(session, self.URL)
+            return first, second
+
+        first, second = asyncio.run(fetch_twice())
+
+        assert not first.from_cache
+        assert second.from_cache and second.content == self.BODY
+        assert session.requests[1] == {'If-None-Match': '"v1"'}
+
+    def test_max_age_forces_revalidation(self, cache):
+        """Запись младше TTL перепроверяется, если запрошена загрузка с max_age=0"""
+        session = FakeAsyncSession(
+            FakeAsyncResponse(body=self.BODY, headers={'ETag': '"v1"'}),
+            FakeAsyncResponse(status=304)
+        )
+
+        async def fetch_twice():
+            await cache.get_async(session, self.URL)
+            return await cache.get_async(session, self.URL, max_age=0)
+
+        second = asyncio.run(fetch_twice())
+
+        assert second.content == self.BODY
+        assert len(session.requests) == 2
+        assert session.requests[1] == {'If-None-Match': '"v1"'}
+        assert cache.get_stats()["revalidated"] == 1
+
+    def test_persistence(self, tmp_path):
+        """Записи сохраняются между экземплярами кеша"""
+        db_path = str(tmp_path / "http_cache.db")
+        HttpCache(db_path).store(self.URL, self.BODY, {'ETag': '"v1"'})
+
+        reopened = HttpCache(db_path)
+        assert reopened.lookup(self.URL).content == self.BODY
+        assert reopened.get_stats()["size_bytes"] > 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,235 @@
+"""
+Тесты для проверки изменений страниц инкрементальным скрапером
+"""
+
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules.crawler import CrawlResult
+from modules.incremental_scraper import IncrementalScraper
+from modules.page_store import PageStore
+from modules.html_extract import get_html_extractor
+from modules.http_cache import CachedResponse
+from modules.rate_limit import HostLimiter
+from modules.web_scraper import WebScraper
+
+CONTENT = "<html><body><main>Статья 1. Трудовой договор заключается в письменной форме.</main></body></html>"
+
+
+class FakeHeadResponse:
+    """Ответ aiohttp на HEAD-запрос"""
+
+    def __init__(self, status, headers=None):
+        self.status = status
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Сессия aiohttp, отвечающая на HEAD-запросы по URL"""
+
+    def __init__(self, head_responses):
+        self.head_responses = head_responses
+        self.head_requests = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def head(self, url, headers=None, allow_redirects=True):
+        self.head_requests[url] = headers
+        return self.head_responses[url]
+
+
+class TestCheckForChanges:
+    """Тесты для метода check_for_changes"""
+
+    @pytest.fixture
+    def scraper(self):
+        """Создает скрапер с хранилищем информации о страницах в памяти"""
+        web_scraper = Mock()
+        web_scraper.http_cache = None
+        web_scraper.html_extractor = get_html_extractor('bs4')
+        web_scraper._clean_text = lambda text: WebScraper._clean_text(web_scraper, text)
+        web_scraper.host_limiter = HostLimiter(max_concurrency=10, rate=1000, burst=100)
+        scraper = IncrementalScraper(web_scraper, Mock(), PageStore(None))
+        scraper.downloaded = []
+
+        scraper.download_max_ages = []
+
+        async def fake_download(session, url, max_age=None):
+            scraper.downloaded.append(url)
+            scraper.download_max_ages.append(max_age)
+            return CachedResponse(url=url, content=CONTENT.encode('utf-8'), headers={'ETag': '"new"'})
+
+        web_scraper._download_async = fake_download
+        return scraper
+
+    def _track(self, scraper, url, **page_info):
+        """Добавляет страницу, проверенную давно"""
+        scraper.page_store.upsert_pages({url: {
+            "content_hash": "old-hash",
+            "last_check": (datetime.now() - timedelta(days=2)).isoformat(),
+            **page_info
+        }})
+
+    def test_conditional_requests_avoid_downloads(self, scraper):
+        """Страницы, неизменность которых подтверждена заголовками, не загружаются"""
+        self._track(scraper, "https://pravo.by/not-modified", etag='"v1"')
+        self._track(scraper, "https://pravo.by/same-etag", etag='"v2"')
+        self._track(scraper, "https://pravo.by/same-date", last_modified="Mon, 01 Jan 2024 00:00:00 GMT",
+                    http_content_length="100")
+        self._track(scraper, "https://pravo.by/gone", etag='"v3"')
+        self._track(scraper, "https://pravo.by/no-validators")
+        self._track(scraper, "https://pravo.by/recent", etag='"v4"', last_check=datetime.now().isoformat())
+
+        session = FakeSession({
+            "https://pravo.by/not-modified": FakeHeadResponse(304),
+            "https://pravo.by/same-etag": FakeHeadResponse(200, {'ETag': '"v2"'}),
+            "https://pravo.by/same-date": FakeHeadResponse(200, {
+                'Last-Modified': "Mon, 01 Jan 2024 00:00:00 GMT", 'Content-Length': "100"
+            }),
+            "https://pravo.by/gone": FakeHeadResponse(404),
+        })
+        scraper.web_scraper.create_session.return_value = session
+
+        urls = scraper.page_store.get_domain_urls("pravo.by") + ["https://pravo.by/new"]
+        new_pages, changed_pages, deleted_pages = scraper.check_for_changes(urls)
+
+        assert new_pages == ["https://pravo.by/new"]
+        assert changed_pages == ["https://pravo.by/no-validators"]
+        assert deleted_pages == ["https://pravo.by/gone"]
+        # Загружена только страница, о которой сервер не сообщил валидаторов
+        assert scraper.downloaded == ["https://pravo.by/no-validators"]
+        assert session.head_requests["https://pravo.by/not-modified"] == {'If-None-Match': '"v1"'}
+        assert "https://pravo.by/recent" not in session.head_requests
+        # Валидаторы сохраняются для следующей проверки
+        assert scraper.page_store.get_page("https://pravo.by/no-validators")["etag"] == '"new"'
+        assert scraper.page_store.get_page("https://pravo.by/not-modified")["content_hash"] == "old-hash"
+
+    def test_changed_etag_confirmed_by_content_hash(self, scraper):
+        """Изменение ETag без изменения контента не считается изменением страницы"""
+        url = "https://pravo.by/document"
+        self._track(scraper, url, etag='"v1"', content_hash=scraper._parse_page_info(CONTENT)["content_hash"])
+        scraper.web_scraper.create_session.return_value = FakeSession({
+            url: FakeHeadResponse(200, {'ETag': '"v2"'})
+        })
+
+        new_pages, changed_pages, deleted_pages = scraper.check_for_changes([url])
+
+        assert (new_pages, changed_pages, deleted_pages) == ([], [], [])
+        assert scraper.downloaded == [url]
+        # Страница перепроверяется на сайте, а не берется из HTTP-кеша
+        assert scraper.download_max_ages == [0]
+        assert scraper.page_store.get_page(url)["etag"] == '"new"'
+
+    def test_missing_pages_of_checked_domain_deleted(self, scraper):
+        """Страницы, исчезнувшие с проверяемого сайта, считаются удаленными, другие сайты не затрагиваются"""
+        self._track(scraper, "https://pravo.by/removed", last_check=datetime.now().isoformat())
+        self._track(scraper, "https://etalonline.by/document", last_check=datetime.now().isoformat())
+        scraper.web_scraper.create_session.return_value = FakeSession({})
+
+        assert scraper.check_for_changes(["https://pravo.by/"]) == (["https://pravo.by/"], [], ["https://pravo.by/removed"])
+
+    def test_pages_checked_concurrently(self, scraper):
+        """Страницы проверяются параллельно"""
+        urls = [f"https://pravo.by/page{i}" for i in range(10)]
+        for url in urls:
+            self._track(scraper, url, etag='"v1"')
+
+        class SlowHeadResponse(FakeHeadResponse):
+            async def __aenter__(self):
+                await asyncio.sleep(0.1)
+                return self
+
+        scraper.web_scraper.create_session.return_value = FakeSession({url: SlowHeadResponse(304) for url in urls})
+
+        start = datetime.now()
+        scraper.check_for_changes(urls)
+        assert (datetime.now() - start).total_seconds() < 0.5
+
+
+class TestIncrementalScrape:
+    """Тесты для метода incremental_scrape"""
+
+    def test_new_page_recorded_with_validators_and_check_hash(self, tmp_path):
+        """Новая страница сохраняется с валидаторами ответа и хэшем, который совпадет при проверке"""
+        url = "https://pravo.by/document"
+        web_scraper = Mock()
+        web_scraper.html_extractor = get_html_extractor('bs4')
+        web_scraper._clean_text = lambda text: WebScraper._clean_text(web_scraper, text)
+        web_scraper.create_session.return_value = FakeSession({})
+        web_scraper.add_to_knowledge_base.return_value = 1
+        web_scraper.crawl.return_value = [CrawlResult(url=url, depth=0, data={
+            'url': url,
+            'title': "Документ",
+            'content': web_scraper._clean_text(web_scraper.html_extractor.extract(CONTENT).text),
+            'domain': "pravo.by",
+            'http_headers': {'etag': '"v1"', 'last-modified': "Mon, 01 Jan 2024 00:00:00 GMT",
+                             'content-length': "100"}
+        })]
+        scraper = IncrementalScraper(web_scraper, Mock(), PageStore(None))
+        scraper._discover_site_urls = lambda start_url, max_pages: [url]
+
+        scraper.incremental_scrape(url)
+
+        page = scraper.page_store.get_page(url)
+        assert page["etag"] == '"v1"'
+        assert page["last_modified"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+        assert page["http_content_length"] == "100"
+        assert page["content_hash"] == scraper._parse_page_info(CONTENT.encode('utf-8'))["content_hash"]
+
+    def test_deleted_pages_removed_from_knowledge_base(self):
+        """Блоки исчезнувших страниц удаляются из базы знаний, запись страницы - только после этого"""
+        web_scraper = Mock()
+        web_scraper.remove_pages.side_effect = lambda urls: [url for url in urls if url.endswith("/removed")]
+        scraper = IncrementalScraper(web_scraper, Mock(), PageStore(None))
+        for url in ("https://pravo.by/removed", "https://pravo.by/locked"):
+            scraper.page_store.upsert_pages({url: {"content_hash": "old-hash"}})
+        scraper._discover_site_urls = lambda start_url, max_pages: []
+        scraper.check_for_changes = lambda urls: ([], [], ["https://pravo.by/removed", "https://pravo.by/locked"])
+
+        result = scraper.incremental_scrape("https://pravo.by/")
+
+        web_scraper.remove_pages.assert_called_once_with(["https://pravo.by/removed", "https://pravo.by/locked"])
+        assert result["deleted_pages"] == 2
+        assert scraper.page_store.get_page("https://pravo.by/removed") is None
+        # Если блоки не удалось удалить, страница остается и удаление повторится при следующей проверке
+        assert scraper.page_store.get_page("https://pravo.by/locked") is not None
+
+    def test_meta_date_not_sent_as_if_modified_since(self):
+        """Дата из мета-тегов не используется как Last-Modified"""
+        html = CONTENT.replace("<html>", '<html><head><meta name="last-modified" content="2024-03-15"></head>')
+        web_scraper = Mock()
+        web_scraper.http_cache = None
+        web_scraper.html_extractor = get_html_extractor('bs4')
+        web_scraper._clean_text = lambda text: WebScraper._clean_text(web_scraper, text)
+
+        async def fake_download(session, url, max_age=None):
+            return CachedResponse(url=url, content=html.encode('utf-8'), headers={})
+
+        web_scraper._download_async = fake_download
+        scraper = IncrementalScraper(web_scraper, Mock(), PageStore(None))
+
+        info = asyncio.run(scraper._get_page_info_async(None, "https://pravo.by/document"))
+
+        assert info["last_modified"] is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
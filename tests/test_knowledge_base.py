@@ -0,0 +1,375 @@
+"""
+Тесты для модуля базы знаний
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules import knowledge_base as kb_module
+from modules.knowledge_base import relevance_distance
+from modules.document_manifest import DocumentManifest
+from modules.bm25_index import BM25Index, tokenize
+
+
+class TestAddDocuments:
+    """Тесты пакетного добавления документов"""
+
+    def test_adds_in_batches(self, knowledge_base):
+        """Тест записи документов пакетами заданного размера"""
+        ids = [f"doc_{i}" for i in range(5)]
+        texts = [f"текст документа {i}" for i in range(5)]
+
+        added = knowledge_base.add_documents(ids, texts, [{"source": "test"}] * 5, batch_size=2)
+
+        assert added == 5
+        assert knowledge_base.embedding_function.calls == [2, 2, 1]
+        assert knowledge_base.collection.count() == 5
+        metadata = knowledge_base.collection.get(ids=["doc_3"])['metadatas'][0]
+        assert metadata['source'] == "test"
+        assert metadata['doc_id'] == "doc_3"
+
+    def test_skips_existing_empty_and_duplicates(self, knowledge_base):
+        """Тест пропуска существующих, пустых и повторяющихся документов"""
+        knowledge_base.add_documents(["doc_0"], ["старый текст"])
+
+        added = knowledge_base.add_documents(
+            ["doc_0", "doc_1", "doc_1", "doc_2"],
+            ["новый текст", "текст", "дубликат", "   "]
+        )
+
+        assert added == 1
+        assert knowledge_base.collection.count() == 2
+        assert knowledge_base.collection.get(ids=["doc_0"])['documents'][0] == "старый текст"
+
+    def test_add_document_uses_batch_path(self, knowledge_base):
+        """Тест добавления одного документа"""
+        assert knowledge_base.add_document("doc_0", "текст")
+        assert not knowledge_base.add_document("doc_0", "текст")
+
+    def test_mismatched_lengths(self, knowledge_base):
+        """Тест проверки длины входных списков"""
+        with pytest.raises(ValueError):
+            knowledge_base.add_documents(["doc_0", "doc_1"], ["текст"])
+
+    def test_listeners_notified(self, knowledge_base):
+        """Тест уведомления подписчиков о добавленных документах"""
+        changes = []
+        kb_module.add_change_listener(changes.append)
+        try:
+            knowledge_base.add_documents(["doc_0", "doc_1", "doc_2"], ["а", "б", "в"], batch_size=2)
+        finally:
+            kb_module.remove_change_listener(changes.append)
+
+        assert changes == [["doc_0", "doc_1"], ["doc_2"]]
+
+
+class TestDocumentReplacement:
+    """Тесты удаления и замены документов по метаданным"""
+
+    def _add_file(self, kb, source_file, count, prefix=None):
+        prefix = prefix or source_file
+        ids = [f"{prefix}_block_{i:03d}" for i in range(count)]
+        texts = [f"{source_file} блок {i}" for i in range(count)]
+        return kb.add_documents(ids, texts, [{"source_file": source_file}] * count)
+
+    def test_delete_where_removes_all_blocks(self, knowledge_base):
+        """Тест удаления всех блоков файла, включая блоки после пропуска в нумерации"""
+        self._add_file(knowledge_base, "law.pdf", 3)
+        self._add_file(knowledge_base, "other.pdf", 2)
+        knowledge_base.delete_document("law.pdf_block_001")
+
+        deleted = knowledge_base.delete_where(source_file="law.pdf")
+
+        assert deleted == 2
+        assert knowledge_base.collection.count() == 2
+        assert not knowledge_base.has_documents_where(source_file="law.pdf")
+        assert knowledge_base.has_documents_where(source_file="other.pdf")
+
+    def test_replace_document(self, knowledge_base):
+        """Тест замены документа новой версией"""
+        self._add_file(knowledge_base, "law.pdf", 4)
+
+        result = knowledge_base.replace_document(
+            "law.pdf", ["law.pdf_block_000", "law.pdf_block_001"], ["новый блок 0", "новый блок 1"]
+        )
+
+        # Блоки 000 и 001 перезаписаны на месте, удалены только блоки, которых нет в новой версии
+        assert result == {"deleted": 2, "added": 2}
+        assert sorted(knowledge_base.get_ids_where(source_file="law.pdf")) == ["law.pdf_block_000", "law.pdf_block_001"]
+        assert knowledge_base.collection.get(ids=["law.pdf_block_000"])['documents'][0] == "новый блок 0"
+        assert sorted(knowledge_base.manifest.get_ids("law.pdf")) == ["law.pdf_block_000", "law.pdf_block_001"]
+
+    def test_failed_replace_keeps_previous_version(self, knowledge_base, monkeypatch):
+        """Тест сохранения старых блоков, если новую версию не удалось записать"""
+        self._add_file(knowledge_base, "law.pdf", 3)
+
+        def broken_embeddings(texts):
+            raise RuntimeError("сервис эмбеддингов недоступен")
+
+        monkeypatch.setattr(knowledge_base, "embedding_function", broken_embeddings)
+        result = knowledge_base.replace_document("law.pdf", ["law.pdf_block_000"], ["новый блок 0"])
+
+        assert result == {"deleted": 0, "added": 0}
+        assert knowledge_base.collection.count() == 3
+        assert knowledge_base.collection.get(ids=["law.pdf_block_000"])['documents'][0] == "law.pdf блок 0"
+
+    def test_manifest_tracks_blocks(self, knowledge_base):
+        """Тест учета блоков файла в манифесте"""
+        self._add_file(knowledge_base, "law.pdf", 2)
+        assert knowledge_base.manifest.get_ids("law.pdf") == ["law.pdf_block_000", "law.pdf_block_001"]
+
+        knowledge_base.delete_where(source_file="law.pdf")
+        assert not knowledge_base.manifest.has_file("law.pdf")
+
+
+class TestSearchCaching:
+    """Тесты кеширования эмбеддингов запросов и количества документов"""
+
+    def test_repeat_search_skips_embedding_model(self, knowledge_base):
+        """Тест того, что повторный поиск не вычисляет эмбеддинг заново"""
+        knowledge_base.add_documents(["doc_0", "doc_1"], ["трудовой договор", "брачный договор"])
+        knowledge_base.embedding_function.calls.clear()
+
+        first = knowledge_base.search_relevant_docs("Трудовой договор", n_results=2)
+        second = knowledge_base.search_relevant_docs("  трудовой   договор ", n_results=2)
+
+        assert knowledge_base.embedding_function.calls == [1]
+        assert [doc['id'] for doc in first] == [doc['id'] for doc in second]
+
+    def test_embedding_cache_is_bounded(self, knowledge_base, monkeypatch):
+        """Тест ограничения размера кеша эмбеддингов"""
+        monkeypatch.setattr(kb_module, "KB_EMBEDDING_CACHE_SIZE", 2)
+        for text in ["первый", "второй", "третий"]:
+            knowledge_base.embed_query(text)
+        assert list(knowledge_base._embedding_cache) == ["второй", "третий"]
+
+    def test_count_maintained_in_memory(self, knowledge_base):
+        """Тест учета количества документов без запроса к коллекции"""
+        knowledge_base.add_documents(["doc_0"], ["текст"])
+        assert knowledge_base.count_documents() == 1
+
+        knowledge_base.add_documents(["doc_1", "doc_2"], ["текст 1", "текст 2"])
+        assert knowledge_base._document_count == 3
+
+        knowledge_base.delete_document("doc_0")
+        assert knowledge_base.count_documents() == 2
+
+
+class TestHybridSearch:
+    """Тесты гибридного поиска BM25 + векторы"""
+
+    def test_exact_norm_reference_found(self, knowledge_base):
+        """Тест того, что точная ссылка на статью дает низкую дистанцию"""
+        knowledge_base.add_documents(
+            ["doc_0", "doc_1", "doc_2"],
+            ["Статья 1014 Гражданского кодекса (ГК) регулирует сроки возврата вещи",
+             "Порядок регистрации индивидуальных предпринимателей",
+             "Трудовой договор заключается в письменной форме"]
+        )
+
+        docs = knowledge_base.search_relevant_docs("статья 1014 ГК", n_results=2)
+
+        assert docs[0]['id'] == "doc_0"
+        assert docs[0]['relevance_distance'] < 0.5
+        assert docs[0]['lexical_score'] == pytest.approx(1.0)
+        assert docs[0]['fused_score'] > docs[1]['fused_score']
+
+    def test_common_words_do_not_lower_relevance_distance(self, knowledge_base):
+        """Тест того, что совпадение обычных слов вопроса не выдается за точное попадание"""
+        knowledge_base.add_documents(
+            ["doc_0", "doc_1"],
+            ["Что такое трудовой договор: трудовой договор заключается в письменной форме",
+             "Порядок регистрации индивидуальных предпринимателей"]
+        )
+
+        docs = knowledge_base.search_relevant_docs("что такое трудовой договор", n_results=2)
+        doc = next(doc for doc in docs if doc['id'] == "doc_0")
+
+        assert doc['lexical_score'] == pytest.approx(1.0)
+        assert doc['relevance_distance'] == pytest.approx(doc['distance'])
+
+    def test_distance_stays_vector_distance(self, knowledge_base):
+        """Тест того, что лексическое совпадение не подменяет векторную дистанцию"""
+        knowledge_base.add_documents(["doc_0"], ["Статья 1014 Гражданского кодекса (ГК)"])
+        vector_distance = knowledge_base.collection.query(
+            query_embeddings=[knowledge_base.embed_query("статья 1014 ГК")], n_results=1
+        )['distances'][0][0]
+
+        doc = knowledge_base.search_relevant_docs("статья 1014 ГК", n_results=1)[0]
+
+        assert doc['distance'] == pytest.approx(vector_distance)
+        assert relevance_distance(doc) == min(doc['distance'], doc['relevance_distance'])
+
+    def test_index_follows_deletions(self, knowledge_base):
+        """Тест синхронизации лексического индекса с удалением документов"""
+        knowledge_base.add_documents(["doc_0", "doc_1"], ["Декрет №8 о развитии цифровой экономики", "Иной текст"])
+        knowledge_base.delete_document("doc_0")
+
+        assert knowledge_base.bm25.search("декрет 8") == []
+
+    def test_rebuild_from_collection(self, knowledge_base):
+        """Тест построения индекса по существующей коллекции"""
+        knowledge_base.add_documents(["doc_0", "doc_1"], ["Декрет №8", "Кодекс о браке и семье"])
+        knowledge_base.bm25.clear()
+
+        assert knowledge_base.rebuild_lexical_index(page_size=1) == 2
+        assert knowledge_base.bm25.search("кодекс")[0][0] == "doc_1"
+
+
+class TestCitationLookup:
+    """Тесты прямого поиска блоков по ссылке на статью"""
+
+    def test_find_by_citation(self, knowledge_base):
+        """Тест поиска блоков статьи и ее части без эмбеддинга запроса"""
+        knowledge_base.add_documents(
+            ["gk_0", "gk_1", "gk_2", "tk_0"],
+            ["Статья 1014. Сроки", "1. Первая часть", "2. Вторая часть", "Статья 1014. Иное"],
+            [
+                {"citation_act": "гк", "citation_article": "1014", "block_index": 0},
+                {"citation_act": "гк", "citation_article": "1014", "citation_part": "1", "block_index": 1},
+                {"citation_act": "гк", "citation_article": "1014", "citation_part": "2", "block_index": 2},
+                {"citation_act": "тк", "citation_article": "1014", "block_index": 0},
+            ]
+        )
+        knowledge_base.embedding_function.calls.clear()
+
+        docs = knowledge_base.find_by_citation("Что сказано в статье 1014 ГК?")
+        assert [doc['id'] for doc in docs] == ["gk_0", "gk_1", "gk_2"]
+        assert all(doc['distance'] == 0.0 for doc in docs)
+        assert knowledge_base.embedding_function.calls == []
+
+        docs = knowledge_base.find_by_citation("ч. 2 ст. 1014 ГК")
+        assert [doc['id'] for doc in docs] == ["gk_2"]
+
+    def test_no_citation_in_question(self, knowledge_base):
+        """Тест пустого результата для вопроса без ссылки на статью"""
+        knowledge_base.add_documents(["gk_0"], ["Статья 1. Текст"], [{"citation_act": "гк", "citation_article": "1"}])
+        assert knowledge_base.find_by_citation("Как открыть ИП?") == []
+
+    def test_index_follows_deletions(self, knowledge_base):
+        """Тест удаления блоков из индекса цитат"""
+        knowledge_base.add_documents(["gk_0"], ["Статья 1. Текст"], [{"citation_act": "гк", "citation_article": "1"}])
+        assert knowledge_base.find_by_citation("статья 1 ГК")
+        knowledge_base.delete_document("gk_0")
+        assert knowledge_base.find_by_citation("статья 1 ГК") == []
+
+
+class TestBM25Index:
+    """Тесты для класса BM25Index"""
+
+    def test_tokenize(self):
+        """Тест выделения термов: числа целиком, слова по префиксу, без стоп-слов"""
+        assert tokenize("Статья 1014 и статьи ГК, Декрет №8") == ["стать", "1014", "стать", "гк", "декре", "8"]
+
+    def test_rare_terms_rank_higher(self):
+        """Тест ранжирования по редким термам"""
+        index = BM25Index()
+        index.add_documents([
+            ("a", "договор аренды договор"),
+            ("b", "статья 1014 договор"),
+            ("c", "договор подряда"),
+        ])
+        assert index.search("договор 1014")[0][0] == "b"
+
+    def test_coverage_for_several_documents(self):
+        """Тест покрытия запроса сразу для нескольких документов"""
+        index = BM25Index()
+        index.add_documents([
+            ("a", "статья 1014 договор"),
+            ("b", "договор подряда"),
+        ])
+
+        coverages = index.coverage("договор 1014", ["a", "b", "missing"])
+
+        assert coverages["a"][0] == pytest.approx(1.0)
+        assert sorted(coverages["a"][1]) == ["1014", "догов"]
+        assert 0.0 < coverages["b"][0] < 0.5
+        assert coverages["missing"] == (0.0, [])
+
+    def test_persistence(self, tmp_path):
+        """Тест сохранения индекса на диск"""
+        index_file = str(tmp_path / "bm25.db")
+        BM25Index(index_file).add_documents([("a", "Декрет №8")])
+
+        index = BM25Index(index_file)
+        assert len(index) == 1
+        assert index.search("декрет")[0][0] == "a"
+
+    def test_concurrent_writers_keep_updates(self, tmp_path):
+        """Тест того, что изменения двух процессов не затирают друг друга"""
+        index_file = str(tmp_path / "bm25.db")
+        first = BM25Index(index_file)
+        second = BM25Index(index_file)
+
+        first.add_documents([("a", "Декрет №8")])
+        second.add_documents([("b", "Кодекс о браке и семье")])
+        first.remove_documents(["a"])
+
+        assert len(second) == 1
+        assert first.search("кодекс")[0][0] == "b"
+
+    def test_readding_replaces_terms(self):
+        """Тест замены термов при повторном добавлении документа"""
+        index = BM25Index()
+        index.add_documents([("a", "Декрет №8")])
+        index.add_documents([("a", "Кодекс о браке")])
+
+        assert index.search("декрет") == []
+        assert index.coverage("кодекс", ["a"]) == {"a": (1.0, ["кодек"])}
+
+
+class TestDocumentManifest:
+    """Тесты для класса DocumentManifest"""
+
+    def test_persisted_between_instances(self, tmp_path):
+        """Тест сохранения манифеста в файл"""
+        manifest_file = str(tmp_path / "manifest.db")
+        DocumentManifest(manifest_file).add_ids({"law.pdf": ["a", "b"]})
+
+        manifest = DocumentManifest(manifest_file)
+        assert manifest.get_ids("law.pdf") == ["a", "b"]
+
+        manifest.remove_ids(["a", "b"])
+        assert not DocumentManifest(manifest_file).has_file("law.pdf")
+
+    def test_changes_visible_to_other_instances(self, tmp_path):
+        """Тест того, что изменения другого процесса видны без перезагрузки манифеста"""
+        manifest_file = str(tmp_path / "manifest.db")
+        reader = DocumentManifest(manifest_file)
+        writer = DocumentManifest(manifest_file)
+
+        writer.add_ids({"law.pdf": ["a"]})
+        writer.set_fingerprints({"law.pdf": {"sha256": "abc"}})
+        assert reader.get_ids("law.pdf") == ["a"]
+        assert reader.get_fingerprints() == {"law.pdf": {"sha256": "abc"}}
+
+        writer.remove_ids(["a"])
+        assert not reader.has_file("law.pdf")
+        assert reader.get_fingerprints() == {}
+
+    def test_legacy_json_imported_once(self, tmp_path):
+        """Тест однократного импорта прежнего JSON-манифеста"""
+        legacy_file = tmp_path / "document_manifest.json"
+        legacy_file.write_text(json.dumps({"files": {
+            "law.pdf": {"ids": ["a", "b"], "updated_at": "2024-01-01", "fingerprint": {"sha256": "abc"}},
+            "empty.pdf": {"ids": []}
+        }}), encoding="utf-8")
+        manifest = DocumentManifest(str(tmp_path / "manifest.db"))
+
+        manifest.migrate_json(str(legacy_file))
+        manifest.remove_ids(["b"])
+        manifest.migrate_json(str(legacy_file))
+
+        assert manifest.get_ids("law.pdf") == ["a"]
+        assert manifest.get_fingerprints() == {"law.pdf": {"sha256": "abc"}}
+        assert not manifest.has_file("empty.pdf")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,194 @@
+"""
+Тесты для асинхронного режима LLM сервиса
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+import modules.llm_service as llm_module
+from modules.llm_service import LLMService
+
+
+def _make_response(text: str):
+    """Создает ответ в формате chat.completions"""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(total_tokens=10, prompt_tokens=7, completion_tokens=3)
+    )
+
+
+def _make_status_error(error_class, status_code: int):
+    """Создает ошибку OpenAI с указанным HTTP-статусом"""
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status_code, request=request)
+    return error_class("error", response=response, body=None)
+
+
+class FakeCompletions:
+    """Имитация chat.completions с заранее заданной последовательностью результатов"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class TestAsyncLLMService:
+    """Тесты для повторов и обработки ошибок асинхронного клиента"""
+
+    @pytest.fixture(autouse=True)
+    def fast_retries(self, monkeypatch):
+        """Ускоряет backoff для тестов"""
+        monkeypatch.setattr(llm_module, "OPENAI_RETRY_BASE_DELAY", 0.01)
+        monkeypatch.setattr(llm_module, "OPENAI_RETRY_MAX_DELAY", 0.02)
+
+    @pytest.fixture
+    def make_service(self, monkeypatch):
+        """Создает сервис с поддельным асинхронным клиентом"""
+        def factory(outcomes):
+            service = LLMService()
+            completions = FakeCompletions(outcomes)
+            fake_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+            def get_client():
+                if service._concurrency is None:
+                    service._concurrency = asyncio.Semaphore(2)
+                return fake_client
+
+            monkeypatch.setattr(service, "_get_async_client", get_client)
+            monkeypatch.setattr(service, "_build_messages", lambda question, docs: [])
+            return service, completions
+        return factory
+
+    def test_retries_on_rate_limit_and_server_error(self, make_service):
+        """Тест повторов при 429 и 5xx"""
+        service, completions = make_service([
+            _make_status_error(openai.RateLimitError, 429),
+            _make_status_error(openai.InternalServerError, 500),
+            _make_response(" Ответ "),
+        ])
+
+        answer = asyncio.run(service.get_answer_async("вопрос", []))
+
+        assert answer == "Ответ"
+        assert completions.calls == 3
+
+    def test_no_retry_on_client_error(self, make_service):
+        """Тест отсутствия повторов при ошибке запроса"""
+        service, completions = make_service([
+            _make_status_error(openai.BadRequestError, 400),
+            _make_response("не должен использоваться"),
+        ])
+
+        answer = asyncio.run(service.get_answer_async("вопрос", []))
+
+        assert answer == service._get_error_response()
+        assert completions.calls == 1
+
+    def test_retries_are_limited(self, make_service, monkeypatch):
+        """Тест ограничения количества повторов"""
+        monkeypatch.setattr(llm_module, "OPENAI_MAX_RETRIES", 1)
+        service, completions = make_service([
+            _make_status_error(openai.RateLimitError, 429),
+            _make_status_error(openai.RateLimitError, 429),
+            _make_response("не должен использоваться"),
+        ])
+
+        answer = asyncio.run(service.get_answer_async("вопрос", []))
+
+        assert answer == service._get_error_response()
+        assert completions.calls == 2
+
+    def test_client_of_previous_loop_is_closed(self, monkeypatch):
+        """Тест закрытия клиента прежнего event loop при создании нового"""
+        monkeypatch.setattr(llm_module, "OPENAI_API_KEY", "sk-proj-key")
+        service = LLMService()
+
+        async def get_client():
+            client = service._get_async_client()
+            await asyncio.sleep(0.01)
+            return client
+
+        first = asyncio.run(get_client())
+        second = asyncio.run(get_client())
+
+        assert first is not second
+        assert first._client.is_closed
+        assert not second._client.is_closed
+        asyncio.run(service.aclose())
+
+    def test_stream_yields_deltas_after_retry(self, make_service):
+        """Тест потоковой генерации с повтором до первого фрагмента"""
+        service, completions = make_service([
+            _make_status_error(openai.RateLimitError, 429),
+            FakeStream(["Пер", "вый ", None, "ответ"]),
+        ])
+
+        async def collect():
+            return [delta async for delta in service.stream_answer_async("вопрос", [])]
+
+        deltas = asyncio.run(collect())
+
+        assert deltas == ["Пер", "вый ", "ответ"]
+        assert completions.calls == 2
+
+    def test_stream_returns_error_response_on_failure(self, make_service):
+        """Тест сообщения об ошибке, если генерация не началась"""
+        service, _ = make_service([_make_status_error(openai.BadRequestError, 400)])
+
+        async def collect():
+            return [delta async for delta in service.stream_answer_async("вопрос", [])]
+
+        assert asyncio.run(collect()) == [service._get_error_response()]
+
+    def test_stream_raises_after_first_delta(self, make_service):
+        """Тест ошибки, если генерация оборвалась после первого фрагмента"""
+        service, _ = make_service([FakeStream(["Пер", "вый ", RuntimeError("обрыв соединения")])])
+        deltas = []
+
+        async def collect():
+            async for delta in service.stream_answer_async("вопрос", []):
+                deltas.append(delta)
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(collect())
+        assert deltas == ["Пер", "вый "]
+
+
+class FakeStream:
+    """Имитация потокового ответа chat.completions"""
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for delta in self.deltas:
+            if isinstance(delta, Exception):
+                raise delta
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+    async def close(self):
+        self.closed = True
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
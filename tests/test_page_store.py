@@ -0,0 +1,115 @@
+"""
+Тесты для хранилища информации о страницах и истории парсинга
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules.page_store import PageStore, HISTORY_LIMIT
+from modules.scraping_tracker import ScrapingTracker
+
+
+class TestPageStore:
+    """Тесты для класса PageStore"""
+
+    @pytest.fixture
+    def store(self):
+        """Создает хранилище в памяти"""
+        return PageStore(None)
+
+    def test_upsert_and_get_pages(self, store):
+        """Записи страниц добавляются и обновляются построчно"""
+        store.upsert_pages({
+            "https://pravo.by/a": {"content_hash": "h1", "title": "Закон", "last_check": "2025-01-01T00:00:00"},
+            "https://etalonline.by/b": {"content_hash": "h2"},
+        })
+        store.upsert_pages({"https://pravo.by/a": {"content_hash": "h3", "etag": '"v1"'}})
+
+        pages = store.get_pages(["https://pravo.by/a", "https://etalonline.by/b", "https://pravo.by/unknown"])
+
+        assert set(pages) == {"https://pravo.by/a", "https://etalonline.by/b"}
+        assert pages["https://pravo.by/a"]["content_hash"] == "h3"
+        assert pages["https://pravo.by/a"]["etag"] == '"v1"'
+        assert pages["https://pravo.by/a"]["domain"] == "pravo.by"
+        assert store.count_pages_by_domain() == {"pravo.by": 1, "etalonline.by": 1}
+
+    def test_many_urls_lookup(self, store):
+        """Выборка большого числа URL разбивается на пакеты"""
+        urls = [f"https://pravo.by/document/{i}" for i in range(1200)]
+        store.upsert_pages({url: {"content_hash": str(i)} for i, url in enumerate(urls)})
+
+        assert len(store.get_pages(urls)) == 1200
+        assert len(store.get_domain_urls("pravo.by")) == 1200
+
+    def test_delete_domain(self, store):
+        """Полное пересканирование удаляет страницы и карту сайта только своего домена"""
+        store.upsert_pages({"https://pravo.by/a": {}, "https://etalonline.by/b": {}})
+        store.set_site_map("pravo.by", ["https://pravo.by/a"], "2025-01-01T00:00:00")
+
+        store.delete_domain("pravo.by")
+
+        assert store.get_domain_urls("pravo.by") == []
+        assert store.get_site_map("pravo.by") is None
+        assert store.get_domain_urls("etalonline.by") == ["https://etalonline.by/b"]
+
+    def test_history_keeps_last_entries(self, store):
+        """В истории парсинга хранятся только последние записи"""
+        for i in range(HISTORY_LIMIT + 3):
+            store.add_history_entry({"date": "01.01.2025", "time": "10:00", "site": f"site{i}",
+                                     "pages_scraped": i, "chunks_added": i})
+
+        history = store.get_history()
+        assert len(history) == HISTORY_LIMIT
+        assert history[-1]["site"] == f"site{HISTORY_LIMIT + 2}"
+
+    def test_json_migration_runs_once(self, store, tmp_path):
+        """Прежние JSON-файлы импортируются один раз"""
+        pages_info = tmp_path / "pages_info.json"
+        pages_info.write_text(json.dumps({
+            "pages": {"https://pravo.by/a": {"content_hash": "h1", "title": "Закон", "content_length": 10}},
+            "site_maps": {"pravo.by": {"urls": ["https://pravo.by/a"], "last_scan": "2025-01-01T00:00:00", "total_urls": 1}},
+            "last_full_scan": None
+        }), encoding='utf-8')
+        scraping_info = tmp_path / "scraping_info.json"
+        scraping_info.write_text(json.dumps({
+            "last_scraping_date": "13.07.2025",
+            "last_scraping_time": "07:30",
+            "last_scraped_sites": ["pravo.by"],
+            "total_pages_scraped": 90,
+            "total_chunks_added": 2586,
+            "scraping_history": [{"date": "12.07.2025", "time": "16:47", "site": "pravo.by",
+                                  "pages_scraped": 5, "chunks_added": 39}]
+        }), encoding='utf-8')
+
+        for _ in range(2):
+            store.migrate_pages_info(str(pages_info))
+            store.migrate_scraping_info(str(scraping_info))
+
+        assert store.get_page("https://pravo.by/a")["title"] == "Закон"
+        assert store.get_site_map("pravo.by")["urls"] == ["https://pravo.by/a"]
+        assert len(store.get_history()) == 1
+
+        tracker = ScrapingTracker(store)
+        assert tracker.get_last_scraping_info()["total_pages"] == 90
+        tracker.update_scraping_info("https://pravo.by/document", 5, 40)
+        info = tracker.get_last_scraping_info()
+        assert info["total_pages"] == 95 and info["total_chunks"] == 2626
+        assert info["sites"] == ["pravo.by"]
+        assert len(store.get_history()) == 2
+
+    def test_persistence(self, tmp_path):
+        """Записи сохраняются между экземплярами хранилища"""
+        db_path = str(tmp_path / "page_store.db")
+        PageStore(db_path).upsert_pages({"https://pravo.by/a": {"content_hash": "h1"}})
+
+        assert PageStore(db_path).get_page("https://pravo.by/a")["content_hash"] == "h1"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
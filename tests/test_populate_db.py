@@ -0,0 +1,242 @@
+"""
+Тесты для конвейера загрузки документов в базу знаний
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import fitz
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+import config
+from modules import extraction_cache
+from scripts import update_documents
+from scripts.populate_db import _stream_document, ingest_documents
+
+
+@pytest.fixture(autouse=True)
+def isolated_extraction_cache(tmp_path, monkeypatch):
+    """Размещает кеш извлечения во временной папке, в том числе для процессов пула"""
+    cache_path = str(tmp_path / "cache" / "extraction_cache.db")
+    monkeypatch.setenv("EXTRACTION_CACHE_PATH", cache_path)
+    monkeypatch.setattr(config, "EXTRACTION_CACHE_PATH", cache_path)
+    monkeypatch.setattr(extraction_cache, "_extraction_cache", None)
+
+
+def long_code_pages(pages_read, pages=50, fail_at=None):
+    """Возвращает извлечение текста длинного кодекса, записывающее прочитанные страницы"""
+    def fake_pages(file_path):
+        for page in range(1, pages + 1):
+            if page == fail_at:
+                raise RuntimeError("поврежденный PDF")
+            pages_read.append(page)
+            yield page, "\n".join(f"Статья {page * 10 + i}. " + "Текст нормы кодекса. " * 30 for i in range(5))
+    return fake_pages
+
+
+def write_pdf(path: Path, pages):
+    """Создает PDF-файл, по одной странице на каждый текст"""
+    with fitz.open() as pdf:
+        for text in pages:
+            pdf.new_page().insert_text((72, 72), text, fontname="helv")
+        pdf.save(str(path))
+
+
+class TestIngestDocuments:
+    """Тесты для функции ingest_documents"""
+
+    @pytest.fixture
+    def documents(self, tmp_path):
+        """Создает папку с несколькими PDF-документами и одним поврежденным файлом"""
+        for i in range(3):
+            write_pdf(tmp_path / f"law_{i}.pdf", [
+                f"Article {j}. Provisions of law {i}, page {j}, with enough text." for j in range(1, 4)
+            ])
+        (tmp_path / "broken.pdf").write_bytes(b"not a pdf")
+        return sorted(str(path) for path in tmp_path.glob("*.pdf"))
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_blocks_written_in_batches(self, knowledge_base, documents, workers):
+        """Блоки нескольких файлов записываются общими пакетами, статистика считается по файлам"""
+        result = ingest_documents(documents, "data/documents", workers=workers, batch_size=100, kb=knowledge_base)
+
+        assert result["failed"] == ["broken.pdf"]
+        assert set(result["added"]) == {"law_0.pdf", "law_1.pdf", "law_2.pdf"}
+        assert sum(result["added"].values()) == result["chunks"] == knowledge_base.collection.count()
+        assert result["pages"] == 9
+        metadata = knowledge_base.collection.get(ids=["law_0_block_000"])["metadatas"][0]
+        assert (metadata["page_start"], metadata["page_end"]) == (1, 3)
+        # Все блоки поместились в один пакет эмбеддингов
+        assert knowledge_base.embedding_function.calls == [result["chunks"]]
+
+    def test_parallel_matches_serial(self, knowledge_base, documents):
+        """Параллельная загрузка дает те же блоки, что и последовательная"""
+        serial = ingest_documents(documents, workers=1, kb=knowledge_base)
+        serial_docs = knowledge_base.collection.get(include=["documents"])
+        knowledge_base.clear_collection()
+
+        parallel = ingest_documents(documents, workers=2, kb=knowledge_base)
+        parallel_docs = knowledge_base.collection.get(include=["documents"])
+
+        assert parallel["added"] == serial["added"]
+        assert sorted(zip(parallel_docs["ids"], parallel_docs["documents"])) == \
+            sorted(zip(serial_docs["ids"], serial_docs["documents"]))
+
+    def test_replace_removes_previous_version(self, knowledge_base, documents, tmp_path):
+        """В режиме замены блоки, которых нет в новой версии файла, удаляются после ее записи"""
+        ingest_documents(documents, workers=1, kb=knowledge_base)
+        write_pdf(tmp_path / "law_0.pdf", ["Article 1. The only remaining provision of the law."])
+
+        result = ingest_documents([str(tmp_path / "law_0.pdf")], workers=1, replace=True, kb=knowledge_base)
+
+        assert result["added"] == {"law_0.pdf": 1}
+        assert knowledge_base.get_ids_where(source_file="law_0.pdf") == ["law_0_block_000"]
+
+    def test_failed_replace_keeps_previous_version(self, knowledge_base, documents, tmp_path, monkeypatch):
+        """Если новую версию файла не удалось записать, старые блоки сохраняются"""
+        ingest_documents(documents, workers=1, kb=knowledge_base)
+        previous = knowledge_base.collection.get(where={"source_file": "law_0.pdf"}, include=["documents"])
+        write_pdf(tmp_path / "law_0.pdf", ["Article 1. The only remaining provision of the law."])
+
+        def broken_embeddings(texts):
+            raise RuntimeError("сервис эмбеддингов недоступен")
+
+        monkeypatch.setattr(knowledge_base, "embedding_function", broken_embeddings)
+        result = ingest_documents([str(tmp_path / "law_0.pdf")], workers=1, replace=True, kb=knowledge_base)
+
+        assert result["failed"] == ["law_0.pdf"]
+        assert result["added"] == {}
+        current = knowledge_base.collection.get(where={"source_file": "law_0.pdf"}, include=["documents"])
+        assert sorted(zip(current["ids"], current["documents"])) == sorted(zip(previous["ids"], previous["documents"]))
+
+    def test_second_run_counts_present_files(self, knowledge_base, documents):
+        """Повторная загрузка тех же файлов не считает их ошибочными"""
+        ingest_documents(documents, workers=1, kb=knowledge_base)
+        embedded = sum(knowledge_base.embedding_function.calls)
+
+        result = ingest_documents(documents, workers=1, kb=knowledge_base)
+
+        assert result["failed"] == ["broken.pdf"]
+        assert result["added"] == {"law_0.pdf": 0, "law_1.pdf": 0, "law_2.pdf": 0}
+        assert sum(knowledge_base.embedding_function.calls) == embedded
+
+
+    def test_blocks_streamed_before_document_is_read(self, tmp_path, monkeypatch):
+        """Блоки передаются пакетами по batch_size, не дожидаясь конца документа"""
+        path = tmp_path / "code.pdf"
+        path.write_bytes(b"pdf content")
+        pages_read = []
+        monkeypatch.setattr(extraction_cache, "iter_document_pages", long_code_pages(pages_read))
+        messages = []
+
+        def put(message):
+            messages.append((message, len(pages_read)))
+
+        _stream_document(str(path), "data/documents", 4, put)
+
+        batches = [(message, read) for message, read in messages if message[0] == "blocks"]
+        (done, _), = [(message, read) for message, read in messages if message[0] == "done"]
+        assert all(len(message[2]) <= 4 for message, _ in batches)
+        assert done[2] == sum(len(message[2]) for message, _ in batches)
+        assert (done[3], messages[-1][0]) == (50, done)
+        # Первый пакет отправлен, когда прочитана лишь часть страниц
+        assert batches[0][1] < 50
+
+    def test_failed_extraction_leaves_no_partial_file(self, knowledge_base, tmp_path, monkeypatch):
+        """Если извлечение оборвалось после записи части блоков, эти блоки удаляются"""
+        path = tmp_path / "code.pdf"
+        path.write_bytes(b"pdf content")
+        pages_read = []
+        monkeypatch.setattr(extraction_cache, "iter_document_pages", long_code_pages(pages_read, fail_at=40))
+
+        result = ingest_documents([str(path)], workers=1, batch_size=4, kb=knowledge_base)
+
+        assert result["failed"] == ["code.pdf"]
+        assert result["added"] == {}
+        assert sum(knowledge_base.embedding_function.calls) > 0
+        assert knowledge_base.collection.count() == 0
+        assert not knowledge_base.manifest.has_file("code.pdf")
+
+    def test_rebuild_reuses_extraction_cache(self, knowledge_base, documents, monkeypatch):
+        """Повторная загрузка тех же файлов берет блоки из кеша без извлечения текста"""
+        first = ingest_documents(documents, workers=2, kb=knowledge_base)
+        first_docs = knowledge_base.collection.get(include=["documents", "metadatas"])
+        knowledge_base.clear_collection()
+
+        def no_extraction(file_path):
+            raise AssertionError(f"текст {file_path} извлекается повторно")
+
+        monkeypatch.setattr(extraction_cache, "iter_document_pages", no_extraction)
+        second = ingest_documents(documents, workers=1, kb=knowledge_base)
+        second_docs = knowledge_base.collection.get(include=["documents", "metadatas"])
+
+        assert (second["added"], second["pages"]) == (first["added"], first["pages"])
+        assert sorted(zip(second_docs["ids"], second_docs["documents"])) == \
+            sorted(zip(first_docs["ids"], first_docs["documents"]))
+        assert extraction_cache.get_extraction_cache().get_stats()["hits"] == 3
+
+
+class TestUpdateAllDocuments:
+    """Тесты для пропуска неизмененных файлов при обновлении"""
+
+    @pytest.fixture
+    def knowledge_base(self, knowledge_base, monkeypatch):
+        """Подставляет базу знаний в памяти в скрипт обновления"""
+        monkeypatch.setattr(update_documents, "get_knowledge_base", lambda: knowledge_base)
+        return knowledge_base
+
+    @pytest.fixture
+    def data_dir(self, tmp_path):
+        """Создает папку с двумя PDF-документами"""
+        for name in ("law_0.pdf", "law_1.pdf"):
+            write_pdf(tmp_path / name, [f"Article 1. Provisions of {name} with enough text."])
+        return tmp_path
+
+    def test_unchanged_corpus_skipped(self, knowledge_base, data_dir):
+        """Повторное обновление неизмененной папки не извлекает и не индексирует файлы"""
+        first = update_documents.update_all_documents(str(data_dir), workers=1)
+        embedded = sum(knowledge_base.embedding_function.calls)
+
+        # Перезапись файла тем же содержимым тоже не считается изменением
+        content = (data_dir / "law_1.pdf").read_bytes()
+        (data_dir / "law_1.pdf").write_bytes(content)
+        os.utime(data_dir / "law_1.pdf", ns=(1, 1))
+        second = update_documents.update_all_documents(str(data_dir), workers=1)
+
+        assert first["new_files"] == 2
+        assert (second["skipped_files"], second["new_files"], second["updated_files"]) == (2, 0, 0)
+        assert sum(knowledge_base.embedding_function.calls) == embedded
+        assert knowledge_base.manifest.get_fingerprints()["law_1.pdf"]["mtime_ns"] == 1
+
+    def test_changed_and_deleted_files(self, knowledge_base, data_dir):
+        """Обновляются только измененные файлы, блоки удаленных файлов удаляются"""
+        update_documents.update_all_documents(str(data_dir), workers=1)
+        write_pdf(data_dir / "law_0.pdf", ["Article 1. New wording of the first law."])
+        (data_dir / "law_1.pdf").unlink()
+
+        stats = update_documents.update_all_documents(str(data_dir), workers=1)
+
+        assert (stats["updated_files"], stats["skipped_files"]) == (1, 0)
+        assert stats["deleted_files"] == ["law_1.pdf"]
+        assert knowledge_base.get_ids_where(source_file="law_1.pdf") == []
+        documents = knowledge_base.collection.get(include=["documents"])["documents"]
+        assert documents == ["Article 1. New wording of the first law."]
+
+    def test_chunker_version_change_reindexes(self, knowledge_base, data_dir):
+        """Смена версии разбиения на блоки приводит к повторной загрузке файлов"""
+        update_documents.update_all_documents(str(data_dir), workers=1)
+        fingerprints = knowledge_base.manifest.get_fingerprints()
+        knowledge_base.manifest.set_fingerprints({name: dict(fingerprint, chunker="structure:v0")
+                                                  for name, fingerprint in fingerprints.items()})
+
+        stats = update_documents.update_all_documents(str(data_dir), workers=1)
+
+        assert stats["updated_files"] == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
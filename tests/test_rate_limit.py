@@ -0,0 +1,134 @@
+"""
+Тесты для ограничения частоты запросов и параллельного динамического поиска
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules.rate_limit import TokenBucket, HostLimiter
+from modules.dynamic_search import DynamicSearcher
+from modules.http_cache import CachedResponse
+
+
+class TestTokenBucket:
+    """Тесты для ведра токенов"""
+
+    def test_burst_without_waiting(self):
+        """Запросы в пределах вместимости не ждут"""
+        bucket = TokenBucket(rate=1, capacity=3)
+        assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+    def test_waits_grow_after_burst(self):
+        """После всплеска каждый следующий запрос ждет дольше предыдущего"""
+        bucket = TokenBucket(rate=10, capacity=1)
+        bucket.reserve()
+        first, second = bucket.reserve(), bucket.reserve()
+        assert first == pytest.approx(0.1, abs=0.01)
+        assert second == pytest.approx(0.2, abs=0.01)
+
+    def test_acquire_respects_rate(self):
+        """acquire ограничивает частоту запросов"""
+        bucket = TokenBucket(rate=20, capacity=1)
+
+        async def acquire_all():
+            start = time.monotonic()
+            await asyncio.gather(*(bucket.acquire() for _ in range(5)))
+            return time.monotonic() - start
+
+        assert asyncio.run(acquire_all()) >= 0.18
+
+
+class TestHostLimiter:
+    """Тесты для ограничителя запросов к хостам"""
+
+    def _max_parallel(self, limiter: HostLimiter, urls):
+        """Возвращает максимальное число одновременных запросов по хостам"""
+        active, peak = {}, {}
+
+        async def request(url):
+            host = url.split('/')[2]
+            async with limiter.limit(url):
+                active[host] = active.get(host, 0) + 1
+                peak[host] = max(peak.get(host, 0), active[host])
+                await asyncio.sleep(0.02)
+                active[host] -= 1
+
+        async def run_all():
+            await asyncio.gather(*(request(url) for url in urls))
+
+        asyncio.run(run_all())
+        return peak
+
+    def test_concurrency_per_host(self):
+        """Число одновременных запросов к хосту ограничено"""
+        limiter = HostLimiter(max_concurrency=2, rate=1000, burst=100)
+        peak = self._max_parallel(limiter, [f"https://pravo.by/page{i}" for i in range(6)])
+        assert peak["pravo.by"] == 2
+
+    def test_hosts_are_independent(self):
+        """Ограничения разных хостов не влияют друг на друга"""
+        limiter = HostLimiter(max_concurrency=1, rate=1000, burst=100)
+        urls = ["https://pravo.by/a", "https://pravo.by/b", "https://etalonline.by/a"]
+        peak = self._max_parallel(limiter, urls)
+        assert peak == {"pravo.by": 1, "etalonline.by": 1}
+
+    def test_reusable_across_event_loops(self):
+        """Ограничитель работает в нескольких последовательных event loop"""
+        limiter = HostLimiter(max_concurrency=1, rate=1000, burst=100)
+        for _ in range(2):
+            assert self._max_parallel(limiter, ["https://pravo.by/a", "https://pravo.by/b"])["pravo.by"] == 1
+
+
+class TestDynamicSearchConcurrency:
+    """Тесты для параллельной загрузки страниц динамическим поиском"""
+
+    FETCH_SECONDS = 0.2
+
+    @pytest.fixture
+    def searcher(self):
+        """Создает поисковик с имитацией загрузки страниц"""
+        web_scraper = Mock()
+        web_scraper.session.headers = {'User-Agent': 'test'}
+        web_scraper.http_cache = None
+        web_scraper.parse_cached_page.side_effect = lambda response: {
+            'url': response.url, 'title': response.url, 'content': 'Текст закона ' * 50, 'domain': 'pravo.by'
+        }
+        limiter = HostLimiter(max_concurrency=10, rate=1000, burst=100)
+        searcher = DynamicSearcher(web_scraper, Mock(), Mock(), Mock(), host_limiter=limiter)
+        searcher.fetched = []
+
+        async def fake_fetch(session, url):
+            searcher.fetched.append(url)
+            await asyncio.sleep(self.FETCH_SECONDS)
+            return CachedResponse(url=url, content=b'<html></html>')
+
+        searcher._fetch_page = fake_fetch
+        searcher._parse_search_page = lambda response, query: [f"/document/{abs(hash(query)) % 1000}"]
+        searcher._index_scraped_pages = lambda question, pages, context_id=None: (pages, len(pages))
+        return searcher
+
+    def test_search_runs_concurrently(self, searcher):
+        """Поиск и загрузка страниц занимают время двух загрузок, а не их суммы"""
+        async def run_search():
+            start = time.monotonic()
+            result = await searcher.search_and_index_async("Как уволиться по трудовому кодексу?", session=Mock())
+            return result, time.monotonic() - start
+
+        (pages, pages_count), elapsed = asyncio.run(run_search())
+
+        assert pages_count == len(pages) > 0
+        # Запросов больше двух, но этапов загрузки всего два: поиск и страницы
+        assert len(searcher.fetched) > 2
+        assert elapsed < self.FETCH_SECONDS * 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
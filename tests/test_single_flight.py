@@ -0,0 +1,103 @@
+"""
+Тесты для модуля объединения одновременных запросов
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules.single_flight import SingleFlight, normalize_question
+
+
+class TestNormalizeQuestion:
+    """Тесты для функции normalize_question"""
+
+    def test_ignores_case_punctuation_and_spaces(self):
+        """Тест нормализации регистра, пунктуации и пробелов"""
+        assert normalize_question("  Как открыть   ИП?") == normalize_question("как открыть ип")
+
+    def test_yo_replaced(self):
+        """Тест замены буквы ё"""
+        assert normalize_question("Расчёт отпускных") == "расчет отпускных"
+
+
+class TestSingleFlight:
+    """Тесты для класса SingleFlight"""
+
+    def test_concurrent_calls_share_result(self):
+        """Тест однократного выполнения одновременных задач с одним ключом"""
+        flight = SingleFlight("test")
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "ответ"
+
+        async def scenario():
+            return await asyncio.gather(*(flight.run("ключ", compute) for _ in range(3)))
+
+        results = asyncio.run(scenario())
+        assert len(calls) == 1
+        assert [result for result, _ in results] == ["ответ"] * 3
+        assert sorted(joined for _, joined in results) == [False, True, True]
+        assert flight.in_flight() == 0
+
+    def test_different_keys_run_separately(self):
+        """Тест независимого выполнения задач с разными ключами"""
+        flight = SingleFlight("test")
+        calls = []
+
+        async def compute(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return value
+
+        async def scenario():
+            return await asyncio.gather(flight.run("a", lambda: compute(1)),
+                                        flight.run("b", lambda: compute(2)))
+
+        assert asyncio.run(scenario()) == [(1, False), (2, False)]
+        assert sorted(calls) == [1, 2]
+
+    def test_exception_shared(self):
+        """Тест передачи исключения всем ожидающим"""
+        flight = SingleFlight("test")
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def scenario():
+            return await asyncio.gather(flight.run("ключ", fail), flight.run("ключ", fail),
+                                        return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flight.in_flight() == 0
+
+    def test_waiter_cancellation_does_not_cancel_task(self):
+        """Тест того, что отмена одного из ожидающих не прерывает вычисление"""
+        flight = SingleFlight("test")
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "ответ"
+
+        async def scenario():
+            first = asyncio.ensure_future(flight.run("ключ", compute))
+            second = asyncio.ensure_future(flight.run("ключ", compute))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(scenario()) == ("ответ", True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,138 @@
+"""
+Тесты для структурного разбиения документов на блоки
+"""
+
+import itertools
+import sys
+from pathlib import Path
+
+import fitz
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from modules.text_processing import (
+    find_structure_boundaries, iter_pdf_pages, iter_structure_blocks, split_text_into_structure
+)
+
+
+def make_code(articles: int) -> str:
+    """Создает текст кодекса из глав и статей разной длины"""
+    parts = []
+    for article in range(1, articles + 1):
+        if article % 20 == 1:
+            parts.append(f"Глава {article // 20 + 1}. Общие положения")
+        words = " ".join(["трудовой договор заключается в письменной форме"] * (article % 17 + 1))
+        parts.append(f"Статья {article}. {words}")
+    return "\n".join(parts)
+
+
+def split_pages(text: str, page_size: int):
+    """Режет текст на страницы фиксированного размера"""
+    return [(i // page_size + 1, text[i:i + page_size]) for i in range(0, len(text), page_size)]
+
+
+class TestIterStructureBlocks:
+    """Тесты для потокового разбиения iter_structure_blocks"""
+
+    def test_matches_whole_text_splitting(self):
+        """Потоковое разбиение дает те же блоки, что и разбиение всего текста"""
+        pages = split_pages(make_code(200), 3000)
+        whole_text = "\n\n".join(page_text for _, page_text in pages)
+        expected = [block for block, _, _ in iter_structure_blocks([(None, whole_text)], window_size=len(whole_text))]
+
+        blocks = [block for block, _, _ in iter_structure_blocks(pages, window_size=8000)]
+
+        assert blocks == expected
+
+    def test_page_numbers(self):
+        """Блоки получают номера первой и последней страницы"""
+        pages = split_pages(make_code(100), 2500)
+        whole_text = "\n\n".join(page_text for _, page_text in pages)
+        page_starts = list(itertools.accumulate([0] + [len(page_text) + 2 for _, page_text in pages[:-1]]))
+
+        def page_of(position):
+            return sum(1 for start in page_starts if start <= position)
+
+        cursor = 0
+        for block, page_start, page_end in iter_structure_blocks(pages, window_size=6000):
+            position = whole_text.find(block, cursor)
+            cursor = position + len(block)
+            assert (page_start, page_end) == (page_of(position), page_of(cursor - 1))
+
+    def test_pages_consumed_lazily(self):
+        """Блоки отдаются до того, как прочитан весь документ"""
+        read = []
+
+        def endless_pages():
+            for page_num in itertools.count(1):
+                read.append(page_num)
+                yield page_num, make_code(10)
+
+        first_blocks = list(itertools.islice(iter_structure_blocks(endless_pages(), window_size=5000), 5))
+
+        assert len(first_blocks) == 5
+        assert len(read) < 10
+
+
+class TestStructuralTokenizer:
+    """Тесты для однопроходного поиска структурных границ"""
+
+    def test_boundary_levels(self):
+        """Границы находятся и внутри текста, с уровнем самого крупного совпавшего разделителя"""
+        text = "Глава 1. Общие\nСтатья 1. Текст\n1. Первый пункт\n  2. Второй пункт\nа) подпункт\n\nАбзац"
+
+        levels = [level for _, level in find_structure_boundaries(text)]
+
+        # Глава, Статья, два пункта (второй с отступом), буквенный пункт, абзац
+        assert levels == [0, 2, 4, 4, 6, 7]
+
+    def test_long_article_split_by_points(self):
+        """Длинная статья делится по нумерованным пунктам, а не по размеру"""
+        points = [f"{i}. Пункт {i} статьи о трудовом договоре " + "и его условиях " * 20 for i in range(1, 8)]
+        text = "Статья 16. Трудовой договор\n" + "\n".join(points)
+
+        blocks = split_text_into_structure(text)
+
+        assert all(len(block) <= 1000 for block in blocks)
+        assert blocks[0].startswith("Статья 16. Трудовой договор\n1. ")
+        assert all(block.split(".")[0].strip().isdigit() for block in blocks[1:])
+        assert "".join("".join(blocks).split()) == "".join(text.split())
+
+    def test_small_points_merged_with_heading(self):
+        """Короткие пункты объединяются в блоки, а заголовок главы остается с текстом после него"""
+        points = [f"{i}. Пункт {i} " + "условия трудового договора " * 5 for i in range(1, 30)]
+        text = "Глава 1. ОБЩИЕ ПОЛОЖЕНИЯ\nСтатья 1. Трудовой договор\n" + "\n".join(points)
+
+        blocks = split_text_into_structure(text)
+
+        assert len(blocks) == 5
+        assert blocks[0].startswith("Глава 1. ОБЩИЕ ПОЛОЖЕНИЯ\nСтатья 1. Трудовой договор\n1. ")
+        assert all(len(block) <= 1000 for block in blocks)
+        assert "".join("".join(blocks).split()) == "".join(text.split())
+
+    def test_short_articles_kept_separate(self):
+        """Короткие статьи большого текста остаются отдельными блоками"""
+        text = "\n".join(f"Статья {i}. Положение номер {i} " + "текст " * 30 for i in range(1, 20))
+
+        blocks = split_text_into_structure(text)
+
+        assert len(blocks) == 19
+        assert all(block.startswith(f"Статья {i}.") for i, block in enumerate(blocks, 1))
+
+
+def test_iter_pdf_pages(tmp_path):
+    """Текст PDF читается по страницам с номерами"""
+    path = tmp_path / "code.pdf"
+    with fitz.open() as pdf:
+        for text in ("Article 1.", "Article 2."):
+            pdf.new_page().insert_text((72, 72), text, fontname="helv")
+        pdf.save(str(path))
+
+    assert [(page_num, text.strip()) for page_num, text in iter_pdf_pages(str(path))] == \
+        [(1, "Article 1."), (2, "Article 2.")]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -7,21 +7,22 @@ import sys
 import os
 from pathlib import Path
 
+
 # Добавляем корневую директорию проекта в путь
 sys.path.append(str(Path(__file__).parent.parent))
 
-from modules.web_scraper import WebScraper
-from modules.knowledge_base import KnowledgeBase
+from modules.web_scraper import WebScraper, canonical_url, make_chunk_ids
 from modules.text_processing import TextProcessor
+from modules.page_store import PageStore
+from scripts.dedupe_knowledge_base import dedupe
 
 
 class TestWebScraper:
     """Тесты для класса WebScraper"""
     
     @pytest.fixture
-    def scraper(self):
+    def scraper(self, knowledge_base, scraper_stores):
         """Создает экземпляр WebScraper для тестов"""
-        knowledge_base = KnowledgeBase()
         text_processor = TextProcessor()
         return WebScraper(knowledge_base, text_processor)
     
@@ -83,42 +84,47 @@ class TestWebScraper:
         assert scraper.max_pages == 50
         assert scraper.delay == 1
     
-    def test_create_scraper_from_config(self):
+    def test_create_scraper_from_config(self, knowledge_base, scraper_stores, monkeypatch):
         """Тест создания скрапера из конфигурации"""
+        from modules import knowledge_base as knowledge_base_module
         from modules.web_scraper import create_scraper_from_config
         
+        monkeypatch.setattr(knowledge_base_module, "get_knowledge_base", lambda: knowledge_base)
+        
         scraper = create_scraper_from_config()
         
         assert isinstance(scraper, WebScraper)
         assert scraper.knowledge_base is not None
         assert scraper.text_processor is not None
+    
+    def test_scrape_website_fetches_each_page_once(self, scraper):
+        """Тест однократной загрузки страницы для контента и ссылок"""
+        from modules.http_cache import CachedResponse
+        
+        body = "Статья о трудовом договоре и правах работника. " * 5
+        pages = {
+            "https://example.com/": f'<html><body><nav><a href="/law/1">Закон о труде</a></nav><main>{body}</main></body></html>',
+            "https://example.com/law/1": f'<html><body><main>{body}</main></body></html>',
+        }
+        requested = []
+        
+        async def fake_download(session, url):
+            requested.append(url)
+            return CachedResponse(url=url, content=pages[url].encode('utf-8'))
+        
+        scraper.http_cache = None
+        scraper._download_async = fake_download
+        
+        pages_data = scraper.scrape_website("https://example.com/", max_pages=5)
+        
+        assert [page['url'] for page in pages_data] == list(pages)
+        # Ссылка из навигации найдена, хотя навигация удаляется из контента
+        assert requested == list(pages)
 
 
 class TestWebScraperIntegration:
     """Интеграционные тесты для веб-скрапера"""
     
-    @pytest.fixture
-    def mock_knowledge_base(self):
-        """Создает мок базы знаний"""
-        class MockKnowledgeBase:
-            def __init__(self):
-                self.documents = []
-            
-            def add_document(self, text, metadata):
-                self.documents.append({
-                    'text': text,
-                    'metadata': metadata
-                })
-            
-            def get_collection_stats(self):
-                return {
-                    'total_documents': len(self.documents),
-                    'collection_name': 'test_collection',
-                    'db_path': '/test/path'
-                }
-        
-        return MockKnowledgeBase()
-    
     @pytest.fixture
     def mock_text_processor(self):
         """Создает мок обработчика текста"""
@@ -132,23 +138,23 @@ class TestWebScraperIntegration:
         
         return MockTextProcessor()
     
-    def test_add_to_knowledge_base(self, mock_knowledge_base, mock_text_processor):
+    def test_add_to_knowledge_base(self, knowledge_base, mock_text_processor, scraper_stores):
         """Тест добавления данных в базу знаний"""
-        scraper = WebScraper(mock_knowledge_base, mock_text_processor)
+        scraper = WebScraper(knowledge_base, mock_text_processor)
         
-        # Тестовые данные страниц
+        # Тестовые данные страниц (проходят фильтр юридической релевантности)
         pages_data = [
             {
-                'url': 'https://example.com/page1',
-                'title': 'Тестовая страница 1',
-                'content': 'Это тестовый контент первой страницы с юридической информацией о правах и обязанностях граждан в соответствии с законодательством Российской Федерации.',
-                'domain': 'example.com'
+                'url': 'https://pravo.by/document/1',
+                'title': 'Трудовой кодекс Республики Беларусь',
+                'content': 'Статья 17. Трудовой договор заключается в письменной форме. В соответствии с Трудовым кодексом Республики Беларусь наниматель обязан ознакомить работника с правилами внутреннего трудового распорядка. Права и обязанности сторон трудового договора определяются законодательством.',
+                'domain': 'pravo.by'
             },
             {
-                'url': 'https://example.com/page2',
-                'title': 'Тестовая страница 2',
-                'content': 'Вторая тестовая страница содержит информацию о договорах и их заключении согласно гражданскому кодексу.',
-                'domain': 'example.com'
+                'url': 'https://pravo.by/document/2',
+                'title': 'Гражданский кодекс Республики Беларусь',
+                'content': 'Статья 390. Договор купли-продажи. Согласно Гражданскому кодексу Республики Беларусь по договору купли-продажи продавец обязуется передать вещь в собственность покупателю, а покупатель обязуется принять этот товар и уплатить за него определенную денежную сумму (цену).',
+                'domain': 'pravo.by'
             }
         ]
         
@@ -156,23 +162,157 @@ class TestWebScraperIntegration:
         chunks_added = scraper.add_to_knowledge_base(pages_data)
         
         # Проверяем результаты
+        stored = knowledge_base.collection.get(include=["documents", "metadatas"])
         assert chunks_added > 0
-        assert len(mock_knowledge_base.documents) == chunks_added
+        assert len(stored['ids']) == chunks_added
         
         # Проверяем структуру добавленных документов
-        for doc in mock_knowledge_base.documents:
-            assert 'text' in doc
-            assert 'metadata' in doc
-            assert doc['metadata']['source'] == 'web_scraper'
-            assert doc['metadata']['content_type'] == 'legal_website'
-            assert 'url' in doc['metadata']
-            assert 'title' in doc['metadata']
-            assert 'domain' in doc['metadata']
+        for text, metadata in zip(stored['documents'], stored['metadatas']):
+            assert text
+            assert metadata['source'] == 'web_scraper'
+            assert metadata['content_type'] == 'legal_website'
+            assert 'url' in metadata
+            assert 'title' in metadata
+            assert 'domain' in metadata
+
+
+class TestChunkDiffing:
+    """Тесты для повторной индексации измененных страниц"""
+    
+    URL = "https://pravo.by/document/?guid=3871&p0=hk9900296"
+    
+    @pytest.fixture
+    def scraper(self, knowledge_base, scraper_stores):
+        """Создает скрапер с базой знаний в памяти и подсчетом эмбеддингов"""
+        class LineSplitter:
+            def split_text(self, text):
+                return [line for line in text.split("\n") if line]
+        
+        scraper = WebScraper(knowledge_base, LineSplitter())
+        scraper.page_store = PageStore(None)
+        return scraper
+    
+    def _page(self, *chunks):
+        return {'url': self.URL, 'title': 'Гражданский кодекс', 'domain': 'pravo.by', 'content': "\n".join(chunks)}
+    
+    def test_unchanged_page_not_reembedded(self, scraper):
+        """Повторная индексация неизмененной страницы не вычисляет эмбеддинги и не дублирует блоки"""
+        page = self._page("Статья 1. Гражданское законодательство.", "Статья 2. Участники отношений.")
+        
+        first = scraper.index_pages([page])
+        embedded = sum(scraper.knowledge_base.embedding_function.calls)
+        second = scraper.index_pages([page])
+        
+        assert first['added'] == 2
+        assert second == {'pages': 1, 'chunks': 2, 'added': 0, 'updated': 2, 'deleted': 0}
+        assert sum(scraper.knowledge_base.embedding_function.calls) == embedded
+        assert scraper.knowledge_base.collection.count() == 2
+    
+    def test_only_changed_chunks_replaced(self, scraper):
+        """Измененные блоки добавляются, исчезнувшие удаляются, остальные сохраняют ID"""
+        scraper.index_pages([self._page("Статья 1. Текст.", "Статья 2. Старая редакция.", "Статья 3. Утратила силу.")])
+        kept_id = scraper.page_store.get_chunk_ids([self.URL])[self.URL][0]
+        
+        stats = scraper.index_pages([self._page("Статья 1. Текст.", "Статья 2. Новая редакция.")])
+        
+        assert stats == {'pages': 1, 'chunks': 2, 'added': 1, 'updated': 1, 'deleted': 2}
+        ids = scraper.page_store.get_chunk_ids([self.URL])[self.URL]
+        assert ids[0] == kept_id
+        documents = scraper.knowledge_base.collection.get(ids=ids)['documents']
+        assert sorted(documents) == ["Статья 1. Текст.", "Статья 2. Новая редакция."]
+        assert scraper.knowledge_base.collection.count() == 2
+    
+    def test_failed_write_keeps_previous_chunks(self, scraper, monkeypatch):
+        """Если новые блоки страницы не записаны, прежние блоки и манифест страницы сохраняются"""
+        scraper.index_pages([self._page("Статья 1. Текст.", "Статья 2. Старая редакция.")])
+        previous_ids = scraper.page_store.get_chunk_ids([self.URL])[self.URL]
+        
+        def broken_embeddings(texts):
+            raise RuntimeError("сервис эмбеддингов недоступен")
+        
+        monkeypatch.setattr(scraper.knowledge_base, "embedding_function", broken_embeddings)
+        stats = scraper.index_pages([self._page("Статья 1. Текст.", "Статья 2. Новая редакция.")])
+        
+        assert (stats['added'], stats['deleted']) == (0, 0)
+        assert scraper.page_store.get_chunk_ids([self.URL])[self.URL] == previous_ids
+        assert sorted(scraper.knowledge_base.collection.get()['documents']) == [
+            "Статья 1. Текст.", "Статья 2. Старая редакция."
+        ]
+    
+    def test_legacy_chunks_of_page_removed(self, scraper):
+        """Блоки страницы со старыми случайными ID удаляются при первой индексации"""
+        scraper.knowledge_base.add_documents(["dynamic_20250712_162030_123456_chunk_000"], ["Статья 1. Текст."],
+                                             [{'url': self.URL, 'source': 'web_scraper'}])
+        
+        stats = scraper.index_pages([self._page("Статья 1. Текст.")])
+        
+        assert stats['deleted'] == 1
+        assert scraper.knowledge_base.collection.count() == 1
+    
+    def test_url_variants_share_chunk_ids(self, scraper):
+        """Варианты адреса одной страницы дают одни и те же ID блоков"""
+        variant = "HTTPS://Pravo.by:443/document/?p0=hk9900296&utm_source=tg&guid=3871#art1"
+        
+        assert canonical_url(variant) == canonical_url(self.URL) == "https://pravo.by/document/?guid=3871&p0=hk9900296"
+        assert make_chunk_ids(variant, ["Статья 1."]) == make_chunk_ids(self.URL, ["Статья 1."])
+        
+        scraper.index_pages([self._page("Статья 1. Текст.")])
+        stats = scraper.index_pages([dict(self._page("Статья 1. Текст."), url=variant)])
+        
+        assert (stats['added'], stats['deleted']) == (0, 0)
+        assert scraper.knowledge_base.collection.count() == 1
+    
+    def test_removed_page_chunks_deleted(self, scraper):
+        """Блоки исчезнувшей страницы удаляются из коллекции, BM25, индекса статей и манифеста страниц"""
+        scraper.index_pages([self._page("Статья 1. Гражданское законодательство.", "Статья 2. Участники.")])
+        assert scraper.knowledge_base.find_by_citation("статья 1 ГК")
+        
+        removed = scraper.remove_pages(["HTTPS://Pravo.by/document/?p0=hk9900296&guid=3871"])
+        
+        assert removed == ["HTTPS://Pravo.by/document/?p0=hk9900296&guid=3871"]
+        assert scraper.knowledge_base.collection.count() == 0
+        assert scraper.knowledge_base.bm25.search("гражданское законодательство") == []
+        assert scraper.knowledge_base.find_by_citation("статья 1 ГК") == []
+        assert scraper.page_store.get_chunk_ids([self.URL]) == {}
+    
+    def test_unchanged_chunks_metadata_refreshed(self, scraper):
+        """Метаданные неизмененных блоков обновляются без вычисления эмбеддингов"""
+        scraper.index_pages([self._page("Статья 1. Текст.")])
+        first = scraper.knowledge_base.collection.get(include=["metadatas"])['metadatas'][0]
+        embedded = sum(scraper.knowledge_base.embedding_function.calls)
+        
+        scraper.index_pages([dict(self._page("Статья 1. Текст."), title="Гражданский кодекс (ред. 2025)")])
+        
+        metadata = scraper.knowledge_base.collection.get(include=["metadatas"])['metadatas'][0]
+        assert metadata['title'] == "Гражданский кодекс (ред. 2025)"
+        assert metadata['added_date'] == first['added_date']
+        assert sum(scraper.knowledge_base.embedding_function.calls) == embedded
+    
+    def test_dedupe_collapses_legacy_duplicates(self, scraper):
+        """Дубликаты со старыми ID сводятся к одному блоку с детерминированным ID"""
+        kb = scraper.knowledge_base
+        kb.add_documents(
+            ["dynamic_20250712_162030_123456_chunk_000", "dynamic_20250713_090000_654321_chunk_000",
+             "dynamic_20250713_090000_654321_chunk_001", "doc_1"],
+            ["Статья 1. Текст.", "Статья 1. Текст.", "Статья 2. Текст.", "Статья 1. Текст."],
+            [{'url': self.URL, 'source': 'web_scraper'}, {'url': self.URL + "#top", 'source': 'web_scraper'},
+             {'url': self.URL, 'source': 'web_scraper'}, {'source_file': 'codex.docx'}]
+        )
+        embedded = sum(kb.embedding_function.calls)
+        
+        assert dedupe(kb, dry_run=True) == {'groups': 2, 'added': 2, 'deleted': 3}
+        assert kb.collection.count() == 4
+        
+        assert dedupe(kb) == {'groups': 2, 'added': 2, 'deleted': 3}
+        
+        ids = set(kb.collection.get(include=[])['ids'])
+        assert ids == {"doc_1", *make_chunk_ids(self.URL, ["Статья 1. Текст.", "Статья 2. Текст."])}
+        assert sum(kb.embedding_function.calls) == embedded
+        assert dedupe(kb)['groups'] == 0
 
 
-def test_scraper_error_handling():
+def test_scraper_error_handling(knowledge_base, scraper_stores):
     """Тест обработки ошибок скрапера"""
-    knowledge_base = KnowledgeBase()
     text_processor = TextProcessor()
     scraper = WebScraper(knowledge_base, text_processor)
     